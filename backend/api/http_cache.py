@@ -0,0 +1,65 @@
+"""
+HTTP Caching Helpers
+Strong ETags derived from weather/traffic snapshot versions, If-None-Match handling
+and Cache-Control max-age aligned with the time left until the next refresh
+"""
+
+import hashlib
+import json
+from typing import Dict, Any, Optional
+
+from fastapi import Request
+from fastapi.responses import Response, JSONResponse
+
+from services.ingestion import Snapshot, ingestion_scheduler
+
+def make_etag(request: Request, *versions: str) -> str:
+    """Strong ETag for this URL (path + query) and the versions its content derives from"""
+    key = "|".join([request.url.path, request.url.query, *versions])
+    return '"' + hashlib.sha1(key.encode("utf-8")).hexdigest()[:20] + '"'
+
+def content_etag(request: Request, data: Any) -> str:
+    """ETag for content that does not derive from a snapshot (hash of the data itself)"""
+    digest = hashlib.sha1(json.dumps(data, sort_keys=True, default=str).encode("utf-8")).hexdigest()
+    return make_etag(request, digest)
+
+def snapshot_max_age(*snapshots: Snapshot) -> int:
+    """Seconds until the earliest of the snapshots is due to be refreshed"""
+    remaining = []
+    for snapshot in snapshots:
+        source = ingestion_scheduler.sources.get(snapshot.source)
+        if source is None or snapshot.version.endswith("-fallback"):
+            return 0  # Fallback data should not be cached downstream
+        remaining.append(source.interval - snapshot.age_seconds())
+    return max(0, int(min(remaining))) if remaining else 0
+
+def cache_headers(etag: str, max_age: int) -> Dict[str, str]:
+    """ETag and Cache-Control headers shared by 200 and 304 responses"""
+    return {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={max_age}" if max_age > 0 else "no-cache"
+    }
+
+def is_not_modified(request: Request, etag: str) -> bool:
+    """Evaluate If-None-Match (weak comparison, as required for GET)"""
+    header = request.headers.get("if-none-match")
+    if not header:
+        return False
+    if header.strip() == "*":
+        return True
+    candidates = [tag.strip() for tag in header.split(",")]
+    return any(tag.removeprefix("W/") == etag for tag in candidates)
+
+def not_modified_response(etag: str, max_age: int) -> Response:
+    """304 with the validators the client needs to keep using its copy"""
+    return Response(status_code=304, headers=cache_headers(etag, max_age))
+
+def cached_response(request: Request, etag: str, max_age: int,
+                    payload: Any = None, body: Optional[bytes] = None) -> Response:
+    """200 with caching headers for a JSON payload or pre-serialized body, or 304 if unchanged"""
+    if is_not_modified(request, etag):
+        return not_modified_response(etag, max_age)
+    headers = cache_headers(etag, max_age)
+    if body is not None:
+        return Response(content=body, media_type="application/json", headers=headers)
+    return JSONResponse(content=payload, headers=headers)
@@ -3,7 +3,8 @@ API Routes for Tokyo Taxi AI Optimizer
 Production-ready endpoints integrating weather, traffic, and research algorithms
 """
 
-from fastapi import APIRouter, HTTPException, Depends, Query
+from fastapi import APIRouter, HTTPException, Depends, Query, Request, Header
+from fastapi.responses import StreamingResponse
 from typing import Dict, List, Any, Optional
 import logging
 from datetime import datetime
@@ -12,31 +13,47 @@ from datetime import datetime
 from services.weather_service import weather_service
 from services.traffic_service import traffic_service
 from services.research_integration import research_integration
+from services.ingestion import get_snapshot, ingestion_scheduler, snapshot_store
+from services.nowcast import nowcast_store
+from services.response_snapshots import response_snapshots, nowcast_version, MAX_HOTSPOTS
+from services.hotspot_stream import hotspot_stream
+from services.history import history_writer
+from services.demand_model import demand_model
+from services.demand_forecast import demand_forecaster
+from api.http_cache import make_etag, content_etag, snapshot_max_age, cached_response, is_not_modified, not_modified_response
 
 logger = logging.getLogger(__name__)
 router = APIRouter()
 
+# Cache lifetime for responses that do not depend on weather/traffic snapshots
+STATIC_MAX_AGE = 3600
+
 # Dependency for rate limiting (placeholder)
 async def rate_limit_dependency():
     """Rate limiting dependency - implement as needed"""
     pass
 
 @router.get("/weather")
-async def get_current_weather(rate_limit: None = Depends(rate_limit_dependency)):
+async def get_current_weather(request: Request, rate_limit: None = Depends(rate_limit_dependency)):
     """
     Get current weather data for Tokyo
     Returns weather information optimized for taxi demand prediction
     """
     try:
-        async with weather_service as ws:
-            weather_data = await ws.get_weather_for_optimization()
+        weather_snapshot = await get_snapshot("weather")
+        etag = make_etag(request, weather_snapshot.version)
+        max_age = snapshot_max_age(weather_snapshot)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, max_age)
+        
+        weather_data = weather_service.format_for_optimization(weather_snapshot.data, weather_snapshot.age_seconds())
         
-        return {
+        return cached_response(request, etag, max_age, payload={
             "success": True,
             "data": weather_data,
             "timestamp": datetime.now().isoformat(),
             "source": "Japan Meteorological Agency (JMA)"
-        }
+        })
     except Exception as e:
         logger.error(f"Weather API error: {e}")
         raise HTTPException(
@@ -45,21 +62,26 @@ async def get_current_weather(rate_limit: None = Depends(rate_limit_dependency))
         )
 
 @router.get("/traffic")
-async def get_current_traffic(rate_limit: None = Depends(rate_limit_dependency)):
+async def get_current_traffic(request: Request, rate_limit: None = Depends(rate_limit_dependency)):
     """
     Get current traffic and transportation data for Tokyo
     Returns ODPT data integrated with MCP-traffic system
     """
     try:
-        async with traffic_service as ts:
-            traffic_data = await ts.get_traffic_for_optimization()
+        traffic_snapshot = await get_snapshot("traffic")
+        etag = make_etag(request, traffic_snapshot.version)
+        max_age = snapshot_max_age(traffic_snapshot)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, max_age)
+        
+        traffic_data = traffic_service.format_for_optimization(traffic_snapshot.data, traffic_snapshot.age_seconds())
         
-        return {
+        return cached_response(request, etag, max_age, payload={
             "success": True,
             "data": traffic_data,
             "timestamp": datetime.now().isoformat(),
             "sources": ["ODPT", "MCP-traffic", "JR-East", "Tokyo Metro"]
-        }
+        })
     except Exception as e:
         logger.error(f"Traffic API error: {e}")
         raise HTTPException(
@@ -69,82 +91,23 @@ async def get_current_traffic(rate_limit: None = Depends(rate_limit_dependency))
 
 @router.get("/hotspots")
 async def get_demand_hotspots(
+    request: Request,
     user_type: str = Query("driver", description="User type: driver or passenger"),
-    limit: int = Query(10, ge=1, le=20, description="Number of hotspots to return")
+    limit: int = Query(10, ge=1, le=MAX_HOTSPOTS, description="Number of hotspots to return")
 ):
     """
     Get current demand hotspots based on integrated AI analysis
     Combines weather, traffic, and research algorithms
     """
     try:
-        # Get current weather and traffic data
-        async with weather_service as ws, traffic_service as ts:
-            weather_data = await ws.get_weather_for_optimization()
-            traffic_data = await ts.get_traffic_for_optimization()
-        
-        # Generate predictions using research integration
-        predictions = research_integration.generate_demand_predictions(
-            weather_data, traffic_data
-        )
-        
-        # Limit results
-        limited_predictions = predictions[:limit]
-        
-        # Add user-specific recommendations
-        recommendations = []
-        if user_type == "driver" and predictions:
-            top_spot = predictions[0]
-            recommendations.append({
-                "type": "positioning",
-                "title": f"Head to {top_spot['name']}",
-                "description": f"Highest AI revenue potential: ¥{top_spot['ai_revenue_per_min']}/min",
-                "priority": "high",
-                "confidence": top_spot['confidence_score']
-            })
-            
-            if weather_data.get("is_raining"):
-                recommendations.append({
-                    "type": "weather",
-                    "title": "Rain Advantage Active",
-                    "description": f"Rain detected: +{int((top_spot['weather_multiplier'] - 1) * 100)}% demand boost",
-                    "priority": "high",
-                    "confidence": 87
-                })
-            
-            # Check for traffic disruptions
-            if traffic_data.get("disruptions"):
-                disruption = traffic_data["disruptions"][0]
-                recommendations.append({
-                    "type": "traffic",
-                    "title": "Service Disruption Opportunity",
-                    "description": f"{disruption['line']}: {disruption['estimated_delay']}min delays increase taxi demand",
-                    "priority": "high",
-                    "confidence": 84
-                })
+        # Precomputed once per weather/traffic snapshot; limit is a slice of serialized items
+        responses = await response_snapshots.get()
+        etag = make_etag(request, responses.content_version)
+        max_age = snapshot_max_age(await get_snapshot("weather"), await get_snapshot("traffic"))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, max_age)
         
-        return {
-            "success": True,
-            "data": {
-                "hotspots": limited_predictions,
-                "recommendations": recommendations,
-                "integrated_factors": {
-                    "weather_impact": {
-                        "is_raining": weather_data.get("is_raining", False),
-                        "rain_intensity": weather_data.get("rain_intensity", 0),
-                        "demand_multiplier": weather_data.get("rain_intensity", 0) * 0.3 + 1.0 if weather_data.get("is_raining") else 1.0
-                    },
-                    "traffic_impact": {
-                        "active_disruptions": len(traffic_data.get("disruptions", [])),
-                        "punctuality_rate": traffic_data.get("system_performance", {}).get("punctuality_rate", 94.0),
-                        "average_delay": traffic_data.get("system_performance", {}).get("average_delay", 1.0)
-                    }
-                },
-                "research_validation": "University of Tokyo - 30.2% improvement validated"
-            },
-            "timestamp": datetime.now().isoformat(),
-            "user_type": user_type,
-            "data_integration": ["Weather (JMA)", "Traffic (ODPT)", "Research (UTokyo)"]
-        }
+        return cached_response(request, etag, max_age, body=responses.hotspots_body(user_type, limit))
         
     except Exception as e:
         logger.error(f"Hotspots API error: {e}")
@@ -153,8 +116,29 @@ async def get_demand_hotspots(
             detail="Failed to generate demand hotspots"
         )
 
+@router.get("/hotspots/stream")
+async def stream_demand_hotspots(last_event_id: Optional[str] = Header(None)):
+    """
+    Server-Sent Events stream of the hotspot ranking
+    Sends a snapshot event, then a diff event only when the ranking changes;
+    reconnecting clients resume from Last-Event-ID with a diff
+    """
+    stream = hotspot_stream.open(last_event_id)
+    if stream is None:
+        raise HTTPException(
+            status_code=503,
+            detail="Hotspot stream at capacity, poll /hotspots instead"
+        )
+    
+    return StreamingResponse(
+        stream,
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
 @router.get("/recommendations/{user_type}")
 async def get_user_recommendations(
+    request: Request,
     user_type: str,
     location_lat: Optional[float] = Query(None, description="User latitude"),
     location_lng: Optional[float] = Query(None, description="User longitude")
@@ -168,14 +152,30 @@ async def get_user_recommendations(
     
     try:
         # Get current conditions
-        async with weather_service as ws, traffic_service as ts:
-            weather_data = await ws.get_weather_for_optimization()
-            traffic_data = await ts.get_traffic_for_optimization()
+        weather_snapshot = await get_snapshot("weather")
+        traffic_snapshot = await get_snapshot("traffic")
         
-        # Generate predictions
-        predictions = research_integration.generate_demand_predictions(
-            weather_data, traffic_data
-        )
+        # Predictions depend on the snapshots, the nowcast raster and the hour of day
+        etag = make_etag(request, weather_snapshot.version, traffic_snapshot.version, nowcast_version(snapshot_store),
+                         datetime.now().strftime("%Y%m%d%H"))
+        max_age = snapshot_max_age(weather_snapshot, traffic_snapshot)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, max_age)
+        
+        weather_data = weather_service.format_for_optimization(weather_snapshot.data, weather_snapshot.age_seconds())
+        traffic_data = traffic_service.format_for_optimization(traffic_snapshot.data, traffic_snapshot.age_seconds())
+        
+        # Generate predictions; drivers with a known position get hotspots ranked by net revenue from there
+        has_location = location_lat is not None and location_lng is not None
+        if user_type == "driver" and has_location:
+            predictions = research_integration.generate_positioned_predictions(
+                weather_data, traffic_data, location_lat, location_lng, limit=5
+            )
+        else:
+            predictions = research_integration.generate_demand_predictions(
+                weather_data, traffic_data, limit=5
+            )
+        history_writer.record_predictions(etag.strip('"'), predictions, "recommendations")
         
         recommendations = []
         
@@ -185,7 +185,7 @@ async def get_user_recommendations(
                 top_spot = predictions[0]
                 
                 # Primary positioning recommendation
-                recommendations.append({
+                positioning = {
                     "id": "positioning",
                     "type": "positioning",
                     "title": f"Optimal Position: {top_spot['name']}",
@@ -195,7 +195,20 @@ async def get_user_recommendations(
                     "action_url": f"maps://directions?daddr={top_spot['latitude']},{top_spot['longitude']}",
                     "estimated_time": "15-20 minutes",
                     "expected_benefit": f"¥{int(top_spot['ai_revenue_per_min'] * 60)} per hour"
-                })
+                }
+                if "distance_km" in top_spot:
+                    positioning["estimated_time"] = f"{top_spot['minutes_to_position']} minutes ({top_spot['distance_km']} km)"
+                    positioning["expected_benefit"] = f"¥{top_spot['net_revenue_next_hour']:,} net over the next hour"
+                    positioning["alternatives"] = [
+                        {
+                            "name": spot["name"],
+                            "distance_km": spot["distance_km"],
+                            "minutes_to_position": spot["minutes_to_position"],
+                            "net_revenue_next_hour": spot["net_revenue_next_hour"]
+                        }
+                        for spot in predictions[1:3]
+                    ]
+                recommendations.append(positioning)
                 
                 # Weather-based recommendations
                 if weather_data.get("is_raining"):
@@ -204,7 +217,7 @@ async def get_user_recommendations(
                         "id": "weather_opportunity",
                         "type": "weather",
                         "title": "Rain Surge Opportunity",
-                        "description": f"Current rain intensity: {rain_intensity}mm/h. Demand increased by {int((top_spot['weather_multiplier'] - 1) * 100)}%",
+                        "description": f"Current rain intensity: {rain_intensity}mm/h. Demand increased by {research_integration.demand_boost_percent(top_spot)}%",
                         "priority": "high",
                         "confidence": 87,
                         "duration": "Next 2-3 hours",
@@ -281,6 +294,20 @@ async def get_user_recommendations(
                     ]
                 })
             
+            # Nearest station as the train alternative
+            if has_location:
+                distances, indices = traffic_service.station_index.nearest(location_lat, location_lng, k=1)
+                station = traffic_service.station_index.names[int(indices[0])]
+                walk_km = round(float(distances[0]), 2)
+                recommendations.append({
+                    "id": "nearest_station",
+                    "type": "station",
+                    "title": f"Nearest Station: {station}",
+                    "description": f"{walk_km} km away, about {int(round(walk_km * 12))} minutes on foot",
+                    "priority": "medium",
+                    "confidence": 90
+                })
+            
             # Cost analysis
             if weather_data.get("is_raining") or has_disruptions:
                 surge_factor = 1.2 if weather_data.get("is_raining") else 1.1
@@ -295,7 +322,7 @@ async def get_user_recommendations(
                     "reasoning": "Increased demand due to weather/disruptions"
                 })
         
-        return {
+        return cached_response(request, etag, max_age, payload={
             "success": True,
             "data": {
                 "recommendations": recommendations,
@@ -303,7 +330,7 @@ async def get_user_recommendations(
                 "location": {
                     "latitude": location_lat,
                     "longitude": location_lng
-                } if location_lat and location_lng else None,
+                } if has_location else None,
                 "context": {
                     "weather": {
                         "temperature": weather_data.get("temperature"),
@@ -319,7 +346,7 @@ async def get_user_recommendations(
                 }
             },
             "timestamp": datetime.now().isoformat()
-        }
+        })
         
     except Exception as e:
         logger.error(f"Recommendations API error: {e}")
@@ -329,18 +356,18 @@ async def get_user_recommendations(
         )
 
 @router.get("/research/summary")
-async def get_research_summary():
+async def get_research_summary(request: Request):
     """
     Get summary of University of Tokyo research backing this system
     """
     try:
         research_summary = research_integration.get_research_summary()
         
-        return {
+        return cached_response(request, content_etag(request, research_summary), STATIC_MAX_AGE, payload={
             "success": True,
             "data": research_summary,
             "timestamp": datetime.now().isoformat()
-        }
+        })
         
     except Exception as e:
         logger.error(f"Research summary API error: {e}")
@@ -350,7 +377,7 @@ async def get_research_summary():
         )
 
 @router.get("/system/health")
-async def system_health_check():
+async def system_health_check(request: Request):
     """
     Comprehensive system health check
     Tests all integrated services
@@ -364,13 +391,14 @@ async def system_health_check():
     
     # Test weather service
     try:
-        async with weather_service as ws:
-            weather_test = await ws.get_current_weather()
+        weather_test = (await get_snapshot("weather")).data
         health_status["services"]["weather"] = {
             "status": "healthy",
             "last_update": weather_test.timestamp.isoformat(),
             "confidence": weather_test.confidence,
-            "source": "JMA API"
+            "source": "JMA API",
+            "cache": weather_service.cache.get_stats(),
+            "circuit": weather_service.breaker.get_stats()
         }
     except Exception as e:
         health_status["services"]["weather"] = {
@@ -381,14 +409,17 @@ async def system_health_check():
     
     # Test traffic service
     try:
-        async with traffic_service as ts:
-            traffic_test = await ts.get_current_traffic_data()
+        traffic_test = (await get_snapshot("traffic")).data
         health_status["services"]["traffic"] = {
             "status": "healthy",
             "last_update": traffic_test.last_updated.isoformat(),
             "stations_monitored": len(traffic_test.stations),
             "active_disruptions": len(traffic_test.disruptions),
-            "sources": traffic_test.data_sources
+            "sources": traffic_test.data_sources,
+            "cache": traffic_service.cache.get_stats(),
+            "circuit": traffic_service.breaker.get_stats(),
+            "station_store": traffic_service.station_store.get_stats(),
+            "simulation": traffic_service.simulation.get_stats()
         }
     except Exception as e:
         health_status["services"]["traffic"] = {
@@ -397,6 +428,24 @@ async def system_health_check():
         }
         health_status["overall"] = "degraded"
     
+    # Per-cell rain raster (optional)
+    health_status["nowcast"] = nowcast_store.get_stats()
+    
+    # Snapshot/prediction history writer
+    health_status["history"] = history_writer.get_stats()
+    
+    # Learned demand model (optional artifact)
+    health_status["demand_model"] = demand_model.get_stats()
+    health_status["demand_forecast"] = demand_forecaster.get_stats()
+    
+    # Streaming connections on this worker
+    health_status["hotspot_stream"] = hotspot_stream.get_stats()
+    
+    # Background ingestion health
+    health_status["ingestion"] = ingestion_scheduler.get_health()
+    if any(source["status"] == "failing" for source in health_status["ingestion"]["sources"].values()):
+        health_status["overall"] = "degraded"
+    
     # Test research integration
     try:
         research_test = research_integration.get_research_summary()
@@ -412,19 +461,18 @@ async def system_health_check():
         }
         health_status["overall"] = "degraded"
     
-    return {
+    # Always revalidated: health reflects live state
+    return cached_response(request, content_etag(request, health_status), 0, payload={
         "success": True,
         "data": health_status
-    }
+    })
 
 @router.get("/stats/performance")
-async def get_performance_stats():
+async def get_performance_stats(request: Request):
     """
     Get system performance statistics
     """
-    return {
-        "success": True,
-        "data": {
+    performance_stats = {
             "research_metrics": {
                 "revenue_improvement": "30.2%",
                 "wait_time_reduction": "38.2%",
@@ -451,7 +499,10 @@ async def get_performance_stats():
                 "research_algorithms": "University of Tokyo validated",
                 "real_time_updates": "60-second refresh cycles"
             }
-        },
-        "timestamp": datetime.now().isoformat()
     }
-"
\ No newline at end of file
+    
+    return cached_response(request, content_etag(request, performance_stats), STATIC_MAX_AGE, payload={
+        "success": True,
+        "data": performance_stats,
+        "timestamp": datetime.now().isoformat()
+    })
@@ -3,20 +3,128 @@ Enhanced API Routes - Weather Intelligence Integration
 Core endpoints for driver positioning and passenger decision support
 """
 
-from fastapi import APIRouter, HTTPException, Query
+from fastapi import APIRouter, HTTPException, Query, Request
+from pydantic import BaseModel, Field
 from typing import Dict, List, Any, Optional
+import asyncio
 import logging
-from datetime import datetime
+from collections import Counter
+from datetime import datetime, timedelta
 
 # Import our enhanced services
 from services.weather_intelligence import weather_intelligence
+from services.ingestion import get_snapshot, snapshot_store
+from services.response_snapshots import response_snapshots, nowcast_version
+from services.demand_forecast import demand_forecaster
+from services.spatial_grid import tokyo_grid
 from services.weather_service import weather_service
+from services.traffic_service import traffic_service
+from services.fleet_assignment import fleet_optimizer, DriverPosition
+from api.http_cache import make_etag, snapshot_max_age, cached_response, is_not_modified, not_modified_response
 
 logger = logging.getLogger(__name__)
 weather_router = APIRouter()
 
+class DriverLocation(BaseModel):
+    """Current position of one driver"""
+    driver_id: str
+    latitude: float = Field(..., ge=-90, le=90)
+    longitude: float = Field(..., ge=-180, le=180)
+
+class FleetAssignmentRequest(BaseModel):
+    """Drivers to spread across the current hotspots"""
+    drivers: List[DriverLocation] = Field(..., min_length=1, max_length=fleet_optimizer.config["max_drivers"])
+
+class PassengerTrip(BaseModel):
+    """One origin -> destination trip"""
+    origin: str = Field(..., min_length=1)
+    destination: str = Field(..., min_length=1)
+
+class PassengerAdviceBatchRequest(BaseModel):
+    """Trips to advise on against the same weather snapshot"""
+    trips: List[PassengerTrip] = Field(..., min_length=1, max_length=1000)
+
+# Format decision recommendation
+DECISION_MAP = {
+    "take_taxi_now": {
+        "action": "Take Taxi Now",
+        "icon": "🚕",
+        "urgency": "high",
+        "color": "#FF6B6B"
+    },
+    "wait_rain_stops": {
+        "action": "Wait for Weather",
+        "icon": "⏳",
+        "urgency": "medium", 
+        "color": "#4ECDC4"
+    },
+    "use_alternative": {
+        "action": "Consider Alternatives",
+        "icon": "🚅",
+        "urgency": "low",
+        "color": "#45B7D1"
+    }
+}
+
+def _format_passenger_advice(advice, origin: str, destination: str) -> Dict[str, Any]:
+    """Response body for one passenger trip"""
+    decision_info = DECISION_MAP.get(advice.recommendation, DECISION_MAP["take_taxi_now"])
+    
+    # Build comprehensive response
+    response_data = {
+        "recommendation": {
+            "decision": advice.recommendation,
+            "action": decision_info["action"],
+            "icon": decision_info["icon"],
+            "urgency": decision_info["urgency"],
+            "color": decision_info["color"],
+            "confidence": f"{int(advice.confidence * 100)}%"
+        },
+        "reasoning": advice.reasoning,
+        "cost_comparison": {
+            "taxi": f"¥{int(advice.cost_comparison['taxi']):,}",
+            "train": f"¥{int(advice.cost_comparison['train']):,}",
+            "walking": "Free"
+        },
+        "weather_timeline": advice.weather_timeline,
+        "trip_details": {
+            "origin": origin,
+            "destination": destination
+        }
+    }
+    
+    # Add wait time if applicable
+    if advice.wait_time_estimate:
+        response_data["wait_recommendation"] = {
+            "wait_duration": f"{advice.wait_time_estimate} minutes",
+            "reason": "Rain expected to stop soon",
+            "alternative_savings": f"¥{int(advice.cost_comparison['taxi'] - advice.cost_comparison['train']):,}"
+        }
+    
+    return response_data
+
+def _weather_alerts(current_weather) -> List[Dict[str, str]]:
+    """Rain and forecast alerts shown alongside passenger advice"""
+    weather_alerts = []
+    if current_weather.is_raining:
+        intensity = "Light" if current_weather.rain_intensity < 3 else "Moderate" if current_weather.rain_intensity < 8 else "Heavy"
+        weather_alerts.append({
+            "type": "rain",
+            "message": f"{intensity} rain detected ({current_weather.rain_intensity}mm/h)",
+            "impact": "Increased taxi demand, consider taxi for comfort"
+        })
+    
+    if current_weather.forecast_3h.get("rain_probability", 0) > 60:
+        weather_alerts.append({
+            "type": "forecast",
+            "message": f"{current_weather.forecast_3h['rain_probability']}% chance of rain in next 3 hours",
+            "impact": "Consider timing of departure"
+        })
+    
+    return weather_alerts
+
 @weather_router.get("/driver/hotspots")
-async def get_driver_hotspots():
+async def get_driver_hotspots(request: Request):
     """
     🚕 GET DRIVER POSITIONING RECOMMENDATIONS
     
@@ -26,79 +134,141 @@ async def get_driver_hotspots():
     - University of Tokyo research (0.847 rain correlation)
     """
     try:
-        logger.info("🚕 Generating driver hotspot recommendations...")
+        # Precomputed once per weather/traffic snapshot
+        responses = await response_snapshots.get()
+        max_age = snapshot_max_age(await get_snapshot("weather"), await get_snapshot("traffic"))
+        return cached_response(request, make_etag(request, responses.content_version), max_age,
+                               body=responses.driver_hotspots)
         
-        recommendations = await weather_intelligence.generate_driver_recommendations()
+    except Exception as e:
+        logger.error(f"Driver hotspots API error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Unable to generate driver recommendations"
+        )
+
+@weather_router.get("/demand/forecast")
+async def get_demand_forecast(
+    request: Request,
+    horizons: Optional[str] = Query(None, description="Comma-separated minutes ahead (default: 15,30,60,180)"),
+    limit: int = Query(10, ge=1, le=50, description="Hotspots per horizon"),
+    latitude: Optional[float] = Query(None, ge=-90, le=90, description="Also return this location's zone"),
+    longitude: Optional[float] = Query(None, ge=-180, le=180)
+):
+    """
+    🕒 GET MULTI-HORIZON DEMAND FORECAST
+    
+    Where demand will be when drivers arrive, not just now:
+    - Per-zone demand 15, 30, 60 and 180 minutes ahead
+    - JMA forecast weather blended with current (nowcast) rain
+    - Scored like the live hotspots (research multipliers or the trained demand model) at each target time
+    """
+    allowed = list(demand_forecaster.config["horizons"])
+    requested = None
+    if horizons:
+        try:
+            requested = [int(value) for value in horizons.split(",") if value.strip()]
+        except ValueError:
+            requested = []
+        if not requested or any(minutes not in allowed for minutes in requested):
+            raise HTTPException(status_code=400, detail=f"horizons must be a comma-separated subset of {allowed}")
+    
+    cell = None
+    if (latitude is None) != (longitude is None):
+        raise HTTPException(status_code=400, detail="latitude and longitude must be given together")
+    if latitude is not None:
+        cell = tokyo_grid.cell_at(latitude, longitude)
+        if cell is None:
+            raise HTTPException(status_code=400, detail="Location is outside the 23 wards")
+    
+    try:
+        # One zones x horizons matrix per weather/traffic snapshot and issue time
+        weather_snapshot = await get_snapshot("weather")
+        traffic_snapshot = await get_snapshot("traffic")
+        forecast = demand_forecaster.get(weather_snapshot, traffic_snapshot, nowcast_version(snapshot_store))
+        etag = make_etag(request, forecast.version)
+        next_issue = forecast.issued_at + timedelta(minutes=demand_forecaster.config["issue_minutes"])
+        max_age = min(snapshot_max_age(weather_snapshot), snapshot_max_age(traffic_snapshot),
+                      max(0, int((next_issue - datetime.now()).total_seconds())))
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, max_age)
         
-        if not recommendations:
-            return {
-                "success": True,
-                "data": {
-                    "message": "No high-opportunity zones detected currently",
-                    "recommendations": [],
-                    "baseline_advice": "Normal demand patterns - continue regular operations"
-                },
-                "timestamp": datetime.now().isoformat()
-            }
+        return cached_response(request, etag, max_age, payload={
+            "success": True,
+            "data": demand_forecaster.format(forecast, requested, limit, cell),
+            "timestamp": datetime.now().isoformat()
+        })
         
-        # Format for driver interface
-        formatted_recommendations = []
-        for rec in recommendations:
-            formatted_recommendations.append({
-                "location": rec.location,
-                "coordinates": {
-                    "latitude": rec.coordinates[0],
-                    "longitude": rec.coordinates[1]
-                },
-                "opportunity": {
-                    "demand_increase": f"+{rec.expected_demand_increase}%",
-                    "revenue_boost": f"¥{int(rec.expected_revenue_boost)}/hour",
-                    "confidence": f"{int(rec.confidence * 100)}%"
-                },
-                "logistics": {
-                    "travel_time": f"{rec.time_to_position} minutes",
-                    "action_url": f"https://maps.apple.com/?daddr={rec.coordinates[0]},{rec.coordinates[1]}"
-                },
-                "reasoning": rec.reasoning,
-                "weather_trigger": rec.weather_trigger,
-                "priority": "high" if rec.expected_demand_increase > 50 else "medium"
-            })
+    except Exception as e:
+        logger.error(f"Demand forecast API error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Unable to generate demand forecast"
+        )
+
+@weather_router.post("/driver/assignments")
+async def assign_fleet(body: FleetAssignmentRequest):
+    """
+    🚕🚕 ASSIGN A FLEET OF DRIVERS TO HOTSPOTS
+    
+    Spreads drivers across demand hotspots instead of sending everyone to the top one:
+    - Each hotspot's capacity follows its predicted demand
+    - Assignment minimizes lost revenue from travel time (min-cost transportation problem)
+    - Reports solver time for monitoring
+    """
+    # Drivers outside the grid would be snapped to its nearest edge cell and routed from there
+    bounds = tokyo_grid.config["bounds"]
+    outside = [driver.driver_id for driver in body.drivers
+               if not (bounds["south"] <= driver.latitude <= bounds["north"]
+                       and bounds["west"] <= driver.longitude <= bounds["east"])]
+    if outside:
+        raise HTTPException(status_code=400, detail=f"Drivers outside the Tokyo service area: {', '.join(outside[:10])}")
+    counts = Counter(driver.driver_id for driver in body.drivers)
+    duplicates = sorted(driver_id for driver_id, count in counts.items() if count > 1)
+    if duplicates:
+        raise HTTPException(status_code=400, detail=f"Duplicate driver_id: {', '.join(duplicates[:10])}")
+    
+    try:
+        weather_snapshot = await get_snapshot("weather")
+        traffic_snapshot = await get_snapshot("traffic")
+        weather_data = weather_service.format_for_optimization(weather_snapshot.data, weather_snapshot.age_seconds())
+        traffic_data = traffic_service.format_for_optimization(traffic_snapshot.data, traffic_snapshot.age_seconds())
+        
+        drivers = [DriverPosition(driver.driver_id, driver.latitude, driver.longitude) for driver in body.drivers]
         
-        # Add current weather context
-        async with weather_service as ws:
-            current_weather = await ws.get_current_weather()
+        # CPU-bound solve runs off the event loop
+        result = await asyncio.to_thread(fleet_optimizer.assign, drivers, weather_data, traffic_data)
         
         return {
             "success": True,
             "data": {
-                "recommendations": formatted_recommendations,
-                "total_opportunities": len(recommendations),
-                "weather_context": {
-                    "current_condition": current_weather.description,
-                    "is_raining": current_weather.is_raining,
-                    "rain_intensity": f"{current_weather.rain_intensity}mm/h",
-                    "temperature": f"{current_weather.temperature}°C",
-                    "demand_multiplier": 2.3 if current_weather.is_raining else 1.0
-                },
-                "research_backing": {
-                    "institution": "University of Tokyo",
-                    "proven_improvement": "30.2% revenue increase",
-                    "rain_correlation": "0.847 (highly significant)"
+                "assignments": result.assignments,
+                "hotspots": result.hotspots,
+                "expected_net_revenue": result.expected_net_revenue,
+                "solver": {
+                    "status": result.status,
+                    "solve_time_ms": result.solve_time_ms,
+                    "total_time_ms": result.total_time_ms,
+                    **result.stats
                 }
             },
             "timestamp": datetime.now().isoformat(),
-            "user_type": "driver"
+            "data_versions": {
+                "weather": weather_snapshot.version,
+                "traffic": traffic_snapshot.version
+            }
         }
         
     except Exception as e:
-        logger.error(f"Driver hotspots API error: {e}")
+        logger.error(f"Fleet assignment API error: {e}")
         raise HTTPException(
             status_code=500,
-            detail="Unable to generate driver recommendations"
+            detail="Unable to assign drivers"
         )
 
 @weather_router.get("/passenger/advice")
 async def get_passenger_advice(
+    request: Request,
     origin: str = Query(..., description="Starting location (e.g., 'Shibuya Station')"),
     destination: str = Query(..., description="Destination (e.g., 'Tokyo Station')")
 ):
@@ -113,30 +283,194 @@ async def get_passenger_advice(
     try:
         logger.info(f"👤 Generating passenger advice: {origin} → {destination}")
         
-        advice = await weather_intelligence.generate_passenger_advice(origin, destination)
+        weather_snapshot = await get_snapshot("weather")
+        # Travel times depend on the hour as well as the weather snapshot
+        now = datetime.now()
+        etag = make_etag(request, weather_snapshot.version, now.strftime("%Y%m%d%H"))
+        seconds_to_next_hour = 3600 - (now.minute * 60 + now.second)
+        max_age = min(snapshot_max_age(weather_snapshot), seconds_to_next_hour)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, max_age)
         
-        # Get current weather for context
-        async with weather_service as ws:
-            current_weather = await ws.get_current_weather()
+        current_weather = weather_snapshot.data
         
-        # Format decision recommendation
-        decision_map = {
-            "take_taxi_now": {
-                "action": "Take Taxi Now",
-                "icon": "🚕",
-                "urgency": "high",
-                "color": "#FF6B6B"
-            },
-            "wait_rain_stops": {
-                "action": "Wait for Weather",
-                "icon": "⏳",
-                "urgency": "medium", 
-                "color": "#4ECDC4"
+        advice = await weather_intelligence.generate_passenger_advice(
+            origin, destination, current_weather, weather_snapshot.version
+        )
+        
+        response_data = _format_passenger_advice(advice, origin, destination)
+        response_data["weather_alerts"] = _weather_alerts(current_weather)
+        
+        return cached_response(request, etag, max_age, payload={
+            "success": True,
+            "data": response_data,
+            "timestamp": datetime.now().isoformat(),
+            "user_type": "passenger"
+        })
+        
+    except Exception as e:
+        logger.error(f"Passenger advice API error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Unable to generate passenger advice"
+        )
+
+@weather_router.post("/passenger/advice/batch")
+async def get_passenger_advice_batch(body: PassengerAdviceBatchRequest):
+    """
+    👥 BATCH PASSENGER ADVICE
+    
+    Advice for many trips against one weather snapshot; transport options are
+    memoized per origin/destination zone, so repeated pairs are not recomputed
+    """
+    try:
+        logger.info(f"👥 Generating passenger advice for {len(body.trips)} trips")
+        
+        weather_snapshot = await get_snapshot("weather")
+        current_weather = weather_snapshot.data
+        weather_alerts = _weather_alerts(current_weather)
+        
+        results = []
+        for trip in body.trips:
+            advice = await weather_intelligence.generate_passenger_advice(
+                trip.origin, trip.destination, current_weather, weather_snapshot.version
+            )
+            results.append(_format_passenger_advice(advice, trip.origin, trip.destination))
+        
+        return {
+            "success": True,
+            "data": {
+                "results": results,
+                "weather_alerts": weather_alerts,
+                "weather_version": weather_snapshot.version,
+                "memo": weather_intelligence.transport_memo.get_stats()
             },
-            "use_alternative": {
-                "action": "Consider Alternatives",
-                "icon": "🚅",
-                "urgency": "low",
-                "color": "#45B7D1"
+            "timestamp": datetime.now().isoformat(),
+            "user_type": "passenger"
+        }
+        
+    except Exception as e:
+        logger.error(f"Batch passenger advice API error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Unable to generate passenger advice"
+        )
+
+@weather_router.get("/weather/forecast")
+async def get_weather_forecast(
+    request: Request,
+    hours: int = Query(3, ge=1, le=72, description="Forecast horizon in hours")
+):
+    """
+    🌦️ GET EXTENDED WEATHER FORECAST
+    
+    Weather forecast optimized for transportation decisions (3 hours by default)
+    """
+    try:
+        weather_snapshot = await get_snapshot("weather")
+        etag = make_etag(request, weather_snapshot.version)
+        max_age = snapshot_max_age(weather_snapshot)
+        if is_not_modified(request, etag):
+            return not_modified_response(etag, max_age)
+        
+        current_weather = weather_snapshot.data
+        
+        # Generate extended forecast timeline
+        forecast_timeline = [
+            {
+                "time": "Now",
+                "condition": current_weather.description,
+                "temperature": f"{current_weather.temperature}°C",
+                "precipitation": f"{current_weather.rain_intensity}mm/h",
+                "is_raining": current_weather.is_raining,
+                "taxi_demand": "High" if current_weather.is_raining else "Normal"
             }
-        }\n        \n        decision_info = decision_map.get(advice.recommendation, decision_map[\"take_taxi_now\"])\n        \n        # Build comprehensive response\n        response_data = {\n            \"recommendation\": {\n                \"decision\": advice.recommendation,\n                \"action\": decision_info[\"action\"],\n                \"icon\": decision_info[\"icon\"],\n                \"urgency\": decision_info[\"urgency\"],\n                \"color\": decision_info[\"color\"],\n                \"confidence\": f\"{int(advice.confidence * 100)}%\"\n            },\n            \"reasoning\": advice.reasoning,\n            \"cost_comparison\": {\n                \"taxi\": f\"¥{int(advice.cost_comparison['taxi']):,}\",\n                \"train\": f\"¥{int(advice.cost_comparison['train']):,}\",\n                \"walking\": \"Free\"\n            },\n            \"weather_timeline\": advice.weather_timeline,\n            \"trip_details\": {\n                \"origin\": origin,\n                \"destination\": destination\n            }\n        }\n        \n        # Add wait time if applicable\n        if advice.wait_time_estimate:\n            response_data[\"wait_recommendation\"] = {\n                \"wait_duration\": f\"{advice.wait_time_estimate} minutes\",\n                \"reason\": \"Rain expected to stop soon\",\n                \"alternative_savings\": f\"¥{int(advice.cost_comparison['taxi'] - advice.cost_comparison['train']):,}\"\n            }\n        \n        # Add weather alerts\n        weather_alerts = []\n        if current_weather.is_raining:\n            intensity = \"Light\" if current_weather.rain_intensity < 3 else \"Moderate\" if current_weather.rain_intensity < 8 else \"Heavy\"\n            weather_alerts.append({\n                \"type\": \"rain\",\n                \"message\": f\"{intensity} rain detected ({current_weather.rain_intensity}mm/h)\",\n                \"impact\": \"Increased taxi demand, consider taxi for comfort\"\n            })\n        \n        if current_weather.forecast_3h.get(\"rain_probability\", 0) > 60:\n            weather_alerts.append({\n                \"type\": \"forecast\",\n                \"message\": f\"{current_weather.forecast_3h['rain_probability']}% chance of rain in next 3 hours\",\n                \"impact\": \"Consider timing of departure\"\n            })\n        \n        response_data[\"weather_alerts\"] = weather_alerts\n        \n        return {\n            \"success\": True,\n            \"data\": response_data,\n            \"timestamp\": datetime.now().isoformat(),\n            \"user_type\": \"passenger\"\n        }\n        \n    except Exception as e:\n        logger.error(f\"Passenger advice API error: {e}\")\n        raise HTTPException(\n            status_code=500,\n            detail=\"Unable to generate passenger advice\"\n        )\n\n@weather_router.get(\"/weather/forecast\")\nasync def get_weather_forecast():\n    \"\"\"\n    🌦️ GET EXTENDED WEATHER FORECAST\n    \n    3-hour weather forecast optimized for transportation decisions\n    \"\"\"\n    try:\n        async with weather_service as ws:\n            current_weather = await ws.get_current_weather()\n        \n        # Generate extended forecast timeline\n        forecast_timeline = [\n            {\n                \"time\": \"Now\",\n                \"condition\": current_weather.description,\n                \"temperature\": f\"{current_weather.temperature}°C\",\n                \"precipitation\": f\"{current_weather.rain_intensity}mm/h\",\n                \"is_raining\": current_weather.is_raining,\n                \"taxi_demand\": \"High\" if current_weather.is_raining else \"Normal\"\n            },\n            {\n                \"time\": \"+1 hour\",\n                \"condition\": \"Partly Cloudy\",\n                \"temperature\": f\"{current_weather.temperature - 1}°C\",\n                \"precipitation\": \"0.5mm/h\",\n                \"rain_probability\": f\"{current_weather.forecast_3h.get('rain_probability', 30)}%\",\n                \"taxi_demand\": \"Normal\"\n            },\n            {\n                \"time\": \"+3 hours\",\n                \"condition\": \"Improving\", \n                \"temperature\": f\"{current_weather.temperature + 1}°C\",\n                \"precipitation\": \"0mm/h\",\n                \"rain_probability\": \"20%\",\n                \"taxi_demand\": \"Normal\"\n            }\n        ]\n        \n        return {\n            \"success\": True,\n            \"data\": {\n                \"forecast_timeline\": forecast_timeline,\n                \"current_conditions\": {\n                    \"temperature\": current_weather.temperature,\n                    \"humidity\": current_weather.humidity,\n                    \"wind_speed\": current_weather.wind_speed,\n                    \"visibility\": current_weather.visibility,\n                    \"pressure\": current_weather.pressure\n                },\n                \"transportation_impact\": {\n                    \"taxi_demand_level\": \"High\" if current_weather.is_raining else \"Normal\",\n                    \"walking_conditions\": \"Poor\" if current_weather.is_raining else \"Good\",\n                    \"visibility_driving\": \"Reduced\" if current_weather.visibility < 10 else \"Good\"\n                },\n                \"research_context\": {\n                    \"rain_demand_correlation\": \"0.847\",\n                    \"expected_demand_increase\": f\"+{int((2.3 - 1) * 100)}%\" if current_weather.is_raining else \"Baseline\"\n                }\n            },\n            \"timestamp\": datetime.now().isoformat(),\n            \"source\": \"Japan Meteorological Agency (JMA)\"\n        }\n        \n    except Exception as e:\n        logger.error(f\"Weather forecast API error: {e}\")\n        raise HTTPException(\n            status_code=500,\n            detail=\"Unable to retrieve weather forecast\"\n        )\n\n@weather_router.get(\"/intelligence/summary\")\nasync def get_intelligence_summary():\n    \"\"\"\n    🤖 GET CURRENT INTELLIGENCE SUMMARY\n    \n    Overview of current conditions and opportunities for both user types\n    \"\"\"\n    try:\n        # Get current weather and generate insights\n        async with weather_service as ws:\n            current_weather = await ws.get_current_weather()\n        \n        driver_recs = await weather_intelligence.generate_driver_recommendations()\n        \n        # Calculate system-wide metrics\n        total_opportunity_zones = len([r for r in driver_recs if r.expected_demand_increase > 25])\n        avg_demand_increase = sum(r.expected_demand_increase for r in driver_recs) / len(driver_recs) if driver_recs else 0\n        \n        # System intelligence summary\n        intelligence_summary = {\n            \"current_conditions\": {\n                \"weather\": current_weather.description,\n                \"temperature\": f\"{current_weather.temperature}°C\",\n                \"is_raining\": current_weather.is_raining,\n                \"rain_intensity\": current_weather.rain_intensity,\n                \"visibility\": current_weather.visibility\n            },\n            \"system_intelligence\": {\n                \"active_opportunity_zones\": total_opportunity_zones,\n                \"average_demand_increase\": f\"+{avg_demand_increase:.1f}%\",\n                \"ai_confidence\": f\"{int(current_weather.confidence * 100)}%\",\n                \"data_freshness\": \"<60 seconds\"\n            },\n            \"driver_insights\": {\n                \"recommended_action\": \"Head to high-demand zones\" if driver_recs else \"Continue normal operations\",\n                \"top_opportunity\": driver_recs[0].location if driver_recs else None,\n                \"expected_revenue_boost\": f\"¥{int(driver_recs[0].expected_revenue_boost)}/hour\" if driver_recs else \"Standard rates\"\n            },\n            \"passenger_insights\": {\n                \"recommended_action\": \"Take taxi\" if current_weather.is_raining else \"Multiple options available\",\n                \"current_wait_time\": \"4-6 minutes\" if current_weather.is_raining else \"2-4 minutes\",\n                \"cost_impact\": \"+20% surge\" if current_weather.is_raining else \"Standard rates\"\n            },\n            \"research_validation\": {\n                \"institution\": \"University of Tokyo\",\n                \"faculty\": \"Faculty of Economics\", \n                \"researcher\": \"Tatsuru Kikuchi\",\n                \"key_finding\": \"30.2% productivity improvement with weather-AI integration\",\n                \"statistical_significance\": \"p < 0.05\"\n            }\n        }\n        \n        return {\n            \"success\": True,\n            \"data\": intelligence_summary,\n            \"timestamp\": datetime.now().isoformat(),\n            \"system_status\": \"Fully Operational\"\n        }\n        \n    except Exception as e:\n        logger.error(f\"Intelligence summary API error: {e}\")\n        raise HTTPException(\n            status_code=500,\n            detail=\"Unable to generate intelligence summary\"\n        )\n
\ No newline at end of file
+        ]
+        
+        # Slices of the parsed JMA arrays: +1 hour, then every 3 hours up to the horizon
+        for offset in [1] + list(range(3, hours + 1, 3)):
+            outlook = weather_service.forecast_at(current_weather, offset, window_hours=1 if offset == 1 else 3)
+            if outlook is None:
+                break
+            forecast_timeline.append({
+                "time": f"+{offset} hour" if offset == 1 else f"+{offset} hours",
+                "condition": outlook["description"],
+                "temperature": f"{outlook['temperature']}°C",
+                "precipitation": f"{outlook['precipitation']}mm/h",
+                "rain_probability": f"{outlook['rain_probability']}%",
+                "taxi_demand": "High" if outlook["precipitation"] > 0 else "Normal"
+            })
+        
+        # Fallback data carries no forecast arrays
+        if current_weather.forecast is None:
+            forecast_timeline.extend([
+                {
+                    "time": "+1 hour",
+                    "condition": "Partly Cloudy",
+                    "temperature": f"{current_weather.temperature - 1}°C",
+                    "precipitation": "0.5mm/h",
+                    "rain_probability": f"{current_weather.forecast_3h.get('rain_probability', 30)}%",
+                    "taxi_demand": "Normal"
+                },
+                {
+                    "time": "+3 hours",
+                    "condition": "Improving", 
+                    "temperature": f"{current_weather.temperature + 1}°C",
+                    "precipitation": "0mm/h",
+                    "rain_probability": "20%",
+                    "taxi_demand": "Normal"
+                }
+            ])
+        
+        return cached_response(request, etag, max_age, payload={
+            "success": True,
+            "data": {
+                "forecast_timeline": forecast_timeline,
+                "current_conditions": {
+                    "temperature": current_weather.temperature,
+                    "humidity": current_weather.humidity,
+                    "wind_speed": current_weather.wind_speed,
+                    "visibility": current_weather.visibility,
+                    "pressure": current_weather.pressure
+                },
+                "transportation_impact": {
+                    "taxi_demand_level": "High" if current_weather.is_raining else "Normal",
+                    "walking_conditions": "Poor" if current_weather.is_raining else "Good",
+                    "visibility_driving": "Reduced" if current_weather.visibility < 10 else "Good"
+                },
+                "research_context": {
+                    "rain_demand_correlation": "0.847",
+                    "expected_demand_increase": f"+{int((2.3 - 1) * 100)}%" if current_weather.is_raining else "Baseline"
+                }
+            },
+            "timestamp": datetime.now().isoformat(),
+            "source": "Japan Meteorological Agency (JMA)"
+        })
+        
+    except Exception as e:
+        logger.error(f"Weather forecast API error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Unable to retrieve weather forecast"
+        )
+
+@weather_router.get("/intelligence/summary")
+async def get_intelligence_summary(request: Request):
+    """
+    🤖 GET CURRENT INTELLIGENCE SUMMARY
+    
+    Overview of current conditions and opportunities for both user types
+    """
+    try:
+        # Precomputed once per weather/traffic snapshot
+        responses = await response_snapshots.get()
+        max_age = snapshot_max_age(await get_snapshot("weather"), await get_snapshot("traffic"))
+        return cached_response(request, make_etag(request, responses.content_version), max_age,
+                               body=responses.intelligence_summary)
+        
+    except Exception as e:
+        logger.error(f"Intelligence summary API error: {e}")
+        raise HTTPException(
+            status_code=500,
+            detail="Unable to generate intelligence summary"
+        )
@@ -17,6 +17,17 @@ from contextlib import asynccontextmanager
 from api.routes import router
 from api.weather_routes import weather_router
 
+# Import shared services
+from services.http_client import create_http_session
+from services.weather_service import weather_service
+from services.traffic_service import traffic_service
+from services.cache import close_shared_backend
+from services.ingestion import ingestion_scheduler
+from services.travel_matrix import travel_matrix
+from services.nowcast import nowcast_store
+from services.hotspot_stream import hotspot_stream
+from services.history import history_writer
+
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 logger = logging.getLogger(__name__)
@@ -30,9 +41,32 @@ async def lifespan(app: FastAPI):
     logger.info("🤖 AI optimization algorithms loaded")
     logger.info("⚡ Driver positioning & passenger decision support active")
     
+    # One pooled upstream HTTP client per worker, shared by all services
+    http_session = create_http_session()
+    weather_service.attach_session(http_session)
+    traffic_service.attach_session(http_session)
+    nowcast_store.attach_session(http_session)
+    
+    # Memory-map the precomputed travel-time matrix (built on first start if missing)
+    await asyncio.to_thread(travel_matrix.load)
+    
+    # Record snapshots and served predictions in batches, off the request path
+    await history_writer.start()
+    
+    # Poll JMA/ODPT in the background; handlers read the published snapshots
+    await ingestion_scheduler.start()
+    
+    # Push hotspot changes to streaming clients
+    await hotspot_stream.start()
+    
     yield
     
     logger.info("🚕 Tokyo Taxi AI Optimizer shutting down...")
+    await hotspot_stream.stop()
+    await ingestion_scheduler.stop()
+    await history_writer.stop()
+    await http_session.close()
+    await close_shared_backend()
 
 # Create FastAPI application
 app = FastAPI(
@@ -0,0 +1,326 @@
+"""
+Demand Model Backtest
+Replays recorded weather/traffic snapshots through the demand models, one process per day, and scores
+their hotspots against recorded trip outcomes. The learned model is only scored when asked for with
+--model learned, and should be replayed on days after its trained_until date
+
+Trips are CSV files named <YYYY-MM-DD>.csv with a header row and the columns
+pickup_at (ISO 8601), latitude, longitude, fare (yen)
+
+Run with: python -m services.backtest --history data/history --trips data/trips --start 2026-10-01 --end 2026-10-30
+Score the learned model too: ... --model research --model learned --model weather_intelligence
+"""
+
+import argparse
+import csv
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+from scipy import stats
+
+from .history import ColumnarHistoryBackend, SQLHistoryBackend, HistoryBackend, HistoryRecord
+from .spatial_grid import distance_km
+
+logger = logging.getLogger(__name__)
+
+# research: the published multipliers only; learned: the trained demand model (DEMAND_MODEL_PATH);
+# static: base revenue only, the baseline every other model is compared with and always scored
+MODELS = ("research", "learned", "weather_intelligence", "static")
+DEFAULT_MODELS = ("research", "weather_intelligence", "static")
+
+def _get_default_config() -> Dict[str, Any]:
+    """Default backtest configuration"""
+    return {
+        "step_minutes": 60,         # Predictions are compared with the trips of each step
+        "hotspots": 5,              # Hotspots a driver is shown
+        "capture_radius_km": 1.0,   # Trips this close to a hotspot count as captured
+        "snapshot_lookback_hours": 3,  # Snapshots from the previous day still in force after midnight
+        "models": list(DEFAULT_MODELS)
+    }
+
+def open_history(location: str) -> HistoryBackend:
+    """Columnar history directory, or a SQLAlchemy URL"""
+    return SQLHistoryBackend(location) if "://" in location else ColumnarHistoryBackend(location)
+
+def load_trips(path: str) -> Tuple[np.ndarray, np.ndarray, np.ndarray, np.ndarray]:
+    """(pickup epoch seconds, latitude, longitude, fare) arrays of one trips file; empty if missing"""
+    if not os.path.exists(path):
+        return np.empty(0), np.empty(0), np.empty(0), np.empty(0)
+    with open(path, newline="") as f:
+        rows = list(csv.DictReader(f))
+    return (
+        np.array([datetime.fromisoformat(row["pickup_at"]).timestamp() for row in rows], dtype=np.float64),
+        np.array([float(row["latitude"]) for row in rows]),
+        np.array([float(row["longitude"]) for row in rows]),
+        np.array([float(row["fare"]) for row in rows])
+    )
+
+def _latest(records: List[HistoryRecord], times: np.ndarray, when: datetime) -> Optional[HistoryRecord]:
+    """Last record at or before a time (records are sorted by recorded_at, times are their epoch seconds)"""
+    i = int(np.searchsorted(times, when.timestamp(), side="right")) - 1
+    return records[i] if i >= 0 else None
+
+class DayReplay:
+    """Everything one worker needs to score one day"""
+
+    def __init__(self, history: str, trips_dir: str, config: Dict[str, Any]):
+        # Imported here so each worker process builds its own engines
+        from .research_integration import research_integration
+        from .weather_intelligence import weather_intelligence
+        from .weather_service import weather_service, WeatherData
+        from .traffic_service import traffic_service, TrafficData
+
+        self.history = open_history(history)
+        self.trips_dir = trips_dir
+        self.config = config
+        self.research = research_integration
+        self.intelligence = weather_intelligence
+        self.weather_service = weather_service
+        self.traffic_service = traffic_service
+        self.WeatherData = WeatherData
+        self.TrafficData = TrafficData
+        self.grid = research_integration.grid
+
+    def _capture_mask(self, hotspots: np.ndarray) -> np.ndarray:
+        """Cells within capture_radius_km of any hotspot"""
+        distances = distance_km(self.grid.lat[:, None], self.grid.lng[:, None],
+                                self.grid.lat[hotspots][None, :], self.grid.lng[hotspots][None, :])
+        return (distances <= self.config["capture_radius_km"]).any(axis=1)
+
+    def _top_cells(self, values: np.ndarray) -> np.ndarray:
+        """Top hotspots by a per-cell score: demand peaks only, spread apart like the served lists"""
+        order = np.argsort(-values, kind="stable")
+        return self.research.select_hotspots({"order": order, "ai_revenue_per_min": values},
+                                             self.config["hotspots"], self.research.zones)
+
+    def run(self, day: date) -> Dict[str, Any]:
+        started = time.perf_counter()
+        day_start = datetime.combine(day, datetime.min.time())
+        day_end = day_start + timedelta(days=1)
+        lookback = day_start - timedelta(hours=self.config["snapshot_lookback_hours"])
+
+        weather_records = self.history.read_payloads("weather", lookback, day_end)
+        traffic_records = self.history.read_payloads("traffic", lookback, day_end)
+        trip_time, trip_lat, trip_lng, trip_fare = load_trips(os.path.join(self.trips_dir, f"{day.isoformat()}.csv"))
+        trip_cell = self.grid.cells_at(trip_lat, trip_lng)
+        inside = trip_cell >= 0
+        trip_time, trip_cell, trip_fare = trip_time[inside], trip_cell[inside], trip_fare[inside]
+
+        weather_times = np.array([record.recorded_at.timestamp() for record in weather_records])
+        traffic_times = np.array([record.recorded_at.timestamp() for record in traffic_records])
+        cells = len(self.grid)
+        static_top = self._top_cells(self.grid.base_revenue.astype(np.float64))
+        static_capture = self._capture_mask(static_top)
+
+        steps = []
+        step = timedelta(minutes=self.config["step_minutes"])
+        when = day_start
+        while when < day_end:
+            weather_record = _latest(weather_records, weather_times, when)
+            traffic_record = _latest(traffic_records, traffic_times, when)
+            in_step = (trip_time >= when.timestamp()) & (trip_time < (when + step).timestamp())
+            if weather_record is None or traffic_record is None or not in_step.any():
+                when += step
+                continue
+
+            weather = self.WeatherData.from_dict(weather_record.payload)
+            traffic = self.TrafficData.from_dict(traffic_record.payload)
+            weather_data = self.weather_service.format_for_optimization(
+                weather, (when - weather_record.recorded_at).total_seconds())
+            traffic_data = self.traffic_service.format_for_optimization(
+                traffic, (when - traffic_record.recorded_at).total_seconds())
+
+            predicted = {}
+            for model in self.config["models"]:
+                if model == "research":
+                    predicted[model] = self.research.predict_demand_arrays(
+                        weather_data, traffic_data, now=when, learned=False)["ai_revenue_per_min"]
+                elif model == "learned":
+                    predicted[model] = self.research.predict_demand_arrays(
+                        weather_data, traffic_data, now=when, learned=True)["ai_revenue_per_min"]
+                elif model == "weather_intelligence":
+                    predicted[model] = self.intelligence.calculate_cell_demand(weather, when.hour)["revenue_boost"]
+                else:
+                    predicted[model] = self.grid.base_revenue.astype(np.float64)
+            observed_trips = np.bincount(trip_cell[in_step], minlength=cells)
+            observed_revenue = np.bincount(trip_cell[in_step], weights=trip_fare[in_step], minlength=cells)
+            total_revenue = observed_revenue.sum()
+
+            result = {
+                "time": when.isoformat(),
+                "trips": int(in_step.sum()),
+                "revenue": float(total_revenue),
+                "is_raining": bool(weather.is_raining),
+                "predicted_level": float(predicted[self.config["models"][0]].sum()),
+                "models": {}
+            }
+            for model, values in predicted.items():
+                if model == "static":
+                    top, capture = static_top, static_capture
+                else:
+                    top = self._top_cells(values)
+                    capture = self._capture_mask(top)
+                correlation = stats.spearmanr(values, observed_trips).correlation if observed_trips.any() else np.nan
+                result["models"][model] = {
+                    "rank_correlation": None if np.isnan(correlation) else float(correlation),
+                    "top_cell_hit_rate": float(np.isin(trip_cell[in_step], top).mean()),
+                    "revenue_share": float(observed_revenue[capture].sum() / total_revenue) if total_revenue else 0.0
+                }
+            steps.append(result)
+            when += step
+
+        return {
+            "day": day.isoformat(),
+            "snapshots": {"weather": len(weather_records), "traffic": len(traffic_records)},
+            "trips": int(len(trip_time)),
+            "steps": steps,
+            "seconds": round(time.perf_counter() - started, 3)
+        }
+
+_replay: Optional[DayReplay] = None
+
+def _init_worker(history: str, trips_dir: str, config: Dict[str, Any]):
+    global _replay
+    logging.basicConfig(level=logging.WARNING)
+    _replay = DayReplay(history, trips_dir, config)
+
+def _run_day(day: date) -> Dict[str, Any]:
+    return _replay.run(day)
+
+def summarize(days: List[Dict[str, Any]]) -> Dict[str, Any]:
+    """Trip-weighted accuracy and revenue metrics per model over every replayed step"""
+    steps = [step for day in days for step in day["steps"]]
+    if not steps:
+        return {"steps": 0}
+
+    trips = np.array([step["trips"] for step in steps], dtype=np.float64)
+    summary = {
+        "steps": len(steps),
+        "trips": int(trips.sum()),
+        "revenue": round(sum(step["revenue"] for step in steps)),
+        "models": {}
+    }
+    # Does the predicted city-wide demand level follow the observed trip volume over time?
+    if len(steps) > 2:
+        level = np.array([step["predicted_level"] for step in steps])
+        # Undefined when either series is flat; None like rank_correlation, so the JSON report stays valid
+        varies = level.std() > 0 and trips.std() > 0
+        summary["level_correlation"] = round(float(stats.pearsonr(level, trips)[0]), 4) if varies else None
+
+    models = list(steps[0]["models"])
+    summary["level_model"] = models[0]
+    for model in models:
+        rows = [step["models"][model] for step in steps]
+        correlations = np.array([np.nan if row["rank_correlation"] is None else row["rank_correlation"] for row in rows])
+        valid = ~np.isnan(correlations)
+        summary["models"][model] = {
+            "rank_correlation": round(float(np.average(correlations[valid], weights=trips[valid])), 4) if valid.any() else None,
+            "top_cell_hit_rate": round(float(np.average([row["top_cell_hit_rate"] for row in rows], weights=trips)), 4),
+            "revenue_share": round(float(np.average([row["revenue_share"] for row in rows], weights=trips)), 4),
+            "revenue_share_rain": round(float(np.average(
+                [row["revenue_share"] for row, step in zip(rows, steps) if step["is_raining"]],
+                weights=[step["trips"] for step in steps if step["is_raining"]]
+            )), 4) if any(step["is_raining"] for step in steps) else None
+        }
+
+    static_share = summary["models"]["static"]["revenue_share"]
+    for model in models:
+        if model == "static":
+            continue
+        share = summary["models"][model]["revenue_share"]
+        summary["models"][model]["revenue_lift_vs_static"] = round(share / static_share, 3) if static_share else None
+    return summary
+
+def learned_model_info(start: date, end: date) -> Dict[str, Any]:
+    """Artifact the learned model is scored with; warns when its training data overlaps the replay"""
+    from .demand_model import demand_model
+
+    if not demand_model.ready:
+        raise ValueError(f"No trained demand model at {demand_model.config['path']}")
+    trained_until = demand_model.trained_until
+    overlaps = trained_until is None or date.fromisoformat(trained_until) >= start
+    if overlaps:
+        logger.warning(f"Demand model was trained until {trained_until or 'an unknown date'}, which overlaps the "
+                       f"replay period {start} to {end}: its scores include days it was fitted on")
+    return {
+        "path": demand_model.config["path"],
+        "trained_until": trained_until,
+        "overlaps_replay": overlaps
+    }
+
+def run_backtest(history: str, trips_dir: str, start: date, end: date, workers: Optional[int] = None,
+                 config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Replay every day from start to end (inclusive), one day per task across worker processes"""
+    config = {**_get_default_config(), **(config or {})}
+    unknown = set(config["models"]) - set(MODELS)
+    if unknown:
+        raise ValueError(f"Unknown models: {', '.join(sorted(unknown))}")
+    config["models"] = [model for model in MODELS if model in config["models"] and model != "static"] + ["static"]
+    learned = learned_model_info(start, end) if "learned" in config["models"] else None
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(days)))
+    started = time.perf_counter()
+
+    if workers == 1:
+        _init_worker(history, trips_dir, config)
+        results = [_run_day(day) for day in days]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(history, trips_dir, config)) as pool:
+            results = list(pool.map(_run_day, days))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "period": {"start": start.isoformat(), "end": end.isoformat(), "days": len(days)},
+        "config": config,
+        "learned_model": learned,
+        "workers": workers,
+        "seconds": round(elapsed, 2),
+        "replay_speedup": round(len(days) * 86400 / elapsed) if elapsed else None,  # Simulated seconds per wall second
+        "summary": summarize(results),
+        "days": [
+            {"day": day["day"], "trips": day["trips"], "snapshots": day["snapshots"], "seconds": day["seconds"],
+             "summary": summarize([day])}
+            for day in results
+        ]
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Backtest the demand models against recorded trips")
+    parser.add_argument("--history", default=os.getenv("HISTORY_DIR") or os.getenv("HISTORY_DATABASE_URL"),
+                        help="History directory or database URL (default: HISTORY_DIR / HISTORY_DATABASE_URL)")
+    parser.add_argument("--trips", required=True, help="Directory of <YYYY-MM-DD>.csv trip files")
+    parser.add_argument("--start", required=True, type=date.fromisoformat)
+    parser.add_argument("--end", required=True, type=date.fromisoformat)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--step-minutes", type=int, default=60)
+    parser.add_argument("--hotspots", type=int, default=5)
+    parser.add_argument("--model", action="append", choices=[model for model in MODELS if model != "static"],
+                        help=f"Model to score, repeatable (default: {', '.join(DEFAULT_MODELS[:-1])}; static is always scored)")
+    parser.add_argument("--output", help="Write the full report (per-day results) to this JSON file")
+    args = parser.parse_args(argv)
+    if not args.history:
+        parser.error("--history is required when HISTORY_DIR is not set")
+
+    try:
+        report = run_backtest(args.history, args.trips, args.start, args.end, args.workers,
+                              {"step_minutes": args.step_minutes, "hotspots": args.hotspots,
+                               "models": args.model or list(DEFAULT_MODELS)})
+    except ValueError as e:
+        parser.error(str(e))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+    json.dump({key: value for key, value in report.items() if key != "days"}, sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
@@ -0,0 +1,280 @@
+"""
+Stale-While-Revalidate Cache
+Two-tier caching layer for weather and traffic snapshots:
+an in-process L1 plus an optional shared L2 (Redis / file) used by every worker and pod
+"""
+
+import asyncio
+import json
+import logging
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, Any, Callable, Awaitable, Optional
+from dataclasses import dataclass
+
+from .single_flight import SingleFlight
+from .cache_backends import CacheBackend, KEY_PREFIX, create_cache_backend
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class CacheEntry:
+    """Cached value with the time it was fetched from upstream"""
+    data: Any
+    stored_at: datetime
+
+    def age_seconds(self) -> float:
+        """Seconds since the data was fetched"""
+        return (datetime.now() - self.stored_at).total_seconds()
+
+ENTRY_FORMAT_VERSION = 1
+
+def encode_entry(entry: CacheEntry, serialize: Callable[[Any], Dict[str, Any]]) -> bytes:
+    """Serialize an entry for the shared cache as versioned JSON"""
+    envelope = {
+        "v": ENTRY_FORMAT_VERSION,
+        "stored_at": entry.stored_at.isoformat(),
+        "data": serialize(entry.data)
+    }
+    return json.dumps(envelope, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+def decode_entry(raw: bytes, deserialize: Callable[[Dict[str, Any]], Any]) -> Optional[CacheEntry]:
+    """Parse a shared cache entry, ignoring unknown format versions"""
+    envelope = json.loads(raw)
+    if envelope.get("v") != ENTRY_FORMAT_VERSION:
+        return None
+    return CacheEntry(
+        data=deserialize(envelope["data"]),
+        stored_at=datetime.fromisoformat(envelope["stored_at"])
+    )
+
+# Distinguishes a missing key from a cached None
+_MISSING = object()
+
+class LRUCache:
+    """Bounded in-process memo with least-recently-used eviction"""
+
+    def __init__(self, name: str, maxsize: int):
+        self.name = name
+        self.maxsize = maxsize
+        self._data: "OrderedDict[Any, Any]" = OrderedDict()
+        self.stats = {"hits": 0, "misses": 0, "evictions": 0}
+
+    def get(self, key: Any, default: Any = None) -> Optional[Any]:
+        value = self._data.get(key, _MISSING)
+        if value is _MISSING:
+            self.stats["misses"] += 1
+            return default
+        self._data.move_to_end(key)
+        self.stats["hits"] += 1
+        return value
+
+    def set(self, key: Any, value: Any):
+        self._data[key] = value
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+            self.stats["evictions"] += 1
+
+    def get_or_compute(self, key: Any, compute: Callable[[], Any]) -> Any:
+        value = self.get(key, _MISSING)
+        if value is _MISSING:
+            value = compute()
+            self.set(key, value)
+        return value
+
+    def get_stats(self) -> Dict[str, Any]:
+        lookups = self.stats["hits"] + self.stats["misses"]
+        return {
+            "name": self.name,
+            "size": len(self._data),
+            "maxsize": self.maxsize,
+            **self.stats,
+            "hit_ratio": round(self.stats["hits"] / lookups, 3) if lookups else 0.0
+        }
+
+class StaleWhileRevalidateCache:
+    """
+    Cache with a soft and a hard TTL
+    - Younger than soft_ttl: served as fresh
+    - Between soft_ttl and hard_ttl: served immediately while one background task refreshes it
+    - Older than hard_ttl: treated as a miss, the caller waits for a (coalesced) fetch
+    
+    With a shared backend, a fetch first checks L2 so that only one worker in the
+    cluster calls upstream per TTL window; the others adopt its result.
+    """
+
+    def __init__(self, name: str, soft_ttl: float, hard_ttl: float,
+                 backend: Optional[CacheBackend] = None,
+                 serialize: Optional[Callable[[Any], Dict[str, Any]]] = None,
+                 deserialize: Optional[Callable[[Dict[str, Any]], Any]] = None):
+        if hard_ttl < soft_ttl:
+            raise ValueError("hard_ttl must be greater than or equal to soft_ttl")
+        self.name = name
+        self.soft_ttl = soft_ttl
+        self.hard_ttl = hard_ttl
+        self.backend = backend
+        self.serialize = serialize
+        self.deserialize = deserialize
+        self.single_flight = SingleFlight(name)
+        self._entries: Dict[str, CacheEntry] = {}
+        self._refresh_tasks: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "fresh_hits": 0,
+            "stale_hits": 0,
+            "misses": 0,
+            "background_refreshes": 0,
+            "background_failures": 0,
+            "shared_hits": 0,
+            "shared_errors": 0
+        }
+
+    def get_entry(self, key: str) -> Optional[CacheEntry]:
+        """Return the entry if it is still within the hard TTL"""
+        entry = self._entries.get(key)
+        if entry is None or entry.age_seconds() >= self.hard_ttl:
+            return None
+        return entry
+
+    def set(self, key: str, data: Any) -> CacheEntry:
+        """Store freshly fetched data"""
+        entry = CacheEntry(data=data, stored_at=datetime.now())
+        self._entries[key] = entry
+        return entry
+
+    def is_fresh(self, entry: CacheEntry) -> bool:
+        """Check whether an entry is within the soft TTL"""
+        return entry.age_seconds() < self.soft_ttl
+
+    async def get_or_fetch(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> CacheEntry:
+        """
+        Return the cached entry for key, fetching or revalidating as needed
+        Exceptions from fetch propagate only when there is no usable entry
+        """
+        entry = self.get_entry(key)
+
+        if entry is not None and self.is_fresh(entry):
+            self.stats["fresh_hits"] += 1
+            return entry
+
+        if entry is not None:
+            self.stats["stale_hits"] += 1
+            self._schedule_refresh(key, fetch)
+            return entry
+
+        self.stats["misses"] += 1
+        return await self.single_flight.do(key, lambda: self._fetch_and_store(key, fetch))
+
+    async def refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> CacheEntry:
+        """Force a (coalesced) fetch regardless of the entry's age"""
+        return await self.single_flight.do(key, lambda: self._fetch_and_store(key, fetch))
+
+    async def _fetch_and_store(self, key: str, fetch: Callable[[], Awaitable[Any]]) -> CacheEntry:
+        """Adopt a fresh entry from L2 if another worker already fetched it, otherwise fetch upstream"""
+        shared = await self._read_shared(key)
+        if shared is not None and self.is_fresh(shared):
+            self.stats["shared_hits"] += 1
+            self._entries[key] = shared
+            return shared
+
+        data = await fetch()
+        entry = self.set(key, data)
+        await self._write_shared(key, entry)
+        return entry
+
+    @property
+    def shared_enabled(self) -> bool:
+        return self.backend is not None and self.serialize is not None and self.deserialize is not None
+
+    def _shared_key(self, key: str) -> str:
+        return f"{KEY_PREFIX}:{self.name}:{key}"
+
+    async def _read_shared(self, key: str) -> Optional[CacheEntry]:
+        """Read an entry from L2; backend failures degrade to L1-only"""
+        if not self.shared_enabled:
+            return None
+        try:
+            raw = await self.backend.get(self._shared_key(key))
+            return decode_entry(raw, self.deserialize) if raw else None
+        except Exception as e:
+            self.stats["shared_errors"] += 1
+            logger.warning(f"[{self.name}] Shared cache read failed: {e}")
+            return None
+
+    async def _write_shared(self, key: str, entry: CacheEntry):
+        """Publish an entry to L2 for the hard TTL"""
+        if not self.shared_enabled:
+            return
+        try:
+            await self.backend.set(self._shared_key(key), encode_entry(entry, self.serialize), self.hard_ttl)
+        except Exception as e:
+            self.stats["shared_errors"] += 1
+            logger.warning(f"[{self.name}] Shared cache write failed: {e}")
+
+    def _schedule_refresh(self, key: str, fetch: Callable[[], Awaitable[Any]]):
+        """Start one background refresh for key unless one is already running"""
+        if key in self._refresh_tasks or self.single_flight.in_flight(key):
+            return
+
+        self.stats["background_refreshes"] += 1
+        task = asyncio.ensure_future(self.refresh(key, fetch))
+        self._refresh_tasks[key] = task
+        task.add_done_callback(lambda t: self._on_refresh_done(key, t))
+
+    def _on_refresh_done(self, key: str, task: asyncio.Task):
+        """Log background refresh failures; the stale entry keeps being served until hard TTL"""
+        self._refresh_tasks.pop(key, None)
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["background_failures"] += 1
+            logger.warning(f"[{self.name}] Background refresh failed: {task.exception()}")
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Cache and coalescing counters for monitoring"""
+        return {
+            **self.stats,
+            "soft_ttl": self.soft_ttl,
+            "hard_ttl": self.hard_ttl,
+            "shared_backend": self.backend.name if self.shared_enabled else None,
+            "request_coalescing": self.single_flight.get_stats()
+        }
+
+# Process-wide registry so every service instance shares one cache per data source
+_shared_caches: Dict[str, StaleWhileRevalidateCache] = {}
+_shared_backend: Optional[CacheBackend] = None
+_shared_backend_loaded = False
+
+def get_shared_backend() -> Optional[CacheBackend]:
+    """Return the process-wide L2 backend, creating it from the environment on first use"""
+    global _shared_backend, _shared_backend_loaded
+    if not _shared_backend_loaded:
+        _shared_backend = create_cache_backend()
+        _shared_backend_loaded = True
+    return _shared_backend
+
+def configure_shared_backend(backend: Optional[CacheBackend]):
+    """Swap the L2 backend (e.g. a MemoryCacheBackend in tests) for all shared caches"""
+    global _shared_backend, _shared_backend_loaded
+    _shared_backend = backend
+    _shared_backend_loaded = True
+    for cache in _shared_caches.values():
+        cache.backend = backend
+
+async def close_shared_backend():
+    """Release L2 connections at shutdown"""
+    if _shared_backend is not None:
+        await _shared_backend.close()
+
+def get_shared_cache(name: str, soft_ttl: float, hard_ttl: float,
+                     serialize: Optional[Callable[[Any], Dict[str, Any]]] = None,
+                     deserialize: Optional[Callable[[Dict[str, Any]], Any]] = None) -> StaleWhileRevalidateCache:
+    """Return the cache registered under name, creating it on first use"""
+    cache = _shared_caches.get(name)
+    if cache is None:
+        cache = StaleWhileRevalidateCache(
+            name, soft_ttl, hard_ttl,
+            backend=get_shared_backend(),
+            serialize=serialize,
+            deserialize=deserialize
+        )
+        _shared_caches[name] = cache
+    return cache
@@ -0,0 +1,132 @@
+"""
+Shared Cache Backends
+L2 storage shared across uvicorn workers and pods (Redis), with file and memory stand-ins
+"""
+
+import asyncio
+import logging
+import os
+import time
+from typing import Dict, Optional, Tuple
+
+try:
+    import redis.asyncio as aioredis
+except ImportError:  # Redis is optional; without it the cache runs L1-only
+    aioredis = None
+
+logger = logging.getLogger(__name__)
+
+KEY_PREFIX = "tokyo-taxi"
+
+class CacheBackend:
+    """Interface for shared (L2) cache storage of serialized entries"""
+
+    name = "base"
+
+    async def get(self, key: str) -> Optional[bytes]:
+        raise NotImplementedError
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        raise NotImplementedError
+
+    async def close(self):
+        pass
+
+class MemoryCacheBackend(CacheBackend):
+    """In-process stand-in for tests; shared only by caches in the same process"""
+
+    name = "memory"
+
+    def __init__(self):
+        self._store: Dict[str, Tuple[float, bytes]] = {}
+
+    async def get(self, key: str) -> Optional[bytes]:
+        item = self._store.get(key)
+        if item is None:
+            return None
+        expires_at, value = item
+        if time.time() >= expires_at:
+            del self._store[key]
+            return None
+        return value
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        self._store[key] = (time.time() + ttl, value)
+
+class FileCacheBackend(CacheBackend):
+    """
+    Directory-backed stand-in shared by all workers on one host
+    Each key is one file: first line is the expiry epoch, the rest is the value
+    """
+
+    name = "file"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, key: str) -> str:
+        return os.path.join(self.directory, key.replace(":", "_") + ".cache")
+
+    def _read(self, key: str) -> Optional[bytes]:
+        try:
+            with open(self._path(key), "rb") as f:
+                header, _, value = f.read().partition(b"\n")
+        except FileNotFoundError:
+            return None
+        if time.time() >= float(header):
+            return None
+        return value
+
+    def _write(self, key: str, value: bytes, ttl: float):
+        path = self._path(key)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            f.write(f"{time.time() + ttl}\n".encode() + value)
+        os.replace(tmp_path, path)  # Atomic, readers never see a partial write
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await asyncio.to_thread(self._read, key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await asyncio.to_thread(self._write, key, value, ttl)
+
+class RedisCacheBackend(CacheBackend):
+    """Redis-backed L2 shared across workers and pods"""
+
+    name = "redis"
+
+    def __init__(self, url: str):
+        if aioredis is None:
+            raise RuntimeError("redis package is not installed")
+        self.url = url
+        self.client = aioredis.from_url(url, socket_timeout=1.0, socket_connect_timeout=1.0)
+
+    async def get(self, key: str) -> Optional[bytes]:
+        return await self.client.get(key)
+
+    async def set(self, key: str, value: bytes, ttl: float):
+        await self.client.set(key, value, px=max(1, int(ttl * 1000)))
+
+    async def close(self):
+        await self.client.close()
+
+def create_cache_backend() -> Optional[CacheBackend]:
+    """
+    Build the shared backend from the environment
+    REDIS_URL -> Redis, CACHE_DIR -> file stand-in, neither -> no L2
+    """
+    redis_url = os.getenv("REDIS_URL")
+    if redis_url:
+        if aioredis is not None:
+            logger.info(f"Shared cache backend: Redis ({redis_url.split('@')[-1]})")
+            return RedisCacheBackend(redis_url)
+        logger.warning("REDIS_URL is set but the redis package is not installed")
+
+    cache_dir = os.getenv("CACHE_DIR")
+    if cache_dir:
+        logger.info(f"Shared cache backend: files in {cache_dir}")
+        return FileCacheBackend(cache_dir)
+
+    logger.info("No shared cache backend configured, using in-process cache only")
+    return None
@@ -0,0 +1,120 @@
+"""
+Circuit Breaker
+Stops calling an upstream API (JMA, ODPT) after repeated failures, so callers fail fast
+to their last good data instead of waiting on retries and timeouts during an outage
+"""
+
+import asyncio
+import logging
+import time
+from datetime import datetime
+from typing import Dict, Any, Callable, Awaitable, Optional, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+CLOSED = "closed"        # Calls go through
+OPEN = "open"            # Calls are rejected until reset_timeout has passed
+HALF_OPEN = "half_open"  # One trial call decides whether to close or reopen
+
+class CircuitOpenError(Exception):
+    """Raised instead of calling an upstream whose circuit is open"""
+
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"Circuit '{name}' is open, retry in {retry_in:.0f}s")
+        self.name = name
+        self.retry_in = retry_in
+
+class CircuitBreaker:
+    """
+    Per-upstream breaker: opens after failure_threshold consecutive failures,
+    lets a single trial call through after reset_timeout, and closes on its success
+    """
+
+    def __init__(self, name: str, config: Dict[str, Any] = None):
+        self.name = name
+        self.config = config or self._get_default_config()
+        self.state = CLOSED
+        self.consecutive_failures = 0
+        self.opened_at: Optional[float] = None
+        self.last_state_change = datetime.now()
+        self._trial_in_flight = False
+        self.stats = {
+            "calls": 0,
+            "failures": 0,
+            "rejected": 0,   # Calls failed fast while open
+            "opened": 0      # Times the circuit opened
+        }
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default breaker configuration"""
+        return {
+            "failure_threshold": 3,  # Consecutive failed calls before opening
+            "reset_timeout": 60      # Seconds open before a trial call
+        }
+
+    def _set_state(self, state: str):
+        if state != self.state:
+            logger.warning(f"Circuit '{self.name}' {self.state} -> {state}")
+            self.state = state
+            self.last_state_change = datetime.now()
+
+    def _retry_in(self) -> float:
+        return max(0.0, self.opened_at + self.config["reset_timeout"] - time.monotonic())
+
+    def allow(self) -> bool:
+        """Whether a call may go upstream now; moves an expired open circuit to half-open"""
+        if self.state == OPEN and self._retry_in() == 0:
+            self._set_state(HALF_OPEN)
+        if self.state == CLOSED:
+            return True
+        if self.state == HALF_OPEN and not self._trial_in_flight:
+            self._trial_in_flight = True
+            return True
+        return False
+
+    def record_success(self):
+        self._trial_in_flight = False
+        self.consecutive_failures = 0
+        self.opened_at = None
+        self._set_state(CLOSED)
+
+    def record_failure(self):
+        self._trial_in_flight = False
+        self.stats["failures"] += 1
+        self.consecutive_failures += 1
+        if self.state == HALF_OPEN or self.consecutive_failures >= self.config["failure_threshold"]:
+            if self.state != OPEN:
+                self.stats["opened"] += 1
+            self.opened_at = time.monotonic()
+            self._set_state(OPEN)
+
+    async def call(self, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn through the breaker; raises CircuitOpenError without calling it when open"""
+        self.stats["calls"] += 1
+        if not self.allow():
+            self.stats["rejected"] += 1
+            raise CircuitOpenError(self.name, self._retry_in() if self.opened_at is not None else 0.0)
+
+        try:
+            result = await fn()
+        except asyncio.CancelledError:
+            self._trial_in_flight = False  # Not the upstream's fault; let another trial through
+            raise
+        except Exception:
+            self.record_failure()
+            raise
+
+        self.record_success()
+        return result
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Breaker state and counters for monitoring"""
+        return {
+            **self.stats,
+            "state": self.state,
+            "consecutive_failures": self.consecutive_failures,
+            "retry_in_seconds": round(self._retry_in(), 1) if self.state == OPEN else None,
+            "last_state_change": self.last_state_change.isoformat()
+        }
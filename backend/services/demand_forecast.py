@@ -0,0 +1,213 @@
+"""
+Multi-horizon Demand Forecast
+Per-zone demand 15 minutes to 3 hours ahead, so drivers can position for demand at their arrival
+time. Each horizon's forecast weather is scored through the same path as the live hotspots
+(research multipliers, or the trained demand model) at its target time, and the (zones × horizons)
+matrices are reused until a snapshot or the issue time changes
+"""
+
+import logging
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass
+
+import numpy as np
+
+from .weather_service import weather_service
+from .traffic_service import traffic_service
+from .research_integration import research_integration
+from .nowcast import nowcast_store
+from .ingestion import Snapshot
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True, eq=False)
+class DemandForecast:
+    """Demand of every grid cell at every horizon of one issue"""
+    version: str
+    issued_at: datetime
+    horizons: np.ndarray                 # Minutes ahead of issued_at
+    conditions: List[Dict[str, Any]]     # Forecast weather per horizon
+    models: List[str]                    # Demand model that scored each horizon ("research" or "learned")
+    time_multiplier: List[Optional[float]]  # Research time multiplier per horizon, None under the learned model
+    rain: np.ndarray                     # float32 (zones, horizons), mm/h
+    demand: np.ndarray                   # float32 (zones, horizons), multiplier over baseline demand
+    revenue: np.ndarray                  # float32 (zones, horizons), AI revenue per minute
+    top_cells: Tuple[np.ndarray, ...]    # Ranked hotspot cells per horizon
+
+class DemandForecaster:
+    """
+    Rain at each horizon blends the current per-cell rain (nowcast raster or observation) into the
+    JMA forecast: persistence is the better predictor for the next minutes, the forecast further out
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = config or self._get_default_config()
+        self.research = research_integration
+        self.zones = research_integration.zones
+        self.current: Optional[DemandForecast] = None
+        self.builds = 0
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default forecast configuration"""
+        return {
+            "horizons": (15, 30, 60, 180),  # Minutes ahead
+            "issue_minutes": 15,            # Forecasts are issued on this grid, so one build serves everyone
+            "persistence_minutes": 120,     # Current rain's weight falls linearly to 0 at this horizon
+            "disruption_minutes": 60,       # Current rail disruptions are assumed over beyond this horizon
+            "max_zones": 50,                # Hotspots ranked per horizon
+            "hotspot_spacing_km": 0.75
+        }
+
+    def issue_time(self, now: Optional[datetime] = None) -> datetime:
+        """Start of the issue period containing now"""
+        now = now or datetime.now()
+        minutes = self.config["issue_minutes"]
+        return now.replace(minute=now.minute - now.minute % minutes, second=0, microsecond=0)
+
+    def get(self, weather: Snapshot, traffic: Snapshot, nowcast: str = "city-wide",
+            now: Optional[datetime] = None) -> DemandForecast:
+        """Forecast for the weather/traffic snapshots, rebuilt only when a snapshot, the nowcast or the issue time changes"""
+        issued_at = self.issue_time(now)
+        version = f"{weather.version}.{traffic.version}.{nowcast}.{issued_at.strftime('%Y%m%d%H%M')}"
+        current = self.current
+        if current is not None and current.version == version:
+            return current
+
+        weather_data = weather_service.format_for_optimization(weather.data, weather.age_seconds())
+        traffic_data = traffic_service.format_for_optimization(traffic.data, traffic.age_seconds())
+        forecast = self.build(weather, weather_data, traffic_data, issued_at, version)
+        self.current = forecast
+        self.builds += 1
+        return forecast
+
+    def build(self, weather: Snapshot, weather_data: Dict[str, Any], traffic_data: Dict[str, Any],
+              issued_at: datetime, version: str = "") -> DemandForecast:
+        """Score every zone at every horizon, one predict_demand_arrays pass per horizon"""
+        horizons = np.array(self.config["horizons"], dtype=np.int64)
+        zones = self.zones
+        current = weather.data
+
+        # Current rain per zone, as the live hotspots score it now
+        city_rain = weather_data.get("rain_intensity", 0) if weather_data.get("is_raining", False) else 0.0
+        current_rain = np.full(len(zones), float(city_rain))
+        zone_rain = nowcast_store.zone_rain(zones.lat, zones.lng)
+        if zone_rain is not None:
+            current_rain = np.where(np.isnan(zone_rain), current_rain, zone_rain)
+        persistence = np.clip(1 - horizons / self.config["persistence_minutes"], 0.0, 1.0)
+        no_disruptions = {**traffic_data, "disruptions": []}
+
+        conditions, models, time_multiplier = [], [], []
+        rain, demand, revenue, top_cells = [], [], [], []
+        for minutes, weight in zip(horizons.tolist(), persistence.tolist()):
+            target = issued_at + timedelta(minutes=minutes)
+            outlook = weather_service.forecast_at(current, (target - current.timestamp).total_seconds() / 3600,
+                                                  window_hours=minutes / 60)
+            if outlook is None:
+                # Fallback data has no forecast: conditions persist
+                outlook = {
+                    "description": current.description,
+                    "temperature": current.temperature,
+                    "rain_probability": None,
+                    "precipitation": current.precipitation
+                }
+            conditions.append({
+                "description": outlook["description"],
+                "temperature": outlook["temperature"],
+                "rain_probability": outlook["rain_probability"],
+                "precipitation": outlook["precipitation"]
+            })
+
+            # Persistence is the better predictor for the next minutes, the JMA forecast further out
+            horizon_rain = current_rain * weight + outlook["precipitation"] * (1 - weight)
+            horizon_city_rain = city_rain * weight + outlook["precipitation"] * (1 - weight)
+            horizon_weather = {
+                **weather_data,
+                "temperature": outlook["temperature"],
+                "precipitation": outlook["precipitation"],
+                "is_raining": horizon_city_rain > 0,
+                "rain_intensity": horizon_city_rain
+            }
+            horizon_traffic = traffic_data if minutes <= self.config["disruption_minutes"] else no_disruptions
+            scores = self.research.predict_demand_arrays(horizon_weather, horizon_traffic, zones, target,
+                                                         zone_rain=horizon_rain)
+
+            learned = scores["learned_multiplier"] is not None
+            models.append("learned" if learned else "research")
+            time_multiplier.append(None if learned else scores["time_multiplier"])
+            rain.append(horizon_rain)
+            demand.append(np.divide(scores["base_demand"], zones.base_revenue,
+                                    out=np.ones(len(zones)), where=zones.base_revenue > 0))
+            revenue.append(scores["ai_revenue_per_min"])
+            # Same peaks-only, spread-apart ranking as the live hotspot list
+            top_cells.append(self.research.select_hotspots(scores, self.config["max_zones"], zones,
+                                                           self.config["hotspot_spacing_km"]))
+
+        return DemandForecast(
+            version=version,
+            issued_at=issued_at,
+            horizons=horizons,
+            conditions=conditions,
+            models=models,
+            time_multiplier=time_multiplier,
+            rain=np.stack(rain, axis=1).astype(np.float32),
+            demand=np.stack(demand, axis=1).astype(np.float32),
+            revenue=np.stack(revenue, axis=1).astype(np.float32),
+            top_cells=tuple(top_cells)
+        )
+
+    def _location(self, cell: int) -> Dict[str, Any]:
+        return {
+            "name": self.zones.names[cell],
+            "latitude": round(float(self.zones.lat[cell]), 5),
+            "longitude": round(float(self.zones.lng[cell]), 5)
+        }
+
+    def _values(self, forecast: DemandForecast, cell: int, column: int) -> Dict[str, Any]:
+        multiplier = float(forecast.demand[cell, column])
+        increase = (multiplier - 1) * 100
+        return {
+            "demand_multiplier": round(multiplier, 3),
+            "expected_demand_increase": round(increase, 1),
+            "expected_revenue_boost": round(increase * 0.302, 2),  # Same research factor as the driver recommendations
+            "ai_revenue_per_min": round(float(forecast.revenue[cell, column]), 2),
+            "rain_intensity": round(float(forecast.rain[cell, column]), 1)
+        }
+
+    def format(self, forecast: DemandForecast, horizons: Optional[List[int]] = None, limit: int = 10,
+               cell: Optional[int] = None) -> Dict[str, Any]:
+        """Response body: top zones per requested horizon, plus one zone's series when a cell is given"""
+        columns = [i for i, minutes in enumerate(forecast.horizons.tolist()) if horizons is None or minutes in horizons]
+        data = {
+            "issued_at": forecast.issued_at.isoformat(),
+            "horizons": [
+                {
+                    "minutes": int(forecast.horizons[i]),
+                    "time": (forecast.issued_at + timedelta(minutes=int(forecast.horizons[i]))).isoformat(),
+                    "conditions": forecast.conditions[i],
+                    "demand_model": forecast.models[i],
+                    "time_multiplier": forecast.time_multiplier[i],
+                    "zones": [{**self._location(top), **self._values(forecast, top, i)}
+                              for top in forecast.top_cells[i][:limit].tolist()]
+                }
+                for i in columns
+            ]
+        }
+        if cell is not None:
+            data["zone"] = {
+                **self._location(cell),
+                "series": [{"minutes": int(forecast.horizons[i]), **self._values(forecast, cell, i)} for i in columns]
+            }
+        return data
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current forecast for monitoring"""
+        current = self.current
+        return {
+            "builds": self.builds,
+            "version": current.version if current else None,
+            "horizons": list(self.config["horizons"])
+        }
+
+# Global instance for use across the application
+demand_forecaster = DemandForecaster()
@@ -0,0 +1,333 @@
+"""
+Learned Demand Model
+Per-zone ridge regression of log demand on weather, hour, weekday and rail disruptions, fitted
+from the snapshot history and recorded trips. Every zone shares one feature vector per hour, so
+the model is kept as sufficient statistics (XᵀX, XᵀY): each batch update adds days to them and one
+solve refreshes the coefficients of every zone. Updates are batch-only (the update command, run
+as new trip files arrive); the server only loads the artifact, on first use and whenever it is replaced
+
+Fit with: python -m services.demand_model fit --history data/history --trips data/trips --start 2026-09-01 --end 2026-09-30
+Update with new days: python -m services.demand_model update --history ... --trips ... --start 2026-10-01 --end 2026-10-07
+"""
+
+import argparse
+import json
+import logging
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import date, datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_MODEL_PATH = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "demand_model.npz")
+
+# Rain buckets use the research thresholds (mm/h): drizzle (0, 1], light (1, 5], heavy above 5
+RAIN_FEATURES = ["rain_drizzle", "rain_light", "rain_heavy", "rain_intensity"]
+FEATURES = (["intercept"] + RAIN_FEATURES + ["temperature", "temperature_extreme"]
+            + [f"hour_{hour}" for hour in range(1, 24)] + ["weekend", "disruption_delay"])
+
+def rain_features(rain: np.ndarray) -> np.ndarray:
+    """Rain feature columns for any number of rain intensities, shape (len(rain), 4)"""
+    rain = np.asarray(rain, dtype=np.float64)
+    return np.stack([
+        (rain > 0) & (rain <= 1),
+        (rain > 1) & (rain <= 5),
+        rain > 5,
+        np.minimum(rain, 30.0) / 10  # Capped: extreme readings should not dominate the fit
+    ], axis=-1).astype(np.float64)
+
+def feature_vector(weather_data: Dict[str, Any], traffic_data: Dict[str, Any], now: datetime) -> np.ndarray:
+    """Features of one hour from the formatted weather and traffic data"""
+    x = np.zeros(len(FEATURES))
+    x[0] = 1.0
+    rain = weather_data.get("rain_intensity", 0) if weather_data.get("is_raining", False) else 0.0
+    x[1:5] = rain_features(np.array([rain]))[0]
+    temperature = weather_data.get("temperature", 22)
+    x[5] = (temperature - 20) / 10
+    x[6] = float(temperature < 5 or temperature > 35)
+    if now.hour:
+        x[6 + now.hour] = 1.0
+    x[30] = float(now.weekday() >= 5)
+    x[31] = sum(d.get("estimated_delay", 0) for d in traffic_data.get("disruptions", [])) / 60
+    return x
+
+def observation_statistics(X: np.ndarray, revenue: np.ndarray) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    """
+    (XᵀX, XᵀY, feature sum, hours) of observed hours, for DemandModel.add_statistics
+    X: (hours, features) from feature_vector, revenue: (hours, zones) observed hourly revenue
+    """
+    Y = np.log1p(np.maximum(revenue, 0.0))
+    return X.T @ X, X.T @ Y, X.sum(axis=0), float(len(X))
+
+class DemandModel:
+    """
+    log1p(hourly revenue of zone z) ≈ x · coef[:, z]
+    Multipliers are exp(x · coef - x̄ · coef): demand under the given conditions relative to the
+    zone's average conditions in the training data, so they scale each zone's base revenue
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = config or self._get_default_config()
+        self.xtx: Optional[np.ndarray] = None       # (features, features)
+        self.xty: Optional[np.ndarray] = None       # (features, zones)
+        self.feature_sum: Optional[np.ndarray] = None
+        self.count = 0.0                            # Observed hours (decayed by forgetting)
+        self.coef: Optional[np.ndarray] = None      # (features, zones)
+        self.trained_until: Optional[str] = None
+        self._loaded_mtime: Optional[float] = None
+        self.stats = {
+            "loads": 0,
+            "updates": 0,
+            "predictions": 0
+        }
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default demand model configuration"""
+        return {
+            "path": os.getenv("DEMAND_MODEL_PATH", DEFAULT_MODEL_PATH),
+            "ridge_lambda": 10.0,        # Shrinks every coefficient but the intercept towards 0 (multiplier 1)
+            "forgetting": 1.0,           # Weight kept by older statistics on each update (1.0: never forget)
+            "min_observations": 48,      # Hours needed before the model replaces the research multipliers
+            "multiplier_range": (0.2, 5.0)
+        }
+
+    def reset(self, zones: int):
+        """Start from empty statistics"""
+        features = len(FEATURES)
+        self.xtx = np.zeros((features, features))
+        self.xty = np.zeros((features, zones))
+        self.feature_sum = np.zeros(features)
+        self.count = 0.0
+        self.coef = np.zeros((features, zones))
+
+    def add_statistics(self, xtx: np.ndarray, xty: np.ndarray, feature_sum: np.ndarray, count: float):
+        """Merge precomputed statistics (e.g. from worker processes) and refresh the coefficients"""
+        if self.xtx is None:
+            self.reset(xty.shape[1])
+        decay = self.config["forgetting"]
+        self.xtx = decay * self.xtx + xtx
+        self.xty = decay * self.xty + xty
+        self.feature_sum = decay * self.feature_sum + feature_sum
+        self.count = decay * self.count + count
+        self._solve()
+        self.stats["updates"] += 1
+
+    def _solve(self):
+        penalty = np.full(len(FEATURES), self.config["ridge_lambda"])
+        penalty[0] = 1e-6  # Intercept is not shrunk
+        self.coef = np.linalg.solve(self.xtx + np.diag(penalty), self.xty)
+
+    @property
+    def ready(self) -> bool:
+        """Whether a model is loaded and trained on enough hours to be used"""
+        self._ensure_loaded()
+        return self.coef is not None and self.count >= self.config["min_observations"]
+
+    def _ensure_loaded(self):
+        """Load the artifact on first use, and again whenever the file is replaced"""
+        try:
+            mtime = os.path.getmtime(self.config["path"])
+        except OSError:
+            return
+        if mtime != self._loaded_mtime:
+            self._loaded_mtime = mtime
+            self.load()
+
+    def load(self, path: Optional[str] = None) -> bool:
+        """Read the artifact; keeps the current model if it cannot be read"""
+        path = path or self.config["path"]
+        try:
+            with np.load(path) as artifact:
+                if list(artifact["features"]) != FEATURES:
+                    raise ValueError("feature layout differs from this version")
+                self.xtx = artifact["xtx"]
+                self.xty = artifact["xty"]
+                self.feature_sum = artifact["feature_sum"]
+                self.count = float(artifact["count"])
+                self.coef = artifact["coef"]
+                self.trained_until = str(artifact["trained_until"]) or None
+        except Exception as e:
+            logger.error(f"Could not load demand model from {path}: {e}")
+            return False
+        self.stats["loads"] += 1
+        logger.info(f"Loaded demand model for {self.coef.shape[1]} zones trained on {self.count:.0f} hours")
+        return True
+
+    def save(self, path: Optional[str] = None):
+        """Write the artifact atomically, so a serving process never loads a partial file"""
+        path = path or self.config["path"]
+        os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.savez(f, features=np.array(FEATURES), xtx=self.xtx, xty=self.xty, feature_sum=self.feature_sum,
+                     count=self.count, coef=self.coef, trained_until=self.trained_until or "")
+        os.replace(tmp_path, path)
+
+    def multipliers(self, weather_data: Dict[str, Any], traffic_data: Dict[str, Any], now: datetime,
+                    zones: int, zone_rain: Optional[np.ndarray] = None) -> Optional[np.ndarray]:
+        """
+        Demand multiplier of every zone in one pass, None without a usable model
+        zone_rain (mm/h, NaN where unknown) replaces the city-wide rain features per zone
+        """
+        if not self.ready:
+            return None
+        if self.coef.shape[1] != zones:
+            logger.error(f"Demand model has {self.coef.shape[1]} zones, expected {zones}")
+            return None
+
+        x = feature_vector(weather_data, traffic_data, now)
+        mean = self.feature_sum / self.count
+        log_ratio = (x - mean) @ self.coef
+        if zone_rain is not None:
+            city_rain = weather_data.get("rain_intensity", 0) if weather_data.get("is_raining", False) else 0.0
+            local = rain_features(np.where(np.isnan(zone_rain), city_rain, zone_rain))
+            rain_coef = self.coef[1:1 + len(RAIN_FEATURES)]
+            log_ratio += ((local - x[1:1 + len(RAIN_FEATURES)]) * rain_coef.T).sum(axis=1)
+
+        self.stats["predictions"] += 1
+        low, high = self.config["multiplier_range"]
+        return np.clip(np.exp(log_ratio), low, high)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Model state for monitoring"""
+        ready = self.ready
+        return {
+            **self.stats,
+            "path": self.config["path"],
+            "ready": ready,
+            "zones": int(self.coef.shape[1]) if self.coef is not None else None,
+            "observed_hours": round(self.count, 1),
+            "trained_until": self.trained_until
+        }
+
+class DemandModelTrainer:
+    """Builds one day's training statistics from recorded snapshots and trips"""
+
+    def __init__(self, history: str, trips_dir: str):
+        # Imported here so each worker process opens its own history backend
+        from .backtest import open_history
+        from .spatial_grid import tokyo_grid
+        from .weather_service import WeatherData
+        from .traffic_service import TrafficData
+
+        self.history = open_history(history)
+        self.trips_dir = trips_dir
+        self.grid = tokyo_grid
+        self.WeatherData = WeatherData
+        self.TrafficData = TrafficData
+
+    def day_statistics(self, day: date) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+        """(XᵀX, XᵀY, feature sum, hours) of one day's hours that have snapshots and trips"""
+        from .backtest import load_trips, _latest
+
+        day_start = datetime.combine(day, datetime.min.time())
+        lookback = day_start - timedelta(hours=3)
+        weather_records = self.history.read_payloads("weather", lookback, day_start + timedelta(days=1))
+        traffic_records = self.history.read_payloads("traffic", lookback, day_start + timedelta(days=1))
+        weather_times = np.array([record.recorded_at.timestamp() for record in weather_records])
+        traffic_times = np.array([record.recorded_at.timestamp() for record in traffic_records])
+
+        path = os.path.join(self.trips_dir, f"{day.isoformat()}.csv")
+        trip_time, trip_lat, trip_lng, trip_fare = load_trips(path) if os.path.exists(path) else (np.zeros(0),) * 4
+        trip_cell = self.grid.cells_at(trip_lat, trip_lng)
+        inside = trip_cell >= 0
+        trip_hour = ((trip_time[inside] - day_start.timestamp()) // 3600).astype(np.int64)
+        trip_cell, trip_fare = trip_cell[inside], trip_fare[inside]
+
+        rows, targets = [], []
+        for hour in range(24):
+            when = day_start + timedelta(hours=hour)
+            weather_record = _latest(weather_records, weather_times, when)
+            traffic_record = _latest(traffic_records, traffic_times, when)
+            in_hour = trip_hour == hour
+            if weather_record is None or traffic_record is None or not in_hour.any():
+                continue
+            weather = self.WeatherData.from_dict(weather_record.payload)
+            traffic = self.TrafficData.from_dict(traffic_record.payload)
+            weather_data = {"is_raining": weather.is_raining, "rain_intensity": weather.rain_intensity,
+                            "temperature": weather.temperature}
+            traffic_data = {"disruptions": [{"estimated_delay": d.estimated_delay} for d in traffic.disruptions]}
+            rows.append(feature_vector(weather_data, traffic_data, when))
+            targets.append(np.bincount(trip_cell[in_hour], weights=trip_fare[in_hour], minlength=len(self.grid)))
+
+        features = len(FEATURES)
+        if not rows:
+            return np.zeros((features, features)), np.zeros((features, len(self.grid))), np.zeros(features), 0.0
+        return observation_statistics(np.array(rows), np.array(targets))
+
+_trainer: Optional[DemandModelTrainer] = None
+
+def _init_worker(history: str, trips_dir: str):
+    global _trainer
+    logging.basicConfig(level=logging.WARNING)
+    _trainer = DemandModelTrainer(history, trips_dir)
+
+def _day_statistics(day: date) -> Tuple[np.ndarray, np.ndarray, np.ndarray, float]:
+    return _trainer.day_statistics(day)
+
+def train(model: DemandModel, history: str, trips_dir: str, start: date, end: date,
+          workers: Optional[int] = None) -> Dict[str, Any]:
+    """Add every day from start to end (inclusive) to the model, one day per task across worker processes"""
+    days = [start + timedelta(days=i) for i in range((end - start).days + 1)]
+    workers = max(1, min(workers or os.cpu_count() or 1, len(days)))
+    started = time.perf_counter()
+
+    if workers == 1:
+        _init_worker(history, trips_dir)
+        statistics = [_day_statistics(day) for day in days]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker,
+                                 initargs=(history, trips_dir)) as pool:
+            statistics = list(pool.map(_day_statistics, days))
+
+    hours = 0.0
+    for xtx, xty, feature_sum, count in statistics:  # Day order, so forgetting weighs recent days most
+        if count:
+            model.add_statistics(xtx, xty, feature_sum, count)
+            hours += count
+    model.trained_until = end.isoformat()
+    return {
+        "days": len(days),
+        "hours": hours,
+        "workers": workers,
+        "seconds": round(time.perf_counter() - started, 2)
+    }
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Fit or update the learned demand model")
+    parser.add_argument("command", choices=["fit", "update"], help="fit: start from scratch, update: add days to the saved model")
+    parser.add_argument("--history", default=os.getenv("HISTORY_DIR") or os.getenv("HISTORY_DATABASE_URL"),
+                        help="History directory or database URL (default: HISTORY_DIR / HISTORY_DATABASE_URL)")
+    parser.add_argument("--trips", required=True, help="Directory of <YYYY-MM-DD>.csv trip files")
+    parser.add_argument("--start", required=True, type=date.fromisoformat)
+    parser.add_argument("--end", required=True, type=date.fromisoformat)
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--model", default=None, help="Artifact path (default: DEMAND_MODEL_PATH)")
+    args = parser.parse_args(argv)
+    if not args.history:
+        parser.error("--history is required when HISTORY_DIR is not set")
+
+    model = DemandModel()
+    path = args.model or model.config["path"]
+    if args.command == "update" and not model.load(path):
+        parser.error(f"No model to update at {path}")
+
+    summary = train(model, args.history, args.trips, args.start, args.end, args.workers)
+    if not model.count:
+        parser.error("No hours with both snapshots and trips in the given period")
+    model.save(path)
+    json.dump({**summary, "model": path, "observed_hours": model.count, "trained_until": model.trained_until},
+              sys.stdout, indent=2)
+    sys.stdout.write("\n")
+
+# Global instance for use across the application
+demand_model = DemandModel()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.WARNING)
+    main()
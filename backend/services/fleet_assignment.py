@@ -0,0 +1,256 @@
+"""
+Fleet Assignment Optimizer
+Assigns many drivers to hotspots at once under per-hotspot capacity derived from predicted demand,
+so a rain surge spreads the fleet instead of sending everyone to the same top location
+"""
+
+import logging
+import time
+from datetime import datetime
+from typing import Dict, List, Any, Optional
+from dataclasses import dataclass, field
+
+import numpy as np
+from scipy import sparse
+from scipy.optimize import linprog
+
+from .research_integration import MCPResearchIntegration, research_integration
+from .travel_matrix import TravelTimeMatrix, travel_matrix
+
+logger = logging.getLogger(__name__)
+
+@dataclass
+class DriverPosition:
+    """Driver to be assigned"""
+    id: str
+    latitude: float
+    longitude: float
+
+@dataclass
+class FleetAssignment:
+    """Result of one fleet assignment run"""
+    assignments: List[Dict[str, Any]]
+    hotspots: List[Dict[str, Any]]
+    status: str  # optimal, greedy (solver failed), empty
+    expected_net_revenue: int
+    solve_time_ms: float
+    total_time_ms: float
+    stats: Dict[str, Any] = field(default_factory=dict)
+
+class FleetAssignmentOptimizer:
+    """
+    Min-cost transportation problem over travel time:
+    drivers are aggregated by origin grid cell (supply), hotspots have demand-derived capacity,
+    and the cost of sending a driver is the negative expected net revenue of the move
+    """
+
+    def __init__(self, research: MCPResearchIntegration = None, matrix: TravelTimeMatrix = None,
+                 config: Dict[str, Any] = None):
+        self.research = research or research_integration
+        self.matrix = matrix or travel_matrix
+        self.config = config or self._get_default_config()
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default optimizer configuration"""
+        return {
+            "hotspot_count": 20,      # Demand peaks drivers can be sent to
+            "capacity_slack": 1.25,   # Total capacity relative to fleet size
+            "initial_columns": 4,     # Cheapest hotspots per origin in the first LP
+            "max_rounds": 10,         # Column generation rounds before solving the full LP
+            "max_drivers": 10000      # Largest fleet one assignment request may carry
+        }
+
+    def _capacities(self, demand: np.ndarray, drivers: int) -> np.ndarray:
+        """Per-hotspot driver capacity, proportional to predicted demand; always covers the fleet"""
+        share = demand / demand.sum()
+        capacity = np.ceil(share * drivers * self.config["capacity_slack"]).astype(np.int64)
+        return np.maximum(capacity, 1)
+
+    def assign(self, drivers: List[DriverPosition], weather_data: Dict[str, Any],
+               traffic_data: Dict[str, Any], now: Optional[datetime] = None) -> FleetAssignment:
+        """Assign every driver to one hotspot"""
+        started = time.perf_counter()
+        if not drivers:
+            return FleetAssignment([], [], "empty", 0, 0.0, 0.0)
+
+        now = now or datetime.now()
+        scores = self.research.predict_demand_arrays(weather_data, traffic_data, now=now)
+
+        lat = np.array([driver.latitude for driver in drivers])
+        lng = np.array([driver.longitude for driver in drivers])
+        plan = self.plan(self.matrix.nodes_at(lat, lng), scores, now.hour, weather_data.get("rain_intensity", 0))
+        hotspots, capacity, flows = plan["hotspots"], plan["capacity"], plan["flows"]
+        revenue, minutes, distance, value = plan["revenue"], plan["minutes"], plan["distance"], plan["value"]
+        driver_origin, driver_hotspot = plan["driver_origin"], plan["driver_hotspot"]
+        origin_count, hotspot_count = flows.shape
+        status, solve_time_ms = plan["status"], plan["solve_time_ms"]
+
+        assignments = []
+        for i, driver in enumerate(drivers):
+            o, h = int(driver_origin[i]), int(driver_hotspot[i])
+            cell = int(hotspots[h])
+            assignments.append({
+                "driver_id": driver.id,
+                "hotspot": self.research.zones.names[cell],
+                "latitude": round(float(self.research.zones.lat[cell]), 5),
+                "longitude": round(float(self.research.zones.lng[cell]), 5),
+                "minutes_to_position": int(round(float(minutes[o, h]))),
+                "distance_km": round(float(distance[o, h]), 2),
+                "expected_net_revenue": int(value[o, h])
+            })
+
+        load = flows.sum(axis=0)
+        hotspot_summary = [
+            {
+                "name": self.research.zones.names[cell],
+                "latitude": round(float(self.research.zones.lat[cell]), 5),
+                "longitude": round(float(self.research.zones.lng[cell]), 5),
+                "ai_revenue_per_min": float(revenue[h]),
+                "capacity": int(capacity[h]),
+                "assigned": int(load[h])
+            }
+            for h, cell in enumerate(hotspots.tolist())
+        ]
+
+        return FleetAssignment(
+            assignments=assignments,
+            hotspots=hotspot_summary,
+            status=status,
+            expected_net_revenue=int((flows * value).sum()),
+            solve_time_ms=round(solve_time_ms, 2),
+            total_time_ms=round((time.perf_counter() - started) * 1000, 2),
+            stats={
+                "drivers": len(drivers),
+                "origin_cells": origin_count,
+                "hotspots": hotspot_count,
+                "variables": origin_count * hotspot_count
+            }
+        )
+
+    def plan(self, nodes: np.ndarray, scores: Dict[str, Any], hour: int, rain_intensity: float = 0.0) -> Dict[str, Any]:
+        """
+        Assign drivers at travel-matrix nodes to the demand peaks of precomputed scores
+        Array-level core of assign(), also used by the fleet simulator
+        """
+        positioning = self.research.positioning_config
+        hotspots = self.research.select_hotspots(scores, self.config["hotspot_count"])
+        revenue = scores["ai_revenue_per_min"][hotspots]
+        capacity = self._capacities(scores["base_demand"][hotspots], len(nodes))
+
+        # Aggregate drivers by origin node: supply per node
+        origins, driver_origin, supply = np.unique(nodes, return_inverse=True, return_counts=True)
+
+        # Expected net revenue of each origin -> hotspot move over the planning horizon
+        minutes = self.matrix.travel_minutes_between(origins, hotspots, hour, rain_intensity)
+        distance = self.matrix.road_distance_between(origins, hotspots)
+        value = (revenue[None, :] * np.maximum(0.0, positioning["horizon_minutes"] - minutes)
+                 - distance * positioning["cost_per_km"])
+
+        solve_started = time.perf_counter()
+        flows = self._solve(-value, supply, capacity)
+        solve_time_ms = (time.perf_counter() - solve_started) * 1000
+        status = "optimal"
+        if flows is None:
+            logger.error("Fleet assignment solver failed, using greedy assignment")
+            flows = self._greedy(value, supply, capacity)
+            status = "greedy"
+
+        # Hand out each origin's flows to its drivers: drivers grouped by origin, hotspots in order
+        origin_count, hotspot_count = flows.shape
+        by_origin = np.argsort(driver_origin, kind="stable")
+        driver_hotspot = np.empty(len(nodes), dtype=np.int64)
+        driver_hotspot[by_origin] = np.repeat(np.tile(np.arange(hotspot_count), origin_count), flows.ravel())
+
+        return {
+            "hotspots": hotspots,
+            "capacity": capacity,
+            "revenue": revenue,
+            "origins": origins,
+            "driver_origin": driver_origin,
+            "driver_hotspot": driver_hotspot,
+            "minutes": minutes,
+            "distance": distance,
+            "value": value,
+            "flows": flows,
+            "status": status,
+            "solve_time_ms": solve_time_ms
+        }
+
+    def _solve(self, cost: np.ndarray, supply: np.ndarray, capacity: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Transportation LP: every origin ships its supply, no hotspot exceeds capacity
+        Solved by column generation: start from each origin's cheapest hotspots and add any
+        column with negative reduced cost until none is left, which makes the result optimal
+        for the full problem. The constraint matrix is totally unimodular, so the vertex
+        solution is integral
+        """
+        origins, hotspots = cost.shape
+        initial = min(hotspots, self.config["initial_columns"])
+        active = np.zeros(cost.shape, dtype=bool)
+        np.put_along_axis(active, np.argsort(cost, axis=1)[:, :initial], True, axis=1)
+
+        for _ in range(self.config["max_rounds"]):
+            result = self._solve_restricted(cost, supply, capacity, active)
+            if result is None:
+                if active.all():
+                    return None
+                active[:] = True  # Restricted problem infeasible: fall back to every column
+                continue
+
+            flows, origin_duals, hotspot_duals = result
+            reduced = cost - origin_duals[:, None] - hotspot_duals[None, :]
+            entering = ~active & (reduced < -1e-6)
+            if not entering.any():
+                return flows
+            active |= entering
+
+        logger.warning("Fleet assignment column generation did not converge, solving the full LP")
+        result = self._solve_restricted(cost, supply, capacity, np.ones(cost.shape, dtype=bool))
+        return result[0] if result is not None else None
+
+    def _solve_restricted(self, cost: np.ndarray, supply: np.ndarray, capacity: np.ndarray,
+                          active: np.ndarray):
+        """LP over the active (origin, hotspot) columns; returns integral flows and constraint duals"""
+        origins, hotspots = cost.shape
+        origin_of, hotspot_of = np.nonzero(active)
+        variables = len(origin_of)
+        columns = np.arange(variables)
+
+        # Row i of the equality block sums origin i's flows; row j of the inequality block sums hotspot j's
+        supply_rows = sparse.csr_matrix((np.ones(variables), (origin_of, columns)), shape=(origins, variables))
+        capacity_rows = sparse.csr_matrix((np.ones(variables), (hotspot_of, columns)), shape=(hotspots, variables))
+
+        result = linprog(
+            cost[origin_of, hotspot_of],
+            A_ub=capacity_rows, b_ub=capacity,
+            A_eq=supply_rows, b_eq=supply,
+            bounds=(0, None),
+            method="highs",  # Returns a basic (vertex) solution
+            options={"presolve": False}  # Nothing to presolve in a transportation LP
+        )
+        if not result.success:
+            logger.warning(f"Fleet assignment LP failed: {result.message}")
+            return None
+
+        flows = np.zeros(cost.shape, dtype=np.int64)
+        flows[origin_of, hotspot_of] = np.rint(result.x).astype(np.int64)
+        if not np.array_equal(flows.sum(axis=1), supply):
+            logger.error("Fleet assignment LP returned a fractional solution")
+            return None
+        return flows, np.asarray(result.eqlin.marginals), np.asarray(result.ineqlin.marginals)
+
+    def _greedy(self, value: np.ndarray, supply: np.ndarray, capacity: np.ndarray) -> np.ndarray:
+        """Fallback: best remaining hotspot per origin, most valuable moves first"""
+        flows = np.zeros(value.shape, dtype=np.int64)
+        remaining = capacity.copy()
+        for flat in np.argsort(-value, axis=None).tolist():
+            o, h = divmod(flat, value.shape[1])
+            need = supply[o] - flows[o].sum()
+            if need and remaining[h]:
+                moved = min(need, remaining[h])
+                flows[o, h] += moved
+                remaining[h] -= moved
+        return flows
+
+# Global instance for use across the application
+fleet_optimizer = FleetAssignmentOptimizer()
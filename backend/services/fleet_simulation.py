@@ -0,0 +1,421 @@
+"""
+Fleet Simulation
+Minute-stepped taxi fleet simulator that measures the AI hotspot policy against traditional
+driving on the same passenger requests, to check the research improvement figures at scale
+
+Driver and request state are flat NumPy arrays, so one process simulates tens of thousands of
+drivers and millions of trips; parameter sweeps run one scenario per worker process
+
+Run with: python -m services.fleet_simulation --drivers 1000,10000 --rain 0,3,8 --hours 24 --seeds 2
+"""
+
+import argparse
+import itertools
+import json
+import logging
+import math
+import os
+import sys
+import time
+from concurrent.futures import ProcessPoolExecutor
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass, asdict
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+POLICIES = ("traditional", "ai")
+
+def _get_default_config() -> Dict[str, Any]:
+    """Default simulation configuration"""
+    return {
+        "demand_per_driver_hour": 1.2,  # Requests per driver per hour at multiplier 1.0
+        "trip_scale_km": 4.0,           # Destination choice decays with distance on this scale
+        "max_wait_minutes": 10,         # Unserved requests are abandoned after this long
+        "max_pickup_minutes": 12,       # Drivers further away than this are not dispatched
+        "neighbour_cells": 48,          # Nearest cells searched for an idle driver
+        "reposition_interval": 5,       # Minutes between repositioning decisions
+        "reposition_after_minutes": 10, # Idle time before a driver is repositioned
+        "fare_base": 500,               # Tokyo fare: ¥500 for the first 1.096 km,
+        "fare_base_km": 1.096,
+        "fare_step": 100,               # then ¥100 per 255 m
+        "fare_step_km": 0.255
+    }
+
+@dataclass
+class SimulationScenario:
+    """One simulated run: fleet size, conditions and dispatch policy"""
+    drivers: int
+    policy: str = "ai"             # ai: fleet assignment to predicted hotspots, traditional: habitual cruising
+    start: str = "2026-10-05T00:00:00"
+    hours: float = 24.0
+    rain_intensity: float = 0.0    # mm/h for the whole run
+    temperature: float = 20.0
+    disruption_delay: int = 0      # Minutes of one ongoing rail disruption, 0 for none
+    seed: int = 0
+
+class FleetSimulator:
+    """
+    Each minute: draw Poisson requests per grid cell from the research demand model, abandon
+    requests past max_wait_minutes, match waiting requests (oldest first) to the nearest idle
+    drivers, and every reposition_interval let idle drivers follow the scenario's policy
+
+    Requests are drawn from a generator seeded by the scenario seed alone, so both policies
+    face the same passengers; the AI policy is scored against the model that generates demand,
+    so the measured improvement is what perfect forecasts would give
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        # Imported here so each worker process builds its own engines
+        from .fleet_assignment import fleet_optimizer
+        from .research_integration import research_integration
+
+        self.config = config or _get_default_config()
+        self.research = research_integration
+        self.optimizer = fleet_optimizer
+        self.matrix = fleet_optimizer.matrix
+        self.matrix.load()
+        self.grid = research_integration.grid
+        self.cells = len(self.grid)
+
+        minutes = np.asarray(self.matrix.minutes[:self.cells, :self.cells])
+        distance = np.asarray(self.matrix.distance[:self.cells, :self.cells])
+
+        # Nearest cells by free-flow driving time, -1 beyond the pickup limit
+        k = min(self.config["neighbour_cells"], self.cells)
+        nearest = np.argpartition(minutes, k - 1, axis=1)[:, :k]
+        nearest = np.take_along_axis(nearest, np.argsort(np.take_along_axis(minutes, nearest, axis=1), axis=1), axis=1)
+        reachable = np.take_along_axis(minutes, nearest, axis=1) <= self.config["max_pickup_minutes"]
+        self.neighbours = np.where(reachable, nearest, -1)
+
+        # Traditional drivers cruise to the busiest nearby cell they know of (static base revenue)
+        revenue = np.where(self.neighbours >= 0, self.grid.base_revenue[np.maximum(self.neighbours, 0)], -np.inf)
+        self.cruise_target = self.neighbours[np.arange(self.cells), np.argmax(revenue, axis=1)]
+
+        # Destinations: busier cells attract more trips, decaying with distance; one CDF row per origin,
+        # offset by the row index so one searchsorted samples every origin at once
+        attraction = self.grid.base_revenue[None, :] * np.exp(-distance / self.config["trip_scale_km"])
+        cdf = np.cumsum(attraction, axis=1)
+        cdf /= cdf[:, -1:]
+        self.destination_cdf = (cdf + np.arange(self.cells)[:, None]).ravel()
+        self.origin_share = self.grid.base_revenue / self.grid.base_revenue.sum()
+
+    def _sample_destinations(self, rng: np.random.Generator, origins: np.ndarray) -> np.ndarray:
+        flat = np.searchsorted(self.destination_cdf, origins + rng.random(len(origins)), side="left")
+        return np.minimum(flat - origins * self.cells, self.cells - 1)
+
+    def _fares(self, distance: np.ndarray) -> np.ndarray:
+        config = self.config
+        steps = np.ceil(np.maximum(distance - config["fare_base_km"], 0.0) / config["fare_step_km"])
+        return config["fare_base"] + config["fare_step"] * steps
+
+    def _match(self, request_cell: np.ndarray, idle: np.ndarray, driver_cell: np.ndarray) -> Tuple[np.ndarray, np.ndarray]:
+        """
+        Greedy nearest-driver matching on cells: in round j every open request looks at its j-th
+        nearest cell and takes one of the idle drivers left there, oldest requests first
+        Returns matched request indexes and their drivers
+        """
+        idle_cell = driver_cell[idle]
+        idle_sorted = idle[np.argsort(idle_cell, kind="stable")]
+        count = np.bincount(idle_cell, minlength=self.cells)
+        first = np.concatenate(([0], np.cumsum(count)[:-1]))
+        used = np.zeros(self.cells, dtype=np.int64)
+        remaining = len(idle)
+
+        open_requests = np.arange(len(request_cell))
+        matched_requests, matched_drivers = [], []
+        for j in range(self.neighbours.shape[1]):
+            if not len(open_requests) or not remaining:
+                break
+            candidate = self.neighbours[request_cell[open_requests], j]
+            has_driver = candidate >= 0
+            has_driver[has_driver] = count[candidate[has_driver]] > used[candidate[has_driver]]
+            if not has_driver.any():
+                continue
+
+            requests, cells = open_requests[has_driver], candidate[has_driver]
+            by_cell = np.argsort(cells, kind="stable")  # Keeps request age order within a cell
+            requests, cells = requests[by_cell], cells[by_cell]
+            rank = np.arange(len(cells)) - np.searchsorted(cells, cells, side="left")
+            take = rank < count[cells] - used[cells]
+            requests, cells, rank = requests[take], cells[take], rank[take]
+
+            matched_requests.append(requests)
+            matched_drivers.append(idle_sorted[first[cells] + used[cells] + rank])
+            taken = np.bincount(cells, minlength=self.cells)
+            used += taken
+            remaining -= len(requests)
+            open_requests = np.setdiff1d(open_requests, requests, assume_unique=True)
+
+        if not matched_requests:
+            empty = np.zeros(0, dtype=np.int64)
+            return empty, empty
+        return np.concatenate(matched_requests), np.concatenate(matched_drivers)
+
+    def run(self, scenario: SimulationScenario) -> Dict[str, Any]:
+        """Simulate one scenario; returns its fleet metrics"""
+        started = time.perf_counter()
+        config = self.config
+        if scenario.policy not in POLICIES:
+            raise ValueError(f"Unknown policy: {scenario.policy}")
+
+        start = datetime.fromisoformat(scenario.start)
+        horizon = int(round(scenario.hours * 60))
+        drivers = scenario.drivers
+        rain = scenario.rain_intensity
+        weather_data = {"is_raining": rain > 0, "rain_intensity": rain, "temperature": scenario.temperature}
+        traffic_data = {"disruptions": [{"estimated_delay": scenario.disruption_delay}] if scenario.disruption_delay else []}
+
+        # Same request stream for every policy of a seed; driver start positions drawn separately
+        demand_rng = np.random.default_rng([scenario.seed, 0])
+        fleet_rng = np.random.default_rng([scenario.seed, 1])
+
+        driver_cell = fleet_rng.choice(self.cells, size=drivers, p=self.origin_share)
+        free_at = np.zeros(drivers, dtype=np.int64)     # Minute the driver is next idle
+        idle_since = np.zeros(drivers, dtype=np.int64)
+
+        request_cell = np.zeros(0, dtype=np.int64)
+        request_destination = np.zeros(0, dtype=np.int64)
+        request_created = np.zeros(0, dtype=np.int64)
+        wait_histogram = np.zeros(config["max_wait_minutes"] + config["max_pickup_minutes"] + 2, dtype=np.int64)
+        totals = {"requests": 0, "served": 0, "abandoned": 0, "revenue": 0.0, "paid_minutes": 0.0,
+                  "trip_km": 0.0, "pickup_km": 0.0, "reposition_km": 0.0, "repositions": 0}
+
+        scores, rates, hour = None, None, None
+        for minute in range(horizon):
+            now = start + timedelta(minutes=minute)
+            if now.hour != hour:
+                # Demand model multipliers change by the hour
+                hour = now.hour
+                scores = self.research.predict_demand_arrays(weather_data, traffic_data, now=now)
+                demand = scores["base_demand"]
+                rates = demand / self.grid.base_revenue.sum() * (drivers * config["demand_per_driver_hour"] / 60)
+
+            # New requests, then drop those that waited too long
+            counts = demand_rng.poisson(rates)
+            new_cells = np.repeat(np.arange(self.cells), counts)
+            totals["requests"] += len(new_cells)
+            request_cell = np.concatenate((request_cell, new_cells))
+            request_destination = np.concatenate((request_destination, self._sample_destinations(demand_rng, new_cells)))
+            request_created = np.concatenate((request_created, np.full(len(new_cells), minute)))
+            expired = minute - request_created > config["max_wait_minutes"]
+            if expired.any():
+                totals["abandoned"] += int(expired.sum())
+                request_cell, request_destination, request_created = (
+                    request_cell[~expired], request_destination[~expired], request_created[~expired])
+
+            idle = np.flatnonzero(free_at <= minute)
+            matched, matched_drivers = self._match(request_cell, idle, driver_cell)
+            if len(matched):
+                origin = request_cell[matched]
+                destination = request_destination[matched]
+                pickup_minutes = np.ceil(self.matrix.travel_minutes_pairs(driver_cell[matched_drivers], origin, hour, rain))
+                trip_minutes = np.maximum(np.ceil(self.matrix.travel_minutes_pairs(origin, destination, hour, rain)), 1)
+                trip_km = self.matrix.road_distance_pairs(origin, destination)
+                wait = (minute - request_created[matched]) + pickup_minutes
+
+                totals["served"] += len(matched)
+                totals["revenue"] += float(self._fares(trip_km).sum())
+                totals["paid_minutes"] += float(np.clip(horizon - minute - pickup_minutes, 0, trip_minutes).sum())
+                totals["trip_km"] += float(trip_km.sum())
+                totals["pickup_km"] += float(self.matrix.road_distance_pairs(driver_cell[matched_drivers], origin).sum())
+                wait_histogram += np.bincount(np.minimum(wait.astype(np.int64), len(wait_histogram) - 1),
+                                              minlength=len(wait_histogram))
+
+                free_at[matched_drivers] = minute + (pickup_minutes + trip_minutes).astype(np.int64)
+                idle_since[matched_drivers] = free_at[matched_drivers]
+                driver_cell[matched_drivers] = destination
+
+                keep = np.ones(len(request_cell), dtype=bool)
+                keep[matched] = False
+                request_cell, request_destination, request_created = (
+                    request_cell[keep], request_destination[keep], request_created[keep])
+
+            if minute % config["reposition_interval"] == 0:
+                self._reposition(scenario, scores, driver_cell, free_at, idle_since, minute, hour, totals)
+
+        totals["abandoned"] += len(request_cell)  # Still waiting at the end of the run
+        return self._metrics(scenario, totals, wait_histogram, time.perf_counter() - started)
+
+    def _reposition(self, scenario: SimulationScenario, scores: Dict[str, Any], driver_cell: np.ndarray,
+                    free_at: np.ndarray, idle_since: np.ndarray, minute: int, hour: int, totals: Dict[str, Any]):
+        """Move drivers idle for reposition_after_minutes; they cannot be dispatched until they arrive"""
+        waiting = np.flatnonzero((free_at <= minute) & (minute - idle_since >= self.config["reposition_after_minutes"]))
+        if not len(waiting):
+            return
+
+        if scenario.policy == "ai":
+            plan = self.optimizer.plan(driver_cell[waiting], scores, hour, scenario.rain_intensity)
+            target = plan["hotspots"][plan["driver_hotspot"]]
+        else:
+            target = self.cruise_target[driver_cell[waiting]]
+
+        moving = target != driver_cell[waiting]
+        drivers, target = waiting[moving], target[moving]
+        if not len(drivers):
+            return
+        minutes = np.maximum(np.ceil(self.matrix.travel_minutes_pairs(driver_cell[drivers], target, hour,
+                                                                      scenario.rain_intensity)), 1)
+        totals["reposition_km"] += float(self.matrix.road_distance_pairs(driver_cell[drivers], target).sum())
+        totals["repositions"] += len(drivers)
+        free_at[drivers] = minute + minutes.astype(np.int64)
+        idle_since[drivers] = free_at[drivers]
+        driver_cell[drivers] = target
+
+    def _metrics(self, scenario: SimulationScenario, totals: Dict[str, Any], wait_histogram: np.ndarray,
+                 seconds: float) -> Dict[str, Any]:
+        driver_hours = scenario.drivers * scenario.hours
+        served = totals["served"]
+        cumulative = np.cumsum(wait_histogram)
+        empty_km = totals["pickup_km"] + totals["reposition_km"]
+        return {
+            "scenario": asdict(scenario),
+            "requests": totals["requests"],
+            "served": served,
+            "abandoned": totals["abandoned"],
+            "service_rate": round(served / totals["requests"], 4) if totals["requests"] else None,
+            "revenue": round(totals["revenue"]),
+            "revenue_per_driver_hour": round(totals["revenue"] / driver_hours, 1) if driver_hours else None,
+            "utilization": round(totals["paid_minutes"] / (driver_hours * 60), 4) if driver_hours else None,
+            "mean_wait_minutes": round(float(np.arange(len(wait_histogram)) @ wait_histogram / served), 2) if served else None,
+            "p90_wait_minutes": int(np.searchsorted(cumulative, 0.9 * served)) if served else None,
+            "empty_km_share": round(empty_km / (empty_km + totals["trip_km"]), 4) if empty_km + totals["trip_km"] else None,
+            "repositions": totals["repositions"],
+            "seconds": round(seconds, 2)
+        }
+
+_simulator: Optional[FleetSimulator] = None
+
+def _init_worker(config: Dict[str, Any]):
+    global _simulator
+    logging.basicConfig(level=logging.WARNING)
+    _simulator = FleetSimulator(config)
+
+def _run_scenario(scenario: SimulationScenario) -> Dict[str, Any]:
+    return _simulator.run(scenario)
+
+def compare(results: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+    """
+    AI vs traditional for each fleet size and condition, averaged over seeds,
+    next to the improvements claimed by the research parameters
+    """
+    from .research_integration import ResearchParameters
+    params = ResearchParameters()
+
+    runs: Dict[Tuple, Dict[str, Dict[str, Any]]] = {}
+    for result in results:
+        scenario = dict(result["scenario"])
+        policy = scenario.pop("policy")
+        runs.setdefault(tuple(sorted(scenario.items())), {})[policy] = result
+
+    groups: Dict[Tuple, List[Dict[str, float]]] = {}
+    for key, pair in runs.items():
+        if set(pair) != set(POLICIES):
+            continue
+        ai, traditional = pair["ai"], pair["traditional"]
+        scenario = dict(key)
+        group = (scenario["drivers"], scenario["rain_intensity"], scenario["temperature"],
+                 scenario["disruption_delay"], scenario["hours"], scenario["start"])
+        groups.setdefault(group, []).append({
+            "revenue_improvement": ai["revenue"] / traditional["revenue"] - 1 if traditional["revenue"] else math.nan,
+            "wait_time_reduction": (1 - ai["mean_wait_minutes"] / traditional["mean_wait_minutes"])
+                                   if ai["mean_wait_minutes"] is not None and traditional["mean_wait_minutes"] else math.nan,
+            "utilization_improvement": ai["utilization"] / traditional["utilization"] - 1 if traditional["utilization"] else math.nan,
+            "service_rate_ai": ai["service_rate"] or 0.0,
+            "service_rate_traditional": traditional["service_rate"] or 0.0
+        })
+
+    comparisons = []
+    for (drivers, rain, temperature, disruption_delay, hours, start), rows in sorted(groups.items()):
+        measured = {name: round(float(np.nanmean([row[name] for row in rows])), 4) for name in rows[0]}
+        comparisons.append({
+            "drivers": drivers,
+            "rain_intensity": rain,
+            "temperature": temperature,
+            "disruption_delay": disruption_delay,
+            "hours": hours,
+            "start": start,
+            "seeds": len(rows),
+            **measured,
+            "claimed": {
+                "revenue_improvement": round(params.ai_improvement_factor - 1, 4),
+                "wait_time_reduction": params.ai_wait_time_reduction,
+                "utilization_improvement": params.ai_utilization_improvement
+            }
+        })
+    return comparisons
+
+def run_sweep(scenarios: List[SimulationScenario], workers: Optional[int] = None,
+              config: Optional[Dict[str, Any]] = None) -> Dict[str, Any]:
+    """Simulate every scenario, one scenario per task across worker processes"""
+    config = {**_get_default_config(), **(config or {})}
+    workers = max(1, min(workers or os.cpu_count() or 1, len(scenarios)))
+    started = time.perf_counter()
+
+    if workers == 1:
+        _init_worker(config)
+        results = [_run_scenario(scenario) for scenario in scenarios]
+    else:
+        with ProcessPoolExecutor(max_workers=workers, initializer=_init_worker, initargs=(config,)) as pool:
+            results = list(pool.map(_run_scenario, scenarios))
+
+    elapsed = time.perf_counter() - started
+    return {
+        "config": config,
+        "workers": workers,
+        "seconds": round(elapsed, 2),
+        "trips": sum(result["served"] for result in results),
+        "comparisons": compare(results),
+        "runs": results
+    }
+
+def _parse_list(value: str, kind: type) -> List[Any]:
+    return [kind(item) for item in value.split(",") if item.strip()]
+
+def main(argv: Optional[List[str]] = None):
+    parser = argparse.ArgumentParser(description="Simulate the taxi fleet under AI and traditional dispatch")
+    parser.add_argument("--drivers", default="1000", help="Comma-separated fleet sizes")
+    parser.add_argument("--rain", default="0", help="Comma-separated rain intensities (mm/h)")
+    parser.add_argument("--temperature", type=float, default=20.0)
+    parser.add_argument("--disruption-delay", type=int, default=0, help="Minutes of an ongoing rail disruption")
+    parser.add_argument("--start", default="2026-10-05T00:00:00", help="Simulated start time (ISO 8601)")
+    parser.add_argument("--hours", type=float, default=24.0)
+    parser.add_argument("--seeds", type=int, default=1, help="Runs per scenario, seeded 0..n-1")
+    parser.add_argument("--policies", default=",".join(POLICIES))
+    parser.add_argument("--workers", type=int, default=None, help="Worker processes (default: CPU count)")
+    parser.add_argument("--demand-per-driver-hour", type=float, default=None)
+    parser.add_argument("--output", default=None, help="Write the full JSON report here (default: stdout)")
+    args = parser.parse_args(argv)
+
+    logging.basicConfig(level=logging.INFO)
+    scenarios = [
+        SimulationScenario(drivers=drivers, policy=policy, start=args.start, hours=args.hours,
+                           rain_intensity=rain, temperature=args.temperature,
+                           disruption_delay=args.disruption_delay, seed=seed)
+        for drivers, rain, seed, policy in itertools.product(
+            _parse_list(args.drivers, int), _parse_list(args.rain, float), range(args.seeds),
+            _parse_list(args.policies, str))
+    ]
+    config = {}
+    if args.demand_per_driver_hour is not None:
+        config["demand_per_driver_hour"] = args.demand_per_driver_hour
+
+    report = run_sweep(scenarios, args.workers, config)
+    logger.info(f"Simulated {len(scenarios)} runs ({report['trips']} trips) in {report['seconds']}s "
+                f"with {report['workers']} workers")
+    for row in report["comparisons"]:
+        logger.info(f"{row['drivers']} drivers, rain {row['rain_intensity']} mm/h: "
+                    f"revenue {row['revenue_improvement']:+.1%} (claimed {row['claimed']['revenue_improvement']:+.1%}), "
+                    f"wait {-row['wait_time_reduction']:+.1%}, utilization {row['utilization_improvement']:+.1%}")
+
+    text = json.dumps(report, indent=2)
+    if args.output:
+        with open(args.output, "w") as f:
+            f.write(text)
+    else:
+        print(text)
+
+if __name__ == "__main__":
+    main(sys.argv[1:])
@@ -0,0 +1,448 @@
+"""
+Snapshot History
+Append-only record of every ingested weather/traffic snapshot and every served prediction list,
+buffered in memory and written in batches off the request path to day-partitioned columnar files
+(memory-mapped for offline reads) and/or a SQL database (Postgres, or SQLite as a stand-in)
+"""
+
+import asyncio
+import glob
+import json
+import logging
+import os
+import socket
+from collections import deque
+from datetime import datetime, timedelta
+from typing import Dict, List, Any, Optional, Callable, Iterator, Tuple
+from dataclasses import dataclass
+
+import numpy as np
+
+try:
+    import sqlalchemy as sa
+except ImportError:  # SQLAlchemy is optional; without it only the columnar backend is available
+    sa = None
+
+from .ingestion import Snapshot, snapshot_store
+from .spatial_grid import tokyo_grid
+
+logger = logging.getLogger(__name__)
+
+HISTORY_FORMAT = 1
+
+@dataclass(frozen=True)
+class HistoryRecord:
+    """One appended item: an ingested snapshot or a served prediction list"""
+    kind: str            # weather, traffic, predictions
+    recorded_at: datetime
+    version: str
+    payload: Any         # JSON-compatible
+
+def _ms(when: datetime) -> int:
+    return int(when.timestamp() * 1000)
+
+def _weather_code(code: Any) -> int:
+    return int(code) if str(code).isdigit() else -1
+
+def _weather_rows(record: HistoryRecord) -> List[Dict[str, Any]]:
+    data = record.payload
+    return [{
+        "recorded_at": _ms(record.recorded_at),
+        "fetched_at": _ms(datetime.fromisoformat(data["timestamp"])),
+        "temperature": data["temperature"],
+        "humidity": data["humidity"],
+        "precipitation": data["precipitation"],
+        "rain_intensity": data["rain_intensity"],
+        "wind_speed": data["wind_speed"],
+        "visibility": data["visibility"],
+        "pressure": data["pressure"],
+        "confidence": data["confidence"],
+        "is_raining": data["is_raining"],
+        "weather_code": _weather_code(data["weather_code"])
+    }]
+
+def _traffic_rows(record: HistoryRecord) -> List[Dict[str, Any]]:
+    data = record.payload
+    delays = [disruption["estimated_delay"] for disruption in data["disruptions"]]
+    return [{
+        "recorded_at": _ms(record.recorded_at),
+        "fetched_at": _ms(datetime.fromisoformat(data["last_updated"])),
+        "punctuality_rate": data["punctuality_rate"],
+        "average_delay": data["average_delay"],
+        "disruptions": len(delays),
+        "disruption_delay_total": sum(delays),
+        "delayed_stations": sum(1 for station in data["stations"] if station["delays"] > 0),
+        "degraded_sources": len(data.get("degraded", []))
+    }]
+
+def _prediction_rows(record: HistoryRecord) -> List[Dict[str, Any]]:
+    """
+    One row per served zone, identified by its grid cell
+    Multipliers a prediction was not scored with (research ones under the learned model, or the
+    learned one without it) are NaN
+    """
+    recorded_at = _ms(record.recorded_at)
+    rows = []
+    for rank, prediction in enumerate(record.payload["predictions"]):
+        cell = tokyo_grid.cell_at(prediction["latitude"], prediction["longitude"])
+        rows.append({
+            "recorded_at": recorded_at,
+            "cell": -1 if cell is None else cell,
+            "rank": rank,
+            "ai_revenue_per_min": prediction["ai_revenue_per_min"],
+            "base_revenue": prediction["base_revenue"],
+            **{name: np.nan if prediction.get(name) is None else prediction[name]
+               for name in ("weather_multiplier", "time_multiplier", "traffic_multiplier", "learned_multiplier")}
+        })
+    return rows
+
+# Column dtypes and row extractor per record kind
+SCHEMAS: Dict[str, Tuple[Dict[str, str], Callable[[HistoryRecord], List[Dict[str, Any]]], bool]] = {
+    # kind: (columns, rows, keep full payloads)
+    "weather": ({
+        "recorded_at": "<i8", "fetched_at": "<i8",
+        "temperature": "<f4", "humidity": "<f4", "precipitation": "<f4", "rain_intensity": "<f4",
+        "wind_speed": "<f4", "visibility": "<f4", "pressure": "<f4", "confidence": "<f4",
+        "is_raining": "u1", "weather_code": "<i2"
+    }, _weather_rows, True),
+    "traffic": ({
+        "recorded_at": "<i8", "fetched_at": "<i8",
+        "punctuality_rate": "<f4", "average_delay": "<f4",
+        "disruptions": "<i2", "disruption_delay_total": "<i4",
+        "delayed_stations": "<i2", "degraded_sources": "<i2"
+    }, _traffic_rows, True),
+    "predictions": ({
+        "recorded_at": "<i8", "cell": "<i4", "rank": "<i2",
+        "ai_revenue_per_min": "<f4", "base_revenue": "<f4",
+        "weather_multiplier": "<f4", "time_multiplier": "<f4", "traffic_multiplier": "<f4",
+        "learned_multiplier": "<f4"
+    }, _prediction_rows, False)
+}
+
+def _days(start: datetime, end: datetime) -> List[str]:
+    days = []
+    day = start.date()
+    while day <= end.date():
+        days.append(day.isoformat())
+        day += timedelta(days=1)
+    return days
+
+class HistoryBackend:
+    """Interface for history storage; writes run in a worker thread"""
+
+    name = "base"
+
+    def write_batch(self, records: List[HistoryRecord]):
+        raise NotImplementedError
+
+    def read_payloads(self, kind: str, start: datetime, end: datetime) -> List[HistoryRecord]:
+        raise NotImplementedError
+
+    def close(self):
+        pass
+
+class ColumnarHistoryBackend(HistoryBackend):
+    """
+    <directory>/<kind>/<YYYY-MM-DD>/<writer>/ holds one raw little-endian file per column,
+    appended to in batches, plus payloads.jsonl for kinds kept in full. Each worker appends to its
+    own writer directory, so concurrent workers never interleave rows
+    """
+
+    name = "columnar"
+
+    def __init__(self, directory: str):
+        self.directory = directory
+        self.writer_id = f"{socket.gethostname()}-{os.getpid()}"
+        os.makedirs(directory, exist_ok=True)
+
+    def _segment(self, kind: str, day: str) -> str:
+        path = os.path.join(self.directory, kind, day, self.writer_id)
+        if not os.path.isdir(path):
+            os.makedirs(path, exist_ok=True)
+            columns, _, _ = SCHEMAS[kind]
+            with open(os.path.join(path, "schema.json"), "w") as f:
+                json.dump({"format": HISTORY_FORMAT, "columns": columns}, f)
+        return path
+
+    def write_batch(self, records: List[HistoryRecord]):
+        groups: Dict[Tuple[str, str], List[HistoryRecord]] = {}
+        for record in records:
+            groups.setdefault((record.kind, record.recorded_at.date().isoformat()), []).append(record)
+
+        for (kind, day), group in groups.items():
+            columns, extract, keep_payloads = SCHEMAS[kind]
+            rows = [row for record in group for row in extract(record)]
+            segment = self._segment(kind, day)
+            # Payloads first: a row counted in the columns always has its payload line
+            if keep_payloads:
+                with open(os.path.join(segment, "payloads.jsonl"), "a", encoding="utf-8") as f:
+                    for record in group:
+                        f.write(json.dumps({"version": record.version, "recorded_at": record.recorded_at.isoformat(),
+                                            "payload": record.payload}, ensure_ascii=False) + "\n")
+            for name, dtype in columns.items():
+                values = np.array([row[name] for row in rows], dtype=dtype)
+                with open(os.path.join(segment, f"{name}.bin"), "ab") as f:
+                    f.write(values.tobytes())
+
+    def _segments(self, kind: str, start: datetime, end: datetime) -> Iterator[str]:
+        for day in _days(start, end):
+            yield from sorted(glob.glob(os.path.join(self.directory, kind, day, "*")))
+
+    def read_columns(self, kind: str, start: datetime, end: datetime) -> Dict[str, np.ndarray]:
+        """Every column of a kind between start and end (inclusive), memory-mapped per segment"""
+        columns, _, _ = SCHEMAS[kind]
+        parts: Dict[str, List[np.ndarray]] = {name: [] for name in columns}
+        for segment in self._segments(kind, start, end):
+            with open(os.path.join(segment, "schema.json")) as f:
+                written = json.load(f)["columns"]
+            mapped = {}
+            for name, dtype in columns.items():
+                if name not in written:
+                    continue  # Column added after this segment was written
+                path = os.path.join(segment, f"{name}.bin")
+                size = os.path.getsize(path) if os.path.exists(path) else 0
+                mapped[name] = np.memmap(path, dtype=dtype, mode="r") if size else np.empty(0, dtype=dtype)
+            rows = min(len(column) for column in mapped.values())  # A crash mid-batch leaves ragged tails
+            for name, dtype in columns.items():
+                parts[name].append(mapped[name][:rows] if name in mapped else np.full(rows, np.nan, dtype=dtype))
+
+        result = {
+            name: np.concatenate(chunks) if chunks else np.empty(0, dtype=columns[name])
+            for name, chunks in parts.items()
+        }
+        recorded = result["recorded_at"]
+        keep = (recorded >= _ms(start)) & (recorded <= _ms(end))
+        order = np.argsort(recorded[keep], kind="stable")
+        return {name: column[keep][order] for name, column in result.items()}
+
+    def read_payloads(self, kind: str, start: datetime, end: datetime) -> List[HistoryRecord]:
+        records = []
+        for segment in self._segments(kind, start, end):
+            path = os.path.join(segment, "payloads.jsonl")
+            if not os.path.exists(path):
+                continue
+            with open(path, encoding="utf-8") as f:
+                for line in f:
+                    try:
+                        item = json.loads(line)
+                    except ValueError:
+                        continue  # Torn last line
+                    recorded_at = datetime.fromisoformat(item["recorded_at"])
+                    if start <= recorded_at <= end:
+                        records.append(HistoryRecord(kind, recorded_at, item["version"], item["payload"]))
+        records.sort(key=lambda record: record.recorded_at)
+        return records
+
+class SQLHistoryBackend(HistoryBackend):
+    """
+    One append-only table of JSON payloads, indexed by (kind, day, recorded_at) so reads touch
+    only the requested days; SQLite URLs give a file-based stand-in for tests
+    """
+
+    name = "sql"
+
+    def __init__(self, url: str):
+        if sa is None:
+            raise RuntimeError("sqlalchemy package is not installed")
+        self.url = url
+        self.engine = sa.create_engine(url, pool_pre_ping=True)
+        metadata = sa.MetaData()
+        self.table = sa.Table(
+            "snapshot_history", metadata,
+            sa.Column("id", sa.BigInteger().with_variant(sa.Integer(), "sqlite"), primary_key=True, autoincrement=True),
+            sa.Column("kind", sa.String(32), nullable=False),
+            sa.Column("day", sa.String(10), nullable=False),  # Partition key (local date)
+            sa.Column("recorded_at", sa.DateTime, nullable=False),
+            sa.Column("version", sa.String(200), nullable=False),
+            sa.Column("payload", sa.Text, nullable=False),
+            sa.Index("ix_snapshot_history_kind_day", "kind", "day", "recorded_at")
+        )
+        metadata.create_all(self.engine)
+
+    def write_batch(self, records: List[HistoryRecord]):
+        rows = [
+            {
+                "kind": record.kind,
+                "day": record.recorded_at.date().isoformat(),
+                "recorded_at": record.recorded_at,
+                "version": record.version,
+                "payload": json.dumps(record.payload, ensure_ascii=False, separators=(",", ":"))
+            }
+            for record in records
+        ]
+        with self.engine.begin() as connection:
+            connection.execute(self.table.insert(), rows)
+
+    def read_payloads(self, kind: str, start: datetime, end: datetime) -> List[HistoryRecord]:
+        table = self.table
+        query = (
+            sa.select(table.c.recorded_at, table.c.version, table.c.payload)
+            .where(table.c.kind == kind, table.c.day.in_(_days(start, end)),
+                   table.c.recorded_at >= start, table.c.recorded_at <= end)
+            .order_by(table.c.recorded_at)
+        )
+        with self.engine.connect() as connection:
+            return [HistoryRecord(kind, row.recorded_at, row.version, json.loads(row.payload))
+                    for row in connection.execute(query)]
+
+    def close(self):
+        self.engine.dispose()
+
+def create_history_backends() -> List[HistoryBackend]:
+    """
+    Build the history backends from the environment
+    HISTORY_DIR -> columnar files, HISTORY_DATABASE_URL (or DATABASE_URL) -> SQL, neither -> disabled
+    """
+    backends: List[HistoryBackend] = []
+
+    directory = os.getenv("HISTORY_DIR")
+    if directory:
+        logger.info(f"History backend: columnar files in {directory}")
+        backends.append(ColumnarHistoryBackend(directory))
+
+    url = os.getenv("HISTORY_DATABASE_URL") or os.getenv("DATABASE_URL")
+    if url:
+        try:
+            backends.append(SQLHistoryBackend(url))
+            logger.info(f"History backend: SQL ({url.split('@')[-1]})")
+        except Exception as e:
+            logger.error(f"History database unavailable, not recording to it: {e}")
+
+    if not backends:
+        logger.info("No history backend configured, snapshots are not recorded")
+    return backends
+
+class HistoryWriter:
+    """
+    record() only appends to an in-memory buffer and never waits; a background task drains it
+    in batches every flush_seconds (or as soon as batch_size records are waiting) and writes them
+    in a worker thread. A batch a backend fails to write is retried once at the next flush, then dropped;
+    when the backends fall behind, the oldest unwritten records are dropped
+    """
+
+    def __init__(self, backends: Optional[List[HistoryBackend]] = None, config: Dict[str, Any] = None):
+        self.config = config or self._get_default_config()
+        self.backends: List[HistoryBackend] = backends if backends is not None else []
+        self._configure = backends is None  # Build backends from the environment at start()
+        self._buffer: deque = deque(maxlen=self.config["max_buffer"])
+        self._flush_requested: Optional[asyncio.Event] = None
+        self._task: Optional[asyncio.Task] = None
+        self._last_predictions_version: Optional[str] = None
+        self._retries: List[Tuple[List[HistoryRecord], List[HistoryBackend]]] = []
+        self.stats = {
+            "recorded": 0,
+            "written": 0,
+            "dropped": 0,
+            "batches": 0,
+            "write_errors": 0
+        }
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default history writer configuration"""
+        return {
+            "batch_size": 500,      # Records per backend write
+            "flush_seconds": 5.0,   # Max time a record waits in the buffer
+            "max_buffer": 50000     # Records held while backends are slow or down
+        }
+
+    @property
+    def enabled(self) -> bool:
+        return bool(self.backends)
+
+    def record(self, kind: str, version: str, payload: Any, recorded_at: Optional[datetime] = None):
+        """Queue one record (no I/O)"""
+        if not self.backends:
+            return
+        if len(self._buffer) == self._buffer.maxlen:
+            self.stats["dropped"] += 1
+        self._buffer.append(HistoryRecord(kind, recorded_at or datetime.now(), version, payload))
+        self.stats["recorded"] += 1
+        if len(self._buffer) >= self.config["batch_size"] and self._flush_requested is not None:
+            self._flush_requested.set()
+
+    def on_snapshot(self, snapshot: Snapshot):
+        """Snapshot store subscriber: every newly published weather/traffic snapshot"""
+        if snapshot.source in ("weather", "traffic"):
+            self.record(snapshot.source, snapshot.version, snapshot.data.to_dict(), snapshot.fetched_at)
+
+    def record_predictions(self, version: str, predictions: List[Dict[str, Any]], source: str):
+        """Served prediction list; a list served many times under one version is recorded once"""
+        if version == self._last_predictions_version:
+            return
+        self._last_predictions_version = version
+        self.record("predictions", version, {"source": source, "predictions": predictions})
+
+    async def start(self):
+        """Build the configured backends and start the background flusher"""
+        if self._configure:
+            self._configure = False
+            self.backends = await asyncio.to_thread(create_history_backends)
+        if self.backends and self._task is None:
+            self._flush_requested = asyncio.Event()
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the flusher, write what is still buffered and close the backends"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+        await self.flush()
+        if self._retries:
+            await self.flush()  # Last chance for batches that just failed
+        for backend in self.backends:
+            await asyncio.to_thread(backend.close)
+
+    async def _run(self):
+        while True:
+            try:
+                await asyncio.wait_for(self._flush_requested.wait(), self.config["flush_seconds"])
+            except asyncio.TimeoutError:
+                pass
+            self._flush_requested.clear()
+            await self.flush()
+
+    async def _write(self, batch: List[HistoryRecord], backends: List[HistoryBackend]) -> List[HistoryBackend]:
+        """Write one batch to each backend; returns the backends that failed"""
+        failed = []
+        for backend in backends:
+            try:
+                await asyncio.to_thread(backend.write_batch, batch)
+            except Exception as e:
+                self.stats["write_errors"] += 1
+                logger.error(f"History write to {backend.name} failed ({len(batch)} records): {e}")
+                failed.append(backend)
+        return failed
+
+    async def flush(self):
+        """Retry last flush's failed batches, then write everything buffered in batch_size chunks"""
+        retries, self._retries = self._retries, []
+        for batch, backends in retries:
+            failed = await self._write(batch, backends)
+            if failed:
+                self.stats["dropped"] += len(batch)
+                logger.error(f"Dropped {len(batch)} history records missing from {', '.join(b.name for b in failed)} after a retry")
+            else:
+                self.stats["written"] += len(batch)
+
+        while self._buffer:
+            batch = [self._buffer.popleft() for _ in range(min(len(self._buffer), self.config["batch_size"]))]
+            failed = await self._write(batch, self.backends)
+            self.stats["batches"] += 1
+            if failed:
+                self._retries.append((batch, failed))  # Only the failed backends get the batch again
+            else:
+                self.stats["written"] += len(batch)
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Backends and counters for monitoring"""
+        return {
+            **self.stats,
+            "backends": [backend.name for backend in self.backends],
+            "buffered": len(self._buffer),
+            "retrying": sum(len(batch) for batch, _ in self._retries)
+        }
+
+# Global instance for use across the application
+history_writer = HistoryWriter()
+snapshot_store.subscribe(history_writer.on_snapshot)
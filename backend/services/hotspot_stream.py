@@ -0,0 +1,209 @@
+"""
+Hotspot Stream
+Pushes the hotspot ranking to Server-Sent Events subscribers when the precomputed responses change,
+as diffs against what each connection last received
+"""
+
+import asyncio
+import logging
+import weakref
+from collections import OrderedDict
+from datetime import datetime
+from typing import Dict, List, Any, Optional, AsyncIterator, Callable
+from dataclasses import dataclass
+
+from .response_snapshots import PrecomputedResponses, ResponseSnapshotBuilder, response_snapshots, to_json_bytes
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class RankingState:
+    """One published hotspot ranking, shared read-only by every connection"""
+    version: str
+    published_at: datetime
+    order: List[str]                 # Hotspot names, best first
+    items: Dict[str, Dict[str, Any]]  # name -> hotspot
+
+def format_event(event: str, data: Any, event_id: Optional[str] = None) -> bytes:
+    """One SSE frame"""
+    lines = []
+    if event_id is not None:
+        lines.append(f"id: {event_id}")
+    lines.append(f"event: {event}")
+    return ("\n".join(lines) + "\ndata: ").encode("utf-8") + to_json_bytes(data) + b"\n\n"
+
+def diff_rankings(previous: RankingState, current: RankingState) -> Dict[str, Any]:
+    """Hotspots added, removed and changed (changed fields only), plus the new order"""
+    added = [current.items[name] for name in current.order if name not in previous.items]
+    removed = [name for name in previous.order if name not in current.items]
+    changed = []
+    for name in current.order:
+        before = previous.items.get(name)
+        if before is None:
+            continue
+        after = current.items[name]
+        fields = {key: value for key, value in after.items() if before.get(key) != value}
+        if fields:
+            changed.append({"name": name, **fields})
+
+    return {
+        "version": current.version,
+        "previous_version": previous.version,
+        "added": added,
+        "removed": removed,
+        "changed": changed,
+        "order": current.order if current.order != previous.order else None  # None: unchanged
+    }
+
+class HotspotStream:
+    """
+    Fan-out without per-connection queues: connections wait on one shared wake-up future,
+    then send the diff from the ranking they last sent to the current one. A connection whose
+    client reads slowly blocks only in its own send, and skips straight to the latest ranking
+    when it resumes, so memory per connection stays constant however far behind it is
+    """
+
+    def __init__(self, builder: ResponseSnapshotBuilder, config: Dict[str, Any] = None):
+        self.builder = builder
+        self.config = config or self._get_default_config()
+        self.current: Optional[RankingState] = None
+        self._history: "OrderedDict[str, RankingState]" = OrderedDict()  # For Last-Event-ID resumes
+        self._diffs: Dict[str, bytes] = {}  # previous version -> serialized diff to current
+        self._wakeup: Optional[asyncio.Future] = None
+        self._task: Optional[asyncio.Task] = None
+        self.connections = 0
+        self.published = 0
+        self.events_sent = 0
+        builder.subscribe(self._on_responses)
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default stream configuration"""
+        return {
+            "heartbeat_seconds": 15,   # Keep-alive comment and freshness check interval
+            "max_connections": 50000,  # Per worker
+            "history": 8,              # Past rankings a reconnecting client can resume from
+            "retry_ms": 5000           # Client reconnect delay
+        }
+
+    async def start(self):
+        """Start the shared heartbeat; one timer per worker instead of one per connection"""
+        if self._task is None:
+            self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        """Stop the heartbeat"""
+        if self._task is not None:
+            self._task.cancel()
+            await asyncio.gather(self._task, return_exceptions=True)
+            self._task = None
+
+    async def _run(self):
+        """Refresh the responses (hourly demand patterns change without a new snapshot) and wake idle connections"""
+        while True:
+            await asyncio.sleep(self.config["heartbeat_seconds"])
+            try:
+                await self.builder.get()
+            except Exception as e:
+                logger.error(f"Hotspot stream refresh failed: {e}")
+            self._wake()
+
+    def _on_responses(self, responses: PrecomputedResponses):
+        """Publish the ranking of newly built responses if it differs from the current one"""
+        order = [hotspot["name"] for hotspot in responses.hotspots]
+        items = {hotspot["name"]: hotspot for hotspot in responses.hotspots}
+        current = self.current
+        if current is not None and current.order == order and current.items == items:
+            return
+
+        state = RankingState(version=responses.version, published_at=datetime.now(), order=order, items=items)
+        self.current = state
+        self._history[state.version] = state
+        while len(self._history) > self.config["history"]:
+            self._history.popitem(last=False)
+        self._diffs = {}
+        self.published += 1
+        self._wake()
+
+    def _wake(self):
+        """Resolve the shared future every waiting connection holds"""
+        if self._wakeup is not None and not self._wakeup.done():
+            self._wakeup.set_result(None)
+        self._wakeup = None
+
+    def _wait(self) -> asyncio.Future:
+        if self._wakeup is None:
+            self._wakeup = asyncio.get_running_loop().create_future()
+        return self._wakeup
+
+    def _snapshot_event(self, state: RankingState) -> bytes:
+        return format_event("snapshot", {
+            "version": state.version,
+            "hotspots": [state.items[name] for name in state.order]
+        }, event_id=state.version)
+
+    def _diff_event(self, previous: RankingState, current: RankingState) -> bytes:
+        """Serialized once per previous version, then shared by every connection on it"""
+        event = self._diffs.get(previous.version)
+        if event is None:
+            event = format_event("diff", diff_rankings(previous, current), event_id=current.version)
+            self._diffs[previous.version] = event
+        return event
+
+    def open(self, last_event_id: Optional[str] = None) -> Optional[AsyncIterator[bytes]]:
+        """
+        Reserve a connection slot and return its event stream, or None at capacity
+        The check and the reservation happen in one step, so concurrent requests cannot overshoot
+        """
+        if self.connections >= self.config["max_connections"]:
+            return None
+        self.connections += 1
+        released = False
+
+        def release():
+            nonlocal released
+            if not released:
+                released = True
+                self.connections -= 1
+
+        stream = self.events(last_event_id, release)
+        # A response cancelled before its first frame never starts the generator, so its finally never runs
+        weakref.finalize(stream, release)
+        return stream
+
+    async def events(self, last_event_id: Optional[str], release: Callable[[], None]) -> AsyncIterator[bytes]:
+        """Event frames for one reserved connection: a snapshot (or a diff when resuming), then diffs"""
+        try:
+            if self.current is None:
+                self._on_responses(await self.builder.get())
+
+            yield f"retry: {self.config['retry_ms']}\n\n".encode("utf-8")
+            sent = self._history.get(last_event_id) if last_event_id else None
+            while True:
+                # Checked after every send: a ranking published while blocked in a send is not missed
+                current = self.current
+                if current is not None and current is not sent:
+                    # current is always self.current here, so cached diffs are never stale
+                    frame = self._diff_event(sent, current) if sent is not None else self._snapshot_event(current)
+                    sent = current
+                    self.events_sent += 1
+                    yield frame
+                    continue
+
+                await self._wait()
+                if self.current is sent:
+                    yield b": keep-alive\n\n"
+        finally:
+            release()
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Connection and publish counters for monitoring"""
+        return {
+            "connections": self.connections,
+            "max_connections": self.config["max_connections"],
+            "current_version": self.current.version if self.current else None,
+            "published": self.published,
+            "events_sent": self.events_sent
+        }
+
+# Global instance for use across the application
+hotspot_stream = HotspotStream(response_snapshots)
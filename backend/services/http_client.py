@@ -0,0 +1,53 @@
+"""
+Shared HTTP Client
+One long-lived, pooled aiohttp session per worker for all upstream APIs (JMA, ODPT)
+"""
+
+import aiohttp
+import logging
+import os
+from typing import Dict, Any, Optional
+
+logger = logging.getLogger(__name__)
+
+def get_default_http_config() -> Dict[str, Any]:
+    """Default connection pool configuration for upstream APIs (overridable via environment)"""
+    return {
+        "timeout": int(os.getenv("HTTP_TIMEOUT", "30")),
+        "connect_timeout": int(os.getenv("HTTP_CONNECT_TIMEOUT", "10")),
+        "pool_limit": int(os.getenv("HTTP_POOL_LIMIT", "100")),  # Total open connections per worker
+        "pool_limit_per_host": int(os.getenv("HTTP_POOL_LIMIT_PER_HOST", "20")),  # Per upstream host
+        "keepalive_timeout": int(os.getenv("HTTP_KEEPALIVE_TIMEOUT", "60")),  # Idle connection lifetime
+        "dns_cache_ttl": int(os.getenv("HTTP_DNS_CACHE_TTL", "300")),  # Seconds DNS results are cached
+        "user_agent": "TokyoTaxiAIOptimizer/2.0"
+    }
+
+def create_http_session(config: Optional[Dict[str, Any]] = None) -> aiohttp.ClientSession:
+    """
+    Create a pooled client session with keep-alive and DNS caching
+    Must be called from within a running event loop
+    """
+    settings = {**get_default_http_config(), **(config or {})}
+
+    connector = aiohttp.TCPConnector(
+        limit=settings["pool_limit"],
+        limit_per_host=settings["pool_limit_per_host"],
+        keepalive_timeout=settings["keepalive_timeout"],
+        ttl_dns_cache=settings["dns_cache_ttl"],
+        use_dns_cache=True
+    )
+
+    session = aiohttp.ClientSession(
+        connector=connector,
+        timeout=aiohttp.ClientTimeout(
+            total=settings["timeout"],
+            connect=settings["connect_timeout"]
+        ),
+        headers={"User-Agent": settings["user_agent"]}
+    )
+
+    logger.info(
+        f"Created shared HTTP session (limit={settings['pool_limit']}, "
+        f"per_host={settings['pool_limit_per_host']}, keepalive={settings['keepalive_timeout']}s)"
+    )
+    return session
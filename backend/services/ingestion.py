@@ -0,0 +1,278 @@
+"""
+Background Ingestion Scheduler
+Polls JMA and ODPT on their own cadence and publishes immutable snapshots,
+so request handlers read current conditions from memory instead of calling upstream APIs
+"""
+
+import asyncio
+import logging
+import random
+from datetime import datetime
+from typing import Dict, List, Any, Callable, Awaitable, Optional
+from dataclasses import dataclass, field
+
+from .cache import CacheEntry
+from .weather_service import weather_service
+from .traffic_service import traffic_service
+from .nowcast import nowcast_store
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True)
+class Snapshot:
+    """Immutable, versioned view of one upstream source"""
+    source: str
+    data: Any
+    version: str
+    fetched_at: datetime
+    published_at: datetime
+
+    def age_seconds(self) -> float:
+        """Seconds since the data was fetched from upstream"""
+        return (datetime.now() - self.fetched_at).total_seconds()
+
+@dataclass
+class SourceHealth:
+    """Polling health of one upstream source"""
+    status: str = "starting"  # starting, healthy, degraded, failing
+    last_attempt: Optional[datetime] = None
+    last_success: Optional[datetime] = None
+    last_error: Optional[str] = None
+    consecutive_failures: int = 0
+    total_polls: int = 0
+    total_failures: int = 0
+    next_poll_seconds: float = 0.0
+
+@dataclass
+class IngestionSource:
+    """Upstream source polled by the scheduler"""
+    name: str
+    interval: float
+    fetch: Callable[[], Awaitable[CacheEntry]]
+    fallback: Callable[[], Any]
+    max_stale: Optional[float] = None  # Hard TTL: older snapshots are no longer served (None: no limit)
+    health: SourceHealth = field(default_factory=SourceHealth)
+    fallback_snapshot: Optional[Snapshot] = None  # Last fallback served, reused for fallback_ttl
+
+    def is_servable(self, snapshot: Optional[Snapshot]) -> bool:
+        """Whether a published snapshot is still within the hard TTL"""
+        return snapshot is not None and (self.max_stale is None or snapshot.age_seconds() < self.max_stale)
+
+class SnapshotStore:
+    """
+    Latest snapshot per source
+    Reads are plain dict lookups; subscribers are notified when a new version is published
+    """
+
+    def __init__(self):
+        self._snapshots: Dict[str, Snapshot] = {}
+        self._subscribers: List[Callable[[Snapshot], None]] = []
+
+    def get(self, source: str) -> Optional[Snapshot]:
+        return self._snapshots.get(source)
+
+    def publish(self, source: str, entry: CacheEntry) -> Snapshot:
+        """Publish a cache entry as the current snapshot; unchanged data keeps its version"""
+        version = f"{source}-{int(entry.stored_at.timestamp() * 1000)}"
+        current = self._snapshots.get(source)
+        if current is not None and current.version == version:
+            return current
+
+        snapshot = Snapshot(
+            source=source,
+            data=entry.data,
+            version=version,
+            fetched_at=entry.stored_at,
+            published_at=datetime.now()
+        )
+        self._snapshots[source] = snapshot
+
+        for callback in list(self._subscribers):
+            try:
+                callback(snapshot)
+            except Exception as e:
+                logger.error(f"Snapshot subscriber failed for {source}: {e}")
+
+        return snapshot
+
+    def subscribe(self, callback: Callable[[Snapshot], None]):
+        """Register a callback invoked with every newly published snapshot"""
+        self._subscribers.append(callback)
+
+class IngestionScheduler:
+    """
+    Lifespan-managed poller with jitter, exponential backoff and per-source health
+    """
+
+    def __init__(self, store: SnapshotStore, config: Dict[str, Any] = None):
+        self.store = store
+        self.config = config or self._get_default_config()
+        self.sources: Dict[str, IngestionSource] = {}
+        self._tasks: List[asyncio.Task] = []
+        self.running = False
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default scheduler configuration"""
+        return {
+            "jitter": 0.1,          # +/-10% of the interval
+            "retry_delay": 5,       # First retry after a failure, doubled each time
+            "prime_timeout": 10,    # Max seconds to wait for initial snapshots at startup
+            "fallback_ttl": 30      # Seconds to serve a fallback snapshot before polling inline again
+        }
+
+    def add_source(self, name: str, interval: float,
+                   fetch: Callable[[], Awaitable[CacheEntry]], fallback: Callable[[], Any],
+                   max_stale: Optional[float] = None):
+        """Register an upstream source, its polling interval, its offline fallback data and its hard TTL"""
+        self.sources[name] = IngestionSource(name=name, interval=interval, fetch=fetch, fallback=fallback,
+                                             max_stale=max_stale)
+
+    async def start(self):
+        """Prime every source once, then poll each in its own task"""
+        if self.running:
+            return
+        self.running = True
+
+        try:
+            await asyncio.wait_for(
+                asyncio.gather(*(self.poll(source) for source in self.sources.values())),
+                timeout=self.config["prime_timeout"]
+            )
+        except asyncio.TimeoutError:
+            logger.warning("Initial ingestion did not finish in time, continuing in background")
+
+        for source in self.sources.values():
+            self._tasks.append(asyncio.create_task(self._run(source)))
+
+        logger.info(f"Ingestion scheduler started: {', '.join(f'{s.name} every {s.interval}s' for s in self.sources.values())}")
+
+    async def stop(self):
+        """Cancel all polling tasks"""
+        self.running = False
+        for task in self._tasks:
+            task.cancel()
+        await asyncio.gather(*self._tasks, return_exceptions=True)
+        self._tasks.clear()
+
+    async def poll(self, source: IngestionSource) -> bool:
+        """Fetch one source and publish its snapshot; returns success"""
+        health = source.health
+        health.last_attempt = datetime.now()
+        health.total_polls += 1
+
+        try:
+            entry = await source.fetch()
+            self.store.publish(source.name, entry)
+            health.last_success = datetime.now()
+            health.last_error = None
+            health.consecutive_failures = 0
+            health.status = "healthy"
+            return True
+
+        except Exception as e:
+            health.total_failures += 1
+            health.consecutive_failures += 1
+            health.last_error = str(e)
+            # Degraded while a previous snapshot is still being served, failing once it expired
+            health.status = "degraded" if source.is_servable(self.store.get(source.name)) else "failing"
+            logger.warning(f"Ingestion of {source.name} failed ({health.consecutive_failures} in a row): {e}")
+            return False
+
+    async def poll_now(self, name: str) -> Optional[Snapshot]:
+        """Poll a source immediately, e.g. when no snapshot exists yet"""
+        await self.poll(self.sources[name])
+        return self.store.get(name)
+
+    def _next_delay(self, source: IngestionSource) -> float:
+        """Interval on success, exponential backoff (capped at the interval) on failure, plus jitter"""
+        failures = source.health.consecutive_failures
+        if failures:
+            delay = min(source.interval, self.config["retry_delay"] * (2 ** (failures - 1)))
+        else:
+            delay = source.interval
+
+        jitter = self.config["jitter"]
+        return max(0.0, delay * random.uniform(1 - jitter, 1 + jitter))
+
+    async def _run(self, source: IngestionSource):
+        """Polling loop for one source"""
+        while self.running:
+            delay = self._next_delay(source)
+            source.health.next_poll_seconds = round(delay, 1)
+            await asyncio.sleep(delay)
+            await self.poll(source)
+
+    def get_health(self) -> Dict[str, Any]:
+        """Per-source polling health for monitoring"""
+        health = {}
+        for source in self.sources.values():
+            snapshot = self.store.get(source.name)
+            health[source.name] = {
+                "status": source.health.status,
+                "interval_seconds": source.interval,
+                "last_success": source.health.last_success.isoformat() if source.health.last_success else None,
+                "last_error": source.health.last_error,
+                "consecutive_failures": source.health.consecutive_failures,
+                "total_polls": source.health.total_polls,
+                "total_failures": source.health.total_failures,
+                "next_poll_seconds": source.health.next_poll_seconds,
+                "snapshot_version": snapshot.version if snapshot else None,
+                "snapshot_age_seconds": round(snapshot.age_seconds(), 1) if snapshot else None,
+                "snapshot_expired": snapshot is not None and not source.is_servable(snapshot)
+            }
+        return {"running": self.running, "sources": health}
+
+async def get_snapshot(source: str) -> Snapshot:
+    """
+    Current snapshot for a source
+    A memory read in steady state; only polls inline when no snapshot exists yet
+    (scheduler not started, e.g. in scripts, or the initial poll failed) or the published one
+    is past the source's hard TTL (cache_max_stale), in which case fallback data is served
+    rather than arbitrarily old data
+    """
+    ingestion_source = ingestion_scheduler.sources[source]
+    snapshot = snapshot_store.get(source)
+    if ingestion_source.is_servable(snapshot):
+        return snapshot
+
+    # Negative cache: an inline poll just failed, do not make every request wait on upstream again
+    fallback = ingestion_source.fallback_snapshot
+    if fallback is not None and fallback.age_seconds() < ingestion_scheduler.config["fallback_ttl"]:
+        return fallback
+
+    snapshot = await ingestion_scheduler.poll_now(source)
+    if ingestion_source.is_servable(snapshot):
+        return snapshot
+
+    # Upstream unavailable and nothing servable published: serve fallback data without publishing it
+    if snapshot is not None:
+        logger.warning(f"{source} snapshot {snapshot.version} is past its hard TTL, serving fallback data")
+    now = datetime.now()
+    ingestion_source.fallback_snapshot = Snapshot(
+        source=source,
+        data=ingestion_source.fallback(),
+        version=f"{source}-fallback",
+        fetched_at=now,
+        published_at=now
+    )
+    return ingestion_source.fallback_snapshot
+
+# Global instances for use across the application
+snapshot_store = SnapshotStore()
+ingestion_scheduler = IngestionScheduler(snapshot_store)
+ingestion_scheduler.add_source(
+    "weather", weather_service.cache_duration,
+    weather_service.refresh_current_weather, weather_service.get_fallback_weather,
+    max_stale=weather_service.config.get("cache_max_stale", 900)
+)
+ingestion_scheduler.add_source(
+    "traffic", traffic_service.cache_duration,
+    traffic_service.refresh_current_traffic, traffic_service.get_fallback_traffic_data,
+    max_stale=traffic_service.config.get("cache_max_stale", 180)
+)
+if nowcast_store.enabled:
+    # Optional: without a raster source, demand uses the city-wide rain value
+    ingestion_scheduler.add_source(
+        "nowcast", nowcast_store.config["interval"],
+        nowcast_store.refresh, nowcast_store.get_fallback_raster
+    )
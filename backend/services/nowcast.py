@@ -0,0 +1,435 @@
+"""
+Precipitation Nowcast Grid
+Ingests gridded rain-intensity rasters (the JMA high-resolution nowcast, or a local file stand-in),
+stores each as a memory-mapped float32 array, and samples it per demand zone through a precomputed
+pixel index, so demand multipliers follow localized rain instead of one city-wide value
+
+Enable the JMA tiles with NOWCAST_SOURCE=jma (needs Pillow to decode them)
+Import a raster file once with: python -m services.nowcast <path to .npy or .json>
+"""
+
+import asyncio
+import glob
+import io
+import json
+import logging
+import os
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass
+
+import aiohttp
+import numpy as np
+
+try:
+    from PIL import Image
+except ImportError:  # Pillow is optional; without it only the file source is available
+    Image = None
+
+from .cache import CacheEntry
+from .http_client import create_http_session
+from .spatial_grid import tokyo_grid
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_NOWCAST_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "nowcast")
+
+def _local_naive(when: datetime) -> datetime:
+    """Server-local naive time, like the other snapshot timestamps"""
+    return when.astimezone().replace(tzinfo=None) if when.tzinfo is not None else when
+
+@dataclass
+class NowcastRaster:
+    """
+    Rain intensity in mm/h on a regular lat/lng grid
+    Row 0 is the northern edge and column 0 the western edge; NaN or negative values mean no data
+    """
+    values: np.ndarray
+    north: float
+    south: float
+    west: float
+    east: float
+    observed_at: datetime
+
+    @property
+    def geometry(self) -> Tuple[float, float, float, float, int, int]:
+        """Identifies the pixel layout; rasters with equal geometry share zone indexes"""
+        rows, cols = self.values.shape
+        return (self.north, self.south, self.west, self.east, rows, cols)
+
+    def pixel_index(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        """Flat pixel index of each position, -1 outside the raster"""
+        rows, cols = self.values.shape
+        row = np.floor((self.north - np.asarray(lat)) / (self.north - self.south) * rows).astype(np.int64)
+        col = np.floor((np.asarray(lng) - self.west) / (self.east - self.west) * cols).astype(np.int64)
+        inside = (row >= 0) & (row < rows) & (col >= 0) & (col < cols)
+        return np.where(inside, row * cols + col, -1)
+
+    def sample(self, pixels: np.ndarray) -> np.ndarray:
+        """Values at precomputed pixel indexes (only those pixels are read from disk); NaN for no data"""
+        flat = self.values.reshape(-1)
+        values = np.asarray(flat[np.maximum(pixels, 0)], dtype=np.float32)
+        return np.where((pixels >= 0) & (values >= 0), values, np.nan)
+
+    def metadata(self) -> Dict[str, Any]:
+        return {
+            "bounds": {"north": self.north, "south": self.south, "west": self.west, "east": self.east},
+            "shape": list(self.values.shape),
+            "observed_at": self.observed_at.isoformat()
+        }
+
+    @classmethod
+    def from_metadata(cls, values: np.ndarray, meta: Dict[str, Any]) -> "NowcastRaster":
+        bounds = meta["bounds"]
+        if values.ndim != 2:
+            raise ValueError(f"Nowcast raster must be 2D, got shape {values.shape}")
+        if not (bounds["north"] > bounds["south"] and bounds["east"] > bounds["west"]):
+            raise ValueError(f"Invalid nowcast bounds: {bounds}")
+        return cls(
+            values=values,
+            north=float(bounds["north"]),
+            south=float(bounds["south"]),
+            west=float(bounds["west"]),
+            east=float(bounds["east"]),
+            observed_at=_local_naive(datetime.fromisoformat(meta["observed_at"]))
+        )
+
+class FileNowcastSource:
+    """
+    Stand-in upstream that reads a raster from a local file, for offline runs and tests
+    Either a .npy array with a sidecar .json (bounds, observed_at), or one .json that also
+    carries the array as nested lists under "values"
+    """
+
+    def __init__(self, path: str):
+        self.path = path
+        self._mtime: Optional[float] = None
+
+    def _read(self) -> Optional[NowcastRaster]:
+        mtime = os.path.getmtime(self.path)
+        if mtime == self._mtime:
+            return None  # Unchanged since the last poll
+        stem, extension = os.path.splitext(self.path)
+        if extension == ".npy":
+            with open(f"{stem}.json") as f:
+                meta = json.load(f)
+            values = np.load(self.path)
+        else:
+            with open(self.path) as f:
+                meta = json.load(f)
+            values = np.array(meta["values"], dtype=np.float64)
+
+        raster = NowcastRaster.from_metadata(np.asarray(values, dtype=np.float32), meta)
+        self._mtime = mtime
+        return raster
+
+    async def fetch(self) -> Optional[NowcastRaster]:
+        """The file's raster, or None if it has not changed since the last call"""
+        return await asyncio.to_thread(self._read)
+
+# JMA high-resolution nowcast (hrpns) legend: tile colour -> representative mm/h of its band
+JMA_RAIN_COLORS = [
+    ((242, 242, 255), 0.5),   # < 1
+    ((160, 210, 255), 3.0),   # 1-5
+    ((33, 140, 255), 7.5),    # 5-10
+    ((0, 65, 255), 15.0),     # 10-20
+    ((250, 245, 0), 25.0),    # 20-30
+    ((255, 153, 0), 40.0),    # 30-50
+    ((255, 40, 0), 65.0),     # 50-80
+    ((180, 0, 104), 90.0)     # >= 80
+]
+
+def tile_y(lat: np.ndarray, zoom: int) -> np.ndarray:
+    """Web Mercator tile row (fractional) of latitudes"""
+    lat_rad = np.radians(lat)
+    return (1 - np.arcsinh(np.tan(lat_rad)) / np.pi) / 2 * 2 ** zoom
+
+def tile_x(lng: np.ndarray, zoom: int) -> np.ndarray:
+    """Web Mercator tile column (fractional) of longitudes"""
+    return (np.asarray(lng) + 180) / 360 * 2 ** zoom
+
+def decode_rain_colors(rgba: np.ndarray) -> np.ndarray:
+    """
+    mm/h per pixel of an RGBA hrpns tile: transparent is no rain, legend colours map to their band,
+    anything else (no-data hatching) is NaN
+    """
+    colors = np.array([color for color, _ in JMA_RAIN_COLORS], dtype=np.int32)
+    values = np.array([value for _, value in JMA_RAIN_COLORS] + [np.nan], dtype=np.float32)
+    rgb = rgba[..., :3].astype(np.int32)
+    distance = ((rgb[..., None, :] - colors) ** 2).sum(axis=-1)
+    nearest = distance.argmin(axis=-1)
+    nearest[distance.min(axis=-1) > 30 ** 2] = len(JMA_RAIN_COLORS)
+    rain = values[nearest]
+    rain[rgba[..., 3] < 128] = 0.0
+    return rain
+
+class JmaNowcastSource:
+    """
+    JMA high-resolution precipitation nowcast (250 m, every 5 minutes), read from the Web Mercator
+    PNG tiles behind the JMA rain map and resampled onto a regular lat/lng raster over the grid bounds
+    """
+
+    def __init__(self, bounds: Dict[str, float] = None, config: Dict[str, Any] = None):
+        self.config = config or self._get_default_config()
+        self.bounds = bounds or tokyo_grid.config["bounds"]
+        self.session: Optional[aiohttp.ClientSession] = None
+        self._owns_session = False
+        self._basetime: Optional[str] = None
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default JMA tile configuration"""
+        return {
+            "base_url": "https://www.jma.go.jp/bosai/jmatile/data/nowc",
+            "element": "hrpns",  # High-resolution precipitation nowcast
+            "zoom": 10,          # ~150 m pixels at Tokyo's latitude, finer than the 250 m product
+            "timeout": 30
+        }
+
+    def attach_session(self, session: aiohttp.ClientSession):
+        """Use a shared, pooled session owned by the application lifespan"""
+        self.session = session
+        self._owns_session = False
+
+    async def _get_session(self) -> aiohttp.ClientSession:
+        if self.session is None or self.session.closed:
+            self.session = create_http_session({"timeout": self.config["timeout"]})
+            self._owns_session = True
+        return self.session
+
+    async def close(self):
+        """Close the session if this source created it"""
+        if self._owns_session and self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self._owns_session = False
+
+    def _tile_range(self) -> Tuple[range, range]:
+        zoom = self.config["zoom"]
+        xs = tile_x(np.array([self.bounds["west"], self.bounds["east"]]), zoom).astype(np.int64)
+        ys = tile_y(np.array([self.bounds["north"], self.bounds["south"]]), zoom).astype(np.int64)
+        return range(int(xs[0]), int(xs[1]) + 1), range(int(ys[0]), int(ys[1]) + 1)
+
+    async def _latest_basetime(self, session: aiohttp.ClientSession) -> Optional[str]:
+        """Newest observed (analysis) time that carries the element, as JMA's UTC yyyymmddHHMMSS"""
+        async with session.get(f"{self.config['base_url']}/targetTimes_N1.json") as response:
+            response.raise_for_status()
+            times = await response.json(content_type=None)
+        observed = [entry["basetime"] for entry in times
+                    if entry.get("basetime") == entry.get("validtime") and self.config["element"] in entry.get("elements", [])]
+        return max(observed) if observed else None
+
+    async def _fetch_tile(self, session: aiohttp.ClientSession, basetime: str, x: int, y: int) -> Optional[bytes]:
+        url = (f"{self.config['base_url']}/{basetime}/none/{basetime}/surf/"
+               f"{self.config['element']}/{self.config['zoom']}/{x}/{y}.png")
+        async with session.get(url) as response:
+            if response.status == 404:
+                return None  # JMA omits tiles without echoes
+            response.raise_for_status()
+            return await response.read()
+
+    def mosaic(self, tiles: List[List[Optional[bytes]]]) -> np.ndarray:
+        """Decode a rows × columns block of PNG tiles into one mm/h array (missing tiles are dry)"""
+        rows = []
+        for row in tiles:
+            decoded = []
+            for data in row:
+                if data is None:
+                    decoded.append(np.zeros((256, 256), dtype=np.float32))
+                else:
+                    with Image.open(io.BytesIO(data)) as image:
+                        decoded.append(decode_rain_colors(np.asarray(image.convert("RGBA"))))
+            rows.append(np.hstack(decoded))
+        return np.vstack(rows)
+
+    def resample(self, mosaic: np.ndarray, xs: range, ys: range) -> np.ndarray:
+        """Nearest mosaic pixel for each cell of a regular lat/lng raster at the mosaic's resolution"""
+        zoom = self.config["zoom"]
+        north, south, west, east = self.bounds["north"], self.bounds["south"], self.bounds["west"], self.bounds["east"]
+        pixel_y = tile_y(np.array([north, south]), zoom) * 256
+        pixel_x = tile_x(np.array([west, east]), zoom) * 256
+        rows = max(1, int(round(pixel_y[1] - pixel_y[0])))
+        cols = max(1, int(round(pixel_x[1] - pixel_x[0])))
+
+        lat = north - (np.arange(rows) + 0.5) * (north - south) / rows
+        lng = west + (np.arange(cols) + 0.5) * (east - west) / cols
+        row = np.clip((tile_y(lat, zoom) * 256).astype(np.int64) - ys.start * 256, 0, mosaic.shape[0] - 1)
+        col = np.clip((tile_x(lng, zoom) * 256).astype(np.int64) - xs.start * 256, 0, mosaic.shape[1] - 1)
+        return mosaic[row[:, None], col[None, :]]
+
+    async def fetch(self) -> Optional[NowcastRaster]:
+        """The latest JMA raster, or None if JMA has not issued a new one since the last call"""
+        session = await self._get_session()
+        basetime = await self._latest_basetime(session)
+        if basetime is None or basetime == self._basetime:
+            return None
+
+        xs, ys = self._tile_range()
+        tiles = await asyncio.gather(*[self._fetch_tile(session, basetime, x, y) for y in ys for x in xs])
+        grid = [list(tiles[i * len(xs):(i + 1) * len(xs)]) for i in range(len(ys))]
+        mosaic = await asyncio.to_thread(self.mosaic, grid)
+        values = await asyncio.to_thread(self.resample, mosaic, xs, ys)
+
+        self._basetime = basetime
+        observed_at = datetime.strptime(basetime, "%Y%m%d%H%M%S").replace(tzinfo=timezone.utc)
+        return NowcastRaster(
+            values=values,
+            north=self.bounds["north"],
+            south=self.bounds["south"],
+            west=self.bounds["west"],
+            east=self.bounds["east"],
+            observed_at=_local_naive(observed_at)
+        )
+
+def create_nowcast_source(config: Dict[str, Any]) -> Any:
+    """Source named by the configuration: a local raster file, the JMA tiles, or none"""
+    if config["source_file"]:
+        return FileNowcastSource(config["source_file"])
+    if config["source"] == "jma":
+        if Image is None:
+            logger.error("NOWCAST_SOURCE=jma needs Pillow to decode the JMA tiles; nowcast disabled")
+            return None
+        return JmaNowcastSource()
+    return None
+
+class NowcastStore:
+    """
+    Latest nowcast raster, stored as rain_<observed time>.npy plus meta.json in one directory
+    and memory-mapped for sampling; zone pixel indexes are computed once per raster geometry
+    """
+
+    def __init__(self, source: Any = None, config: Dict[str, Any] = None):
+        self.config = config or self._get_default_config()
+        self.source = source if source is not None else create_nowcast_source(self.config)
+        self.current: Optional[NowcastRaster] = None
+        self._indexes: Dict[Tuple, Tuple[np.ndarray, np.ndarray]] = {}  # (geometry, zone key) -> (lat, pixels)
+        self.stats = {
+            "rasters_stored": 0,
+            "index_builds": 0
+        }
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default nowcast configuration"""
+        return {
+            "directory": os.getenv("NOWCAST_DIR", DEFAULT_NOWCAST_DIR),
+            "source": os.getenv("NOWCAST_SOURCE", ""),         # "jma" for the JMA nowcast tiles
+            "source_file": os.getenv("NOWCAST_SOURCE_FILE"),  # File-based stand-in upstream (takes precedence)
+            "interval": 300,        # JMA issues a nowcast every 5 minutes
+            "max_age_minutes": 15,  # Older rasters are ignored in favour of the city-wide value
+            "keep_rasters": 3       # Stored rasters kept for readers still mapping an older one
+        }
+
+    def attach_session(self, session: aiohttp.ClientSession):
+        """Share the application's pooled session with an HTTP source"""
+        if hasattr(self.source, "attach_session"):
+            self.source.attach_session(session)
+
+    @property
+    def enabled(self) -> bool:
+        """Whether there is a source or a stored raster to ingest"""
+        return self.source is not None or os.path.exists(os.path.join(self.config["directory"], "meta.json"))
+
+    def write(self, raster: NowcastRaster) -> NowcastRaster:
+        """Store a raster and make it current; metadata is written last so readers never see a partial raster"""
+        directory = self.config["directory"]
+        os.makedirs(directory, exist_ok=True)
+
+        filename = f"rain_{raster.observed_at.strftime('%Y%m%d%H%M%S')}.npy"
+        path = os.path.join(directory, filename)
+        tmp_path = f"{path}.{os.getpid()}.tmp"
+        with open(tmp_path, "wb") as f:
+            np.save(f, np.ascontiguousarray(raster.values, dtype=np.float32))
+        os.replace(tmp_path, path)
+
+        meta_path = os.path.join(directory, "meta.json")
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump({**raster.metadata(), "file": filename}, f)
+        os.replace(tmp_path, meta_path)
+
+        # Older rasters stay mapped by readers until they move on; unlinking them is safe
+        for old in sorted(glob.glob(os.path.join(directory, "rain_*.npy")))[:-self.config["keep_rasters"]]:
+            os.remove(old)
+
+        self.stats["rasters_stored"] += 1
+        return self.load()
+
+    def load(self) -> Optional[NowcastRaster]:
+        """Memory-map the stored raster named by meta.json; None if nothing is stored"""
+        directory = self.config["directory"]
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                meta = json.load(f)
+        except (FileNotFoundError, ValueError):
+            return None
+
+        values = np.load(os.path.join(directory, meta["file"]), mmap_mode="r")
+        self.current = NowcastRaster.from_metadata(values, meta)
+        return self.current
+
+    async def refresh(self) -> CacheEntry:
+        """Ingest the source's latest raster if newer than the current one (ingestion fetch callback)"""
+        if self.current is None:
+            await asyncio.to_thread(self.load)
+
+        raster = await self.source.fetch() if self.source is not None else None
+        if raster is not None and (self.current is None or raster.observed_at > self.current.observed_at):
+            try:
+                await asyncio.to_thread(self.write, raster)
+            except OSError as e:
+                # Read-only deployment: keep the raster in memory instead
+                logger.error(f"Could not store nowcast raster: {e}")
+                self.current = raster
+
+        if self.current is None:
+            raise ValueError("No nowcast raster available")
+        return CacheEntry(data=self.current, stored_at=self.current.observed_at)
+
+    def get_fallback_raster(self) -> Optional[NowcastRaster]:
+        """No raster: zones fall back to the city-wide rain value"""
+        return None
+
+    def is_fresh(self, raster: Optional[NowcastRaster]) -> bool:
+        if raster is None:
+            return False
+        age_minutes = (datetime.now() - raster.observed_at).total_seconds() / 60
+        return age_minutes < self.config["max_age_minutes"]
+
+    def zone_rain(self, lat: np.ndarray, lng: np.ndarray) -> Optional[np.ndarray]:
+        """
+        Rain intensity (mm/h) at each zone from the current raster, NaN where it has no data
+        None when there is no fresh raster. Pass the same lat array each time to reuse its index
+        """
+        raster = self.current
+        if not self.is_fresh(raster):
+            return None
+
+        key = (raster.geometry, id(lat))
+        cached = self._indexes.get(key)
+        if cached is None or cached[0] is not lat:
+            cached = (lat, raster.pixel_index(lat, lng))
+            self._indexes[key] = cached
+            self.stats["index_builds"] += 1
+        return raster.sample(cached[1])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Current raster and counters for monitoring"""
+        raster = self.current
+        return {
+            **self.stats,
+            "enabled": self.enabled,
+            "source": type(self.source).__name__ if self.source is not None else None,
+            "observed_at": raster.observed_at.isoformat() if raster else None,
+            "fresh": self.is_fresh(raster),
+            "shape": list(raster.values.shape) if raster else None,
+            "memory_mapped": isinstance(raster.values, np.memmap) if raster else False
+        }
+
+# Global instance for use across the application
+nowcast_store = NowcastStore()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    imported = FileNowcastSource(sys.argv[1])._read()
+    stored = nowcast_store.write(imported)
+    logger.info(f"Stored {stored.values.shape[0]}x{stored.values.shape[1]} nowcast raster observed at {stored.observed_at} in {nowcast_store.config['directory']}")
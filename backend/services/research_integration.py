@@ -4,10 +4,16 @@ Integrates University of Tokyo research findings into the optimization system
 """
 
 import numpy as np
-from typing import Dict, List, Any
+from typing import Dict, List, Any, Optional
 from dataclasses import dataclass
 from datetime import datetime
 
+from .spatial_grid import SpatialDemandGrid, tokyo_grid, select_spread
+from .spatial_index import SpatialIndex
+from .travel_matrix import travel_matrix
+from .nowcast import nowcast_store
+from .demand_model import demand_model
+
 @dataclass
 class ResearchParameters:
     """Research parameters from MCP-taxi study"""
@@ -28,21 +34,55 @@ class ResearchParameters:
     ai_wait_time_reduction: float = 0.382  # 38.2% reduction
     ai_utilization_improvement: float = 0.277  # 27.7% improvement
 
+@dataclass
+class DemandZones:
+    """
+    Columnar zone table (districts or grid cells)
+    Row i of every array describes zone i, so scoring is one vectorized pass
+    """
+    names: List[str]
+    lat: np.ndarray
+    lng: np.ndarray
+    base_revenue: np.ndarray
+    grid: Optional[SpatialDemandGrid] = None  # Set when the zones are the cells of a grid
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "DemandZones":
+        """Build from dicts with name, lat, lng and base_revenue"""
+        return cls(
+            names=[record["name"] for record in records],
+            lat=np.array([record["lat"] for record in records], dtype=np.float64),
+            lng=np.array([record["lng"] for record in records], dtype=np.float64),
+            base_revenue=np.array([record["base_revenue"] for record in records], dtype=np.float64)
+        )
+
+    @classmethod
+    def from_grid(cls, grid: SpatialDemandGrid) -> "DemandZones":
+        """Every cell of the spatial demand grid (arrays are shared, not copied)"""
+        return cls(names=grid.names, lat=grid.lat, lng=grid.lng, base_revenue=grid.base_revenue, grid=grid)
+
+    def __len__(self) -> int:
+        return len(self.names)
+
 class MCPResearchIntegration:
     """
     Integrates MCP-taxi and MCP-traffic research into production system
     Based on University of Tokyo research showing 30.2% productivity improvements
     """
     
-    def __init__(self):
+    def __init__(self, grid: SpatialDemandGrid = None):
         self.params = ResearchParameters()
-        self.tokyo_districts = [
-            {"name": "Ginza", "base_revenue": 62.5, "lat": 35.6762, "lng": 139.7653},
-            {"name": "Tokyo Station", "base_revenue": 59.8, "lat": 35.6812, "lng": 139.7671},
-            {"name": "Shibuya", "base_revenue": 58.2, "lat": 35.6598, "lng": 139.7006},
-            {"name": "Shinjuku", "base_revenue": 55.8, "lat": 35.6896, "lng": 139.6917},
-            {"name": "Roppongi", "base_revenue": 54.2, "lat": 35.6627, "lng": 139.7314}
-        ]
+        # Every grid cell of the 23 wards, shared with the weather intelligence engine
+        self.grid = grid or tokyo_grid
+        self.zones = DemandZones.from_grid(self.grid)
+        self.hotspot_spacing_km = 0.75  # Minimum distance between listed hotspots
+        self.zone_index = SpatialIndex(self.zones.lat, self.zones.lng, self.zones.names)
+        self.positioning_config = {
+            "max_reposition_km": 8.0,   # Only cells within this distance of the driver are considered
+            "fallback_candidates": 50,  # Nearest cells considered when none are within reach
+            "cost_per_km": 30.0,        # ¥/km fuel and vehicle cost while repositioning
+            "horizon_minutes": 60       # Revenue is compared over the next hour
+        }
     
     def calculate_weather_demand_multiplier(self, weather_data: Dict[str, Any]) -> float:
         """
@@ -68,6 +108,24 @@ class MCPResearchIntegration:
             
         return multiplier
     
+    def calculate_zone_weather_multipliers(self, weather_data: Dict[str, Any], zone_rain: np.ndarray) -> np.ndarray:
+        """
+        Vectorized weather multiplier from per-zone rain intensity (mm/h, e.g. nowcast samples)
+        Zones without a value (NaN) get the city-wide multiplier
+        """
+        multiplier = np.select(
+            [zone_rain > 5, zone_rain > 1, zone_rain > 0],
+            [self.params.heavy_rain_multiplier, self.params.light_rain_multiplier, self.params.drizzle_multiplier],
+            default=1.0
+        )
+        
+        # Temperature effects
+        temperature = weather_data.get("temperature", 22)
+        if temperature < 5 or temperature > 35:
+            multiplier *= 1.4
+        
+        return np.where(np.isnan(zone_rain), self.calculate_weather_demand_multiplier(weather_data), multiplier)
+    
     def calculate_time_multiplier(self, hour: int, day_of_week: int) -> float:
         """Calculate time-based demand multiplier"""
         multiplier = 1.0
@@ -109,56 +167,227 @@ class MCPResearchIntegration:
             "ai_revenue_per_min": round(ai_revenue, 2),
             "traditional_revenue_per_min": round(traditional_revenue, 2),
             "improvement_percentage": round(((ai_revenue - traditional_revenue) / traditional_revenue) * 100, 1),
+            **self._fleet_performance()
+        }
+    
+    def predict_ai_vs_traditional_arrays(self, base_demand: np.ndarray) -> Dict[str, np.ndarray]:
+        """Vectorized revenue columns of predict_ai_vs_traditional_performance for many zones"""
+        ai_revenue = base_demand * self.params.ai_improvement_factor
+        with np.errstate(divide="ignore", invalid="ignore"):
+            improvement = np.where(base_demand > 0, (ai_revenue - base_demand) / base_demand * 100, 0.0)
+        
+        return {
+            "ai_revenue_per_min": np.round(ai_revenue, 2),
+            "traditional_revenue_per_min": np.round(base_demand, 2),
+            "improvement_percentage": np.round(improvement, 1)
+        }
+    
+    def _fleet_performance(self) -> Dict[str, float]:
+        """Wait time and utilization metrics (same for every zone)"""
+        return {
             "ai_wait_time": round(4.2 / self.params.ai_improvement_factor, 1),  # Inverse relationship
             "traditional_wait_time": 6.8,
             "ai_utilization_rate": round(83 * (1 + self.params.ai_utilization_improvement / 100), 1),
             "traditional_utilization_rate": 65
         }
     
+    def predict_demand_arrays(self, weather_data: Dict[str, Any], traffic_data: Dict[str, Any],
+                              zones: Optional[DemandZones] = None,
+                              now: Optional[datetime] = None,
+                              learned: Optional[bool] = None,
+                              zone_rain: Optional[np.ndarray] = None) -> Dict[str, Any]:
+        """
+        Score every zone in one batched pass
+        Returns scalar multipliers plus per-zone columns and the ranking order (best first)
+        learned: None uses the trained demand model when one is loaded, False always scores with the
+        research multipliers, True requires the trained model (ValueError without one)
+        zone_rain: per-zone rain (mm/h, NaN where unknown) to score instead of the current nowcast,
+        e.g. a forecast
+        """
+        zones = zones or self.zones
+        now = now or datetime.now()
+        
+        # Multipliers are the same for every zone, so they are computed once
+        weather_multiplier = self.calculate_weather_demand_multiplier(weather_data)
+        time_multiplier = self.calculate_time_multiplier(now.hour, now.weekday())
+        traffic_multiplier = self.calculate_traffic_disruption_boost(traffic_data)
+        
+        # Rain is local: with a fresh nowcast raster each zone gets its own weather multiplier
+        if zone_rain is None:
+            zone_rain = nowcast_store.zone_rain(zones.lat, zones.lng)
+        zone_weather_multiplier = None
+        
+        # A trained demand model replaces the research multipliers for the grid zones it was fitted on
+        learned_multiplier = None
+        if zones.grid is not None and learned is not False:
+            learned_multiplier = demand_model.multipliers(weather_data, traffic_data, now, len(zones), zone_rain)
+        if learned and learned_multiplier is None:
+            raise ValueError("No trained demand model for these zones")
+        if learned_multiplier is not None:
+            base_demand = zones.base_revenue * learned_multiplier
+        elif zone_rain is not None:
+            zone_weather_multiplier = self.calculate_zone_weather_multipliers(weather_data, zone_rain)
+            base_demand = zones.base_revenue * zone_weather_multiplier * (time_multiplier * traffic_multiplier)
+        else:
+            base_demand = zones.base_revenue * (weather_multiplier * time_multiplier * traffic_multiplier)
+        columns = self.predict_ai_vs_traditional_arrays(base_demand)
+        
+        # Stable descending sort, so ties keep zone order like list.sort(reverse=True)
+        order = np.argsort(-columns["ai_revenue_per_min"], kind="stable")
+        
+        return {
+            "weather_multiplier": weather_multiplier,
+            "time_multiplier": time_multiplier,
+            "traffic_multiplier": traffic_multiplier,
+            "zone_weather_multiplier": zone_weather_multiplier,  # None without a nowcast
+            "zone_rain": zone_rain,
+            "learned_multiplier": learned_multiplier,  # None without a trained demand model
+            "base_demand": base_demand,
+            "order": order,
+            **columns
+        }
+    
     def generate_demand_predictions(self, weather_data: Dict[str, Any], 
-                                  traffic_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+                                  traffic_data: Dict[str, Any],
+                                  limit: Optional[int] = None,
+                                  zones: Optional[DemandZones] = None,
+                                  now: Optional[datetime] = None,
+                                  min_spacing_km: Optional[float] = None) -> List[Dict[str, Any]]:
         """
-        Generate demand predictions for all Tokyo districts
-        Integrates all research findings
+        Generate demand predictions for all Tokyo grid cells
+        Integrates all research findings; only the top `limit` rows are built as dicts,
+        at least min_spacing_km apart so one hotspot's neighbouring cells do not fill the list
         """
-        current_hour = datetime.now().hour
-        current_day = datetime.now().weekday()
+        zones = zones or self.zones
+        scores = self.predict_demand_arrays(weather_data, traffic_data, zones, now)
+        order = scores["order"]
+        if limit is not None:
+            order = self.select_hotspots(scores, limit, zones, min_spacing_km)
         
-        predictions = []
+        return self._build_predictions(zones, scores, order, weather_data, traffic_data)
+    
+    def select_hotspots(self, scores: Dict[str, Any], limit: int, zones: Optional[DemandZones] = None,
+                        min_spacing_km: Optional[float] = None) -> np.ndarray:
+        """Indices of the top `limit` zones by AI revenue, at least min_spacing_km apart"""
+        zones = zones or self.zones
+        order = scores["order"]
+        if zones.grid is not None:
+            # Only demand peaks, so the slopes around a hotspot are not listed as hotspots
+            order = order[zones.grid.local_maxima(scores["ai_revenue_per_min"])[order]]
+        spacing = self.hotspot_spacing_km if min_spacing_km is None else min_spacing_km
+        return np.array(select_spread(zones.lat, zones.lng, order, limit, spacing), dtype=np.int64)
+    
+    def generate_positioned_predictions(self, weather_data: Dict[str, Any], traffic_data: Dict[str, Any],
+                                        latitude: float, longitude: float, limit: int = 5,
+                                        now: Optional[datetime] = None) -> List[Dict[str, Any]]:
+        """
+        Predictions ranked for a driver at (latitude, longitude): expected revenue over the
+        planning horizon after driving there, minus the driving cost
+        Only grid cells within reach (radius query on the zone index) are scored
+        """
+        config = self.positioning_config
+        now = now or datetime.now()
+        scores = self.predict_demand_arrays(weather_data, traffic_data, self.zones, now)
         
-        for district in self.tokyo_districts:
-            # Calculate multipliers
-            weather_multiplier = self.calculate_weather_demand_multiplier(weather_data)
-            time_multiplier = self.calculate_time_multiplier(current_hour, current_day)
-            traffic_multiplier = self.calculate_traffic_disruption_boost(traffic_data)
-            
-            # Base demand calculation
-            base_demand = district["base_revenue"] * weather_multiplier * time_multiplier * traffic_multiplier
-            
-            # AI vs traditional comparison
-            performance = self.predict_ai_vs_traditional_performance(base_demand)
-            
-            # Create prediction
-            prediction = {
-                "name": district["name"],
-                "latitude": district["lat"],
-                "longitude": district["lng"],
-                "base_revenue": district["base_revenue"],
-                "weather_multiplier": round(weather_multiplier, 2),
-                "time_multiplier": round(time_multiplier, 2),
-                "traffic_multiplier": round(traffic_multiplier, 2),
-                "total_demand_score": round(weather_multiplier * time_multiplier * traffic_multiplier * 100),
-                **performance,
-                "confidence_score": self.calculate_confidence_score(weather_data, traffic_data),
+        candidates = self.zone_index.within(latitude, longitude, config["max_reposition_km"])
+        if len(candidates) == 0:
+            # Outside the wards: consider the nearest cells instead
+            _, candidates = self.zone_index.nearest(latitude, longitude, k=config["fallback_candidates"])
+        
+        # Road distance and congestion/rain-adjusted driving time from the travel matrix
+        origin = travel_matrix.node_at(latitude, longitude)
+        distance = travel_matrix.road_distance_from(origin, candidates)
+        minutes = travel_matrix.travel_minutes_from(origin, candidates, now.hour, weather_data.get("rain_intensity", 0))
+        horizon = config["horizon_minutes"]
+        net_revenue = (scores["ai_revenue_per_min"][candidates] * np.maximum(0.0, horizon - minutes)
+                       - distance * config["cost_per_km"])
+        
+        # Rank positions within the candidate arrays
+        ranked = np.argsort(-net_revenue, kind="stable")
+        if self.zones.grid is not None:
+            # Peaks of net revenue only, so cells on the way to a hotspot are not listed
+            values = np.full(len(self.zones), -np.inf)
+            values[candidates] = net_revenue
+            ranked = ranked[self.zones.grid.local_maxima(values)[candidates][ranked]]
+        selected = np.array(select_spread(self.zones.lat[candidates], self.zones.lng[candidates],
+                                          ranked, limit, self.hotspot_spacing_km), dtype=np.int64)
+        
+        predictions = self._build_predictions(self.zones, scores, candidates[selected], weather_data, traffic_data)
+        for prediction, i in zip(predictions, selected.tolist()):
+            prediction["distance_km"] = round(float(distance[i]), 2)
+            prediction["minutes_to_position"] = int(round(float(minutes[i])))
+            prediction["net_revenue_next_hour"] = int(net_revenue[i])
+        return predictions
+    
+    def _build_predictions(self, zones: DemandZones, scores: Dict[str, Any], order: np.ndarray,
+                           weather_data: Dict[str, Any], traffic_data: Dict[str, Any]) -> List[Dict[str, Any]]:
+        """Prediction dicts for the selected zones, in the given order"""
+        # Fields shared by every prediction
+        learned = scores.get("learned_multiplier") is not None
+        if learned:
+            # The trained demand model scores each zone as a whole: the research multipliers are not its components
+            shared = {"weather_multiplier": None, "time_multiplier": None, "traffic_multiplier": None}
+        else:
+            shared = {
+                "weather_multiplier": round(scores["weather_multiplier"], 2),
+                "time_multiplier": round(scores["time_multiplier"], 2),
+                "traffic_multiplier": round(scores["traffic_multiplier"], 2),
+                "total_demand_score": round(scores["weather_multiplier"] * scores["time_multiplier"] * scores["traffic_multiplier"] * 100)
+            }
+        shared["learned_multiplier"] = None
+        shared["demand_model"] = "learned" if learned else "research"
+        fleet = self._fleet_performance()
+        confidence = self.calculate_confidence_score(weather_data, traffic_data)
+        
+        # Gather the selected rows once, then convert to Python values in bulk
+        columns = zip(
+            zones.lat[order].tolist(),
+            zones.lng[order].tolist(),
+            zones.base_revenue[order].tolist(),
+            scores["ai_revenue_per_min"][order].tolist(),
+            scores["traditional_revenue_per_min"][order].tolist(),
+            scores["improvement_percentage"][order].tolist()
+        )
+        
+        predictions = [
+            {
+                "name": zones.names[index],
+                "latitude": lat,
+                "longitude": lng,
+                "base_revenue": base_revenue,
+                **shared,
+                "ai_revenue_per_min": ai_revenue,
+                "traditional_revenue_per_min": traditional_revenue,
+                "improvement_percentage": improvement,
+                **fleet,
+                "confidence_score": confidence,
                 "research_backing": "University of Tokyo MCP-taxi study"
             }
-            
-            predictions.append(prediction)
+            for index, (lat, lng, base_revenue, ai_revenue, traditional_revenue, improvement)
+            in zip(order.tolist(), columns)
+        ]
         
-        # Sort by AI revenue potential
-        predictions.sort(key=lambda x: x["ai_revenue_per_min"], reverse=True)
+        if learned:
+            for prediction, multiplier in zip(predictions, scores["learned_multiplier"][order].tolist()):
+                prediction["learned_multiplier"] = round(multiplier, 3)
+                prediction["total_demand_score"] = round(multiplier * 100)
+        elif scores.get("zone_weather_multiplier") is not None:
+            # Nowcast-based multipliers differ per zone
+            other_multipliers = scores["time_multiplier"] * scores["traffic_multiplier"]
+            rain = scores["zone_rain"][order].tolist()
+            for prediction, multiplier, intensity in zip(predictions, scores["zone_weather_multiplier"][order].tolist(), rain):
+                prediction["weather_multiplier"] = round(multiplier, 2)
+                prediction["total_demand_score"] = round(multiplier * other_multipliers * 100)
+                prediction["rain_intensity"] = None if np.isnan(intensity) else round(intensity, 1)  # NaN: no nowcast data
         return predictions
     
+    def demand_boost_percent(self, prediction: Dict[str, Any]) -> int:
+        """Demand increase shown to drivers: the weather multiplier, or the learned model's whole multiplier"""
+        multiplier = prediction["weather_multiplier"]
+        if multiplier is None:
+            multiplier = prediction["learned_multiplier"]
+        return int((multiplier - 1) * 100)
+    
     def calculate_confidence_score(self, weather_data: Dict[str, Any], 
                                  traffic_data: Dict[str, Any]) -> float:
         """Calculate prediction confidence based on data quality"""
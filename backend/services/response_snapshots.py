@@ -0,0 +1,355 @@
+"""
+Precomputed Response Snapshots
+Builds the hot read payloads (/hotspots, /weather/driver/hotspots, /weather/intelligence/summary)
+once per weather/traffic snapshot, pre-serialized to bytes and tagged with a version
+"""
+
+import asyncio
+import json
+import logging
+from datetime import datetime
+from typing import Dict, List, Any, Optional, Tuple, Callable
+from dataclasses import dataclass, field
+
+from .weather_service import weather_service, WeatherData
+from .traffic_service import traffic_service
+from .research_integration import research_integration
+from .weather_intelligence import weather_intelligence
+from .nowcast import nowcast_store
+from .history import history_writer
+from .ingestion import Snapshot, SnapshotStore, snapshot_store, get_snapshot
+from .single_flight import SingleFlight
+
+logger = logging.getLogger(__name__)
+
+HOTSPOTS_PLACEHOLDER = "__hotspots__"
+MAX_HOTSPOTS = 20  # Largest /hotspots limit; only this many items are serialized
+
+def to_json_bytes(payload: Any) -> bytes:
+    """Serialize like FastAPI's JSONResponse (compact UTF-8)"""
+    return json.dumps(payload, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+
+@dataclass(frozen=True)
+class PrecomputedResponses:
+    """Serialized hot-endpoint payloads for one weather/traffic snapshot pair"""
+    version: str
+    built_at: datetime
+    weather_version: str
+    traffic_version: str
+    hotspot_items: Tuple[bytes, ...]
+    hotspots_templates: Dict[str, Tuple[bytes, bytes]]  # user_type -> (prefix, suffix) around the hotspot list
+    hotspots_generic: Dict[str, Any]  # Non-driver payload for uncommon user_type values
+    driver_hotspots: bytes
+    intelligence_summary: bytes
+    driver_recommendations: List[Any] = field(default_factory=list)
+    hotspots: Tuple[Dict[str, Any], ...] = ()  # The predictions behind hotspot_items
+
+    def age_seconds(self) -> float:
+        return (datetime.now() - self.built_at).total_seconds()
+
+    @property
+    def content_version(self) -> str:
+        """
+        Version of the serialized bodies (ETags): rebuilds after cache_duration keep the snapshot
+        version but embed a new timestamp, so the build time is part of it
+        """
+        return f"{self.version}.{int(self.built_at.timestamp() * 1000)}"
+
+    def hotspots_body(self, user_type: str, limit: int) -> bytes:
+        """/hotspots body for a user type and limit, sliced from the precomputed items"""
+        template = self.hotspots_templates.get(user_type)
+        if template is None:
+            template = _split_hotspots_template({**self.hotspots_generic, "user_type": user_type})
+        prefix, suffix = template
+        return prefix + b"[" + b",".join(self.hotspot_items[:limit]) + b"]" + suffix
+
+def _split_hotspots_template(payload: Dict[str, Any]) -> Tuple[bytes, bytes]:
+    """Serialize a /hotspots payload around a placeholder so any slice of items can be spliced in"""
+    body = to_json_bytes(payload)
+    prefix, _, suffix = body.partition(to_json_bytes(HOTSPOTS_PLACEHOLDER))
+    return prefix, suffix
+
+def nowcast_version(store: SnapshotStore) -> str:
+    """Version of the nowcast raster zones are scored with, or "city-wide" when none is fresh"""
+    snapshot = store.get("nowcast")
+    if snapshot is not None and nowcast_store.is_fresh(snapshot.data):
+        return snapshot.version
+    return "city-wide"
+
+def build_hotspots_payload(weather_data: Dict[str, Any], traffic_data: Dict[str, Any],
+                           predictions: List[Dict[str, Any]], user_type: str,
+                           timestamp: datetime) -> Dict[str, Any]:
+    """/api/v1/hotspots payload with the hotspot list left as a placeholder"""
+    # Add user-specific recommendations
+    recommendations = []
+    if user_type == "driver" and predictions:
+        top_spot = predictions[0]
+        recommendations.append({
+            "type": "positioning",
+            "title": f"Head to {top_spot['name']}",
+            "description": f"Highest AI revenue potential: ¥{top_spot['ai_revenue_per_min']}/min",
+            "priority": "high",
+            "confidence": top_spot['confidence_score']
+        })
+
+        if weather_data.get("is_raining"):
+            recommendations.append({
+                "type": "weather",
+                "title": "Rain Advantage Active",
+                "description": f"Rain detected: +{research_integration.demand_boost_percent(top_spot)}% demand boost",
+                "priority": "high",
+                "confidence": 87
+            })
+
+        # Check for traffic disruptions
+        if traffic_data.get("disruptions"):
+            disruption = traffic_data["disruptions"][0]
+            recommendations.append({
+                "type": "traffic",
+                "title": "Service Disruption Opportunity",
+                "description": f"{disruption['line']}: {disruption['estimated_delay']}min delays increase taxi demand",
+                "priority": "high",
+                "confidence": 84
+            })
+
+    return {
+        "success": True,
+        "data": {
+            "hotspots": HOTSPOTS_PLACEHOLDER,
+            "recommendations": recommendations,
+            "integrated_factors": {
+                "weather_impact": {
+                    "is_raining": weather_data.get("is_raining", False),
+                    "rain_intensity": weather_data.get("rain_intensity", 0),
+                    "demand_multiplier": weather_data.get("rain_intensity", 0) * 0.3 + 1.0 if weather_data.get("is_raining") else 1.0
+                },
+                "traffic_impact": {
+                    "active_disruptions": len(traffic_data.get("disruptions", [])),
+                    "punctuality_rate": traffic_data.get("system_performance", {}).get("punctuality_rate", 94.0),
+                    "average_delay": traffic_data.get("system_performance", {}).get("average_delay", 1.0)
+                }
+            },
+            "research_validation": "University of Tokyo - 30.2% improvement validated"
+        },
+        "timestamp": timestamp.isoformat(),
+        "user_type": user_type,
+        "data_integration": ["Weather (JMA)", "Traffic (ODPT)", "Research (UTokyo)"]
+    }
+
+def build_driver_hotspots_payload(recommendations: List[Any], current_weather: WeatherData,
+                                  weather_age_seconds: float, timestamp: datetime) -> Dict[str, Any]:
+    """/api/v1/weather/driver/hotspots payload"""
+    if not recommendations:
+        return {
+            "success": True,
+            "data": {
+                "message": "No high-opportunity zones detected currently",
+                "recommendations": [],
+                "baseline_advice": "Normal demand patterns - continue regular operations"
+            },
+            "timestamp": timestamp.isoformat()
+        }
+
+    # Format for driver interface
+    formatted_recommendations = []
+    for rec in recommendations:
+        formatted_recommendations.append({
+            "location": rec.location,
+            "coordinates": {
+                "latitude": rec.coordinates[0],
+                "longitude": rec.coordinates[1]
+            },
+            "opportunity": {
+                "demand_increase": f"+{rec.expected_demand_increase}%",
+                "revenue_boost": f"¥{int(rec.expected_revenue_boost)}/hour",
+                "confidence": f"{int(rec.confidence * 100)}%"
+            },
+            "logistics": {
+                "travel_time": f"{rec.time_to_position} minutes",
+                "action_url": f"https://maps.apple.com/?daddr={rec.coordinates[0]},{rec.coordinates[1]}"
+            },
+            "reasoning": rec.reasoning,
+            "weather_trigger": rec.weather_trigger,
+            "priority": "high" if rec.expected_demand_increase > 50 else "medium"
+        })
+
+    return {
+        "success": True,
+        "data": {
+            "recommendations": formatted_recommendations,
+            "total_opportunities": len(recommendations),
+            "weather_context": {
+                "current_condition": current_weather.description,
+                "is_raining": current_weather.is_raining,
+                "rain_intensity": f"{current_weather.rain_intensity}mm/h",
+                "temperature": f"{current_weather.temperature}°C",
+                "demand_multiplier": 2.3 if current_weather.is_raining else 1.0,
+                "data_age_seconds": round(weather_age_seconds, 1)
+            },
+            "research_backing": {
+                "institution": "University of Tokyo",
+                "proven_improvement": "30.2% revenue increase",
+                "rain_correlation": "0.847 (highly significant)"
+            }
+        },
+        "timestamp": timestamp.isoformat(),
+        "user_type": "driver"
+    }
+
+def build_intelligence_summary_payload(driver_recs: List[Any], current_weather: WeatherData,
+                                       timestamp: datetime) -> Dict[str, Any]:
+    """/api/v1/weather/intelligence/summary payload"""
+    # Calculate system-wide metrics
+    total_opportunity_zones = len([r for r in driver_recs if r.expected_demand_increase > 25])
+    avg_demand_increase = sum(r.expected_demand_increase for r in driver_recs) / len(driver_recs) if driver_recs else 0
+
+    # System intelligence summary
+    intelligence_summary = {
+        "current_conditions": {
+            "weather": current_weather.description,
+            "temperature": f"{current_weather.temperature}°C",
+            "is_raining": current_weather.is_raining,
+            "rain_intensity": current_weather.rain_intensity,
+            "visibility": current_weather.visibility
+        },
+        "system_intelligence": {
+            "active_opportunity_zones": total_opportunity_zones,
+            "average_demand_increase": f"+{avg_demand_increase:.1f}%",
+            "ai_confidence": f"{int(current_weather.confidence * 100)}%",
+            "data_freshness": "<60 seconds"
+        },
+        "driver_insights": {
+            "recommended_action": "Head to high-demand zones" if driver_recs else "Continue normal operations",
+            "top_opportunity": driver_recs[0].location if driver_recs else None,
+            "expected_revenue_boost": f"¥{int(driver_recs[0].expected_revenue_boost)}/hour" if driver_recs else "Standard rates"
+        },
+        "passenger_insights": {
+            "recommended_action": "Take taxi" if current_weather.is_raining else "Multiple options available",
+            "current_wait_time": "4-6 minutes" if current_weather.is_raining else "2-4 minutes",
+            "cost_impact": "+20% surge" if current_weather.is_raining else "Standard rates"
+        },
+        "research_validation": {
+            "institution": "University of Tokyo",
+            "faculty": "Faculty of Economics",
+            "researcher": "Tatsuru Kikuchi",
+            "key_finding": "30.2% productivity improvement with weather-AI integration",
+            "statistical_significance": "p < 0.05"
+        }
+    }
+
+    return {
+        "success": True,
+        "data": intelligence_summary,
+        "timestamp": timestamp.isoformat(),
+        "system_status": "Fully Operational"
+    }
+
+class ResponseSnapshotBuilder:
+    """
+    Rebuilds the precomputed responses whenever a new weather or traffic snapshot is published
+    Handlers call get() and return the bytes directly
+    """
+
+    def __init__(self, store: SnapshotStore, config: Dict[str, Any] = None):
+        self.store = store
+        self.config = config or self._get_default_config()
+        self.current: Optional[PrecomputedResponses] = None
+        self.single_flight = SingleFlight("response_snapshots")
+        self._pending: Optional[asyncio.Task] = None
+        self.builds = 0
+        self._subscribers: List[Callable[[PrecomputedResponses], None]] = []
+        store.subscribe(self._on_snapshot)
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default configuration for precomputed responses"""
+        return {
+            "cache_duration": 120  # Max age of a precomputed response (config cache.hotspots)
+        }
+
+    @staticmethod
+    def make_version(weather: Snapshot, traffic: Snapshot, now: datetime, nowcast: str = "city-wide") -> str:
+        """Version of the responses for a snapshot pair (hour included: demand patterns are hourly)"""
+        return f"{weather.version}.{traffic.version}.{nowcast}.{now.strftime('%Y%m%d%H')}"
+
+    def _on_snapshot(self, snapshot: Snapshot):
+        """Schedule one rebuild per newly published snapshot"""
+        if self.store.get("weather") is None or self.store.get("traffic") is None:
+            return
+        if self._pending is not None and not self._pending.done():
+            return
+        try:
+            self._pending = asyncio.ensure_future(self.get())
+        except RuntimeError:
+            # No running event loop (e.g. publishing from a script); build lazily on first read
+            self._pending = None
+
+    def subscribe(self, callback: Callable[[PrecomputedResponses], None]):
+        """Register a callback invoked with every newly built set of responses"""
+        self._subscribers.append(callback)
+
+    async def get(self) -> PrecomputedResponses:
+        """Current precomputed responses, rebuilt if the snapshots changed or they expired"""
+        weather = await get_snapshot("weather")
+        traffic = await get_snapshot("traffic")
+        version = self.make_version(weather, traffic, datetime.now(), nowcast_version(self.store))
+
+        current = self.current
+        if (current is not None and current.version == version
+                and current.age_seconds() < self.config["cache_duration"]):
+            return current
+
+        return await self.single_flight.do(version, lambda: self._build(version, weather, traffic))
+
+    async def _build(self, version: str, weather: Snapshot, traffic: Snapshot) -> PrecomputedResponses:
+        """Compute and serialize every hot payload once"""
+        built_at = datetime.now()
+        weather_data = weather_service.format_for_optimization(weather.data, weather.age_seconds())
+        traffic_data = traffic_service.format_for_optimization(traffic.data, traffic.age_seconds())
+
+        # /api/v1/hotspots: hotspot items are serialized individually so limits are byte slices
+        predictions = research_integration.generate_demand_predictions(weather_data, traffic_data, limit=MAX_HOTSPOTS)
+        history_writer.record_predictions(version, predictions, "hotspots")
+        hotspot_items = tuple(to_json_bytes(prediction) for prediction in predictions)
+        hotspots_templates = {
+            user_type: _split_hotspots_template(
+                build_hotspots_payload(weather_data, traffic_data, predictions, user_type, built_at)
+            )
+            for user_type in ("driver", "passenger")
+        }
+        hotspots_generic = build_hotspots_payload(weather_data, traffic_data, predictions, "passenger", built_at)
+
+        # Weather intelligence endpoints share one set of driver recommendations
+        driver_recs = await weather_intelligence.generate_driver_recommendations(weather.data)
+        driver_hotspots = to_json_bytes(
+            build_driver_hotspots_payload(driver_recs, weather.data, weather.age_seconds(), built_at)
+        )
+        intelligence_summary = to_json_bytes(
+            build_intelligence_summary_payload(driver_recs, weather.data, built_at)
+        )
+
+        responses = PrecomputedResponses(
+            version=version,
+            built_at=built_at,
+            weather_version=weather.version,
+            traffic_version=traffic.version,
+            hotspot_items=hotspot_items,
+            hotspots_templates=hotspots_templates,
+            hotspots_generic=hotspots_generic,
+            driver_hotspots=driver_hotspots,
+            intelligence_summary=intelligence_summary,
+            driver_recommendations=driver_recs,
+            hotspots=tuple(predictions)
+        )
+        self.current = responses
+        self.builds += 1
+        logger.info(f"Precomputed hot responses {version} in {(datetime.now() - built_at).total_seconds() * 1000:.1f}ms")
+
+        for callback in list(self._subscribers):
+            try:
+                callback(responses)
+            except Exception as e:
+                logger.error(f"Response snapshot subscriber failed for {version}: {e}")
+        return responses
+
+# Global instance for use across the application
+response_snapshots = ResponseSnapshotBuilder(snapshot_store)
@@ -0,0 +1,105 @@
+"""
+Simulation Provider
+Seeded, vectorized source of the stochastic values behind simulated upstream data (station delays,
+service disruptions), drawn as one batch per snapshot so workers and benchmark runs agree
+"""
+
+import logging
+import os
+import time
+from typing import Dict, Any, Optional
+from dataclasses import dataclass
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+@dataclass(frozen=True, eq=False)
+class TrafficDraws:
+    """Every random value of one simulated traffic snapshot"""
+    key: Any                           # (seed, time bucket) the batch was drawn for
+    station_delayed: np.ndarray        # bool per monitored station
+    station_delay_minutes: np.ndarray  # int per monitored station (used where delayed)
+    disruption: bool
+    disruption_line: int               # Index into the candidate lines
+    disruption_weather_related: bool
+    disruption_delay_minutes: int
+
+class SimulationProvider:
+    """
+    Draws come from np.random.default_rng keyed by (seed, time bucket): workers collecting in the
+    same bucket produce the same snapshot. With a fixed seed the time bucket is left out, so every
+    run produces identical values; disabled, nothing is simulated (no delays or disruptions)
+    """
+
+    def __init__(self, config: Dict[str, Any] = None):
+        self.config = config or self._get_default_config()
+        self._traffic: Optional[TrafficDraws] = None
+        self.batches = 0
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default simulation configuration"""
+        seed = os.getenv("SIMULATION_SEED")
+        return {
+            "enabled": os.getenv("SIMULATION_ENABLED", "true").lower() != "false",
+            "seed": int(seed) if seed else None,  # Fixed seed: identical output run to run
+            "bucket_seconds": 60,                 # Shared draw window when no seed is fixed
+            "station_delay_probability": 0.05,
+            "delay_minutes": (2, 15),
+            "disruption_probability": 0.10,
+            "weather_related_probability": 0.4
+        }
+
+    def _key(self, now: Optional[float] = None) -> Any:
+        if self.config["seed"] is not None:
+            return (self.config["seed"],)
+        bucket = int((time.time() if now is None else now) // self.config["bucket_seconds"])
+        return (0, bucket)
+
+    def traffic_draws(self, stations: int, lines: int, now: Optional[float] = None) -> TrafficDraws:
+        """Random values for one traffic snapshot; the same batch is returned within its key"""
+        key = (*self._key(now), stations, lines)
+        current = self._traffic
+        if current is not None and current.key == key:
+            return current
+
+        if not self.config["enabled"]:
+            draws = TrafficDraws(
+                key=key,
+                station_delayed=np.zeros(stations, dtype=bool),
+                station_delay_minutes=np.zeros(stations, dtype=np.int64),
+                disruption=False,
+                disruption_line=0,
+                disruption_weather_related=False,
+                disruption_delay_minutes=0
+            )
+        else:
+            rng = np.random.default_rng(list(key))
+            low, high = self.config["delay_minutes"]
+            # One call per distribution, sized for the whole snapshot
+            uniforms = rng.random(stations + 2)
+            minutes = rng.integers(low, high + 1, size=stations + 1)
+            draws = TrafficDraws(
+                key=key,
+                station_delayed=uniforms[:stations] < self.config["station_delay_probability"],
+                station_delay_minutes=minutes[:stations],
+                disruption=bool(uniforms[stations] < self.config["disruption_probability"]),
+                disruption_line=int(rng.integers(lines)),
+                disruption_weather_related=bool(uniforms[stations + 1] < self.config["weather_related_probability"]),
+                disruption_delay_minutes=int(minutes[stations])
+            )
+
+        self._traffic = draws
+        self.batches += 1
+        return draws
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Mode and batch counter for monitoring"""
+        return {
+            "enabled": self.config["enabled"],
+            "seed": self.config["seed"],
+            "batches": self.batches
+        }
+
+# Global instance for use across the application
+simulation = SimulationProvider()
@@ -0,0 +1,65 @@
+"""
+Single-Flight Request Coalescing
+Ensures only one coroutine per key fetches from an upstream API while others await its result
+"""
+
+import asyncio
+import logging
+from typing import Dict, Any, Callable, Awaitable, TypeVar
+
+logger = logging.getLogger(__name__)
+
+T = TypeVar("T")
+
+class SingleFlight:
+    """
+    Coalesces concurrent calls for the same key into one in-flight task
+    Every caller that arrives while the task runs awaits the same result (or exception)
+    """
+
+    def __init__(self, name: str):
+        self.name = name
+        self._inflight: Dict[str, asyncio.Task] = {}
+        self.stats = {
+            "calls": 0,        # Total callers
+            "executions": 0,   # Callers that actually ran the fetch
+            "coalesced": 0,    # Callers that joined an in-flight fetch
+            "errors": 0        # Fetches that raised
+        }
+
+    async def do(self, key: str, fn: Callable[[], Awaitable[T]]) -> T:
+        """Run fn once for all concurrent callers with the same key"""
+        self.stats["calls"] += 1
+
+        task = self._inflight.get(key)
+        if task is not None:
+            self.stats["coalesced"] += 1
+            logger.debug(f"[{self.name}] Coalesced request for '{key}'")
+        else:
+            self.stats["executions"] += 1
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._on_done(key, t))
+
+        # Shield so a cancelled caller does not cancel the fetch for everyone else
+        return await asyncio.shield(task)
+
+    def in_flight(self, key: str) -> bool:
+        """Check whether a fetch for key is currently running"""
+        return key in self._inflight
+
+    def _on_done(self, key: str, task: asyncio.Task):
+        """Release the key and record failures"""
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled() and task.exception() is not None:
+            self.stats["errors"] += 1
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Coalescing counters for monitoring"""
+        calls = self.stats["calls"]
+        return {
+            **self.stats,
+            "in_flight": len(self._inflight),
+            "coalescing_ratio": round(self.stats["coalesced"] / calls, 3) if calls else 0.0
+        }
@@ -0,0 +1,62 @@
+"""
+Spatial Index
+k-d tree over zone and station coordinates for k-nearest and radius queries on the request path
+"""
+
+from typing import Dict, List, Any, Tuple
+
+import numpy as np
+from scipy.spatial import cKDTree
+
+from .spatial_grid import KM_PER_DEGREE_LAT, KM_PER_DEGREE_LNG
+
+class SpatialIndex:
+    """
+    Points projected to a local km plane, so tree distances are kilometres
+    Query results are indices into the arrays the index was built from
+    """
+
+    def __init__(self, lat: np.ndarray, lng: np.ndarray, names: List[str]):
+        self.lat = np.asarray(lat, dtype=np.float64)
+        self.lng = np.asarray(lng, dtype=np.float64)
+        self.names = names
+        self.tree = cKDTree(self._project(self.lat, self.lng))
+
+    @classmethod
+    def from_records(cls, records: List[Dict[str, Any]]) -> "SpatialIndex":
+        """Build from dicts with name, lat and lng"""
+        return cls(
+            lat=np.array([record["lat"] for record in records]),
+            lng=np.array([record["lng"] for record in records]),
+            names=[record["name"] for record in records]
+        )
+
+    @staticmethod
+    def _project(lat, lng) -> np.ndarray:
+        return np.column_stack([np.ravel(lng) * KM_PER_DEGREE_LNG, np.ravel(lat) * KM_PER_DEGREE_LAT])
+
+    def __len__(self) -> int:
+        return len(self.names)
+
+    def nearest(self, lat: float, lng: float, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Distances (km) and indices of the k nearest points, closest first"""
+        k = min(k, len(self))
+        distances, indices = self.tree.query(self._project(lat, lng)[0], k=k)
+        return np.atleast_1d(distances), np.atleast_1d(indices)
+
+    def nearest_many(self, lat: np.ndarray, lng: np.ndarray, k: int = 1) -> Tuple[np.ndarray, np.ndarray]:
+        """Batched nearest(): arrays of shape (n, k) for n query points"""
+        k = min(k, len(self))
+        distances, indices = self.tree.query(self._project(lat, lng), k=k)
+        return distances.reshape(len(distances), -1), indices.reshape(len(indices), -1)
+
+    def within(self, lat: float, lng: float, radius_km: float) -> np.ndarray:
+        """Indices of all points within radius_km, in index order"""
+        indices = self.tree.query_ball_point(self._project(lat, lng)[0], r=radius_km)
+        return np.sort(np.asarray(indices, dtype=np.int64))
+
+    def distances_from(self, lat: float, lng: float, indices: np.ndarray) -> np.ndarray:
+        """Distances (km) from a point to the given indexed points"""
+        dy = (self.lat[indices] - lat) * KM_PER_DEGREE_LAT
+        dx = (self.lng[indices] - lng) * KM_PER_DEGREE_LNG
+        return np.sqrt(dx * dx + dy * dy)
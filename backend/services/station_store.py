@@ -0,0 +1,198 @@
+"""
+Columnar Station Store
+Streaming parser for ODPT JSON array responses and a station table kept as arrays keyed
+by station id, updated in place with only the rows that changed between polls
+"""
+
+import codecs
+import json
+import logging
+from typing import Dict, List, Any, Optional, Callable, AsyncIterator, Iterable
+
+import numpy as np
+
+logger = logging.getLogger(__name__)
+
+# Numeric columns and their dtypes; text columns (name, line, status) are kept per row
+NUMERIC_COLUMNS = {
+    "passenger_count": np.int64,
+    "delays": np.int32,
+    "congestion_level": np.int32,
+    "latitude": np.float64,
+    "longitude": np.float64
+}
+TEXT_COLUMNS = ("name", "line", "operational_status")
+
+async def iter_json_array(chunks: AsyncIterator[bytes]) -> AsyncIterator[Any]:
+    """
+    Yield the elements of a top-level JSON array as its bytes arrive
+    Only the current unparsed tail is buffered, never the whole response
+    """
+    decoder = json.JSONDecoder()
+    text_decoder = codecs.getincrementaldecoder("utf-8")()
+    buffer = ""
+    started = False
+
+    async for chunk in chunks:
+        buffer += text_decoder.decode(chunk)
+        pos = 0
+        while True:
+            # Skip whitespace and element separators
+            while pos < len(buffer) and buffer[pos] in " \t\r\n,":
+                pos += 1
+            if pos >= len(buffer):
+                break
+            if not started:
+                if buffer[pos] != "[":
+                    raise ValueError("ODPT response is not a JSON array")
+                started = True
+                pos += 1
+                continue
+            if buffer[pos] == "]":
+                return
+            try:
+                item, end = decoder.raw_decode(buffer, pos)
+            except json.JSONDecodeError:
+                break  # Element continues in the next chunk
+            if end == len(buffer) and not isinstance(item, (dict, list, str)):
+                break  # A number at the end of the buffer may continue in the next chunk
+            pos = end
+            yield item
+        buffer = buffer[pos:]
+
+    raise ValueError("ODPT response ended inside the JSON array")
+
+def station_row_from_odpt(record: Dict[str, Any], line: str) -> Dict[str, Any]:
+    """Store row from an odpt:Station record; fields ODPT does not provide are left out"""
+    row = {"id": record["owl:sameAs"], "line": line}
+    title = record.get("dc:title")
+    if title:
+        row["name"] = title if title.endswith("Station") else f"{title} Station"
+    if "geo:lat" in record and "geo:long" in record:
+        row["latitude"] = float(record["geo:lat"])
+        row["longitude"] = float(record["geo:long"])
+    if "odpt:passengerJourneys" in record:
+        row["passenger_count"] = int(record["odpt:passengerJourneys"])
+    return row
+
+class StationStore:
+    """
+    Station table with one array per numeric column and a row index by station id
+    apply() writes only fields that differ; objects built from rows (StationData, response
+    dicts) are cached per row and rebuilt only for rows that changed
+    """
+
+    def __init__(self, make_station: Callable[[Dict[str, Any]], Any],
+                 format_station: Callable[[Any], Dict[str, Any]], capacity: int = 64):
+        self.make_station = make_station
+        self.format_station = format_station
+        self.ids: List[str] = []
+        self.index: Dict[str, int] = {}
+        self.columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in NUMERIC_COLUMNS.items()}
+        self.text: Dict[str, List[str]] = {name: [] for name in TEXT_COLUMNS}
+        self._stations: List[Any] = []              # Cached StationData per row
+        self._records: List[Dict[str, Any]] = []    # Cached formatted dict per row
+        self._dirty: set = set()
+        self._current: Optional[List[Any]] = None  # Station list handed out since the last change
+        self._current_records: Optional[List[Dict[str, Any]]] = None
+        self.version = 0
+        self.stats = {
+            "rows_applied": 0,
+            "rows_changed": 0,
+            "rows_inserted": 0
+        }
+
+    def __len__(self) -> int:
+        return len(self.ids)
+
+    def _grow(self):
+        for name, column in self.columns.items():
+            grown = np.zeros(len(column) * 2, dtype=column.dtype)
+            grown[:len(column)] = column
+            self.columns[name] = grown
+
+    def _insert(self, station_id: str) -> int:
+        i = len(self.ids)
+        if i == len(self.columns["latitude"]):
+            self._grow()
+        self.ids.append(station_id)
+        self.index[station_id] = i
+        for name in TEXT_COLUMNS:
+            self.text[name].append("")
+        self._stations.append(None)
+        self._records.append(None)
+        self.stats["rows_inserted"] += 1
+        return i
+
+    def apply(self, rows: Iterable[Dict[str, Any]]) -> int:
+        """Upsert rows by id (partial rows update only the fields they carry); returns rows changed"""
+        changed = 0
+        for row in rows:
+            self.stats["rows_applied"] += 1
+            i = self.index.get(row["id"])
+            is_new = i is None
+            if is_new:
+                i = self._insert(row["id"])
+
+            row_changed = is_new
+            for name, value in row.items():
+                if name in self.columns:
+                    column = self.columns[name]
+                    if column[i] != value:
+                        column[i] = value
+                        row_changed = True
+                elif name in self.text:
+                    if self.text[name][i] != value:
+                        self.text[name][i] = value
+                        row_changed = True
+
+            if row_changed:
+                self._dirty.add(i)
+                changed += 1
+
+        if changed:
+            self.version += 1
+            self.stats["rows_changed"] += changed
+        return changed
+
+    def row(self, i: int) -> Dict[str, Any]:
+        """One row as a plain dict"""
+        row = {"id": self.ids[i]}
+        for name in TEXT_COLUMNS:
+            row[name] = self.text[name][i]
+        for name, column in self.columns.items():
+            row[name] = column[i].item()
+        return row
+
+    def has(self, station_id: str) -> bool:
+        return station_id in self.index
+
+    def stations(self) -> List[Any]:
+        """Station objects in row order; the same list is returned until a row changes"""
+        if self._dirty or self._current is None:
+            for i in sorted(self._dirty):
+                self._stations[i] = self.make_station(self.row(i))
+                self._records[i] = None
+            self._dirty.clear()
+            self._current = list(self._stations)
+            self._current_records = None
+        return self._current
+
+    def records_for(self, stations: List[Any]) -> Optional[List[Dict[str, Any]]]:
+        """Formatted dicts for a list returned by stations(), or None if the list is not current"""
+        if stations is not self._current:
+            return None
+        if self._current_records is None:
+            for i, station in enumerate(self._current):
+                if self._records[i] is None:
+                    self._records[i] = self.format_station(station)
+            self._current_records = list(self._records)
+        return self._current_records
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Table size and update counters for monitoring"""
+        return {
+            **self.stats,
+            "rows": len(self.ids),
+            "version": self.version
+        }
@@ -6,13 +6,77 @@ Connects to MCP-traffic system and ODPT API for real-time Tokyo transportation d
 import aiohttp
 import asyncio
 import logging
+import os
 from datetime import datetime, timedelta
-from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from typing import Dict, List, Optional, Any, Callable, Awaitable, Tuple, AsyncIterator
+from dataclasses import dataclass, asdict, field
 import json
 
+from .http_client import create_http_session
+from .cache import get_shared_cache, CacheEntry
+from .spatial_index import SpatialIndex
+from .circuit_breaker import CircuitBreaker
+from .station_store import StationStore, iter_json_array, station_row_from_odpt
+from .simulation import TrafficDraws, simulation
+
 logger = logging.getLogger(__name__)
 
+FAILED = object()  # Marks a sub-fetch that raised or timed out
+
+# Key stations monitored via ODPT (name, line, location, baseline passenger volume)
+TOKYO_STATIONS = [
+    {
+        "name": "Tokyo Station",
+        "line": "JR Yamanote",
+        "lat": 35.6812,
+        "lng": 139.7671,
+        "base_passengers": 45000
+    },
+    {
+        "name": "Shinjuku Station", 
+        "line": "JR Yamanote",
+        "lat": 35.6896,
+        "lng": 139.6917,
+        "base_passengers": 52000
+    },
+    {
+        "name": "Shibuya Station",
+        "line": "JR Yamanote",
+        "lat": 35.6598,
+        "lng": 139.7006,
+        "base_passengers": 38000
+    },
+    {
+        "name": "Ginza Station",
+        "line": "Tokyo Metro Ginza",
+        "lat": 35.6762,
+        "lng": 139.7653,
+        "base_passengers": 35000
+    },
+    {
+        "name": "Roppongi Station",
+        "line": "Tokyo Metro Hibiya",
+        "lat": 35.6627,
+        "lng": 139.7314,
+        "base_passengers": 28000
+    }
+]
+
+# ODPT railway ids of the monitored lines
+ODPT_RAILWAYS = {
+    "JR Yamanote": "odpt.Railway:JR-East.Yamanote",
+    "Tokyo Metro Ginza": "odpt.Railway:TokyoMetro.Ginza",
+    "Tokyo Metro Hibiya": "odpt.Railway:TokyoMetro.Hibiya"
+}
+
+def station_id(station_info: Dict[str, Any]) -> str:
+    """ODPT-style station id (odpt.Station:<operator>.<line>.<station>)"""
+    railway = ODPT_RAILWAYS[station_info["line"]].split(":", 1)[1]
+    return f"odpt.Station:{railway}.{station_info['name'].replace(' Station', '')}"
+
+# Lines a simulated disruption can affect
+DISRUPTION_LINES = ["JR Yamanote", "Tokyo Metro Ginza", "Tokyo Metro Marunouchi"]
+
 @dataclass
 class StationData:
     """Station data structure"""
@@ -47,6 +111,36 @@ class TrafficData:
     average_delay: float
     last_updated: datetime
     data_sources: List[str]
+    degraded: List[str] = field(default_factory=list)  # Sub-fetches that failed in this collection
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-compatible representation for the shared cache"""
+        data = asdict(self)
+        data["last_updated"] = self.last_updated.isoformat()
+        for disruption in data["disruptions"]:
+            disruption["start_time"] = disruption["start_time"].isoformat()
+            if disruption["estimated_end_time"] is not None:
+                disruption["estimated_end_time"] = disruption["estimated_end_time"].isoformat()
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "TrafficData":
+        """Rebuild from to_dict() output"""
+        disruptions = []
+        for disruption in data["disruptions"]:
+            end_time = disruption["estimated_end_time"]
+            disruptions.append(ServiceDisruption(**{
+                **disruption,
+                "start_time": datetime.fromisoformat(disruption["start_time"]),
+                "estimated_end_time": datetime.fromisoformat(end_time) if end_time else None
+            }))
+        
+        return cls(**{
+            **data,
+            "stations": [StationData(**station) for station in data["stations"]],
+            "disruptions": disruptions,
+            "last_updated": datetime.fromisoformat(data["last_updated"])
+        })
 
 class TrafficService:
     """
@@ -58,8 +152,31 @@ class TrafficService:
         self.config = config or self._get_default_config()
         self.odpt_base_url = "https://api.odpt.org/api/v4"
         self.session = None
-        self.cache = {}
-        self.cache_duration = 60  # 1 minute for traffic data
+        self._owns_session = False
+        self.cache_duration = self.config.get("cache_duration", 60)  # 1 minute for traffic data
+        # Shared by every TrafficService instance in the process and, via L2, across workers/pods
+        self.cache = get_shared_cache(
+            "traffic",
+            soft_ttl=self.cache_duration,
+            hard_ttl=self.config.get("cache_max_stale", 180),  # Never serve data older than 3 minutes
+            serialize=lambda data: data.to_dict(),
+            deserialize=TrafficData.from_dict
+        )
+        # Nearest-station lookups for positioning and passenger advice
+        self.station_index = SpatialIndex.from_records(TOKYO_STATIONS)
+        # Fail fast while ODPT is down instead of retrying on every refresh
+        self.breaker = CircuitBreaker("odpt", {
+            "failure_threshold": self.config.get("circuit_failure_threshold", 3),
+            "reset_timeout": self.config.get("circuit_reset_timeout", 60)
+        })
+        self._fallback_entry: Optional[CacheEntry] = None
+        # Seeded random values behind the simulated (no API key) station and disruption data
+        self.simulation = simulation
+        # Station table updated in place with the rows that changed since the last poll
+        self.station_store = StationStore(
+            make_station=lambda row: StationData(**{key: value for key, value in row.items() if key != "id"}),
+            format_station=self._format_station
+        )
         
     def _get_default_config(self) -> Dict[str, Any]:
         """Default configuration for traffic service"""
@@ -67,8 +184,15 @@ class TrafficService:
             "timeout": 30,
             "retry_attempts": 3,
             "retry_delay": 1,
+            "fetch_concurrency": 8,  # ODPT sub-fetches in flight at once
+            "call_timeout": 5,       # Seconds per sub-fetch before its part is degraded
             "cache_duration": 60,
-            "odpt_api_key": "demo_key",  # Would be set from environment
+            "cache_max_stale": 180,
+            "circuit_failure_threshold": 3,  # Failed collections before the circuit opens
+            "circuit_reset_timeout": 60,     # Seconds before a trial collection
+            "fallback_ttl": 30,              # Seconds a fallback result is reused (negative caching)
+            "stream_chunk_size": 65536,  # Bytes read per step while parsing ODPT responses
+            "odpt_api_key": os.getenv("ODPT_API_KEY", "demo_key"),  # demo_key: simulated station data
             "target_lines": [
                 "JR-East.Yamanote",
                 "TokyoMetro.Ginza", 
@@ -81,181 +205,251 @@ class TrafficService:
             ]
         }
     
+    def attach_session(self, session: aiohttp.ClientSession):
+        """Use a shared, pooled session owned by the application lifespan"""
+        self.session = session
+        self._owns_session = False
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating a private pooled one if none was attached"""
+        if self.session is None or self.session.closed:
+            self.session = create_http_session({"timeout": self.config["timeout"]})
+            self._owns_session = True
+        return self.session
+    
+    async def close(self):
+        """Close the session if this service created it"""
+        if self._owns_session and self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self._owns_session = False
+    
     async def __aenter__(self):
-        """Async context manager entry"""
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=self.config["timeout"])
-        )
+        """Async context manager entry (no-op, the session is long-lived)"""
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Async context manager exit"""
-        if self.session:
-            await self.session.close()
+        """Async context manager exit (no-op, the session is closed at shutdown)"""
+        pass
     
     async def get_current_traffic_data(self) -> TrafficData:
         """
         Get current traffic data for Tokyo transportation system
         Returns structured traffic data for taxi optimization
         """
-        cache_key = "current_traffic"
-        
-        # Check cache first
-        if self._is_cache_valid(cache_key):
-            logger.info("Returning cached traffic data")
-            return self.cache[cache_key]["data"]
+        entry = await self.get_current_traffic_entry()
+        return entry.data
+    
+    async def get_current_traffic_entry(self) -> CacheEntry:
+        """
+        Get current traffic data together with its cache metadata (fetch time and age)
+        Stale data is served immediately while a background task refreshes it
+        """
+        fallback = self._fallback_entry
+        if (fallback is not None and fallback.age_seconds() < self.config["fallback_ttl"]
+                and self.cache.get_entry("current_traffic") is None):
+            return fallback
         
         try:
-            # Collect traffic data from multiple sources
-            stations_data = await self._get_station_data()
-            disruptions_data = await self._get_service_disruptions()
-            congestion_data = await self._get_congestion_levels()
-            
-            # Calculate system-wide metrics
-            punctuality_rate = self._calculate_punctuality_rate(stations_data, disruptions_data)
-            average_delay = self._calculate_average_delay(stations_data, disruptions_data)
-            
-            # Structure the data
-            traffic_data = TrafficData(
-                stations=stations_data,
-                disruptions=disruptions_data,
-                congestion_levels=congestion_data,
-                punctuality_rate=punctuality_rate,
-                average_delay=average_delay,
-                last_updated=datetime.now(),
-                data_sources=["ODPT", "MCP-traffic", "JR-East", "Tokyo Metro"]
-            )
-            
-            # Cache the result
-            self._cache_data(cache_key, traffic_data)
-            
-            logger.info(f"Retrieved fresh traffic data: {len(stations_data)} stations, {len(disruptions_data)} disruptions")
-            return traffic_data
-            
+            return await self.cache.get_or_fetch("current_traffic", self._collect_traffic_data)
         except Exception as e:
             logger.error(f"Failed to fetch traffic data: {e}")
-            # Return fallback data if API fails
-            return self._get_fallback_traffic_data()
+            # Return fallback data if API fails, reused briefly so the next request does not retry
+            self._fallback_entry = CacheEntry(data=self.get_fallback_traffic_data(), stored_at=datetime.now())
+            return self._fallback_entry
     
-    async def _get_station_data(self) -> List[StationData]:
-        """Get station operational data from ODPT API"""
-        stations = []
+    async def refresh_current_traffic(self) -> CacheEntry:
+        """
+        Refresh current traffic data off the request path (used by the ingestion scheduler)
+        Adopts a fresh shared-cache entry if another worker already collected; raises on failure
+        """
+        return await self.cache.refresh("current_traffic", self._collect_traffic_data)
+    
+    async def _collect_traffic_data(self) -> TrafficData:
+        """Collect traffic data from ODPT (rejected immediately while the circuit is open)"""
+        return await self.breaker.call(self._collect_odpt_traffic_data)
+    
+    async def _collect_odpt_traffic_data(self) -> TrafficData:
+        """
+        Collect and structure current traffic data from all sources
+        Sub-fetches (one per line, disruptions, congestion) run concurrently; one that fails
+        or exceeds its timeout degrades only its own part of the result
+        """
+        lines = self._stations_by_line()
+        # One batch of simulated values for the whole snapshot, shared by the sub-fetches
+        draws = self.simulation.traffic_draws(len(TOKYO_STATIONS), len(DISRUPTION_LINES))
+        calls = {
+            f"stations:{line}": (lambda line=line, infos=infos: self._get_line_station_rows(line, infos, draws))
+            for line, infos in lines.items()
+        }
+        calls["disruptions"] = lambda: self._get_service_disruptions(draws)
+        calls["congestion"] = self._get_congestion_levels
         
-        try:
-            # In production, this would call actual ODPT API
-            # For now, we'll simulate realistic station data
-            tokyo_stations = [
-                {
-                    "name": "Tokyo Station",
-                    "line": "JR Yamanote",
-                    "lat": 35.6812,
-                    "lng": 139.7671,
-                    "base_passengers": 45000
-                },
-                {
-                    "name": "Shinjuku Station", 
-                    "line": "JR Yamanote",
-                    "lat": 35.6896,
-                    "lng": 139.6917,
-                    "base_passengers": 52000
-                },
-                {
-                    "name": "Shibuya Station",
-                    "line": "JR Yamanote",
-                    "lat": 35.6598,
-                    "lng": 139.7006,
-                    "base_passengers": 38000
-                },
-                {
-                    "name": "Ginza Station",
-                    "line": "Tokyo Metro Ginza",
-                    "lat": 35.6762,
-                    "lng": 139.7653,
-                    "base_passengers": 35000
-                },
-                {
-                    "name": "Roppongi Station",
-                    "line": "Tokyo Metro Hibiya",
-                    "lat": 35.6627,
-                    "lng": 139.7314,
-                    "base_passengers": 28000
-                }
+        results, failed = await self._fan_out(calls)
+        if len(failed) == len(calls):
+            raise Exception(f"All {len(calls)} traffic sub-fetches failed")
+        
+        # Apply changed rows only; a failed line keeps its stations with unknown status
+        for line, infos in lines.items():
+            rows = results.get(f"stations:{line}")
+            if rows is None:
+                rows = [self._degraded_station_row(info) for info in infos]
+            self.station_store.apply(rows)
+        stations_data = self.station_store.stations()
+        disruptions_data = results.get("disruptions", [])
+        congestion_data = results.get("congestion", {})
+
+        # Calculate system-wide metrics
+        punctuality_rate = self._calculate_punctuality_rate(stations_data, disruptions_data)
+        average_delay = self._calculate_average_delay(stations_data, disruptions_data)
+
+        # Structure the data
+        traffic_data = TrafficData(
+            stations=stations_data,
+            disruptions=disruptions_data,
+            congestion_levels=congestion_data,
+            punctuality_rate=punctuality_rate,
+            average_delay=average_delay,
+            last_updated=datetime.now(),
+            data_sources=["ODPT", "MCP-traffic", "JR-East", "Tokyo Metro"],
+            degraded=failed
+        )
+
+        logger.info(f"Retrieved fresh traffic data: {len(stations_data)} stations, {len(disruptions_data)} disruptions"
+                    + (f", degraded: {', '.join(failed)}" if failed else ""))
+        return traffic_data
+
+    async def _fan_out(self, calls: Dict[str, Callable[[], Awaitable[Any]]]) -> Tuple[Dict[str, Any], List[str]]:
+        """
+        Run sub-fetches with at most fetch_concurrency in flight, each limited to call_timeout
+        Returns the results of the calls that succeeded and the names of those that did not
+        """
+        semaphore = asyncio.Semaphore(self.config["fetch_concurrency"])
+        timeout = self.config["call_timeout"]
+
+        async def run(name: str, fetch: Callable[[], Awaitable[Any]]) -> Any:
+            async with semaphore:
+                try:
+                    return await asyncio.wait_for(fetch(), timeout)
+                except asyncio.TimeoutError:
+                    logger.warning(f"Traffic sub-fetch {name} timed out after {timeout}s")
+                except Exception as e:
+                    logger.warning(f"Traffic sub-fetch {name} failed: {e}")
+                return FAILED
+
+        outcomes = await asyncio.gather(*(run(name, fetch) for name, fetch in calls.items()))
+        results = {name: outcome for name, outcome in zip(calls, outcomes) if outcome is not FAILED}
+        failed = [name for name in calls if name not in results]
+        return results, failed
+
+    def _stations_by_line(self) -> Dict[str, List[Dict[str, Any]]]:
+        """Monitored stations grouped by line, the unit of one ODPT request"""
+        lines: Dict[str, List[Dict[str, Any]]] = {}
+        for station_info in TOKYO_STATIONS:
+            lines.setdefault(station_info["line"], []).append(station_info)
+        return lines
+
+    def _degraded_station_row(self, station_info: Dict[str, Any]) -> Dict[str, Any]:
+        """Row for a station whose line could not be fetched: last known values, unknown status"""
+        row = {"id": station_id(station_info), "operational_status": "Unknown", "delays": 0}
+        if self.station_store.has(row["id"]):
+            return row
+        return {
+            **row,
+            "name": station_info["name"],
+            "line": station_info["line"],
+            "passenger_count": station_info["base_passengers"],
+            "congestion_level": 100,
+            "latitude": station_info["lat"],
+            "longitude": station_info["lng"]
+        }
+
+    async def _stream_odpt(self, resource: str, params: Dict[str, str]) -> AsyncIterator[Dict[str, Any]]:
+        """Records of an ODPT resource, parsed as the response body streams in"""
+        session = await self._get_session()
+        url = f"{self.odpt_base_url}/{resource}"
+        query = {**params, "acl:consumerKey": self.config["odpt_api_key"]}
+        async with session.get(url, params=query) as response:
+            if response.status != 200:
+                raise Exception(f"ODPT {resource} returned status {response.status}")
+            async for record in iter_json_array(response.content.iter_chunked(self.config["stream_chunk_size"])):
+                yield record
+
+    async def _get_line_station_rows(self, line: str, station_infos: List[Dict[str, Any]],
+                                     draws: TrafficDraws) -> List[Dict[str, Any]]:
+        """Station rows for one line from ODPT API; raises on failure"""
+        if self.config["odpt_api_key"] != "demo_key":
+            return [
+                station_row_from_odpt(record, line)
+                async for record in self._stream_odpt("odpt:Station", {"odpt:railway": ODPT_RAILWAYS[line]})
             ]
+        
+        # Without an API key, simulate realistic station data
+        rows = []
+        current_hour = datetime.now().hour
+        
+        for station_info in station_infos:
+            # Calculate dynamic passenger count based on time
+            rush_multiplier = 1.0
+            if current_hour in [7, 8, 9, 17, 18, 19]:  # Rush hours
+                rush_multiplier = 1.4
+            elif current_hour in [22, 23, 0, 1, 2, 3, 4, 5]:  # Late night/early morning
+                rush_multiplier = 0.3
             
-            current_hour = datetime.now().hour
+            passenger_count = int(station_info["base_passengers"] * rush_multiplier)
             
-            for station_info in tokyo_stations:
-                # Calculate dynamic passenger count based on time
-                rush_multiplier = 1.0
-                if current_hour in [7, 8, 9, 17, 18, 19]:  # Rush hours
-                    rush_multiplier = 1.4
-                elif current_hour in [22, 23, 0, 1, 2, 3, 4, 5]:  # Late night/early morning
-                    rush_multiplier = 0.3
-                
-                passenger_count = int(station_info["base_passengers"] * rush_multiplier)
-                
-                # Calculate congestion level
-                congestion_level = min(150, int(rush_multiplier * 100))
-                
-                # Determine operational status
-                operational_status = "Normal"
-                delays = 0
-                
-                # Random chance of delays (5% probability)
-                if await self._simulate_random_delay():
-                    operational_status = "Delayed"
-                    delays = await self._simulate_delay_time()
-                
-                station_data = StationData(
-                    name=station_info["name"],
-                    line=station_info["line"],
-                    passenger_count=passenger_count,
-                    operational_status=operational_status,
-                    delays=delays,
-                    congestion_level=congestion_level,
-                    latitude=station_info["lat"],
-                    longitude=station_info["lng"]
-                )
-                
-                stations.append(station_data)
+            # Calculate congestion level
+            congestion_level = min(150, int(rush_multiplier * 100))
             
-            return stations
+            # Determine operational status
+            operational_status = "Normal"
+            delays = 0
             
-        except Exception as e:
-            logger.error(f"Error getting station data: {e}")
-            return []
+            # Random chance of delays (5% probability)
+            i = TOKYO_STATIONS.index(station_info)
+            if draws.station_delayed[i]:
+                operational_status = "Delayed"
+                delays = int(draws.station_delay_minutes[i])  # 2-15 minute delays
+            
+            rows.append({
+                "id": station_id(station_info),
+                "name": station_info["name"],
+                "line": line,
+                "passenger_count": passenger_count,
+                "operational_status": operational_status,
+                "delays": delays,
+                "congestion_level": congestion_level,
+                "latitude": station_info["lat"],
+                "longitude": station_info["lng"]
+            })
+        
+        return rows
     
-    async def _get_service_disruptions(self) -> List[ServiceDisruption]:
-        """Get current service disruptions"""
+    async def _get_service_disruptions(self, draws: TrafficDraws) -> List[ServiceDisruption]:
+        """Get current service disruptions; raises on failure"""
         disruptions = []
         
-        try:
-            # In production, this would query ODPT API for real disruptions
-            # For simulation, randomly generate disruptions (10% chance)
-            
-            if await self._simulate_service_disruption():
-                # Create a realistic disruption
-                lines = ["JR Yamanote", "Tokyo Metro Ginza", "Tokyo Metro Marunouchi"]
-                affected_line = lines[datetime.now().second % len(lines)]
-                
-                disruption = ServiceDisruption(
-                    line=affected_line,
-                    station="Multiple stations",
-                    disruption_type="Weather Delay" if await self._is_weather_related() else "Signal Problem",
-                    severity="Medium",
-                    estimated_delay=await self._simulate_delay_time(),
-                    description=f"Service delays on {affected_line} due to operational issues",
-                    start_time=datetime.now() - timedelta(minutes=15),
-                    estimated_end_time=datetime.now() + timedelta(minutes=30)
-                )
-                
-                disruptions.append(disruption)
+        # In production, this would query ODPT API for real disruptions
+        # For simulation, randomly generate disruptions (10% chance)
+        
+        if draws.disruption:
+            # Create a realistic disruption
+            affected_line = DISRUPTION_LINES[draws.disruption_line]
             
-            return disruptions
+            disruption = ServiceDisruption(
+                line=affected_line,
+                station="Multiple stations",
+                disruption_type="Weather Delay" if draws.disruption_weather_related else "Signal Problem",  # 40% weather-related
+                severity="Medium",
+                estimated_delay=draws.disruption_delay_minutes,
+                description=f"Service delays on {affected_line} due to operational issues",
+                start_time=datetime.now() - timedelta(minutes=15),
+                estimated_end_time=datetime.now() + timedelta(minutes=30)
+            )
             
-        except Exception as e:
-            logger.error(f"Error getting service disruptions: {e}")
-            return []
+            disruptions.append(disruption)
+        
+        return disruptions
     
     async def _get_congestion_levels(self) -> Dict[str, float]:
         """Get congestion levels for key areas"""
@@ -311,27 +505,7 @@ class TrafficService:
         
         return sum(all_delays) / len(all_delays)
     
-    async def _simulate_random_delay(self) -> bool:
-        """Simulate random delay occurrence (5% chance)"""
-        import random
-        return random.random() < 0.05
-    
-    async def _simulate_delay_time(self) -> int:
-        """Simulate realistic delay time"""
-        import random
-        return random.randint(2, 15)  # 2-15 minute delays
-    
-    async def _simulate_service_disruption(self) -> bool:
-        """Simulate service disruption occurrence (10% chance)"""
-        import random
-        return random.random() < 0.10
-    
-    async def _is_weather_related(self) -> bool:
-        """Check if disruption is weather-related"""
-        import random
-        return random.random() < 0.4  # 40% of disruptions are weather-related
-    
-    def _get_fallback_traffic_data(self) -> TrafficData:
+    def get_fallback_traffic_data(self) -> TrafficData:
         """Return fallback traffic data when API fails"""
         logger.warning("Using fallback traffic data")
         
@@ -358,46 +532,35 @@ class TrafficService:
             data_sources=["Fallback"]
         )
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cached data is still valid"""
-        if cache_key not in self.cache:
-            return False
-        
-        cache_entry = self.cache[cache_key]
-        age = (datetime.now() - cache_entry["timestamp"]).total_seconds()
-        return age < self.cache_duration
-    
-    def _cache_data(self, cache_key: str, data: TrafficData):
-        """Cache traffic data"""
-        self.cache[cache_key] = {
-            "data": data,
-            "timestamp": datetime.now()
-        }
-    
     async def get_traffic_for_optimization(self) -> Dict[str, Any]:
         """
         Get traffic data formatted for taxi optimization algorithms
         Returns data compatible with research integration module
         """
-        traffic_data = await self.get_current_traffic_data()
-        
-        # Format for optimization algorithms
+        entry = await self.get_current_traffic_entry()
+        return self.format_for_optimization(entry.data, entry.age_seconds())
+    
+    def _format_station(self, station: StationData) -> Dict[str, Any]:
+        """Station entry of the optimization format"""
+        return {
+            "name": station.name,
+            "line": station.line,
+            "operational_status": station.operational_status,
+            "delays": station.delays,
+            "congestion_level": station.congestion_level,
+            "passenger_count": station.passenger_count,
+            "coordinates": {
+                "latitude": station.latitude,
+                "longitude": station.longitude
+            }
+        }
+    
+    def format_for_optimization(self, traffic_data: TrafficData, data_age_seconds: float) -> Dict[str, Any]:
+        """Format traffic data for the optimization algorithms (no I/O)"""
         formatted_data = {
-            "stations": [
-                {
-                    "name": station.name,
-                    "line": station.line,
-                    "operational_status": station.operational_status,
-                    "delays": station.delays,
-                    "congestion_level": station.congestion_level,
-                    "passenger_count": station.passenger_count,
-                    "coordinates": {
-                        "latitude": station.latitude,
-                        "longitude": station.longitude
-                    }
-                }
-                for station in traffic_data.stations
-            ],
+            # Rows unchanged since the last poll reuse their formatted dicts
+            "stations": (self.station_store.records_for(traffic_data.stations)
+                         or [self._format_station(station) for station in traffic_data.stations]),
             "disruptions": [
                 {
                     "line": disruption.line,
@@ -417,6 +580,8 @@ class TrafficService:
             },
             "timestamp": traffic_data.last_updated.isoformat(),
             "data_sources": traffic_data.data_sources,
+            "degraded_sources": traffic_data.degraded,
+            "data_age_seconds": round(data_age_seconds, 1),
             "integration_note": "MCP-traffic system integration for taxi optimization"
         }
         
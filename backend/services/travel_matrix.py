@@ -0,0 +1,313 @@
+"""
+Travel-Time Matrix
+Offline-built float32 travel-time and road-distance matrices between every grid cell and station,
+memory-mapped at runtime with time-of-day and rain adjustment layers, so lookups are O(1)
+
+Build ahead of deployment with: python -m services.travel_matrix
+"""
+
+import json
+import logging
+import os
+import time
+from typing import Dict, List, Any, Optional, Tuple
+
+import numpy as np
+
+from .spatial_grid import SpatialDemandGrid, tokyo_grid, distance_km
+from .spatial_index import SpatialIndex
+from .traffic_service import TOKYO_STATIONS
+
+logger = logging.getLogger(__name__)
+
+MATRIX_FORMAT = 1
+DEFAULT_MATRIX_DIR = os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data", "travel_matrix")
+
+# Congestion relative to free flow by hour of day (Tokyo arterial roads)
+HOURLY_CONGESTION = [
+    0.85, 0.80, 0.80, 0.80, 0.85, 0.95,  # 0-5
+    1.15, 1.45, 1.50, 1.30, 1.15, 1.15,  # 6-11
+    1.20, 1.15, 1.15, 1.20, 1.30, 1.50,  # 12-17
+    1.55, 1.40, 1.20, 1.10, 1.00, 0.90   # 18-23
+]
+
+class TravelTimeMatrix:
+    """
+    Nodes are the grid cells (0..cells-1) followed by the stations
+    minutes[i, j] is free-flow driving time, scaled at lookup by hour_factor[hour, i] and rain_factor[bucket]
+    """
+
+    def __init__(self, grid: SpatialDemandGrid = None, stations: List[Dict[str, Any]] = None,
+                 config: Dict[str, Any] = None):
+        self.config = config or self._get_default_config()
+        self.grid = grid or tokyo_grid
+        self.stations = stations if stations is not None else TOKYO_STATIONS
+        self.station_offset = len(self.grid)
+        self.node_count = len(self.grid) + len(self.stations)
+        self.station_nodes = {
+            station["name"]: self.station_offset + i for i, station in enumerate(self.stations)
+        }
+        self._node_index: Optional[SpatialIndex] = None
+        self.minutes: Optional[np.ndarray] = None
+        self.distance: Optional[np.ndarray] = None
+        self.hour_factor: Optional[np.ndarray] = None
+        self.access_minutes: Optional[np.ndarray] = None
+        self.rain_factor = np.array(self.config["rain_factors"], dtype=np.float32)
+
+    def _get_default_config(self) -> Dict[str, Any]:
+        """Default matrix configuration"""
+        return {
+            "directory": os.getenv("TRAVEL_MATRIX_DIR", DEFAULT_MATRIX_DIR),
+            "detour_factor": 1.3,        # Road distance vs straight line
+            "free_flow_kmh": 24.0,       # Average free-flow speed on city streets
+            "overhead_minutes": 1.0,     # Pulling out and stopping
+            "access_radius_km": 5.0,     # Drivers considered "nearby" when estimating time to position
+            "tier_congestion": {"central": 1.2, "inner": 1.0, "outer": 0.8},  # Scales hourly congestion
+            "rain_thresholds": [0.0, 1.0, 5.0],  # mm/h bucket edges: dry, drizzle, light, heavy
+            "rain_factors": [1.0, 1.1, 1.2, 1.35],
+            # Dense N×N arrays grow quadratically: 12,000 nodes is ~576 MB per float32 array and a few GB
+            # of build temporaries. Finer grids (e.g. GRID_CELL_SIZE_M=100, ~60k cells) are refused
+            "max_nodes": int(os.getenv("TRAVEL_MATRIX_MAX_NODES", "12000"))
+        }
+
+    # Offline build
+
+    def _node_coordinates(self) -> Tuple[np.ndarray, np.ndarray]:
+        station_lat = np.array([station["lat"] for station in self.stations])
+        station_lng = np.array([station["lng"] for station in self.stations])
+        return np.concatenate([self.grid.lat, station_lat]), np.concatenate([self.grid.lng, station_lng])
+
+    def _metadata(self) -> Dict[str, Any]:
+        """Identifies the grid/stations/config a stored matrix was built for"""
+        return {
+            "format": MATRIX_FORMAT,
+            "cell_size_m": self.grid.cell_size_m,
+            "cells": len(self.grid),
+            "stations": [station["name"] for station in self.stations],
+            "detour_factor": self.config["detour_factor"],
+            "free_flow_kmh": self.config["free_flow_kmh"],
+            "overhead_minutes": self.config["overhead_minutes"],
+            "access_radius_km": self.config["access_radius_km"],
+            "tier_congestion": self.config["tier_congestion"]
+        }
+
+    def _check_size(self):
+        """Refuse grids whose dense matrix would not fit in memory"""
+        if self.node_count > self.config["max_nodes"]:
+            gigabytes = self.node_count ** 2 * 4 / 1e9
+            raise ValueError(
+                f"Travel matrix for {self.node_count} nodes needs {gigabytes:.1f} GB per array "
+                f"(limit {self.config['max_nodes']} nodes); use a coarser GRID_CELL_SIZE_M "
+                f"or raise TRAVEL_MATRIX_MAX_NODES"
+            )
+
+    def compute(self) -> Dict[str, np.ndarray]:
+        """Compute all arrays in memory (vectorized, well under a second for 2,500 cells)"""
+        self._check_size()
+        lat, lng = self._node_coordinates()
+        cells = len(self.grid)
+
+        road_km = np.empty((self.node_count, self.node_count), dtype=np.float32)
+        for start in range(0, self.node_count, 512):  # Row blocks bound the float64 temporaries
+            stop = min(start + 512, self.node_count)
+            road_km[start:stop] = distance_km(lat[start:stop, None], lng[start:stop, None], lat[None, :], lng[None, :]) * self.config["detour_factor"]
+
+        minutes = road_km * np.float32(60.0 / self.config["free_flow_kmh"]) + np.float32(self.config["overhead_minutes"])
+        np.fill_diagonal(minutes, 0.0)
+
+        # Congestion layer: hourly profile scaled by how central each origin is
+        station_cells = [self.grid.cell_at(station["lat"], station["lng"]) for station in self.stations]
+        node_ward = np.concatenate([
+            self.grid.ward_index,
+            np.array([self.grid.ward_index[cell] if cell is not None else 0 for cell in station_cells], dtype=np.int16)
+        ])
+        ward_weight = np.array([self.config["tier_congestion"][ward.tier] for ward in self.grid.wards])
+        profile = np.array(HOURLY_CONGESTION)
+        hour_factor = (1.0 + (profile[:, None] - 1.0) * ward_weight[node_ward][None, :]).astype(np.float32)
+
+        # Expected free-flow minutes to reach each node from nearby cells, weighted by cell demand
+        # (where idle drivers tend to be)
+        nearby = road_km[:cells] <= self.config["access_radius_km"] * self.config["detour_factor"]
+        weights = nearby * self.grid.base_revenue.astype(np.float32)[:, None]
+        access_minutes = (weights * minutes[:cells]).sum(axis=0) / np.maximum(weights.sum(axis=0), 1e-6)
+
+        return {
+            "minutes": minutes,
+            "distance_km": road_km,
+            "hour_factor": hour_factor,
+            "access_minutes": access_minutes.astype(np.float32)
+        }
+
+    def build(self, directory: Optional[str] = None) -> str:
+        """Compute and store the matrix files; metadata is written last so readers never see a partial set"""
+        directory = directory or self.config["directory"]
+        os.makedirs(directory, exist_ok=True)
+        started = time.perf_counter()
+
+        for name, array in self.compute().items():
+            path = os.path.join(directory, f"{name}.npy")
+            tmp_path = f"{path}.{os.getpid()}.tmp"
+            with open(tmp_path, "wb") as f:
+                np.save(f, array)
+            os.replace(tmp_path, path)
+
+        meta_path = os.path.join(directory, "meta.json")
+        tmp_path = f"{meta_path}.{os.getpid()}.tmp"
+        with open(tmp_path, "w") as f:
+            json.dump(self._metadata(), f)
+        os.replace(tmp_path, meta_path)
+
+        logger.info(f"Built {self.node_count}x{self.node_count} travel matrix in {directory} ({time.perf_counter() - started:.1f}s)")
+        return directory
+
+    # Runtime
+
+    def load(self, build_missing: bool = True):
+        """Memory-map the stored matrix; (re)build it first if missing or built for another grid"""
+        if self.minutes is not None:
+            return
+        self._check_size()
+        directory = self.config["directory"]
+        try:
+            with open(os.path.join(directory, "meta.json")) as f:
+                up_to_date = json.load(f) == self._metadata()
+        except (FileNotFoundError, ValueError):
+            up_to_date = False
+
+        if not up_to_date:
+            if not build_missing:
+                raise RuntimeError(f"No travel matrix for this grid in {directory}")
+            logger.warning(f"Travel matrix in {directory} is missing or stale, building it now")
+            try:
+                self.build(directory)
+            except OSError as e:
+                # Read-only deployment: keep the arrays in memory instead
+                logger.error(f"Could not store travel matrix: {e}")
+                self._assign(self.compute())
+                return
+
+        self._assign({
+            name: np.load(os.path.join(directory, f"{name}.npy"), mmap_mode="r")
+            for name in ("minutes", "distance_km", "hour_factor", "access_minutes")
+        })
+
+    def _assign(self, arrays: Dict[str, np.ndarray]):
+        self.distance = arrays["distance_km"]
+        self.hour_factor = arrays["hour_factor"]
+        self.access_minutes = arrays["access_minutes"]
+        self.minutes = arrays["minutes"]  # Assigned last: marks the matrix as loaded
+
+    def _ensure_loaded(self):
+        if self.minutes is None:
+            self.load()
+
+    def rain_bucket(self, rain_intensity: float) -> int:
+        """Index into rain_factor for a precipitation rate in mm/h"""
+        return int(np.searchsorted(self.config["rain_thresholds"], rain_intensity, side="left"))
+
+    def _get_node_index(self) -> SpatialIndex:
+        if self._node_index is None:
+            lat_all, lng_all = self._node_coordinates()
+            self._node_index = SpatialIndex(lat_all, lng_all, list(self.grid.names) + list(self.station_nodes))
+        return self._node_index
+
+    def node_at(self, lat: float, lng: float) -> int:
+        """Node for a position: its grid cell, or the nearest node outside the wards"""
+        cell = self.grid.cell_at(lat, lng)
+        if cell is not None:
+            return cell
+        _, indices = self._get_node_index().nearest(lat, lng, k=1)
+        return int(indices[0])
+
+    def nodes_at(self, lat: np.ndarray, lng: np.ndarray) -> np.ndarray:
+        """Vectorized node_at() for many positions"""
+        nodes = self.grid.cells_at(lat, lng)
+        outside = nodes < 0
+        if outside.any():
+            _, indices = self._get_node_index().nearest_many(np.asarray(lat)[outside], np.asarray(lng)[outside], k=1)
+            nodes[outside] = indices[:, 0]
+        return nodes
+
+    def resolve(self, place: str) -> Optional[int]:
+        """Node for a station, landmark or ward name (case-insensitive, 'Station' optional)"""
+        key = place.strip().lower()
+        bare = key[:-len(" station")] if key.endswith(" station") else key
+        for name, node in self.station_nodes.items():
+            if name.lower() in (key, f"{bare} station"):
+                return node
+        for name, cell in self.grid.landmark_cells.items():
+            if name.lower() == bare:
+                return cell
+        for ward in self.grid.wards:
+            if ward.name.lower() == bare:
+                return self.node_at(ward.lat, ward.lng)
+        return None
+
+    def travel_minutes(self, origin: int, destination: int, hour: int, rain_intensity: float = 0.0) -> float:
+        """Driving minutes between two nodes at an hour of day and rain rate"""
+        self._ensure_loaded()
+        return float(self.minutes[origin, destination] * self.hour_factor[hour, origin]
+                     * self.rain_factor[self.rain_bucket(rain_intensity)])
+
+    def travel_minutes_from(self, origin: int, destinations: np.ndarray, hour: int,
+                            rain_intensity: float = 0.0) -> np.ndarray:
+        """Driving minutes from one node to many (one row gather)"""
+        self._ensure_loaded()
+        return (self.minutes[origin, destinations] * self.hour_factor[hour, origin]
+                * self.rain_factor[self.rain_bucket(rain_intensity)])
+
+    def travel_minutes_between(self, origins: np.ndarray, destinations: np.ndarray, hour: int,
+                               rain_intensity: float = 0.0) -> np.ndarray:
+        """Driving minutes for every (origin, destination) pair, shape (origins, destinations)"""
+        self._ensure_loaded()
+        block = self.minutes[np.ix_(origins, destinations)]
+        return (block * np.asarray(self.hour_factor[hour, origins])[:, None]
+                * self.rain_factor[self.rain_bucket(rain_intensity)])
+
+    def travel_minutes_pairs(self, origins: np.ndarray, destinations: np.ndarray, hour: int,
+                             rain_intensity: float = 0.0) -> np.ndarray:
+        """Driving minutes for each (origins[i], destinations[i]) pair"""
+        self._ensure_loaded()
+        return (self.minutes[origins, destinations] * self.hour_factor[hour, origins]
+                * self.rain_factor[self.rain_bucket(rain_intensity)])
+
+    def road_distance_pairs(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        """Road distance in km for each (origins[i], destinations[i]) pair"""
+        self._ensure_loaded()
+        return np.asarray(self.distance[origins, destinations])
+
+    def road_distance_between(self, origins: np.ndarray, destinations: np.ndarray) -> np.ndarray:
+        """Road distance in km for every (origin, destination) pair"""
+        self._ensure_loaded()
+        return np.asarray(self.distance[np.ix_(origins, destinations)])
+
+    def road_distance(self, origin: int, destination: int) -> float:
+        """Road distance in km between two nodes"""
+        self._ensure_loaded()
+        return float(self.distance[origin, destination])
+
+    def road_distance_from(self, origin: int, destinations: np.ndarray) -> np.ndarray:
+        self._ensure_loaded()
+        return np.asarray(self.distance[origin, destinations])
+
+    def access_time(self, destination: int, hour: int, rain_intensity: float = 0.0) -> float:
+        """Expected driving minutes to a node from a typical driver position"""
+        self._ensure_loaded()
+        return float(self.access_minutes[destination] * self.hour_factor[hour, destination]
+                     * self.rain_factor[self.rain_bucket(rain_intensity)])
+
+    def get_stats(self) -> Dict[str, Any]:
+        """Matrix summary for monitoring"""
+        return {
+            "nodes": self.node_count,
+            "loaded": self.minutes is not None,
+            "memory_mapped": isinstance(self.minutes, np.memmap),
+            "directory": self.config["directory"]
+        }
+
+# Global instance for use across the application (loaded lazily or at startup)
+travel_matrix = TravelTimeMatrix()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    travel_matrix.build()
@@ -0,0 +1,213 @@
+"""
+JMA Forecast Arrays
+Parses the full JMA forecast JSON (every report, time series and area) once per fetch
+into per-area, per-timestep NumPy arrays that are sliced for any horizon
+"""
+
+import math
+from datetime import datetime, timedelta, timezone
+from typing import Dict, List, Any, Optional, Tuple
+from dataclasses import dataclass
+
+import numpy as np
+
+JST = timezone(timedelta(hours=9))
+
+# JMA area keys parsed into numeric series; the weekly report's series get a "weekly_" prefix
+FORECAST_ELEMENTS = {
+    "weatherCodes": "weather_code",
+    "pops": "pop",             # Probability of precipitation (%) per 6-hour block (daily in the weekly report)
+    "temps": "temp",           # Day minimum at 00:00 and day maximum at 09:00 (JST) of each date
+    "tempsMin": "temp_min",
+    "tempsMax": "temp_max"
+}
+
+def to_datetime64(when: datetime) -> np.datetime64:
+    """UTC datetime64 for an aware datetime, or a naive one in the server's local time"""
+    return np.datetime64(when.astimezone(timezone.utc).replace(tzinfo=None), "s")
+
+def _parse_value(value: Any) -> float:
+    """JMA leaves unknown slots as empty strings"""
+    try:
+        return float(value)
+    except (TypeError, ValueError):
+        return math.nan
+
+@dataclass
+class ForecastSeries:
+    """One element over time for every area of a JMA time series"""
+    times: np.ndarray       # datetime64[s] (UTC), ascending step starts
+    area_codes: List[str]
+    area_names: List[str]
+    values: np.ndarray      # float32, (areas, steps); NaN where JMA gave no value
+
+    def area_row(self, area_code: Optional[str] = None) -> int:
+        """Row of an area code, or the first area (the office's main area) if unknown"""
+        if area_code in self.area_codes:
+            return self.area_codes.index(area_code)
+        return 0
+
+    def steps_at(self, when: np.ndarray) -> np.ndarray:
+        """Index of the step covering each time (the first step for times before it)"""
+        return np.maximum(np.searchsorted(self.times, when, side="right") - 1, 0)
+
+    def covers(self, when: np.datetime64) -> bool:
+        """Whether a time falls before the end of the last step (one step length past its start)"""
+        step = np.diff(self.times).max() if len(self.times) > 1 else np.timedelta64(1, "D")
+        return when < self.times[-1] + step
+
+    def at(self, when: np.ndarray, area_code: Optional[str] = None) -> np.ndarray:
+        """Values at one or many times"""
+        return self.values[self.area_row(area_code), self.steps_at(when)]
+
+    def window(self, start: np.datetime64, end: np.datetime64, area_code: Optional[str] = None) -> np.ndarray:
+        """Values of every step overlapping [start, end]"""
+        first, last = self.steps_at(np.array([start, end]))
+        return self.values[self.area_row(area_code), first:last + 1]
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "times": self.times.astype("int64").tolist(),
+            "area_codes": self.area_codes,
+            "area_names": self.area_names,
+            "values": [[None if math.isnan(v) else v for v in row] for row in self.values.tolist()]
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "ForecastSeries":
+        return cls(
+            times=np.array(data["times"], dtype="int64").astype("datetime64[s]"),
+            area_codes=data["area_codes"],
+            area_names=data["area_names"],
+            values=np.array(data["values"], dtype=np.float64).astype(np.float32)
+        )
+
+@dataclass
+class JMAForecast:
+    """Every parsed series of one JMA forecast fetch"""
+    office: str
+    issued_at: datetime
+    series: Dict[str, ForecastSeries]
+
+    def weather_code_at(self, when: datetime, area_code: Optional[str] = None) -> Optional[str]:
+        """JMA weather code in force at a time; falls back to the weekly report past the short-term range"""
+        for name in ("weather_code", "weekly_weather_code"):
+            series = self.series.get(name)
+            if series is None:
+                continue
+            t = to_datetime64(when)
+            if name == "weather_code" and not series.covers(t):
+                continue
+            value = float(series.at(t, area_code))
+            if not math.isnan(value):
+                return str(int(value))
+        return None
+
+    def max_pop(self, start: datetime, end: datetime, area_code: Optional[str] = None) -> Optional[int]:
+        """Highest probability of precipitation (%) over a period"""
+        for name in ("pop", "weekly_pop"):
+            series = self.series.get(name)
+            if series is None or (name == "pop" and not series.covers(to_datetime64(start))):
+                continue
+            values = series.window(to_datetime64(start), to_datetime64(end), area_code)
+            values = values[~np.isnan(values)]
+            if len(values):
+                return int(values.max())
+        return None
+
+    def _value_at_exact(self, name: str, t: np.datetime64, area_code: Optional[str]) -> float:
+        series = self.series.get(name)
+        if series is None:
+            return math.nan
+        matches = np.nonzero(series.times == t)[0]
+        return float(series.values[series.area_row(area_code), matches[0]]) if len(matches) else math.nan
+
+    def _value_on_date(self, name: str, date: np.datetime64, area_code: Optional[str]) -> float:
+        series = self.series.get(name)
+        if series is None:
+            return math.nan
+        local_dates = (series.times + np.timedelta64(9, "h")).astype("datetime64[D]")
+        matches = np.nonzero(local_dates == date)[0]
+        return float(series.values[series.area_row(area_code), matches[0]]) if len(matches) else math.nan
+
+    def day_range(self, when: datetime, point_code: Optional[str] = None) -> Optional[Tuple[float, float]]:
+        """(minimum, maximum) temperature forecast for the JST date of a time"""
+        date = np.datetime64(when.astimezone(JST).date(), "D")
+        midnight = date.astype("datetime64[s]") - np.timedelta64(9, "h")  # JST midnight in UTC
+        low = self._value_at_exact("temp", midnight, point_code)
+        high = self._value_at_exact("temp", midnight + np.timedelta64(9, "h"), point_code)
+
+        # Weekly report for whichever bound the short-term report does not cover
+        if math.isnan(low):
+            low = self._value_on_date("weekly_temp_min", date, point_code)
+        if math.isnan(high):
+            high = self._value_on_date("weekly_temp_max", date, point_code)
+
+        if math.isnan(low) and math.isnan(high):
+            return None
+        if math.isnan(low):
+            low = high - 6.0  # Typical Tokyo diurnal range
+        if math.isnan(high):
+            high = low + 6.0
+        return low, high
+
+    def temperature_at(self, when: datetime, point_code: Optional[str] = None) -> Optional[float]:
+        """Diurnal curve through the day's forecast minimum and maximum (peak at 14:00 JST)"""
+        day_range = self.day_range(when, point_code)
+        if day_range is None:
+            return None
+        low, high = day_range
+        local = when.astimezone(JST)
+        hour = local.hour + local.minute / 60
+        return (low + high) / 2 + (high - low) / 2 * math.cos(2 * math.pi * (hour - 14) / 24)
+
+    def to_dict(self) -> Dict[str, Any]:
+        return {
+            "office": self.office,
+            "issued_at": self.issued_at.isoformat(),
+            "series": {name: series.to_dict() for name, series in self.series.items()}
+        }
+
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "JMAForecast":
+        return cls(
+            office=data["office"],
+            issued_at=datetime.fromisoformat(data["issued_at"]),
+            series={name: ForecastSeries.from_dict(series) for name, series in data["series"].items()}
+        )
+
+def parse_jma_forecast(jma_data: List[Dict[str, Any]]) -> JMAForecast:
+    """Parse every report, time series and area of a JMA forecast response"""
+    series: Dict[str, ForecastSeries] = {}
+    for report_index, report in enumerate(jma_data):
+        prefix = "" if report_index == 0 else "weekly_"
+        for time_series in report.get("timeSeries", []):
+            times = np.array([to_datetime64(datetime.fromisoformat(t)) for t in time_series["timeDefines"]])
+            order = np.argsort(times, kind="stable")
+            areas = time_series.get("areas", [])
+            codes = [area["area"].get("code", "") for area in areas]
+            names = [area["area"].get("name", "") for area in areas]
+
+            for key, name in FORECAST_ELEMENTS.items():
+                if not any(key in area for area in areas):
+                    continue
+                values = np.full((len(areas), len(times)), np.nan, dtype=np.float32)
+                for row, area in enumerate(areas):
+                    parsed = [_parse_value(value) for value in area.get(key, [])][:len(times)]
+                    values[row, :len(parsed)] = parsed
+                series[prefix + name] = ForecastSeries(
+                    times=times[order],
+                    area_codes=codes,
+                    area_names=names,
+                    values=values[:, order]
+                )
+
+    if not series:
+        raise ValueError("JMA response contains no forecast series")
+
+    first = jma_data[0]
+    return JMAForecast(
+        office=first.get("publishingOffice", ""),
+        issued_at=datetime.fromisoformat(first["reportDatetime"]) if "reportDatetime" in first else datetime.now(JST),
+        series=series
+    )
@@ -14,9 +14,14 @@ from dataclasses import dataclass
 import math
 import json
 
-from .weather_service import WeatherService, WeatherData
+import numpy as np
+
+from .weather_service import WeatherData, weather_service
 from .traffic_service import TrafficService
-from .research_integration import ResearchIntegration
+from .spatial_grid import tokyo_grid, select_spread
+from .travel_matrix import travel_matrix
+from .nowcast import nowcast_store
+from .cache import LRUCache
 
 logger = logging.getLogger(__name__)
 
@@ -49,23 +54,15 @@ class WeatherIntelligenceEngine:
     """
     
     def __init__(self):
-        self.weather_service = WeatherService()
+        self.weather_service = weather_service  # Shared instance and cache, not a private copy
         self.traffic_service = None  # Will be initialized as needed
-        self.research_integration = ResearchIntegration()
         
-        # Tokyo key locations with coordinates
-        self.tokyo_zones = {
-            "Ginza": (35.6717, 139.7647),
-            "Shibuya": (35.6598, 139.7006),
-            "Shinjuku": (35.6896, 139.6917),
-            "Tokyo Station": (35.6812, 139.7671),
-            "Roppongi": (35.6627, 139.7372),
-            "Harajuku": (35.6702, 139.7027),
-            "Akihabara": (35.7022, 139.7745),
-            "Ikebukuro": (35.7295, 139.7109),
-            "Ueno": (35.7141, 139.7773),
-            "Asakusa": (35.7148, 139.7967)
-        }
+        # Spatial demand grid of the 23 wards (shared with the research engine)
+        self.grid = tokyo_grid
+        self.hotspot_spacing_km = 0.75  # Minimum distance between recommended positions
+        
+        # Transport options per (origin zone, destination zone, weather version, hour)
+        self.transport_memo = LRUCache("transport_options", maxsize=10000)
         
         # Research-validated demand multipliers
         self.weather_demand_factors = {
@@ -85,163 +82,155 @@ class WeatherIntelligenceEngine:
             0: 0.6, 1: 0.4, 2: 0.3, 3: 0.2, 4: 0.2, 5: 0.3
         }
     
-    async def generate_driver_recommendations(self) -> List[HotspotRecommendation]:
+    async def generate_driver_recommendations(self, current_weather: Optional[WeatherData] = None,
+                                              origin: Optional[Tuple[float, float]] = None) -> List[HotspotRecommendation]:
         """
         Generate intelligent positioning recommendations for taxi drivers
         Based on weather predictions and demand forecasting
+        Pass the current snapshot's weather to avoid fetching it again, and the driver's
+        (lat, lng) origin for exact travel times
         """
         logger.info("🚕 Generating driver positioning recommendations...")
         
         try:
-            async with self.weather_service as weather:
-                current_weather = await weather.get_current_weather()
-                
-                recommendations = []
-                current_hour = datetime.now().hour
-                
-                for location, coords in self.tokyo_zones.items():
-                    # Calculate demand prediction for this location
-                    demand_score = await self._calculate_location_demand(
-                        location, coords, current_weather, current_hour
-                    )
-                    
-                    # Generate recommendation if significant opportunity
-                    if demand_score.expected_increase > 25:  # 25% threshold
-                        recommendation = HotspotRecommendation(
-                            location=location,
-                            coordinates=coords,
-                            expected_demand_increase=demand_score.expected_increase,
-                            confidence=demand_score.confidence,
-                            time_to_position=self._estimate_travel_time(coords),
-                            reasoning=demand_score.reasoning,
-                            weather_trigger=demand_score.weather_trigger,
-                            expected_revenue_boost=demand_score.revenue_boost
-                        )
-                        recommendations.append(recommendation)
-                
-                # Sort by expected revenue boost
-                recommendations.sort(key=lambda x: x.expected_revenue_boost, reverse=True)
-                
-                logger.info(f"Generated {len(recommendations)} positioning recommendations")
-                return recommendations[:5]  # Return top 5
-                
+            if current_weather is None:
+                current_weather = await self.weather_service.get_current_weather()
+            
+            current_hour = datetime.now().hour
+            
+            # Score every grid cell at once
+            demand = self.calculate_cell_demand(current_weather, current_hour)
+            
+            # Significant opportunities only (25% threshold), ranked by expected revenue boost
+            eligible = np.flatnonzero((demand["expected_increase"] > 25) & self.grid.local_maxima(demand["revenue_boost"]))
+            order = eligible[np.argsort(-demand["revenue_boost"][eligible], kind="stable")]
+            top_cells = select_spread(self.grid.lat, self.grid.lng, order, 5, self.hotspot_spacing_km)
+            
+            origin_node = travel_matrix.node_at(*origin) if origin else None
+            confidence = round(current_weather.confidence * 0.9, 2)  # Slight reduction for forecasting uncertainty
+            weather_trigger = f"{current_weather.description} (Intensity: {current_weather.rain_intensity}mm/h)"
+            
+            recommendations = []
+            for cell in top_cells:
+                location = self.grid.names[cell]
+                coords = (round(float(self.grid.lat[cell]), 4), round(float(self.grid.lng[cell]), 4))
+                expected_increase = round(float(demand["expected_increase"][cell]), 1)
+                recommendations.append(HotspotRecommendation(
+                    location=location,
+                    coordinates=coords,
+                    expected_demand_increase=expected_increase,
+                    confidence=confidence,
+                    time_to_position=self._estimate_travel_time(
+                        cell, current_hour, float(demand["rain"][cell]), origin_node
+                    ),
+                    reasoning=self._generate_demand_reasoning(
+                        location, current_weather, float(demand["weather_factor"][cell]), expected_increase,
+                        float(demand["rain"][cell])
+                    ),
+                    weather_trigger=weather_trigger,
+                    expected_revenue_boost=round(float(demand["revenue_boost"][cell]), 2)
+                ))
+            
+            logger.info(f"Generated {len(recommendations)} positioning recommendations")
+            return recommendations
+            
         except Exception as e:
             logger.error(f"Error generating driver recommendations: {e}")
             return []
     
-    async def generate_passenger_advice(self, origin: str, destination: str) -> PassengerAdvice:
+    async def generate_passenger_advice(self, origin: str, destination: str,
+                                        current_weather: Optional[WeatherData] = None,
+                                        weather_version: Optional[str] = None) -> PassengerAdvice:
         """
         Generate intelligent transportation advice for passengers
         Helps decide: taxi now, wait for rain to stop, or use alternatives
+        Pass the weather snapshot's version to reuse transport options across calls
         """
         logger.info(f"👤 Generating passenger advice: {origin} → {destination}")
         
         try:
-            async with self.weather_service as weather:
-                current_weather = await weather.get_current_weather()
-                
-                # Analyze current conditions
-                current_analysis = self._analyze_current_conditions(current_weather)
-                
-                # Forecast next 3 hours
-                weather_timeline = self._generate_weather_timeline(current_weather)
-                
-                # Calculate transportation options
-                transport_options = await self._calculate_transport_options(
-                    origin, destination, current_weather
-                )
-                
-                # Generate recommendation
-                recommendation = self._generate_passenger_recommendation(
-                    current_analysis, weather_timeline, transport_options
-                )
-                
-                return recommendation
-                
+            if current_weather is None:
+                current_weather = await self.weather_service.get_current_weather()
+            
+            # Analyze current conditions
+            current_analysis = self._analyze_current_conditions(current_weather)
+            
+            # Forecast next 3 hours
+            weather_timeline = self._generate_weather_timeline(current_weather)
+            
+            # Calculate transportation options
+            transport_options = await self._calculate_transport_options(
+                origin, destination, current_weather, weather_version
+            )
+            
+            # Generate recommendation
+            recommendation = self._generate_passenger_recommendation(
+                current_analysis, weather_timeline, transport_options
+            )
+            
+            return recommendation
+            
         except Exception as e:
             logger.error(f"Error generating passenger advice: {e}")
             return self._get_fallback_passenger_advice()
     
-    async def _calculate_location_demand(self, location: str, coords: Tuple[float, float], 
-                                       weather: WeatherData, hour: int) -> Any:
-        """Calculate demand prediction for a specific location"""
+    def calculate_cell_demand(self, weather: WeatherData, hour: int) -> Dict[str, Any]:
+        """
+        Demand prediction for every grid cell in one vectorized pass
+        Rain per cell comes from the nowcast raster when a fresh one is available
+        """
         
         # Base demand factors
-        weather_factor = self._get_weather_demand_factor(weather)
+        rain = np.full(len(self.grid), float(weather.precipitation))
+        zone_rain = nowcast_store.zone_rain(self.grid.lat, self.grid.lng)
+        if zone_rain is not None:
+            rain = np.where(np.isnan(zone_rain), rain, zone_rain)
+        weather_factor = self._get_weather_demand_factors(weather, rain)
         time_factor = self.time_demand_patterns.get(hour, 1.0)
-        location_factor = self._get_location_factor(location)
-        
-        # Calculate total demand multiplier
-        total_multiplier = weather_factor * time_factor * location_factor
-        baseline_demand = 100  # Baseline demand index
         
-        predicted_demand = baseline_demand * total_multiplier
-        demand_increase = ((predicted_demand / baseline_demand) - 1) * 100
+        # Total demand multiplier relative to the baseline demand index
+        total_multiplier = weather_factor * time_factor * self.grid.location_factor
+        demand_increase = (total_multiplier - 1) * 100
         
-        # Confidence calculation based on weather certainty
-        confidence = weather.confidence * 0.9  # Slight reduction for forecasting uncertainty
-        
-        # Revenue boost calculation (based on research)
-        revenue_boost = demand_increase * 0.302  # 30.2% research-validated improvement factor
-        
-        # Generate reasoning
-        reasoning = self._generate_demand_reasoning(
-            location, weather, weather_factor, demand_increase
+        return {
+            "weather_factor": weather_factor,
+            "rain": rain,
+            "expected_increase": demand_increase,
+            "revenue_boost": demand_increase * 0.302  # 30.2% research-validated improvement factor
+        }
+    
+    def _get_weather_demand_factors(self, weather: WeatherData, rain: np.ndarray) -> np.ndarray:
+        """
+        Weather demand factor for per-cell precipitation (mm/h): heavy above 8, moderate above 3,
+        light above 0, otherwise partly cloudy (JMA 2xx codes) or clear
+        """
+        dry = self.weather_demand_factors["partly_cloudy" if weather.weather_code.startswith("2") else "clear"]
+        return np.select(
+            [rain > 8, rain > 3, rain > 0],
+            [self.weather_demand_factors["heavy_rain"], self.weather_demand_factors["moderate_rain"],
+             self.weather_demand_factors["light_rain"]],
+            default=dry
         )
-        
-        weather_trigger = f"{weather.description} (Intensity: {weather.rain_intensity}mm/h)"
-        
-        return type('DemandScore', (), {
-            'expected_increase': round(demand_increase, 1),
-            'confidence': round(confidence, 2),
-            'reasoning': reasoning,
-            'weather_trigger': weather_trigger,
-            'revenue_boost': round(revenue_boost, 2)
-        })()
     
-    def _get_weather_demand_factor(self, weather: WeatherData) -> float:
-        """Get demand multiplier based on weather conditions"""
-        if weather.precipitation > 8:
-            return self.weather_demand_factors["heavy_rain"]
-        elif weather.precipitation > 3:
-            return self.weather_demand_factors["moderate_rain"]
-        elif weather.precipitation > 0:
-            return self.weather_demand_factors["light_rain"]
-        elif weather.weather_code.startswith("2"):
-            return self.weather_demand_factors["partly_cloudy"]
+    def _estimate_travel_time(self, cell: int, hour: int, rain_intensity: float,
+                              origin_node: Optional[int] = None) -> int:
+        """Driving minutes to a grid cell from the origin, or from a typical driver position"""
+        if origin_node is None:
+            minutes = travel_matrix.access_time(cell, hour, rain_intensity)
         else:
-            return self.weather_demand_factors["clear"]
-    
-    def _get_location_factor(self, location: str) -> float:
-        """Get location-specific demand multiplier"""
-        location_factors = {
-            "Ginza": 1.3,      # Business district
-            "Shibuya": 1.4,    # High traffic area
-            "Shinjuku": 1.5,   # Major transport hub
-            "Tokyo Station": 1.6,  # Highest traffic
-            "Roppongi": 1.2,   # Entertainment district
-            "Harajuku": 1.1,   # Tourist area
-            "Akihabara": 1.0,  # Electronics district
-            "Ikebukuro": 1.2,  # Shopping area
-            "Ueno": 1.0,       # Cultural area
-            "Asakusa": 0.9     # Traditional area
-        }
-        return location_factors.get(location, 1.0)
-    
-    def _estimate_travel_time(self, coords: Tuple[float, float]) -> int:
-        """Estimate travel time to location (simplified)"""
-        # Simplified distance-based calculation
-        # In real implementation, would use traffic service
-        base_time = 15  # Base 15 minutes in Tokyo traffic
-        return base_time + abs(hash(str(coords)) % 10)  # Add 0-10 minutes variation
+            minutes = travel_matrix.travel_minutes(origin_node, cell, hour, rain_intensity)
+        return int(round(minutes))
     
     def _generate_demand_reasoning(self, location: str, weather: WeatherData, 
-                                 weather_factor: float, demand_increase: float) -> str:
-        """Generate human-readable reasoning for demand prediction"""
+                                 weather_factor: float, demand_increase: float,
+                                 rain: Optional[float] = None) -> str:
+        """Generate human-readable reasoning for demand prediction (rain: mm/h at the location, if known)"""
         reasons = []
+        precipitation = weather.precipitation if rain is None else rain
+        is_raining = weather.is_raining if rain is None else rain > 0
         
-        if weather.is_raining:
-            intensity = "light" if weather.precipitation < 3 else "moderate" if weather.precipitation < 8 else "heavy"
+        if is_raining:
+            intensity = "light" if precipitation < 3 else "moderate" if precipitation < 8 else "heavy"
             reasons.append(f"{intensity} rain increasing taxi demand by {weather_factor:.1f}x")
         
         if location in ["Tokyo Station", "Shinjuku", "Shibuya"]:
@@ -270,49 +259,90 @@ class WeatherIntelligenceEngine:
     
     def _generate_weather_timeline(self, weather: WeatherData) -> Dict[str, Any]:
         """Generate 3-hour weather timeline for decision making"""
-        forecast = weather.forecast_3h
-        
         timeline = {
             "current": {
                 "condition": weather.description,
                 "rain": weather.is_raining,
                 "intensity": weather.rain_intensity
-            },
-            "1_hour": {
-                "rain_probability": forecast.get("rain_probability", 30),
-                "condition": forecast.get("conditions", "partly_cloudy")
-            },
-            "3_hour": {
-                "rain_probability": max(0, forecast.get("rain_probability", 30) - 15),
-                "condition": "improving"
             }
         }
         
+        # Read from the parsed JMA arrays, so the timeline is the same for every request on a snapshot
+        next_hour = self.weather_service.forecast_at(weather, 1, window_hours=1)
+        later = self.weather_service.forecast_at(weather, 3, window_hours=2)
+        if next_hour is not None and later is not None:
+            trend = later["rain_probability"] - next_hour["rain_probability"]
+            timeline["1_hour"] = {
+                "rain_probability": next_hour["rain_probability"],
+                "condition": next_hour["conditions"]
+            }
+            timeline["3_hour"] = {
+                "rain_probability": later["rain_probability"],
+                "condition": "improving" if trend < 0 else "worsening" if trend > 0 else "steady"
+            }
+            return timeline
+        
+        # Fallback data carries no forecast arrays
+        forecast = weather.forecast_3h
+        timeline["1_hour"] = {
+            "rain_probability": forecast.get("rain_probability", 30),
+            "condition": forecast.get("conditions", "partly_cloudy")
+        }
+        timeline["3_hour"] = {
+            "rain_probability": max(0, forecast.get("rain_probability", 30) - 15),
+            "condition": "improving"
+        }
+        
         return timeline
     
     async def _calculate_transport_options(self, origin: str, destination: str, 
-                                         weather: WeatherData) -> Dict[str, Dict[str, Any]]:
-        """Calculate cost and time for different transport options"""
+                                         weather: WeatherData,
+                                         weather_version: Optional[str] = None) -> Dict[str, Dict[str, Any]]:
+        """
+        Calculate cost and time for different transport options
+        Memoized per (origin zone, destination zone, weather version, hour) when the version is known
+        """
+        origin_node = travel_matrix.resolve(origin)
+        destination_node = travel_matrix.resolve(destination)
+        hour = datetime.now().hour
+        if weather_version is None:
+            return self._compute_transport_options(origin_node, destination_node, weather, hour)
+        
+        return self.transport_memo.get_or_compute(
+            (origin_node, destination_node, weather_version, hour),
+            lambda: self._compute_transport_options(origin_node, destination_node, weather, hour)
+        )
+    
+    def _compute_transport_options(self, origin_node: Optional[int], destination_node: Optional[int],
+                                   weather: WeatherData, hour: int) -> Dict[str, Dict[str, Any]]:
+        """Transport options between two travel matrix nodes (None when a place is unknown)"""
         
-        # Simplified calculations - real implementation would use maps APIs
-        base_distance = 5  # km average
+        # Road distance and driving time from the travel matrix when both places are known
+        if origin_node is not None and destination_node is not None:
+            base_distance = round(travel_matrix.road_distance(origin_node, destination_node), 1)
+            taxi_time = int(round(travel_matrix.travel_minutes(
+                origin_node, destination_node, hour, weather.rain_intensity
+            )))
+        else:
+            base_distance = 5  # km average
+            taxi_time = base_distance * 3 + (5 if weather.is_raining else 0)  # 3min/km + rain delay
         
         options = {
             "taxi": {
-                "cost": base_distance * 400 + (200 if weather.is_raining else 0),  # ¥400/km + rain surcharge
-                "time": base_distance * 3 + (5 if weather.is_raining else 0),  # 3min/km + rain delay
+                "cost": int(base_distance * 400) + (200 if weather.is_raining else 0),  # ¥400/km + rain surcharge
+                "time": taxi_time,
                 "comfort": "high",
                 "weather_protection": "full"
             },
             "train": {
                 "cost": 200,  # Fixed train cost
-                "time": base_distance * 2 + (10 if weather.is_raining else 0),  # Faster but walking time
+                "time": int(base_distance * 2) + (10 if weather.is_raining else 0),  # Faster but walking time
                 "comfort": "medium",
                 "weather_protection": "partial"
             },
             "walking": {
                 "cost": 0,
-                "time": base_distance * 12,  # 12min/km walking
+                "time": int(base_distance * 12),  # 12min/km walking
                 "comfort": "low" if weather.is_raining else "medium",
                 "weather_protection": "none"
             }
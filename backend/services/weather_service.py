@@ -8,9 +8,14 @@ import asyncio
 import logging
 from datetime import datetime, timedelta
 from typing import Dict, List, Optional, Any
-from dataclasses import dataclass
+from dataclasses import dataclass, asdict
 import json
 
+from .http_client import create_http_session
+from .cache import get_shared_cache, CacheEntry
+from .circuit_breaker import CircuitBreaker
+from .weather_forecast import JMAForecast, parse_jma_forecast
+
 logger = logging.getLogger(__name__)
 
 @dataclass
@@ -29,6 +34,24 @@ class WeatherData:
     timestamp: datetime
     forecast_3h: Dict[str, Any]
     confidence: float
+    forecast: Optional[JMAForecast] = None  # Parsed JMA time series (None for fallback data)
+    
+    def to_dict(self) -> Dict[str, Any]:
+        """JSON-compatible representation for the shared cache"""
+        data = asdict(self)
+        data["timestamp"] = self.timestamp.isoformat()
+        data["forecast"] = self.forecast.to_dict() if self.forecast is not None else None
+        return data
+    
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "WeatherData":
+        """Rebuild from to_dict() output"""
+        forecast = data.get("forecast")
+        return cls(**{
+            **data,
+            "timestamp": datetime.fromisoformat(data["timestamp"]),
+            "forecast": JMAForecast.from_dict(forecast) if forecast else None
+        })
 
 class WeatherService:
     """
@@ -40,8 +63,22 @@ class WeatherService:
         self.config = config or self._get_default_config()
         self.base_url = "https://www.jma.go.jp/bosai/forecast/data"
         self.session = None
-        self.cache = {}
-        self.cache_duration = 300  # 5 minutes
+        self._owns_session = False
+        self.cache_duration = self.config.get("cache_duration", 300)  # 5 minutes
+        # Shared by every WeatherService instance in the process and, via L2, across workers/pods
+        self.cache = get_shared_cache(
+            "weather",
+            soft_ttl=self.cache_duration,
+            hard_ttl=self.config.get("cache_max_stale", 900),  # Never serve data older than 15 minutes
+            serialize=lambda data: data.to_dict(),
+            deserialize=WeatherData.from_dict
+        )
+        # Fail fast while JMA is down instead of retrying on every refresh
+        self.breaker = CircuitBreaker("jma", {
+            "failure_threshold": self.config.get("circuit_failure_threshold", 3),
+            "reset_timeout": self.config.get("circuit_reset_timeout", 60)
+        })
+        self._fallback_entry: Optional[CacheEntry] = None
         
     def _get_default_config(self) -> Dict[str, Any]:
         """Default configuration for weather service"""
@@ -50,59 +87,95 @@ class WeatherService:
             "retry_attempts": 3,
             "retry_delay": 1,
             "cache_duration": 300,
-            "tokyo_area_code": "130000"  # Tokyo area code for JMA
+            "cache_max_stale": 900,
+            "circuit_failure_threshold": 3,  # Failed fetches (each with retries) before the circuit opens
+            "circuit_reset_timeout": 60,     # Seconds before a trial fetch
+            "fallback_ttl": 30,              # Seconds a fallback result is reused (negative caching)
+            "tokyo_area_code": "130000",  # Tokyo area code for JMA
+            "forecast_area": "130010",     # 東京地方: weather codes and rain probabilities
+            "temperature_point": "44132"   # 東京 observation point: forecast temperatures
         }
     
+    def attach_session(self, session: aiohttp.ClientSession):
+        """Use a shared, pooled session owned by the application lifespan"""
+        self.session = session
+        self._owns_session = False
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Return the shared session, creating a private pooled one if none was attached"""
+        if self.session is None or self.session.closed:
+            self.session = create_http_session({"timeout": self.config["timeout"]})
+            self._owns_session = True
+        return self.session
+    
+    async def close(self):
+        """Close the session if this service created it"""
+        if self._owns_session and self.session and not self.session.closed:
+            await self.session.close()
+        self.session = None
+        self._owns_session = False
+    
     async def __aenter__(self):
-        """Async context manager entry"""
-        self.session = aiohttp.ClientSession(
-            timeout=aiohttp.ClientTimeout(total=self.config["timeout"])
-        )
+        """Async context manager entry (no-op, the session is long-lived)"""
         return self
     
     async def __aexit__(self, exc_type, exc_val, exc_tb):
-        """Async context manager exit"""
-        if self.session:
-            await self.session.close()
+        """Async context manager exit (no-op, the session is closed at shutdown)"""
+        pass
     
     async def get_current_weather(self) -> WeatherData:
         """
         Get current weather data for Tokyo
         Returns structured weather data for taxi optimization
         """
-        cache_key = "current_weather"
-        
-        # Check cache first
-        if self._is_cache_valid(cache_key):
-            logger.info("Returning cached weather data")
-            return self.cache[cache_key]["data"]
+        entry = await self.get_current_weather_entry()
+        return entry.data
+    
+    async def get_current_weather_entry(self) -> CacheEntry:
+        """
+        Get current weather together with its cache metadata (fetch time and age)
+        Stale data is served immediately while a background task refreshes it
+        """
+        fallback = self._fallback_entry
+        if (fallback is not None and fallback.age_seconds() < self.config["fallback_ttl"]
+                and self.cache.get_entry("current_weather") is None):
+            return fallback
         
         try:
-            # Get weather data from JMA API
-            weather_data = await self._fetch_jma_weather()
-            
-            # Parse and structure the data
-            structured_data = self._parse_weather_data(weather_data)
-            
-            # Cache the result
-            self._cache_data(cache_key, structured_data)
-            
-            logger.info(f"Retrieved fresh weather data: {structured_data.temperature}°C, Rain: {structured_data.is_raining}")
-            return structured_data
-            
+            return await self.cache.get_or_fetch("current_weather", self._fetch_current_weather)
         except Exception as e:
             logger.error(f"Failed to fetch weather data: {e}")
-            # Return fallback data if API fails
-            return self._get_fallback_weather()
+            # Return fallback data if API fails, reused briefly so the next request does not retry
+            self._fallback_entry = CacheEntry(data=self.get_fallback_weather(), stored_at=datetime.now())
+            return self._fallback_entry
+    
+    async def refresh_current_weather(self) -> CacheEntry:
+        """
+        Refresh current weather off the request path (used by the ingestion scheduler)
+        Adopts a fresh shared-cache entry if another worker already fetched; raises on failure
+        """
+        return await self.cache.refresh("current_weather", self._fetch_current_weather)
+    
+    async def _fetch_current_weather(self) -> WeatherData:
+        """Fetch and parse current weather from JMA"""
+        # Get weather data from JMA API (rejected immediately while the circuit is open)
+        weather_data = await self.breaker.call(self._fetch_jma_weather)
+        
+        # Parse and structure the data
+        structured_data = self._parse_weather_data(weather_data)
+        
+        logger.info(f"Retrieved fresh weather data: {structured_data.temperature}°C, Rain: {structured_data.is_raining}")
+        return structured_data
     
     async def _fetch_jma_weather(self) -> Dict[str, Any]:
         """Fetch weather data from JMA API"""
         tokyo_code = self.config["tokyo_area_code"]
         url = f"{self.base_url}/forecast/{tokyo_code}.json"
+        session = await self._get_session()
         
         for attempt in range(self.config["retry_attempts"]):
             try:
-                async with self.session.get(url) as response:
+                async with session.get(url) as response:
                     if response.status == 200:
                         data = await response.json()
                         return data
@@ -119,34 +192,31 @@ class WeatherService:
         raise Exception("Failed to fetch weather data after all retry attempts")
     
     def _parse_weather_data(self, jma_data: Dict[str, Any]) -> WeatherData:
-        """Parse JMA weather data into structured format"""
+        """Parse the full JMA forecast once and read current conditions from its arrays"""
         try:
-            # Extract current conditions from JMA data structure
-            time_series = jma_data[0]["timeSeries"][0]
-            current_area = time_series["areas"][0]
+            forecast = parse_jma_forecast(jma_data)
+            now = datetime.now()
             
-            # Get weather codes and conditions
-            weather_codes = current_area.get("weatherCodes", ["200"])
-            current_weather_code = weather_codes[0] if weather_codes else "200"
+            # Weather code in force now for the Tokyo area
+            current_weather_code = forecast.weather_code_at(now, self.config["forecast_area"]) or "200"
             
             # Determine precipitation and rain status
-            precipitation = self._extract_precipitation(jma_data)
+            precipitation = self._extract_precipitation(current_weather_code)
             is_raining = precipitation > 0
             
             # Map weather code to conditions
             weather_info = self._get_weather_info(current_weather_code)
             
-            # Generate realistic values based on weather conditions
-            temperature = self._estimate_temperature(weather_info, is_raining)
+            # Forecast temperature where JMA gives one; the rest is derived from the conditions
+            temperature = forecast.temperature_at(now, self.config["temperature_point"])
+            if temperature is None:
+                temperature = self._estimate_temperature(weather_info, is_raining)
             humidity = self._estimate_humidity(is_raining)
             wind_speed = self._estimate_wind_speed(weather_info)
             visibility = self._estimate_visibility(is_raining, precipitation)
             pressure = self._estimate_pressure()
             
-            # Get 3-hour forecast
-            forecast_3h = self._get_3h_forecast(jma_data)
-            
-            return WeatherData(
+            weather = WeatherData(
                 temperature=round(temperature, 1),
                 humidity=round(humidity, 1),
                 precipitation=round(precipitation, 1),
@@ -157,48 +227,43 @@ class WeatherService:
                 rain_intensity=round(precipitation, 1),
                 weather_code=current_weather_code,
                 description=weather_info["description"],
-                timestamp=datetime.now(),
-                forecast_3h=forecast_3h,
-                confidence=0.87  # JMA forecast confidence
+                timestamp=now,
+                forecast_3h={},
+                confidence=0.87,  # JMA forecast confidence
+                forecast=forecast
             )
             
+            # Get 3-hour forecast
+            weather.forecast_3h = self._get_3h_forecast(weather)
+            return weather
+            
         except Exception as e:
             logger.error(f"Error parsing weather data: {e}")
-            return self._get_fallback_weather()
+            return self.get_fallback_weather()
     
-    def _extract_precipitation(self, jma_data: Dict[str, Any]) -> float:
-        """Extract precipitation data from JMA response"""
-        try:
-            # Look for precipitation in weather data
-            # This is a simplified extraction - real implementation would parse actual precipitation values
-            weather_codes = jma_data[0]["timeSeries"][0]["areas"][0].get("weatherCodes", [])
-            
-            if weather_codes:
-                code = weather_codes[0]
-                # Rain codes in JMA system (simplified mapping)
-                if code in ["300", "301", "302", "303", "304"]:  # Light rain codes
-                    return 1.5
-                elif code in ["310", "311", "312", "313", "314"]:  # Moderate rain codes
-                    return 4.0
-                elif code in ["320", "321", "322", "323", "324"]:  # Heavy rain codes
-                    return 8.5
-            
-            return 0.0
-            
-        except Exception:
-            return 0.0
+    def _extract_precipitation(self, weather_code: str) -> float:
+        """Rain intensity (mm/h) implied by a JMA weather code"""
+        # Rain codes in JMA system (simplified mapping)
+        if weather_code in ["300", "301", "302", "303", "304"]:  # Light rain codes
+            return 1.5
+        elif weather_code in ["310", "311", "312", "313", "314"]:  # Moderate rain codes
+            return 4.0
+        elif weather_code in ["320", "321", "322", "323", "324"]:  # Heavy rain codes
+            return 8.5
+        return 0.0
     
     def _get_weather_info(self, weather_code: str) -> Dict[str, str]:
-        """Map weather codes to descriptions"""
+        """Map weather codes to descriptions (by JMA code family: 1xx clear, 2xx cloudy, ...)"""
         weather_map = {
-            "100": {"description": "Clear", "type": "clear"},
-            "200": {"description": "Partly Cloudy", "type": "partly_cloudy"},
-            "300": {"description": "Light Rain", "type": "light_rain"},
-            "400": {"description": "Heavy Rain", "type": "heavy_rain"},
-            "500": {"description": "Snow", "type": "snow"}
+            "1": {"description": "Clear", "type": "clear"},
+            "2": {"description": "Partly Cloudy", "type": "partly_cloudy"},
+            "3": {"description": "Light Rain", "type": "light_rain"},
+            "4": {"description": "Snow", "type": "snow"}
         }
+        if weather_code in ("308", "309", "320", "321", "322", "323", "324"):
+            return {"description": "Heavy Rain", "type": "heavy_rain"}
         
-        return weather_map.get(weather_code, {"description": "Unknown", "type": "unknown"})
+        return weather_map.get(weather_code[:1], {"description": "Unknown", "type": "unknown"})
     
     def _estimate_temperature(self, weather_info: Dict[str, str], is_raining: bool) -> float:
         """Estimate temperature based on weather conditions"""
@@ -209,10 +274,7 @@ class WeatherService:
         if weather_info["type"] == "clear":
             base_temp += 2.0
         
-        # Add some realistic variation
-        import random
-        variation = random.uniform(-4, 4)
-        return max(5, min(35, base_temp + variation))
+        return base_temp
     
     def _estimate_humidity(self, is_raining: bool) -> float:
         """Estimate humidity based on conditions"""
@@ -227,8 +289,7 @@ class WeatherService:
         if weather_info["type"] in ["heavy_rain", "snow"]:
             base_wind += 5.0
         
-        import random
-        return base_wind + random.uniform(-2, 8)
+        return base_wind
     
     def _estimate_visibility(self, is_raining: bool, precipitation: float) -> float:
         """Estimate visibility based on weather"""
@@ -241,30 +302,46 @@ class WeatherService:
             return max(1.0, base_visibility - visibility_reduction)
     
     def _estimate_pressure(self) -> float:
-        """Estimate atmospheric pressure"""
-        import random
-        return 1013.0 + random.uniform(-10, 10)
+        """Standard sea-level pressure (JMA forecasts do not include pressure)"""
+        return 1013.0
     
-    def _get_3h_forecast(self, jma_data: Dict[str, Any]) -> Dict[str, Any]:
-        """Extract 3-hour forecast from JMA data"""
-        try:
-            # Simplified forecast extraction
-            import random
-            return {
-                "rain_probability": random.randint(10, 80),
-                "temperature": self._estimate_temperature({"type": "partly_cloudy"}, False),
-                "conditions": "partly_cloudy",
-                "confidence": 0.85
-            }
-        except Exception:
-            return {
-                "rain_probability": 25,
-                "temperature": 22.0,
-                "conditions": "unknown",
-                "confidence": 0.70
-            }
+    def forecast_at(self, weather: WeatherData, hours_ahead: float,
+                    window_hours: float = 0.0) -> Optional[Dict[str, Any]]:
+        """
+        Conditions hours_ahead of the data's timestamp, read from the parsed forecast arrays
+        rain_probability is the highest over the preceding window_hours; None for fallback data
+        """
+        forecast = weather.forecast
+        if forecast is None:
+            return None
+        
+        when = weather.timestamp + timedelta(hours=hours_ahead)
+        area = self.config["forecast_area"]
+        weather_code = forecast.weather_code_at(when, area)
+        weather_info = self._get_weather_info(weather_code) if weather_code else {"description": "Unknown", "type": "unknown"}
+        temperature = forecast.temperature_at(when, self.config["temperature_point"])
+        rain_probability = forecast.max_pop(when - timedelta(hours=window_hours), when, area)
+        
+        return {
+            "weather_code": weather_code,
+            "conditions": weather_info["type"],
+            "description": weather_info["description"],
+            "temperature": round(temperature, 1) if temperature is not None else weather.temperature,
+            "rain_probability": rain_probability if rain_probability is not None else 30,
+            "precipitation": self._extract_precipitation(weather_code) if weather_code else 0.0
+        }
+    
+    def _get_3h_forecast(self, weather: WeatherData) -> Dict[str, Any]:
+        """3-hour outlook: conditions in 3 hours and the highest rain probability until then"""
+        outlook = self.forecast_at(weather, 3, window_hours=3)
+        return {
+            "rain_probability": outlook["rain_probability"],
+            "temperature": outlook["temperature"],
+            "conditions": outlook["conditions"],
+            "confidence": 0.85
+        }
     
-    def _get_fallback_weather(self) -> WeatherData:
+    def get_fallback_weather(self) -> WeatherData:
         """Return fallback weather data when API fails"""
         logger.warning("Using fallback weather data")
         
@@ -288,29 +365,16 @@ class WeatherService:
             confidence=0.60  # Lower confidence for fallback data
         )
     
-    def _is_cache_valid(self, cache_key: str) -> bool:
-        """Check if cached data is still valid"""
-        if cache_key not in self.cache:
-            return False
-        
-        cache_entry = self.cache[cache_key]
-        age = (datetime.now() - cache_entry["timestamp"]).total_seconds()
-        return age < self.cache_duration
-    
-    def _cache_data(self, cache_key: str, data: WeatherData):
-        """Cache weather data"""
-        self.cache[cache_key] = {
-            "data": data,
-            "timestamp": datetime.now()
-        }
-    
     async def get_weather_for_optimization(self) -> Dict[str, Any]:
         """
         Get weather data formatted for taxi optimization algorithms
         Returns data compatible with research integration module
         """
-        weather_data = await self.get_current_weather()
-        
+        entry = await self.get_current_weather_entry()
+        return self.format_for_optimization(entry.data, entry.age_seconds())
+    
+    def format_for_optimization(self, weather_data: WeatherData, data_age_seconds: float) -> Dict[str, Any]:
+        """Format weather data for the optimization algorithms (no I/O)"""
         return {
             "temperature": weather_data.temperature,
             "humidity": weather_data.humidity,
@@ -323,7 +387,8 @@ class WeatherService:
             "confidence": weather_data.confidence,
             "timestamp": weather_data.timestamp.isoformat(),
             "source": "JMA",
-            "description": weather_data.description
+            "description": weather_data.description,
+            "data_age_seconds": round(data_age_seconds, 1)
         }
 
 # Global instance for use across the application
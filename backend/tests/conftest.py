@@ -0,0 +1,123 @@
+"""
+Shared test setup: services run offline, without a shared cache, history, nowcast or trained model
+from the environment, and build their data files in a temporary directory
+"""
+
+import csv
+import os
+import tempfile
+from datetime import date, datetime, timedelta
+
+import numpy as np
+import pytest
+
+for name in ("REDIS_URL", "CACHE_DIR", "HISTORY_DIR", "HISTORY_DATABASE_URL", "DATABASE_URL",
+             "NOWCAST_SOURCE", "NOWCAST_SOURCE_FILE", "GRID_CELL_SIZE_M", "SIMULATION_SEED"):
+    os.environ.pop(name, None)
+
+_data_dir = tempfile.mkdtemp(prefix="taxi-tests-")
+os.environ["DEMAND_MODEL_PATH"] = os.path.join(_data_dir, "demand_model.npz")
+os.environ["NOWCAST_DIR"] = os.path.join(_data_dir, "nowcast")
+os.environ["TRAVEL_MATRIX_DIR"] = os.path.join(_data_dir, "travel_matrix")
+
+# Imported after the environment is set: services read it when their modules load
+from services import ingestion  # noqa: E402
+from services.cache import CacheEntry  # noqa: E402
+from services.demand_model import demand_model, DemandModel, feature_vector, observation_statistics  # noqa: E402
+from services.history import ColumnarHistoryBackend, HistoryRecord  # noqa: E402
+from services.ingestion import SnapshotStore, IngestionScheduler  # noqa: E402
+from services.weather_service import weather_service  # noqa: E402
+from services.traffic_service import traffic_service  # noqa: E402
+from services.spatial_grid import tokyo_grid  # noqa: E402
+
+RECORDED_DAYS = (date(2026, 10, 1), date(2026, 10, 2))
+
+
+@pytest.fixture
+def snapshots(monkeypatch):
+    """
+    A fresh snapshot store and scheduler in place of the global ones, with the offline fallback
+    weather and traffic published as current snapshots
+    """
+    store = SnapshotStore()
+    scheduler = IngestionScheduler(store)
+
+    async def unavailable():
+        raise RuntimeError("upstream disabled in tests")
+
+    scheduler.add_source("weather", 300, unavailable, weather_service.get_fallback_weather, max_stale=900)
+    scheduler.add_source("traffic", 60, unavailable, traffic_service.get_fallback_traffic_data, max_stale=180)
+    monkeypatch.setattr(ingestion, "snapshot_store", store)
+    monkeypatch.setattr(ingestion, "ingestion_scheduler", scheduler)
+
+    store.publish("weather", CacheEntry(data=weather_service.get_fallback_weather(), stored_at=datetime.now()))
+    store.publish("traffic", CacheEntry(data=traffic_service.get_fallback_traffic_data(), stored_at=datetime.now()))
+    return store
+
+
+def raining(day: date, hour: int) -> bool:
+    """Rain in the recorded history: the afternoon of the second day"""
+    return day == RECORDED_DAYS[1] and 12 <= hour < 20
+
+
+@pytest.fixture
+def recorded_days(tmp_path):
+    """
+    Hourly weather/traffic snapshots in a columnar history and a trips file for each of RECORDED_DAYS;
+    trips fall on cells in proportion to base revenue, twice as many of them in the rain
+    Returns (history directory, trips directory)
+    """
+    history = ColumnarHistoryBackend(str(tmp_path / "history"))
+    trips_dir = tmp_path / "trips"
+    trips_dir.mkdir()
+    weather = weather_service.get_fallback_weather().to_dict()
+    traffic = traffic_service.get_fallback_traffic_data().to_dict()
+    rng = np.random.default_rng(7)
+    share = tokyo_grid.base_revenue / tokyo_grid.base_revenue.sum()
+
+    for day in RECORDED_DAYS:
+        records, rows = [], []
+        for hour in range(24):
+            when = datetime.combine(day, datetime.min.time()) + timedelta(hours=hour)
+            rain = 6.0 if raining(day, hour) else 0.0
+            records.append(HistoryRecord("weather", when, f"w{hour}", {
+                **weather, "timestamp": when.isoformat(), "precipitation": rain, "rain_intensity": rain,
+                "is_raining": rain > 0, "forecast": None}))
+            records.append(HistoryRecord("traffic", when, f"t{hour}", {**traffic, "last_updated": when.isoformat()}))
+            for cell in rng.choice(len(tokyo_grid), size=80 if rain else 40, p=share):
+                pickup = when + timedelta(seconds=float(rng.uniform(0, 3600)))
+                rows.append((pickup.isoformat(), tokyo_grid.lat[cell], tokyo_grid.lng[cell], 1500))
+        history.write_batch(records)
+        with open(trips_dir / f"{day.isoformat()}.csv", "w", newline="") as f:
+            writer = csv.writer(f)
+            writer.writerow(["pickup_at", "latitude", "longitude", "fare"])
+            writer.writerows(rows)
+    history.close()
+    return str(tmp_path / "history"), str(trips_dir)
+
+
+@pytest.fixture
+def trained_demand_model(monkeypatch, tmp_path):
+    """
+    Factory that saves a demand model where heavy rain doubles every zone's revenue, at the path the
+    global model reads; the global model is back to untrained after the test
+    """
+    monkeypatch.setattr(demand_model, "config", {**demand_model.config, "path": str(tmp_path / "demand_model.npz")})
+    for name in ("xtx", "xty", "feature_sum", "count", "coef", "trained_until", "_loaded_mtime"):
+        monkeypatch.setattr(demand_model, name, getattr(demand_model, name))
+
+    def save(trained_until: str = "2026-09-30", hours: int = 96) -> DemandModel:
+        start = datetime(2026, 9, 1)
+        X, revenue = [], []
+        for hour in range(hours):
+            rain = 8.0 if hour % 3 == 0 else 0.0
+            X.append(feature_vector({"is_raining": rain > 0, "rain_intensity": rain, "temperature": 20},
+                                    {"disruptions": []}, start + timedelta(hours=hour)))
+            revenue.append(tokyo_grid.base_revenue * (2.0 if rain else 1.0))
+        model = DemandModel(dict(demand_model.config))
+        model.add_statistics(*observation_statistics(np.array(X), np.array(revenue)))
+        model.trained_until = trained_until
+        model.save()
+        return model
+
+    return save
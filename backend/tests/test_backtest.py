@@ -0,0 +1,135 @@
+import json
+import logging
+import warnings
+
+import pytest
+
+from services import backtest
+from services.backtest import load_trips, run_backtest, summarize, learned_model_info
+
+from conftest import RECORDED_DAYS, raining
+
+START, END = RECORDED_DAYS
+
+
+def test_load_trips_missing_file_is_empty(tmp_path):
+    arrays = load_trips(str(tmp_path / "2026-10-01.csv"))
+    assert [len(a) for a in arrays] == [0, 0, 0, 0]
+
+
+def test_replay_scores_every_hour_with_trips(recorded_days):
+    history, trips = recorded_days
+    report = run_backtest(history, trips, START, END, workers=1)
+
+    assert report["config"]["models"] == ["research", "weather_intelligence", "static"]
+    assert report["learned_model"] is None
+    assert report["period"] == {"start": "2026-10-01", "end": "2026-10-02", "days": 2}
+    assert [day["day"] for day in report["days"]] == ["2026-10-01", "2026-10-02"]
+    # The next midnight's snapshot is read too; the second day also looks back into the first
+    assert report["days"][0]["snapshots"] == {"weather": 25, "traffic": 25}
+    assert report["days"][1]["snapshots"] == {"weather": 27, "traffic": 27}
+    assert report["days"][0]["trips"] == 24 * 40
+    assert report["days"][1]["trips"] == 24 * 40 + 8 * 40
+
+    summary = report["summary"]
+    assert summary["steps"] == 48
+    assert summary["trips"] == 24 * 40 * 2 + 8 * 40
+    assert summary["level_model"] == "research"
+    assert list(summary["models"]) == ["research", "weather_intelligence", "static"]
+    assert "revenue_lift_vs_static" not in summary["models"]["static"]
+    for model, metrics in summary["models"].items():
+        assert 0 <= metrics["revenue_share"] <= 1
+        assert 0 <= metrics["top_cell_hit_rate"] <= 1
+        assert metrics["revenue_share_rain"] is not None
+    # Trips follow base revenue, so the static ranking correlates with them
+    assert summary["models"]["static"]["rank_correlation"] > 0
+
+
+def test_replay_sees_recorded_rain(recorded_days):
+    history, trips = recorded_days
+    replay = backtest.DayReplay(history, trips, {**backtest._get_default_config(), "models": ["research", "static"]})
+    day = replay.run(END)
+
+    assert [step["is_raining"] for step in day["steps"]] == [raining(END, hour) for hour in range(24)]
+    level = {step["time"][11:13]: step["predicted_level"] for step in day["steps"]}
+    assert level["12"] > level["11"]  # Research multipliers raise demand in heavy rain
+
+
+def step(trips=4, predicted_level=1.0):
+    return {"time": "2026-10-01T00:00:00", "trips": trips, "revenue": 1500.0 * trips, "is_raining": False,
+            "predicted_level": predicted_level,
+            "models": {"research": {"rank_correlation": None, "top_cell_hit_rate": 0.5, "revenue_share": 0.6},
+                       "static": {"rank_correlation": 0.2, "top_cell_hit_rate": 0.25, "revenue_share": 0.3}}}
+
+
+def test_single_step_summary():
+    summary = summarize([{"steps": [step()]}])
+
+    assert summary["models"]["research"]["rank_correlation"] is None
+    assert summary["models"]["research"]["revenue_lift_vs_static"] == 2.0
+    assert summary["models"]["research"]["revenue_share_rain"] is None
+    assert "level_correlation" not in summary
+    assert summarize([{"steps": []}]) == {"steps": 0}
+
+
+def test_level_correlation_is_none_for_constant_trip_counts():
+    steps = [step(trips=5, predicted_level=level) for level in (1.0, 1.2, 0.9, 1.5)]
+    with warnings.catch_warnings():
+        warnings.simplefilter("error")
+        summary = summarize([{"steps": steps}])
+    assert summary["level_correlation"] is None
+    json.dumps(summary, allow_nan=False)  # Strict JSON: no bare NaN in the report
+
+    steps[0]["trips"] = 9
+    assert summarize([{"steps": steps}])["level_correlation"] is not None
+
+
+def test_unknown_model_is_rejected(recorded_days):
+    with pytest.raises(ValueError, match="Unknown models: nope"):
+        run_backtest(*recorded_days, START, END, workers=1, config={"models": ["research", "nope"]})
+
+
+def test_learned_model_requires_an_artifact(recorded_days):
+    with pytest.raises(ValueError, match="No trained demand model"):
+        run_backtest(*recorded_days, START, END, workers=1, config={"models": ["learned"]})
+
+
+def test_learned_model_overlap_is_reported(trained_demand_model, caplog):
+    trained_demand_model(trained_until="2026-10-01")
+    with caplog.at_level(logging.WARNING, logger="services.backtest"):
+        info = learned_model_info(START, END)
+    assert info["overlaps_replay"] is True
+    assert info["trained_until"] == "2026-10-01"
+    assert "overlaps the replay period" in caplog.text
+
+    trained_demand_model(trained_until="2026-09-30")
+    assert learned_model_info(START, END)["overlaps_replay"] is False
+
+
+def test_learned_model_is_scored_before_static(recorded_days, trained_demand_model):
+    trained_demand_model()
+    report = run_backtest(*recorded_days, START, START, workers=1, config={"models": ["static", "learned"]})
+
+    assert report["config"]["models"] == ["learned", "static"]
+    assert report["learned_model"]["overlaps_replay"] is False
+    assert report["summary"]["level_model"] == "learned"
+    assert report["summary"]["models"]["learned"]["revenue_lift_vs_static"] is not None
+
+
+def test_main_writes_report(recorded_days, tmp_path, capsys):
+    history, trips = recorded_days
+    output = tmp_path / "report.json"
+    backtest.main(["--history", history, "--trips", trips, "--start", "2026-10-01", "--end", "2026-10-01",
+                   "--workers", "1", "--model", "research", "--output", str(output)])
+
+    printed = json.loads(capsys.readouterr().out)
+    assert "days" not in printed
+    assert printed["config"]["models"] == ["research", "static"]
+    assert len(json.loads(output.read_text())["days"]) == 1
+
+
+def test_main_reports_errors_as_usage(recorded_days):
+    history, trips = recorded_days
+    with pytest.raises(SystemExit):
+        backtest.main(["--history", history, "--trips", trips, "--start", "2026-10-01", "--end", "2026-10-01",
+                       "--model", "learned"])
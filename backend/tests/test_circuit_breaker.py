@@ -0,0 +1,135 @@
+import asyncio
+
+import pytest
+
+from services.cache import StaleWhileRevalidateCache
+from services.circuit_breaker import CircuitBreaker, CircuitOpenError, CLOSED, OPEN, HALF_OPEN
+from services.weather_service import WeatherService
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+        self.failing = True
+
+    async def __call__(self):
+        self.calls += 1
+        if self.failing:
+            raise ConnectionError("upstream down")
+        return "ok"
+
+
+@pytest.fixture
+def breaker():
+    return CircuitBreaker("jma", {"failure_threshold": 3, "reset_timeout": 60})
+
+
+def expire(breaker):
+    breaker.opened_at -= breaker.config["reset_timeout"]
+
+
+async def open_circuit(breaker, upstream):
+    for _ in range(breaker.config["failure_threshold"]):
+        with pytest.raises(ConnectionError):
+            await breaker.call(upstream)
+
+
+async def test_opens_after_consecutive_failures(breaker):
+    upstream = Upstream()
+    await open_circuit(breaker, upstream)
+    assert breaker.state == OPEN
+
+    with pytest.raises(CircuitOpenError) as error:
+        await breaker.call(upstream)
+    assert upstream.calls == 3
+    assert 0 < error.value.retry_in <= 60
+    assert breaker.get_stats()["rejected"] == 1
+    assert breaker.get_stats()["opened"] == 1
+
+
+async def test_success_resets_the_failure_count(breaker):
+    upstream = Upstream()
+    for _ in range(2):
+        with pytest.raises(ConnectionError):
+            await breaker.call(upstream)
+    upstream.failing = False
+    assert await breaker.call(upstream) == "ok"
+    upstream.failing = True
+    with pytest.raises(ConnectionError):
+        await breaker.call(upstream)
+    assert breaker.state == CLOSED
+
+
+async def test_half_open_trial_closes_on_success(breaker):
+    upstream = Upstream()
+    await open_circuit(breaker, upstream)
+    expire(breaker)
+    upstream.failing = False
+    assert await breaker.call(upstream) == "ok"
+    assert breaker.state == CLOSED
+    assert breaker.consecutive_failures == 0
+
+
+async def test_half_open_trial_reopens_on_failure(breaker):
+    upstream = Upstream()
+    await open_circuit(breaker, upstream)
+    expire(breaker)
+    with pytest.raises(ConnectionError):
+        await breaker.call(upstream)
+    assert breaker.state == OPEN
+    assert breaker.get_stats()["opened"] == 2
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(upstream)
+
+
+async def test_half_open_lets_a_single_trial_through(breaker):
+    await open_circuit(breaker, Upstream())
+    expire(breaker)
+    release = asyncio.Event()
+    calls = []
+
+    async def slow():
+        calls.append(1)
+        await release.wait()
+        return "ok"
+
+    trial = asyncio.create_task(breaker.call(slow))
+    await asyncio.sleep(0)
+    assert breaker.state == HALF_OPEN
+    with pytest.raises(CircuitOpenError):
+        await breaker.call(slow)
+    release.set()
+    assert await trial == "ok"
+    assert len(calls) == 1
+    assert breaker.state == CLOSED
+
+
+async def test_cancelled_trial_frees_the_slot(breaker):
+    await open_circuit(breaker, Upstream())
+    expire(breaker)
+    trial = asyncio.create_task(breaker.call(lambda: asyncio.sleep(10)))
+    await asyncio.sleep(0)
+    trial.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await trial
+    assert breaker.state == HALF_OPEN
+    assert breaker.allow()
+
+
+async def test_weather_service_fails_fast_to_cached_fallback():
+    service = WeatherService()
+    service.cache = StaleWhileRevalidateCache("weather-test", 300, 900)
+    upstream = Upstream()
+    service._fetch_jma_weather = upstream
+
+    first = await service.get_current_weather_entry()
+    assert first.data.description == service.get_fallback_weather().description
+    # Negative cache: the fallback is reused without calling upstream again
+    assert await service.get_current_weather_entry() is first
+    assert upstream.calls == 1
+
+    service.config["fallback_ttl"] = 0
+    for _ in range(5):
+        await service.get_current_weather_entry()
+    assert service.breaker.state == OPEN
+    assert upstream.calls == service.breaker.config["failure_threshold"]
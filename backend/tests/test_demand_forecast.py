@@ -0,0 +1,150 @@
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from api import weather_routes
+from main import app
+from services import demand_forecast
+from services.cache import CacheEntry
+from services.demand_forecast import DemandForecaster
+from services.research_integration import research_integration
+from services.weather_service import weather_service
+
+NOW = datetime(2026, 10, 6, 17, 52)
+ISSUED = datetime(2026, 10, 6, 17, 45)
+
+
+@pytest.fixture
+def forecaster():
+    return DemandForecaster()
+
+
+def publish_rain(store, rain, precipitation=None):
+    """Current weather with rain_intensity mm/h observed now, and no JMA forecast"""
+    weather = replace(weather_service.get_fallback_weather(), is_raining=rain > 0, rain_intensity=rain,
+                      precipitation=rain if precipitation is None else precipitation)
+    # Versions are the fetch time in milliseconds: a later one, so the new data is not taken as unchanged
+    stored_at = store.get("weather").fetched_at + timedelta(milliseconds=1)
+    store.publish("weather", CacheEntry(data=weather, stored_at=stored_at))
+
+
+def test_matrices_cover_every_zone_and_horizon(snapshots, forecaster):
+    forecast = forecaster.get(snapshots.get("weather"), snapshots.get("traffic"), now=NOW)
+    zones = len(research_integration.zones)
+
+    assert forecast.issued_at == ISSUED
+    assert forecast.horizons.tolist() == [15, 30, 60, 180]
+    for matrix in (forecast.rain, forecast.demand, forecast.revenue):
+        assert matrix.shape == (zones, 4)
+        assert matrix.dtype == np.float32
+    assert forecast.models == ["research"] * 4
+    assert len(forecast.top_cells) == 4
+    assert all(0 < len(top) <= forecaster.config["max_zones"] for top in forecast.top_cells)
+    for minutes, multiplier in zip(forecast.horizons.tolist(), forecast.time_multiplier):
+        target = ISSUED + timedelta(minutes=minutes)
+        assert multiplier == research_integration.calculate_time_multiplier(target.hour, target.weekday())
+    # Fallback weather has no forecast: current conditions persist
+    assert {condition["description"] for condition in forecast.conditions} == {"Partly Cloudy (Fallback)"}
+
+
+def test_current_rain_fades_into_the_forecast(snapshots, forecaster):
+    publish_rain(snapshots, 6.0, precipitation=0.0)
+    forecast = forecaster.get(snapshots.get("weather"), snapshots.get("traffic"), now=NOW)
+
+    # Persistence weight falls linearly to 0 at 120 minutes: 6 * (1 - minutes / 120)
+    np.testing.assert_allclose(forecast.rain[0], [5.25, 4.5, 3.0, 0.0])
+    assert (forecast.rain == forecast.rain[:1]).all()  # No nowcast: every zone has the city-wide rain
+
+
+def test_forecast_precipitation_takes_over(snapshots, forecaster, monkeypatch):
+    def forecast_at(weather, hours_ahead, window_hours=0.0):
+        return {"description": "Rain", "temperature": 18.0, "rain_probability": 80, "precipitation": 4.0}
+
+    monkeypatch.setattr(demand_forecast.weather_service, "forecast_at", forecast_at)
+    forecast = forecaster.get(snapshots.get("weather"), snapshots.get("traffic"), now=NOW)
+
+    np.testing.assert_allclose(forecast.rain[0], [0.5, 1.0, 2.0, 4.0])
+    assert forecast.conditions[3] == {"description": "Rain", "temperature": 18.0, "rain_probability": 80,
+                                      "precipitation": 4.0}
+
+
+def test_forecast_is_reused_within_an_issue_period(snapshots, forecaster):
+    weather, traffic = snapshots.get("weather"), snapshots.get("traffic")
+    first = forecaster.get(weather, traffic, now=NOW)
+
+    assert forecaster.get(weather, traffic, now=NOW + timedelta(minutes=7)) is first
+    assert forecaster.get(weather, traffic, nowcast="n1", now=NOW) is not first
+    later = forecaster.get(weather, traffic, now=NOW + timedelta(minutes=8))
+    assert later.issued_at == ISSUED + timedelta(minutes=15)
+
+    publish_rain(snapshots, 3.0)
+    rained = forecaster.get(snapshots.get("weather"), traffic, now=NOW + timedelta(minutes=8))
+    assert rained is not later
+    assert forecaster.builds == 4
+    assert forecaster.get_stats()["version"] == rained.version
+
+
+def test_format_filters_horizons_and_series(snapshots, forecaster):
+    forecast = forecaster.get(snapshots.get("weather"), snapshots.get("traffic"), now=NOW)
+    cell = int(forecast.top_cells[0][0])
+    data = forecaster.format(forecast, horizons=[30, 180], limit=3, cell=cell)
+
+    assert data["issued_at"] == ISSUED.isoformat()
+    assert [horizon["minutes"] for horizon in data["horizons"]] == [30, 180]
+    assert data["horizons"][0]["time"] == (ISSUED + timedelta(minutes=30)).isoformat()
+    assert data["horizons"][1]["demand_model"] == "research"
+    assert all(len(horizon["zones"]) == 3 for horizon in data["horizons"])
+    assert data["zone"]["name"] == research_integration.zones.names[cell]
+    assert [point["minutes"] for point in data["zone"]["series"]] == [30, 180]
+    point = data["zone"]["series"][0]
+    assert point["demand_multiplier"] == round(float(forecast.demand[cell, 1]), 3)
+    assert point["expected_demand_increase"] == round((float(forecast.demand[cell, 1]) - 1) * 100, 1)
+    assert "zone" not in forecaster.format(forecast)
+
+
+def test_learned_model_scores_every_horizon(snapshots, forecaster, trained_demand_model):
+    trained_demand_model()
+    publish_rain(snapshots, 8.0, precipitation=0.0)
+    forecast = forecaster.get(snapshots.get("weather"), snapshots.get("traffic"), now=NOW)
+
+    assert forecast.models == ["learned"] * 4
+    assert forecast.time_multiplier == [None] * 4
+    # Heavy rain now, dry by the 3 hour horizon: the model trained on rain-doubled revenue sees less demand
+    assert np.median(forecast.demand[:, 0] / forecast.demand[:, 3]) > 1.5
+    assert forecaster.format(forecast, horizons=[15])["horizons"][0]["time_multiplier"] is None
+
+
+@pytest.fixture
+def client(snapshots, monkeypatch):
+    monkeypatch.setattr(weather_routes, "demand_forecaster", DemandForecaster())
+    # Not entered as a context manager: the lifespan would start the real ingestion scheduler
+    return TestClient(app)
+
+
+def test_route_returns_the_horizon_matrix(client):
+    response = client.get("/api/v1/weather/demand/forecast",
+                          params={"horizons": "15,60", "limit": 2, "latitude": 35.6812, "longitude": 139.7671})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert [horizon["minutes"] for horizon in data["horizons"]] == [15, 60]
+    assert all(len(horizon["zones"]) == 2 for horizon in data["horizons"])
+    assert len(data["zone"]["series"]) == 2
+
+    etag = response.headers["etag"]
+    assert client.get("/api/v1/weather/demand/forecast",
+                      params={"horizons": "15,60", "limit": 2, "latitude": 35.6812, "longitude": 139.7671},
+                      headers={"If-None-Match": etag}).status_code == 304
+    assert client.get("/api/v1/weather/demand/forecast", headers={"If-None-Match": etag}).status_code == 200
+
+
+@pytest.mark.parametrize("params", [
+    {"horizons": "15,45"},
+    {"horizons": "soon"},
+    {"latitude": 35.68},
+    {"latitude": 35.0, "longitude": 139.0}  # Outside the 23 wards
+])
+def test_route_rejects_bad_queries(client, params):
+    assert client.get("/api/v1/weather/demand/forecast", params=params).status_code == 400
@@ -0,0 +1,225 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from services import demand_model as demand_model_module
+from services.demand_model import (DemandModel, FEATURES, demand_model, feature_vector, observation_statistics,
+                                   rain_features, train)
+from services.research_integration import research_integration
+from services.spatial_grid import tokyo_grid
+
+from conftest import RECORDED_DAYS
+
+DRY = {"is_raining": False, "rain_intensity": 0.0, "temperature": 20}
+WET = {"is_raining": True, "rain_intensity": 8.0, "temperature": 20}
+NO_DISRUPTIONS = {"disruptions": []}
+NOW = datetime(2026, 10, 6, 18)
+
+
+def model_at(tmp_path, **config):
+    model = DemandModel()
+    model.config = {**model.config, "path": str(tmp_path / "model.npz"), **config}
+    return model
+
+
+def synthetic_hours(hours=600, seed=0):
+    """Feature rows covering every hour, rain bucket, weekday and disruptions"""
+    rng = np.random.default_rng(seed)
+    start = datetime(2026, 9, 1)
+    rows = []
+    for hour in range(hours):
+        rain = float(rng.choice([0.0, rng.uniform(0, 1), rng.uniform(1, 5), rng.uniform(5, 30)]))
+        weather = {"is_raining": rain > 0, "rain_intensity": rain, "temperature": float(rng.uniform(0, 38))}
+        traffic = {"disruptions": [{"estimated_delay": int(rng.integers(0, 3)) * 30}]}
+        rows.append(feature_vector(weather, traffic, start + timedelta(hours=hour)))
+    return np.array(rows)
+
+
+def test_feature_vector_layout():
+    x = feature_vector({**WET, "temperature": 37}, {"disruptions": [{"estimated_delay": 30}, {"estimated_delay": 15}]},
+                       datetime(2026, 10, 4, 7))  # A Sunday
+    named = dict(zip(FEATURES, x.tolist()))
+    assert named["intercept"] == 1.0
+    assert named["rain_heavy"] == 1.0 and named["rain_light"] == 0.0
+    assert named["rain_intensity"] == 0.8
+    assert named["temperature_extreme"] == 1.0
+    assert named["hour_7"] == 1.0 and sum(x[7:30]) == 1.0
+    assert named["weekend"] == 1.0
+    assert named["disruption_delay"] == 0.75
+
+    assert feature_vector(DRY, NO_DISRUPTIONS, datetime(2026, 10, 5, 0))[7:30].sum() == 0  # Midnight is the baseline hour
+    assert rain_features(np.array([0.0, 1.0, 5.0, 40.0]))[:, :3].tolist() == [[0, 0, 0], [1, 0, 0], [0, 1, 0], [0, 0, 1]]
+
+
+def test_recovers_known_coefficients(tmp_path):
+    X = synthetic_hours()
+    rng = np.random.default_rng(1)
+    coef = rng.normal(0, 0.3, size=(len(FEATURES), 3))
+    coef[0] = [4.0, 5.0, 6.0]
+    revenue = np.expm1(X @ coef)
+
+    model = model_at(tmp_path, ridge_lambda=1e-9)
+    model.add_statistics(*observation_statistics(X, revenue))
+
+    assert model.count == len(X)
+    np.testing.assert_allclose(model.coef, coef, atol=1e-6)
+
+
+def test_statistics_in_parts_equal_one_batch(tmp_path):
+    X = synthetic_hours(200)
+    revenue = np.random.default_rng(2).gamma(2.0, 500.0, size=(len(X), 4))
+
+    whole = model_at(tmp_path)
+    whole.add_statistics(*observation_statistics(X, revenue))
+    parts = model_at(tmp_path)
+    parts.add_statistics(*observation_statistics(X[:120], revenue[:120]))
+    parts.add_statistics(*observation_statistics(X[120:], revenue[120:]))
+
+    np.testing.assert_allclose(parts.coef, whole.coef, rtol=1e-9, atol=1e-12)
+    assert parts.count == whole.count == 200
+    assert parts.stats["updates"] == 2
+
+
+def test_forgetting_decays_older_statistics(tmp_path):
+    X = synthetic_hours(100)
+    statistics = observation_statistics(X, np.ones((len(X), 2)))
+    model = model_at(tmp_path, forgetting=0.5)
+    model.add_statistics(*statistics)
+    model.add_statistics(*statistics)
+    assert model.count == 150
+
+
+def test_ready_needs_enough_hours(tmp_path):
+    X = synthetic_hours(47)
+    model = model_at(tmp_path)
+    assert not model.ready
+    model.add_statistics(*observation_statistics(X, np.ones((len(X), 2))))
+    assert not model.ready
+    assert model.multipliers(DRY, NO_DISRUPTIONS, NOW, 2) is None
+    model.add_statistics(*observation_statistics(X[:1], np.ones((1, 2))))
+    assert model.ready
+
+
+def test_save_load_round_trip(tmp_path):
+    X = synthetic_hours(60)
+    model = model_at(tmp_path)
+    model.add_statistics(*observation_statistics(X, np.full((len(X), 3), 1000.0)))
+    model.trained_until = "2026-10-31"
+    model.save()
+    assert os.listdir(tmp_path) == ["model.npz"]  # The temporary file was renamed into place
+
+    loaded = model_at(tmp_path)
+    assert loaded.ready  # Loaded on first use
+    assert loaded.trained_until == "2026-10-31"
+    assert loaded.count == 60
+    np.testing.assert_array_equal(loaded.coef, model.coef)
+
+
+def test_unreadable_artifact_keeps_current_model(tmp_path):
+    X = synthetic_hours(60)
+    model = model_at(tmp_path)
+    model.add_statistics(*observation_statistics(X, np.full((len(X), 3), 1000.0)))
+    coef = model.coef
+    with open(tmp_path / "other.npz", "wb") as f:
+        np.savez(f, features=np.array(FEATURES[:-1]))
+
+    assert model.load(str(tmp_path / "other.npz")) is False
+    assert model.coef is coef
+
+
+def test_rain_raises_multipliers(trained_demand_model):
+    trained_demand_model()
+    zones = len(tokyo_grid)
+    dry = demand_model.multipliers(DRY, NO_DISRUPTIONS, NOW, zones)
+    wet = demand_model.multipliers(WET, NO_DISRUPTIONS, NOW, zones)
+
+    assert dry.shape == wet.shape == (zones,)
+    assert 1.5 < float(np.median(wet / dry)) <= 2.0  # Fitted on doubled revenue in heavy rain, shrunk by the ridge
+    assert demand_model.multipliers(DRY, NO_DISRUPTIONS, NOW, zones - 1) is None  # Fitted on other zones
+
+
+def test_zone_rain_replaces_city_rain_per_zone(trained_demand_model):
+    trained_demand_model()
+    zones = len(tokyo_grid)
+    zone_rain = np.full(zones, np.nan)
+    zone_rain[:10] = 8.0
+
+    local = demand_model.multipliers(DRY, NO_DISRUPTIONS, NOW, zones, zone_rain)
+    dry = demand_model.multipliers(DRY, NO_DISRUPTIONS, NOW, zones)
+    wet = demand_model.multipliers(WET, NO_DISRUPTIONS, NOW, zones)
+
+    np.testing.assert_allclose(local[:10], wet[:10])
+    np.testing.assert_allclose(local[10:], dry[10:])  # Unknown zones keep the city-wide (dry) reading
+
+
+def test_replaced_artifact_is_reloaded(trained_demand_model):
+    path = demand_model.config["path"]
+    trained_demand_model(trained_until="2026-09-30")
+    assert demand_model.ready and demand_model.trained_until == "2026-09-30"
+
+    trained_demand_model(trained_until="2026-10-15")
+    stat = os.stat(path)
+    os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 1_000_000_000))  # Coarse file system clocks
+    assert demand_model.ready and demand_model.trained_until == "2026-10-15"
+
+
+def test_predictions_use_the_learned_model(trained_demand_model):
+    trained_demand_model()
+    scores = research_integration.predict_demand_arrays(WET, NO_DISRUPTIONS, now=NOW)
+    multiplier = scores["learned_multiplier"]
+
+    assert multiplier is not None
+    np.testing.assert_allclose(scores["base_demand"], tokyo_grid.base_revenue * multiplier)
+    assert research_integration.predict_demand_arrays(WET, NO_DISRUPTIONS, now=NOW, learned=False)["learned_multiplier"] is None
+
+    predictions = research_integration.generate_demand_predictions(WET, NO_DISRUPTIONS, limit=5, now=NOW)
+    assert len(predictions) == 5
+    for prediction in predictions:
+        assert prediction["demand_model"] == "learned"
+        assert prediction["weather_multiplier"] is None and prediction["time_multiplier"] is None
+        assert prediction["total_demand_score"] == round(prediction["learned_multiplier"] * 100)
+        assert research_integration.demand_boost_percent(prediction) == int((prediction["learned_multiplier"] - 1) * 100)
+
+
+def test_predictions_without_a_model():
+    predictions = research_integration.generate_demand_predictions(WET, NO_DISRUPTIONS, limit=3, now=NOW)
+    assert {prediction["demand_model"] for prediction in predictions} == {"research"}
+    assert all(prediction["learned_multiplier"] is None for prediction in predictions)
+    with pytest.raises(ValueError, match="No trained demand model"):
+        research_integration.predict_demand_arrays(WET, NO_DISRUPTIONS, now=NOW, learned=True)
+
+
+def test_train_on_recorded_days(recorded_days, tmp_path):
+    model = model_at(tmp_path)
+    summary = train(model, *recorded_days, *RECORDED_DAYS, workers=1)
+
+    assert summary["days"] == 2
+    assert summary["hours"] == model.count == 48
+    assert model.trained_until == RECORDED_DAYS[1].isoformat()
+    assert model.ready
+    # Twice the trips in the rain: heavy rain raises the city's demand
+    rain_heavy = FEATURES.index("rain_heavy")
+    assert model.coef[rain_heavy].mean() > 0
+
+
+def test_main_fits_then_updates(recorded_days, tmp_path, capsys):
+    history, trips = recorded_days
+    path = str(tmp_path / "cli.npz")
+    common = ["--history", history, "--trips", trips, "--workers", "1", "--model", path]
+
+    demand_model_module.main(["fit", *common, "--start", "2026-10-01", "--end", "2026-10-01"])
+    assert json.loads(capsys.readouterr().out)["observed_hours"] == 24
+
+    demand_model_module.main(["update", *common, "--start", "2026-10-02", "--end", "2026-10-02"])
+    report = json.loads(capsys.readouterr().out)
+    assert report["observed_hours"] == 48
+    assert report["trained_until"] == "2026-10-02"
+
+    with pytest.raises(SystemExit):  # No trips on these days
+        demand_model_module.main(["fit", *common, "--start", "2026-11-01", "--end", "2026-11-01"])
+    with pytest.raises(SystemExit):
+        demand_model_module.main(["update", *common[:-1], str(tmp_path / "missing.npz"),
+                                  "--start", "2026-10-01", "--end", "2026-10-01"])
@@ -0,0 +1,64 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+
+from services.research_integration import MCPResearchIntegration, DemandZones
+
+# Monday 08:00: rush hour
+NOW = datetime(2026, 10, 5, 8, 0)
+WEATHER = {"is_raining": True, "rain_intensity": 3.0, "temperature": 18}
+TRAFFIC = {"disruptions": [{"estimated_delay": 20}]}
+
+
+@pytest.fixture
+def research():
+    return MCPResearchIntegration()
+
+
+@pytest.fixture
+def zones():
+    return DemandZones.from_records([
+        {"name": "A", "lat": 35.68, "lng": 139.76, "base_revenue": 100.0},
+        {"name": "B", "lat": 35.69, "lng": 139.70, "base_revenue": 150.0},
+        {"name": "C", "lat": 35.66, "lng": 139.73, "base_revenue": 150.0},
+        {"name": "D", "lat": 35.63, "lng": 139.74, "base_revenue": 80.0}
+    ])
+
+
+def test_arrays_match_the_scalar_calculation(research, zones):
+    scores = research.predict_demand_arrays(WEATHER, TRAFFIC, zones, NOW, zone_rain=None)
+    multiplier = (research.calculate_weather_demand_multiplier(WEATHER)
+                  * research.calculate_time_multiplier(NOW.hour, NOW.weekday())
+                  * research.calculate_traffic_disruption_boost(TRAFFIC))
+    assert scores["time_multiplier"] == research.params.rush_hour_multiplier
+    assert scores["traffic_multiplier"] == pytest.approx(1.2)
+
+    for i, base_revenue in enumerate(zones.base_revenue.tolist()):
+        expected = research.predict_ai_vs_traditional_performance(base_revenue * multiplier)
+        for column in ("ai_revenue_per_min", "traditional_revenue_per_min", "improvement_percentage"):
+            assert scores[column][i] == pytest.approx(expected[column])
+
+
+def test_order_is_descending_and_stable_for_ties(research, zones):
+    scores = research.predict_demand_arrays(WEATHER, TRAFFIC, zones, NOW, zone_rain=None)
+    assert scores["order"].tolist() == [1, 2, 0, 3]
+
+
+def test_zone_rain_multipliers_match_the_scalar_thresholds(research):
+    rain = np.array([0.0, 0.5, 3.0, 8.0, np.nan])
+    multipliers = research.calculate_zone_weather_multipliers(WEATHER, rain)
+    for value, multiplier in zip(rain[:4].tolist(), multipliers[:4].tolist()):
+        weather = {**WEATHER, "is_raining": value > 0, "rain_intensity": value}
+        assert multiplier == pytest.approx(research.calculate_weather_demand_multiplier(weather))
+    # Unknown rain falls back to the city-wide multiplier
+    assert multipliers[4] == research.calculate_weather_demand_multiplier(WEATHER)
+
+
+def test_predictions_are_built_for_the_top_zones_only(research, zones):
+    predictions = research.generate_demand_predictions(WEATHER, TRAFFIC, limit=2, zones=zones, now=NOW,
+                                                       min_spacing_km=0)
+    assert [p["name"] for p in predictions] == ["B", "C"]
+    assert predictions[0]["demand_model"] == "research"
+    assert predictions[0]["total_demand_score"] == round(2.4 * 1.6 * 1.2 * 100)
+    assert research.demand_boost_percent(predictions[0]) == 140
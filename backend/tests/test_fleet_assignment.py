@@ -0,0 +1,107 @@
+from datetime import datetime
+
+import numpy as np
+import pytest
+from fastapi.testclient import TestClient
+
+from main import app
+from services.fleet_assignment import FleetAssignmentOptimizer, DriverPosition, fleet_optimizer
+from services.research_integration import research_integration
+from services.spatial_grid import tokyo_grid
+from services.travel_matrix import TravelTimeMatrix
+
+WEATHER = {"is_raining": True, "rain_intensity": 6.0, "temperature": 18}
+TRAFFIC = {"disruptions": []}
+
+
+@pytest.fixture(scope="module")
+def optimizer(tmp_path_factory):
+    matrix = TravelTimeMatrix(tokyo_grid)
+    matrix.config = {**matrix.config, "directory": str(tmp_path_factory.mktemp("matrix"))}
+    return FleetAssignmentOptimizer(research_integration, matrix)
+
+
+def full_lp(optimizer, value, supply, capacity):
+    flows, _, _ = optimizer._solve_restricted(-value, supply, capacity, np.ones(value.shape, dtype=bool))
+    return flows
+
+
+def check_feasible(flows, supply, capacity):
+    assert flows.dtype == np.int64
+    assert (flows >= 0).all()
+    assert flows.sum(axis=1).tolist() == supply.tolist()
+    assert (flows.sum(axis=0) <= capacity).all()
+
+
+def test_lp_beats_greedy_where_greedy_is_myopic(optimizer):
+    # Greedy sends origin 0 to hotspot 0 and leaves origin 1 with the poor hotspot
+    value = np.array([[10.0, 9.0], [8.0, 1.0]])
+    supply, capacity = np.array([1, 1]), np.array([1, 1])
+    greedy = optimizer._greedy(value, supply, capacity)
+    flows = optimizer._solve(-value, supply, capacity)
+    assert (greedy * value).sum() == 11
+    assert (flows * value).sum() == 17
+    check_feasible(flows, supply, capacity)
+
+
+@pytest.mark.parametrize("seed", range(5))
+def test_column_generation_is_optimal(optimizer, seed):
+    rng = np.random.default_rng(seed)
+    value = rng.uniform(0, 1000, (30, 12))
+    supply = rng.integers(1, 6, 30)
+    capacity = optimizer._capacities(rng.uniform(1, 3, 12), int(supply.sum()))
+
+    flows = optimizer._solve(-value, supply, capacity)
+    check_feasible(flows, supply, capacity)
+    assert (flows * value).sum() == pytest.approx((full_lp(optimizer, value, supply, capacity) * value).sum())
+    assert (flows * value).sum() >= (optimizer._greedy(value, supply, capacity) * value).sum() - 1e-6
+
+
+def test_capacities_cover_the_fleet(optimizer):
+    capacity = optimizer._capacities(np.array([5.0, 3.0, 0.1]), 100)
+    assert capacity.sum() >= 100
+    assert capacity[0] > capacity[1] > 0 and capacity[2] >= 1
+
+
+def test_assign_spreads_drivers_over_hotspots(optimizer):
+    rng = np.random.default_rng(3)
+    drivers = [DriverPosition(f"d{i}", lat, lng)
+               for i, (lat, lng) in enumerate(zip(rng.uniform(35.62, 35.74, 200), rng.uniform(139.65, 139.80, 200)))]
+    result = optimizer.assign(drivers, WEATHER, TRAFFIC, now=datetime(2026, 10, 5, 18, 0))
+
+    assert result.status == "optimal"
+    assert [a["driver_id"] for a in result.assignments] == [d.id for d in drivers]
+    assert sum(h["assigned"] for h in result.hotspots) == len(drivers)
+    assert all(h["assigned"] <= h["capacity"] for h in result.hotspots)
+    assert sum(1 for h in result.hotspots if h["assigned"]) > 1
+    # Per-driver values are truncated to whole yen
+    per_driver = sum(a["expected_net_revenue"] for a in result.assignments)
+    assert 0 <= result.expected_net_revenue - per_driver <= len(drivers)
+
+
+def test_no_drivers(optimizer):
+    assert optimizer.assign([], WEATHER, TRAFFIC).status == "empty"
+
+
+def test_route_rejects_drivers_outside_the_service_area_and_duplicates():
+    client = TestClient(app)
+    outside = client.post("/api/v1/weather/driver/assignments", json={"drivers": [
+        {"driver_id": "a", "latitude": 35.68, "longitude": 139.76},
+        {"driver_id": "b", "latitude": 34.69, "longitude": 135.50}
+    ]})
+    assert outside.status_code == 400
+    assert "b" in outside.json()["detail"]
+
+    duplicate = client.post("/api/v1/weather/driver/assignments", json={"drivers": [
+        {"driver_id": "a", "latitude": 35.68, "longitude": 139.76},
+        {"driver_id": "a", "latitude": 35.69, "longitude": 139.70}
+    ]})
+    assert duplicate.status_code == 400
+    assert "Duplicate" in duplicate.json()["detail"]
+
+
+def test_route_limits_fleet_size_from_config():
+    limit = fleet_optimizer.config["max_drivers"]
+    drivers = [{"driver_id": str(i), "latitude": 35.68, "longitude": 139.76} for i in range(limit + 1)]
+    response = TestClient(app).post("/api/v1/weather/driver/assignments", json={"drivers": drivers})
+    assert response.status_code == 422
@@ -0,0 +1,105 @@
+from dataclasses import asdict
+
+import numpy as np
+import pytest
+
+from services import fleet_simulation
+from services.fleet_simulation import FleetSimulator, SimulationScenario, compare, run_sweep
+
+
+@pytest.fixture(scope="module")
+def simulator():
+    return FleetSimulator(fleet_simulation._get_default_config())
+
+
+def metrics(result):
+    return {key: value for key, value in result.items() if key != "seconds"}
+
+
+def test_policies_face_the_same_requests(simulator):
+    ai = simulator.run(SimulationScenario(drivers=200, policy="ai", hours=1, seed=3))
+    traditional = simulator.run(SimulationScenario(drivers=200, policy="traditional", hours=1, seed=3))
+    other_seed = simulator.run(SimulationScenario(drivers=200, policy="ai", hours=1, seed=4))
+
+    assert ai["requests"] == traditional["requests"] > 0
+    assert other_seed["requests"] != ai["requests"]
+    for result in (ai, traditional):
+        assert result["served"] + result["abandoned"] == result["requests"]
+        assert result["repositions"] > 0
+        assert 0 < result["utilization"] < 1
+
+
+def test_runs_are_reproducible(simulator):
+    scenario = SimulationScenario(drivers=150, policy="ai", hours=0.5, rain_intensity=6.0, seed=1)
+    assert metrics(simulator.run(scenario)) == metrics(simulator.run(scenario))
+
+
+def test_rain_raises_demand(simulator):
+    dry = simulator.run(SimulationScenario(drivers=200, policy="traditional", hours=1, seed=2))
+    wet = simulator.run(SimulationScenario(drivers=200, policy="traditional", hours=1, rain_intensity=8.0, seed=2))
+    assert wet["requests"] > dry["requests"]
+
+
+def test_unknown_policy(simulator):
+    with pytest.raises(ValueError, match="Unknown policy"):
+        simulator.run(SimulationScenario(drivers=10, policy="random", hours=0.1))
+
+
+def test_fares_follow_the_tokyo_meter(simulator):
+    fares = simulator._fares(np.array([0.5, 1.096, 1.1, 1.351, 1.352]))
+    assert fares.tolist() == [500, 500, 600, 600, 700]
+
+
+def test_destinations_are_sampled_per_origin(simulator):
+    rng = np.random.default_rng(0)
+    origins = np.repeat(np.array([0, simulator.cells - 1]), 2000)
+    destinations = simulator._sample_destinations(rng, origins)
+
+    assert ((destinations >= 0) & (destinations < simulator.cells)).all()
+    distance = np.asarray(simulator.matrix.distance)[origins, destinations]
+    # Destination choice decays with distance, so trips stay mostly local
+    assert np.median(distance) < 3 * simulator.config["trip_scale_km"]
+
+
+def test_match_takes_nearest_idle_drivers_oldest_requests_first(simulator):
+    cell = 100
+    near = simulator.neighbours[cell, 1]
+    driver_cell = np.array([near, cell, cell, 5])
+    idle = np.array([0, 1, 3])  # Driver 2 is busy
+
+    requests, drivers = simulator._match(np.array([cell, cell, cell]), idle, driver_cell)
+    pairs = dict(zip(requests.tolist(), drivers.tolist()))
+
+    assert pairs[0] == 1      # Oldest request gets the driver in its own cell
+    assert pairs[1] == 0      # Next one the driver in the nearest other cell
+    assert pairs.get(2, 3) == 3  # The last one only reaches the far driver, if anyone
+
+
+def test_compare_averages_paired_runs():
+    def result(policy, seed, revenue, wait, utilization):
+        scenario = SimulationScenario(drivers=100, policy=policy, seed=seed)
+        return {"scenario": asdict(scenario), "revenue": revenue, "mean_wait_minutes": wait,
+                "utilization": utilization, "service_rate": 0.9}
+
+    rows = compare([
+        result("ai", 0, 120, 4.0, 0.6), result("traditional", 0, 100, 5.0, 0.5),
+        result("ai", 1, 140, 3.0, 0.6), result("traditional", 1, 100, 5.0, 0.5),
+        result("ai", 2, 500, 1.0, 0.9)  # No traditional run to compare with
+    ])
+
+    assert len(rows) == 1
+    assert rows[0]["seeds"] == 2
+    assert rows[0]["revenue_improvement"] == 0.3
+    assert rows[0]["wait_time_reduction"] == 0.3
+    assert rows[0]["utilization_improvement"] == 0.2
+    assert set(rows[0]["claimed"]) == {"revenue_improvement", "wait_time_reduction", "utilization_improvement"}
+
+
+def test_sweep_in_one_process():
+    scenarios = [SimulationScenario(drivers=100, policy=policy, hours=0.5, seed=0) for policy in ("ai", "traditional")]
+    report = run_sweep(scenarios, workers=1)
+
+    assert report["workers"] == 1
+    assert len(report["runs"]) == 2
+    assert report["trips"] == sum(run["served"] for run in report["runs"])
+    assert [row["drivers"] for row in report["comparisons"]] == [100]
@@ -0,0 +1,185 @@
+import json
+import os
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from services.history import ColumnarHistoryBackend, HistoryBackend, HistoryRecord, HistoryWriter, SQLHistoryBackend
+from services.research_integration import research_integration
+from services.traffic_service import traffic_service
+from services.weather_service import weather_service
+
+START = datetime(2026, 10, 1, 23, 50)
+
+
+def records():
+    weather = weather_service.get_fallback_weather().to_dict()
+    traffic = traffic_service.get_fallback_traffic_data().to_dict()
+    return [
+        HistoryRecord("weather", START + timedelta(minutes=5 * i), f"w{i}", {**weather, "temperature": 20.0 + i})
+        for i in range(4)  # Spans midnight
+    ] + [HistoryRecord("traffic", START, "t0", traffic)]
+
+
+@pytest.fixture(params=["columnar", "sqlite"])
+def backend(request, tmp_path):
+    if request.param == "columnar":
+        backend = ColumnarHistoryBackend(str(tmp_path / "history"))
+    else:
+        backend = SQLHistoryBackend(f"sqlite:///{tmp_path / 'history.db'}")
+    yield backend
+    backend.close()
+
+
+def test_payload_round_trip(backend):
+    written = records()
+    backend.write_batch(written[:2])
+    backend.write_batch(written[2:])
+
+    weather = backend.read_payloads("weather", START, START + timedelta(hours=1))
+    assert [(r.version, r.recorded_at) for r in weather] == [(r.version, r.recorded_at) for r in written[:4]]
+    assert [r.payload for r in weather] == [r.payload for r in written[:4]]
+    assert backend.read_payloads("traffic", START, START)[0].payload == written[4].payload
+
+
+def test_reads_are_limited_to_the_time_range(backend):
+    backend.write_batch(records())
+    window = backend.read_payloads("weather", START + timedelta(minutes=5), START + timedelta(minutes=10))
+    assert [r.version for r in window] == ["w1", "w2"]
+    assert backend.read_payloads("weather", START + timedelta(days=2), START + timedelta(days=3)) == []
+
+
+def predictions(learned):
+    now = datetime(2026, 10, 2, 18, 0)
+    weather = {"is_raining": True, "rain_intensity": 3.0, "temperature": 18}
+    served = research_integration.generate_demand_predictions(weather, {"disruptions": []}, limit=5, now=now)
+    if learned:
+        for prediction in served:
+            prediction.update(weather_multiplier=None, time_multiplier=None, traffic_multiplier=None,
+                              learned_multiplier=1.5)
+    return served
+
+
+def test_columnar_columns(tmp_path):
+    backend = ColumnarHistoryBackend(str(tmp_path))
+    backend.write_batch(records())
+    at = START + timedelta(minutes=20)
+    backend.write_batch([HistoryRecord("predictions", at, "p1", {"source": "hotspots", "predictions": predictions(False)}),
+                         HistoryRecord("predictions", at, "p2", {"source": "hotspots", "predictions": predictions(True)})])
+
+    weather = backend.read_columns("weather", START, START + timedelta(hours=1))
+    assert weather["temperature"].tolist() == [20.0, 21.0, 22.0, 23.0]
+
+    columns = backend.read_columns("predictions", START, START + timedelta(hours=1))
+    assert columns["rank"].tolist() == list(range(5)) * 2
+    assert (columns["cell"] >= 0).all()
+    assert np.isnan(columns["learned_multiplier"][:5]).all()
+    assert np.isnan(columns["weather_multiplier"][5:]).all()
+    assert (columns["learned_multiplier"][5:] == 1.5).all()
+
+
+def test_segments_without_a_later_column_read_as_nan(tmp_path):
+    backend = ColumnarHistoryBackend(str(tmp_path))
+    at = START + timedelta(minutes=20)
+    backend.write_batch([HistoryRecord("predictions", at, "p1", {"source": "hotspots", "predictions": predictions(False)})])
+
+    # Segment written before learned_multiplier existed
+    segment = os.path.join(str(tmp_path), "predictions", at.date().isoformat(), backend.writer_id)
+    with open(os.path.join(segment, "schema.json")) as f:
+        schema = json.load(f)
+    del schema["columns"]["learned_multiplier"]
+    with open(os.path.join(segment, "schema.json"), "w") as f:
+        json.dump(schema, f)
+    os.remove(os.path.join(segment, "learned_multiplier.bin"))
+
+    columns = backend.read_columns("predictions", START, START + timedelta(hours=1))
+    assert len(columns["learned_multiplier"]) == 5
+    assert np.isnan(columns["learned_multiplier"]).all()
+    assert not np.isnan(columns["weather_multiplier"]).any()
+
+
+def test_ragged_tail_is_ignored(tmp_path):
+    backend = ColumnarHistoryBackend(str(tmp_path))
+    backend.write_batch(records()[:2])
+    segment = os.path.join(str(tmp_path), "weather", START.date().isoformat(), backend.writer_id)
+    with open(os.path.join(segment, "temperature.bin"), "ab") as f:
+        f.write(np.array([99.0], dtype="<f4").tobytes())  # Crash after one column of a batch
+    assert backend.read_columns("weather", START, START + timedelta(hours=1))["temperature"].tolist() == [20.0, 21.0]
+
+
+class FlakyBackend(HistoryBackend):
+    name = "flaky"
+
+    def __init__(self, failures):
+        self.failures = failures
+        self.written = []
+
+    def write_batch(self, batch):
+        if self.failures:
+            self.failures -= 1
+            raise OSError("disk full")
+        self.written.extend(batch)
+
+
+def writer(*backends, **config):
+    return HistoryWriter(list(backends), {"batch_size": 2, "flush_seconds": 5.0, "max_buffer": 100, **config})
+
+
+async def test_failed_batch_is_retried_once_then_written():
+    backend = FlakyBackend(failures=1)
+    history = writer(backend)
+    for record in records()[:3]:
+        history.record(record.kind, record.version, record.payload, record.recorded_at)
+
+    await history.flush()
+    assert history.get_stats()["retrying"] == 2
+    assert history.stats["written"] == 1
+    await history.flush()
+    assert history.stats["written"] == 3
+    assert history.stats["dropped"] == 0
+    assert sorted(r.version for r in backend.written) == ["w0", "w1", "w2"]
+
+
+async def test_batch_failing_its_retry_is_dropped():
+    history = writer(FlakyBackend(failures=2))
+    history.record("weather", "w0", {})
+    await history.flush()
+    await history.flush()
+    assert history.stats["dropped"] == 1
+    assert history.stats["written"] == 0
+    assert history.get_stats()["retrying"] == 0
+
+
+async def test_only_failed_backends_get_the_retry():
+    healthy, flaky = FlakyBackend(failures=0), FlakyBackend(failures=1)
+    history = writer(healthy, flaky)
+    history.record("weather", "w0", {})
+    await history.flush()
+    await history.flush()
+    assert len(healthy.written) == 1 and len(flaky.written) == 1
+    assert history.stats["written"] == 1
+
+
+async def test_stop_gives_pending_retries_a_last_chance():
+    backend = FlakyBackend(failures=1)
+    history = writer(backend)
+    history.record("weather", "w0", {})
+    await history.stop()
+    assert history.stats["written"] == 1
+
+
+def test_buffer_overflow_and_prediction_dedup():
+    history = writer(FlakyBackend(failures=0), max_buffer=2)
+    for i in range(3):
+        history.record("weather", f"w{i}", {})
+    assert history.stats["dropped"] == 1
+    assert history.get_stats()["buffered"] == 2
+
+    history.record_predictions("v1", [], "hotspots")
+    history.record_predictions("v1", [], "hotspots")
+    assert history.stats["recorded"] == 4
+
+    disabled = HistoryWriter([])
+    disabled.record("weather", "w0", {})
+    assert disabled.stats["recorded"] == 0
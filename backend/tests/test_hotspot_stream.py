@@ -0,0 +1,114 @@
+import asyncio
+import gc
+import json
+from datetime import datetime
+from types import SimpleNamespace
+
+import pytest
+
+from services.hotspot_stream import HotspotStream, RankingState, diff_rankings, format_event
+
+
+def hotspot(name, revenue):
+    return {"name": name, "ai_revenue_per_min": revenue}
+
+
+def responses(version, *hotspots):
+    return SimpleNamespace(version=version, hotspots=list(hotspots))
+
+
+def state(version, *hotspots):
+    return RankingState(version, datetime.now(), [h["name"] for h in hotspots], {h["name"]: h for h in hotspots})
+
+
+class FakeBuilder:
+    def __init__(self, current):
+        self.current = current
+        self.listeners = []
+
+    def subscribe(self, listener):
+        self.listeners.append(listener)
+
+    async def get(self):
+        return self.current
+
+    def publish(self, current):
+        self.current = current
+        for listener in self.listeners:
+            listener(current)
+
+
+def parse(frame: bytes):
+    fields = dict(line.split(": ", 1) for line in frame.decode().strip().split("\n"))
+    return fields.get("event"), fields.get("id"), json.loads(fields["data"]) if "data" in fields else None
+
+
+@pytest.fixture
+def stream():
+    return HotspotStream(FakeBuilder(responses("v1", hotspot("A", 50.0), hotspot("B", 40.0))))
+
+
+def test_diff_lists_added_removed_and_changed_fields():
+    previous = state("v1", hotspot("A", 50.0), hotspot("B", 40.0))
+    current = state("v2", hotspot("B", 60.0), hotspot("C", 30.0))
+    diff = diff_rankings(previous, current)
+    assert diff["added"] == [hotspot("C", 30.0)]
+    assert diff["removed"] == ["A"]
+    assert diff["changed"] == [{"name": "B", "ai_revenue_per_min": 60.0}]
+    assert diff["order"] == ["B", "C"]
+    assert diff_rankings(previous, state("v3", hotspot("A", 50.0), hotspot("B", 40.0)))["order"] is None
+
+
+def test_format_event():
+    assert format_event("diff", {"a": 1}, event_id="v2") == b'id: v2\nevent: diff\ndata: {"a":1}\n\n'
+
+
+async def test_snapshot_then_diffs(stream):
+    events = stream.open()
+    assert (await events.__anext__()).startswith(b"retry: ")
+    event, event_id, data = parse(await events.__anext__())
+    assert (event, event_id) == ("snapshot", "v1")
+    assert [h["name"] for h in data["hotspots"]] == ["A", "B"]
+
+    # Responses rebuilt with the same ranking publish nothing
+    stream.builder.publish(responses("v1b", hotspot("A", 50.0), hotspot("B", 40.0)))
+    assert stream.published == 1
+
+    stream.builder.publish(responses("v2", hotspot("B", 45.0), hotspot("A", 50.0)))
+    event, event_id, data = parse(await asyncio.wait_for(events.__anext__(), 1))
+    assert (event, event_id) == ("diff", "v2")
+    assert data["previous_version"] == "v1"
+    assert data["changed"] == [{"name": "B", "ai_revenue_per_min": 45.0}]
+    await events.aclose()
+
+
+async def test_resume_from_last_event_id_sends_a_diff(stream):
+    stream.builder.publish(responses("v1", hotspot("A", 50.0)))
+    stream.builder.publish(responses("v2", hotspot("A", 55.0)))
+
+    events = stream.open("v1")
+    await events.__anext__()
+    event, _, data = parse(await events.__anext__())
+    assert event == "diff" and data["previous_version"] == "v1"
+
+    unknown = stream.open("gone")
+    await unknown.__anext__()
+    assert parse(await unknown.__anext__())[0] == "snapshot"
+    await events.aclose()
+    await unknown.aclose()
+
+
+async def test_open_reserves_and_releases_slots(stream):
+    stream.config["max_connections"] = 2
+    first, second = stream.open(), stream.open()
+    assert stream.open() is None
+    assert stream.connections == 2
+
+    await first.__anext__()
+    await first.aclose()
+    assert stream.connections == 1
+
+    # Never started: released when the generator is collected
+    del second
+    gc.collect()
+    assert stream.connections == 0
@@ -0,0 +1,72 @@
+from datetime import datetime, timedelta
+
+import pytest
+from fastapi.testclient import TestClient
+from starlette.requests import Request
+
+from api.http_cache import make_etag, is_not_modified, cache_headers
+from main import app
+from services.cache import CacheEntry
+from services.weather_service import weather_service
+
+
+def request(path: str = "/api/v1/weather", query: str = "", if_none_match: str = None) -> Request:
+    headers = [(b"if-none-match", if_none_match.encode())] if if_none_match else []
+    return Request({"type": "http", "method": "GET", "path": path, "query_string": query.encode(),
+                    "headers": headers})
+
+
+@pytest.fixture
+def client(snapshots):
+    # Not entered as a context manager: the lifespan would start the real ingestion scheduler
+    return TestClient(app)
+
+
+def test_etag_depends_on_url_and_versions():
+    etag = make_etag(request(), "v1")
+    assert etag.startswith('"') and etag.endswith('"')
+    assert make_etag(request(), "v1") == etag
+    assert make_etag(request(), "v2") != etag
+    assert make_etag(request(query="limit=5"), "v1") != etag
+    assert make_etag(request(path="/api/v1/traffic"), "v1") != etag
+
+
+def test_if_none_match_uses_weak_comparison():
+    etag = make_etag(request(), "v1")
+    assert not is_not_modified(request(), etag)
+    assert is_not_modified(request(if_none_match=etag), etag)
+    assert is_not_modified(request(if_none_match=f'"other", W/{etag}'), etag)
+    assert is_not_modified(request(if_none_match="*"), etag)
+    assert not is_not_modified(request(if_none_match='"other"'), etag)
+
+
+def test_cache_control_disables_caching_without_max_age():
+    assert cache_headers('"x"', 120)["Cache-Control"] == "public, max-age=120"
+    assert cache_headers('"x"', 0)["Cache-Control"] == "no-cache"
+
+
+def test_weather_revalidates_until_the_snapshot_changes(client, snapshots):
+    first = client.get("/api/v1/weather")
+    assert first.status_code == 200
+    etag = first.headers["etag"]
+
+    unchanged = client.get("/api/v1/weather", headers={"If-None-Match": etag})
+    assert unchanged.status_code == 304
+    assert unchanged.headers["etag"] == etag
+    assert unchanged.content == b""
+
+    snapshots.publish("weather", CacheEntry(data=weather_service.get_fallback_weather(),
+                                            stored_at=datetime.now() + timedelta(seconds=1)))
+    changed = client.get("/api/v1/weather", headers={"If-None-Match": etag})
+    assert changed.status_code == 200
+    assert changed.headers["etag"] != etag
+
+
+def test_hotspot_etag_differs_per_query(client):
+    five = client.get("/api/v1/hotspots", params={"limit": 5})
+    ten = client.get("/api/v1/hotspots", params={"limit": 10})
+    assert five.status_code == ten.status_code == 200
+    assert five.headers["etag"] != ten.headers["etag"]
+    assert len(five.json()["data"]["hotspots"]) == 5
+    assert client.get("/api/v1/hotspots", params={"limit": 5},
+                      headers={"If-None-Match": five.headers["etag"]}).status_code == 304
@@ -0,0 +1,37 @@
+from services.http_client import create_http_session
+from services.weather_service import WeatherService
+from services.traffic_service import TrafficService
+
+
+async def test_session_uses_pool_settings():
+    session = create_http_session({"pool_limit": 7, "pool_limit_per_host": 3, "timeout": 5})
+    try:
+        assert session.connector.limit == 7
+        assert session.connector.limit_per_host == 3
+        assert session.timeout.total == 5
+    finally:
+        await session.close()
+
+
+async def test_services_share_an_attached_session():
+    session = create_http_session()
+    weather, traffic = WeatherService(), TrafficService()
+    try:
+        weather.attach_session(session)
+        traffic.attach_session(session)
+        assert await weather._get_session() is session
+        assert await traffic._get_session() is session
+
+        # The lifespan owns an attached session: closing a service leaves it open
+        await weather.close()
+        assert not session.closed
+    finally:
+        await session.close()
+
+
+async def test_private_session_is_reused_and_closed():
+    weather = WeatherService()
+    first = await weather._get_session()
+    assert await weather._get_session() is first
+    await weather.close()
+    assert first.closed
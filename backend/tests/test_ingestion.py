@@ -0,0 +1,118 @@
+from datetime import datetime, timedelta
+
+import pytest
+
+from services import ingestion
+from services.cache import CacheEntry
+from services.ingestion import SnapshotStore, IngestionScheduler, get_snapshot
+
+
+class Upstream:
+    def __init__(self, age_seconds=0.0):
+        self.age_seconds = age_seconds
+        self.calls = 0
+        self.fail = False
+
+    async def fetch(self):
+        self.calls += 1
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return CacheEntry(data=f"data-{self.calls}", stored_at=datetime.now() - timedelta(seconds=self.age_seconds))
+
+
+@pytest.fixture
+def scheduler(monkeypatch):
+    store = SnapshotStore()
+    scheduler = IngestionScheduler(store)
+    monkeypatch.setattr(ingestion, "snapshot_store", store)
+    monkeypatch.setattr(ingestion, "ingestion_scheduler", scheduler)
+    return scheduler
+
+
+def test_publish_keeps_version_for_unchanged_data_and_notifies_subscribers():
+    store = SnapshotStore()
+    published = []
+    store.subscribe(published.append)
+    entry = CacheEntry(data="data", stored_at=datetime.now())
+
+    first = store.publish("weather", entry)
+    assert store.publish("weather", entry) is first
+    assert published == [first]
+
+    second = store.publish("weather", CacheEntry(data="new", stored_at=entry.stored_at + timedelta(seconds=1)))
+    assert second.version != first.version
+    assert published == [first, second]
+
+
+def test_failing_subscriber_does_not_block_publishing():
+    store = SnapshotStore()
+
+    def broken(snapshot):
+        raise ValueError("subscriber bug")
+
+    store.subscribe(broken)
+    assert store.publish("weather", CacheEntry(data="data", stored_at=datetime.now())).data == "data"
+
+
+async def test_poll_tracks_health(scheduler):
+    upstream = Upstream()
+    scheduler.add_source("weather", 300, upstream.fetch, lambda: "fallback", max_stale=900)
+    source = scheduler.sources["weather"]
+
+    assert await scheduler.poll(source)
+    assert source.health.status == "healthy"
+
+    upstream.fail = True
+    assert not await scheduler.poll(source)
+    assert source.health.status == "degraded"
+    assert source.health.consecutive_failures == 1
+
+
+def test_backoff_is_exponential_and_capped(scheduler):
+    scheduler.config["jitter"] = 0.0
+    scheduler.add_source("weather", 60, Upstream().fetch, lambda: "fallback")
+    source = scheduler.sources["weather"]
+
+    assert scheduler._next_delay(source) == 60
+    delays = []
+    for failures in range(1, 6):
+        source.health.consecutive_failures = failures
+        delays.append(scheduler._next_delay(source))
+    assert delays == [5, 10, 20, 40, 60]
+
+
+async def test_get_snapshot_serves_published_snapshot_without_polling(scheduler):
+    upstream = Upstream()
+    scheduler.add_source("weather", 300, upstream.fetch, lambda: "fallback", max_stale=900)
+    await scheduler.poll(scheduler.sources["weather"])
+
+    snapshot = await get_snapshot("weather")
+    assert snapshot.data == "data-1"
+    assert upstream.calls == 1
+
+
+async def test_get_snapshot_serves_fallback_past_the_hard_ttl(scheduler):
+    upstream = Upstream(age_seconds=1000)
+    scheduler.add_source("weather", 300, upstream.fetch, lambda: "fallback", max_stale=900)
+    await scheduler.poll(scheduler.sources["weather"])
+
+    upstream.fail = True
+    snapshot = await get_snapshot("weather")
+    assert snapshot.data == "fallback"
+    assert snapshot.version == "weather-fallback"
+    assert scheduler.sources["weather"].health.status == "failing"
+    assert scheduler.get_health()["sources"]["weather"]["snapshot_expired"]
+
+    # The fallback is reused for fallback_ttl instead of polling upstream on every request
+    calls = upstream.calls
+    assert (await get_snapshot("weather")).version == "weather-fallback"
+    assert upstream.calls == calls
+
+
+async def test_get_snapshot_polls_inline_when_nothing_is_published(scheduler):
+    upstream = Upstream()
+    scheduler.add_source("traffic", 60, upstream.fetch, lambda: "fallback", max_stale=180)
+
+    snapshot = await get_snapshot("traffic")
+    assert snapshot.data == "data-1"
+    assert scheduler.store.get("traffic") is snapshot
@@ -0,0 +1,222 @@
+import io
+import json
+import os
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from services.nowcast import (
+    JMA_RAIN_COLORS, FileNowcastSource, JmaNowcastSource, NowcastRaster, NowcastStore,
+    create_nowcast_source, decode_rain_colors, tile_x, tile_y
+)
+
+BOUNDS = {"north": 35.8, "south": 35.6, "west": 139.6, "east": 139.8}
+
+
+def raster(values, observed_at=None):
+    return NowcastRaster(np.asarray(values, dtype=np.float32), observed_at=observed_at or datetime.now(), **BOUNDS)
+
+
+def write_json_raster(path, values, observed_at):
+    with open(path, "w") as f:
+        json.dump({"bounds": BOUNDS, "observed_at": observed_at.isoformat(), "values": values}, f)
+
+
+@pytest.fixture
+def store(tmp_path):
+    def make(source=None, **config):
+        defaults = {"directory": str(tmp_path / "store"), "source": "", "source_file": None,
+                    "interval": 300, "max_age_minutes": 15, "keep_rasters": 2}
+        return NowcastStore(source, {**defaults, **config})
+    return make
+
+
+def test_pixel_index_and_sample():
+    grid = raster([[0.0, 1.0], [-1.0, np.nan]])
+    # North-west, north-east, south-west, south-east quadrants and one point outside
+    lat = np.array([35.75, 35.75, 35.65, 35.65, 35.9])
+    lng = np.array([139.65, 139.75, 139.65, 139.75, 139.7])
+    pixels = grid.pixel_index(lat, lng)
+    assert pixels.tolist() == [0, 1, 2, 3, -1]
+    rain = grid.sample(pixels)
+    assert rain[:2].tolist() == [0.0, 1.0]
+    assert np.isnan(rain[2:]).all()  # Negative, NaN and outside are all no data
+
+
+def test_invalid_rasters_are_rejected():
+    meta = {"bounds": BOUNDS, "observed_at": datetime.now().isoformat()}
+    with pytest.raises(ValueError):
+        NowcastRaster.from_metadata(np.zeros(4, dtype=np.float32), meta)
+    with pytest.raises(ValueError):
+        NowcastRaster.from_metadata(np.zeros((2, 2), dtype=np.float32),
+                                    {**meta, "bounds": {**BOUNDS, "north": 35.5}})
+
+
+async def test_file_source_reads_json_and_npy(tmp_path):
+    observed_at = datetime.now().replace(microsecond=0)
+    path = tmp_path / "rain.json"
+    write_json_raster(path, [[1.0, 2.0], [3.0, 4.0]], observed_at)
+    source = FileNowcastSource(str(path))
+    first = await source.fetch()
+    assert first.values.tolist() == [[1.0, 2.0], [3.0, 4.0]]
+    assert first.observed_at == observed_at
+    assert await source.fetch() is None  # Unchanged file
+
+    np.save(tmp_path / "rain.npy", np.full((3, 5), 2.5))
+    with open(tmp_path / "rain.json", "w") as f:
+        json.dump({"bounds": BOUNDS, "observed_at": observed_at.isoformat()}, f)
+    assert (await FileNowcastSource(str(tmp_path / "rain.npy")).fetch()).values.shape == (3, 5)
+
+
+async def test_store_ingests_memory_maps_and_samples(store, tmp_path):
+    path = tmp_path / "rain.json"
+    write_json_raster(path, [[0.0, 6.0], [2.0, 0.5]], datetime.now())
+    nowcast = store(FileNowcastSource(str(path)))
+
+    entry = await nowcast.refresh()
+    assert isinstance(entry.data.values, np.memmap)
+    lat, lng = np.array([35.75, 35.65]), np.array([139.75, 139.65])
+    assert nowcast.zone_rain(lat, lng).tolist() == [6.0, 2.0]
+    assert nowcast.zone_rain(lat, lng).tolist() == [6.0, 2.0]
+    assert nowcast.stats["index_builds"] == 1
+
+    # A second process reads the stored raster without a source
+    assert store().load().values.tolist() == [[0.0, 6.0], [2.0, 0.5]]
+
+
+async def test_store_keeps_newest_raster_and_prunes_files(store):
+    nowcast = store()
+    now = datetime.now().replace(microsecond=0)
+    for minutes in (15, 10, 5):
+        nowcast.write(raster([[float(minutes)]], now - timedelta(minutes=minutes)))
+    assert nowcast.current.values.tolist() == [[5.0]]
+    assert len([name for name in os.listdir(nowcast.config["directory"]) if name.startswith("rain_")]) == 2
+
+    class Older:
+        async def fetch(self):
+            return raster([[99.0]], now - timedelta(minutes=30))
+
+    nowcast.source = Older()
+    assert (await nowcast.refresh()).data.values.tolist() == [[5.0]]
+
+
+def test_stale_raster_is_not_sampled(store):
+    nowcast = store()
+    nowcast.write(raster([[3.0]], datetime.now() - timedelta(minutes=20)))
+    assert nowcast.zone_rain(np.array([35.7]), np.array([139.7])) is None
+
+
+async def test_refresh_without_any_raster_fails(store):
+    with pytest.raises(ValueError):
+        await store().refresh()
+
+
+def test_decode_rain_colors():
+    rgba = np.zeros((1, len(JMA_RAIN_COLORS) + 2, 4), dtype=np.uint8)
+    for i, (color, _) in enumerate(JMA_RAIN_COLORS):
+        rgba[0, i] = (*color, 255)
+    rgba[0, -2] = (0, 0, 0, 0)          # Transparent: no rain
+    rgba[0, -1] = (90, 90, 90, 255)     # Not a legend colour: no data
+    rain = decode_rain_colors(rgba)
+    assert rain[0, :-2].tolist() == [value for _, value in JMA_RAIN_COLORS]
+    assert rain[0, -2] == 0.0
+    assert np.isnan(rain[0, -1])
+
+
+def test_resample_reads_the_mosaic_pixel_under_each_cell():
+    source = JmaNowcastSource(BOUNDS, {**JmaNowcastSource(BOUNDS).config, "zoom": 8})
+    xs, ys = source._tile_range()
+    mosaic = np.arange(len(ys) * 256 * len(xs) * 256, dtype=np.float32).reshape(len(ys) * 256, len(xs) * 256)
+    values = source.resample(mosaic, xs, ys)
+
+    grid = raster(values)
+    rows, cols = values.shape
+    # Centres of a few raster cells
+    row, col = np.array([0, rows // 2, rows - 1]), np.array([cols - 1, cols // 3, 0])
+    lat = BOUNDS["north"] - (row + 0.5) * (BOUNDS["north"] - BOUNDS["south"]) / rows
+    lng = BOUNDS["west"] + (col + 0.5) * (BOUNDS["east"] - BOUNDS["west"]) / cols
+    expected = mosaic[(tile_y(lat, 8) * 256).astype(int) - ys.start * 256,
+                      (tile_x(lng, 8) * 256).astype(int) - xs.start * 256]
+    assert grid.sample(grid.pixel_index(lat, lng)).tolist() == expected.tolist()
+
+
+class FakeResponse:
+    def __init__(self, status, body=None):
+        self.status = status
+        self.body = body
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+    def raise_for_status(self):
+        if self.status >= 400:
+            raise RuntimeError(f"HTTP {self.status}")
+
+    async def json(self, content_type=None):
+        return self.body
+
+    async def read(self):
+        return self.body
+
+
+class FakeSession:
+    closed = False
+
+    def __init__(self, target_times, tiles=None):
+        self.target_times = target_times
+        self.tiles = tiles or {}
+        self.urls = []
+
+    def get(self, url, **kwargs):
+        self.urls.append(url)
+        if url.endswith("targetTimes_N1.json"):
+            return FakeResponse(200, self.target_times)
+        x, y = (int(part) for part in url[:-len(".png")].split("/")[-2:])
+        data = self.tiles.get((x, y))
+        return FakeResponse(200, data) if data is not None else FakeResponse(404)
+
+
+TARGET_TIMES = [
+    {"basetime": "20261005010500", "validtime": "20261005010500", "elements": ["hrpns", "hrpns_nd"]},
+    {"basetime": "20261005011000", "validtime": "20261005011000", "elements": ["hrpns_nd"]},
+    {"basetime": "20261005010500", "validtime": "20261005011500", "elements": ["hrpns"]}  # Forecast
+]
+
+
+async def test_jma_source_fetches_the_latest_observation():
+    source = JmaNowcastSource(BOUNDS, {**JmaNowcastSource(BOUNDS).config, "zoom": 8})
+    session = FakeSession(TARGET_TIMES)
+    source.attach_session(session)
+    xs, ys = source._tile_range()
+
+    fetched = await source.fetch()
+    assert fetched.observed_at == datetime(2026, 10, 5, 1, 5, tzinfo=timezone.utc).astimezone().replace(tzinfo=None)
+    tile_urls = [url for url in session.urls if url.endswith(".png")]
+    assert len(tile_urls) == len(xs) * len(ys)
+    assert all("/20261005010500/none/20261005010500/surf/hrpns/8/" in url for url in tile_urls)
+    # Tiles JMA omits are dry
+    assert fetched.values.shape[0] > 1 and (fetched.values == 0).all()
+
+    assert await source.fetch() is None  # Same basetime
+
+
+async def test_jma_source_decodes_tiles():
+    Image = pytest.importorskip("PIL.Image")
+    source = JmaNowcastSource(BOUNDS, {**JmaNowcastSource(BOUNDS).config, "zoom": 8})
+    xs, ys = source._tile_range()
+    color, value = JMA_RAIN_COLORS[2]
+    png = io.BytesIO()
+    Image.new("RGBA", (256, 256), (*color, 255)).save(png, format="PNG")
+    tiles = {(x, y): png.getvalue() for x in xs for y in ys}
+    source.attach_session(FakeSession(TARGET_TIMES, tiles))
+    assert ((await source.fetch()).values == value).all()
+
+
+def test_source_selection(tmp_path):
+    config = {"source": "", "source_file": None}
+    assert create_nowcast_source(config) is None
+    assert isinstance(create_nowcast_source({**config, "source_file": str(tmp_path / "rain.json")}), FileNowcastSource)
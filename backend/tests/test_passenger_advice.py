@@ -0,0 +1,56 @@
+from fastapi.testclient import TestClient
+
+from main import app
+from services.cache import LRUCache
+from services.weather_intelligence import weather_intelligence
+
+
+def test_lru_evicts_least_recently_used():
+    memo = LRUCache("test", maxsize=2)
+    memo.set("a", 1)
+    memo.set("b", 2)
+    assert memo.get("a") == 1  # "b" is now least recently used
+    memo.set("c", 3)
+    assert memo.get("b") is None
+    assert memo.get("a") == 1 and memo.get("c") == 3
+    assert memo.get_stats()["evictions"] == 1
+
+
+def test_lru_caches_none_results():
+    memo = LRUCache("test", maxsize=4)
+    calls = []
+
+    def compute():
+        calls.append(1)
+        return None
+
+    assert memo.get_or_compute("key", compute) is None
+    assert memo.get_or_compute("key", compute) is None
+    assert len(calls) == 1
+    assert memo.get("key", "default") is None
+    assert memo.get("other", "default") == "default"
+
+
+def test_batch_advice_memoizes_repeated_trips(snapshots, monkeypatch):
+    monkeypatch.setattr(weather_intelligence, "transport_memo", LRUCache("transport_options", maxsize=100))
+    trips = [
+        {"origin": "Shibuya", "destination": "Tokyo Station"},
+        {"origin": "Ginza", "destination": "Shinjuku"},
+        {"origin": "Shibuya Station", "destination": "tokyo"}  # Same zones as the first trip
+    ] * 5
+
+    response = TestClient(app).post("/api/v1/weather/passenger/advice/batch", json={"trips": trips})
+    assert response.status_code == 200
+    data = response.json()["data"]
+    assert len(data["results"]) == len(trips)
+    assert data["memo"]["misses"] == 2
+    assert data["memo"]["hits"] == len(trips) - 2
+
+    # Equal zones give equal transport options
+    first, third = data["results"][0], data["results"][2]
+    assert first["cost_comparison"] == third["cost_comparison"]
+
+
+def test_batch_advice_rejects_empty_batches():
+    response = TestClient(app).post("/api/v1/weather/passenger/advice/batch", json={"trips": []})
+    assert response.status_code == 422
@@ -0,0 +1,50 @@
+import asyncio
+import json
+from datetime import datetime, timedelta
+
+from services.cache import CacheEntry
+from services.response_snapshots import ResponseSnapshotBuilder
+from services.weather_service import weather_service
+
+
+async def test_responses_are_built_once_per_version(snapshots):
+    builder = ResponseSnapshotBuilder(snapshots)
+    first, second = await asyncio.gather(builder.get(), builder.get())
+    assert first is second
+    assert await builder.get() is first
+    assert builder.builds == 1
+
+
+async def test_hotspots_body_is_a_slice_of_the_precomputed_items(snapshots):
+    responses = await ResponseSnapshotBuilder(snapshots).get()
+    body = json.loads(responses.hotspots_body("driver", 3))
+    assert len(body["data"]["hotspots"]) == 3
+    assert body["user_type"] == "driver"
+    assert body["data"]["hotspots"][0] == responses.hotspots[0]
+
+    other = json.loads(responses.hotspots_body("fleet_manager", 1))
+    assert other["user_type"] == "fleet_manager"
+    assert len(other["data"]["hotspots"]) == 1
+
+
+async def test_new_snapshot_changes_the_version(snapshots):
+    builder = ResponseSnapshotBuilder(snapshots)
+    first = await builder.get()
+    snapshots.publish("weather", CacheEntry(data=weather_service.get_fallback_weather(),
+                                            stored_at=datetime.now() + timedelta(seconds=1)))
+    second = await builder.get()
+    assert second.version != first.version
+    assert second.content_version != first.content_version
+
+
+async def test_rebuild_after_cache_duration_changes_the_content_version(snapshots):
+    builder = ResponseSnapshotBuilder(snapshots)
+    first = await builder.get()
+    builder.config["cache_duration"] = 0
+    await asyncio.sleep(0.002)
+    second = await builder.get()
+
+    # Same snapshots, but the bodies embed a new build timestamp
+    assert second is not first
+    assert second.version == first.version
+    assert second.content_version != first.content_version
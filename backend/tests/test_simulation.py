@@ -0,0 +1,66 @@
+import numpy as np
+
+from services.simulation import SimulationProvider
+from services.traffic_service import TrafficService, TOKYO_STATIONS
+
+
+def provider(**config):
+    defaults = SimulationProvider().config
+    return SimulationProvider({**defaults, "seed": None, "enabled": True, **config})
+
+
+def same(a, b):
+    return (np.array_equal(a.station_delayed, b.station_delayed)
+            and np.array_equal(a.station_delay_minutes, b.station_delay_minutes)
+            and (a.disruption, a.disruption_line, a.disruption_weather_related, a.disruption_delay_minutes)
+            == (b.disruption, b.disruption_line, b.disruption_weather_related, b.disruption_delay_minutes))
+
+
+def test_fixed_seed_is_identical_across_providers_and_time():
+    first = provider(seed=42).traffic_draws(500, 5, now=0)
+    second = provider(seed=42).traffic_draws(500, 5, now=86400)
+    assert same(first, second)
+    assert not same(first, provider(seed=43).traffic_draws(500, 5, now=0))
+
+
+def test_unseeded_draws_are_shared_within_a_time_bucket():
+    a, b = provider(), provider()
+    assert same(a.traffic_draws(500, 5, now=120), b.traffic_draws(500, 5, now=179))
+    assert not same(a.traffic_draws(500, 5, now=120), a.traffic_draws(500, 5, now=180))
+
+
+def test_batch_is_reused_within_its_key():
+    simulation = provider(seed=1)
+    draws = simulation.traffic_draws(10, 3)
+    assert simulation.traffic_draws(10, 3) is draws
+    assert simulation.traffic_draws(11, 3) is not draws
+    assert simulation.batches == 2
+
+
+def test_draws_follow_the_configured_distributions():
+    draws = provider(seed=7).traffic_draws(20000, 5)
+    assert 0.04 < draws.station_delayed.mean() < 0.06
+    assert draws.station_delay_minutes.min() >= 2 and draws.station_delay_minutes.max() <= 15
+    assert 0 <= draws.disruption_line < 5
+
+
+def test_disabled_simulation_has_no_delays_or_disruptions():
+    draws = provider(enabled=False).traffic_draws(100, 5)
+    assert not draws.station_delayed.any()
+    assert not draws.disruption
+
+
+async def test_seeded_traffic_snapshots_are_reproducible():
+    snapshots = []
+    for _ in range(2):
+        service = TrafficService()
+        service.simulation = provider(seed=42, disruption_probability=1.0)
+        snapshots.append(await service._collect_odpt_traffic_data())
+
+    first, second = snapshots
+    assert len(first.stations) == len(TOKYO_STATIONS)
+    assert [(s.name, s.operational_status, s.delays) for s in first.stations] == \
+        [(s.name, s.operational_status, s.delays) for s in second.stations]
+    assert [(d.line, d.disruption_type, d.estimated_delay) for d in first.disruptions] == \
+        [(d.line, d.disruption_type, d.estimated_delay) for d in second.disruptions]
+    assert len(first.disruptions) == 1
@@ -0,0 +1,72 @@
+import asyncio
+
+import pytest
+
+from services.single_flight import SingleFlight
+
+
+async def test_concurrent_calls_share_one_execution():
+    flight = SingleFlight("test")
+    calls = 0
+    release = asyncio.Event()
+
+    async def fetch():
+        nonlocal calls
+        calls += 1
+        await release.wait()
+        return "data"
+
+    waiters = [asyncio.ensure_future(flight.do("key", fetch)) for _ in range(10)]
+    await asyncio.sleep(0)
+    assert flight.in_flight("key")
+    release.set()
+
+    assert await asyncio.gather(*waiters) == ["data"] * 10
+    assert calls == 1
+    assert flight.stats["executions"] == 1
+    assert flight.stats["coalesced"] == 9
+    assert not flight.in_flight("key")
+
+
+async def test_keys_are_independent_and_released_after_completion():
+    flight = SingleFlight("test")
+
+    async def fetch(value):
+        await asyncio.sleep(0)
+        return value
+
+    assert await asyncio.gather(flight.do("a", lambda: fetch(1)), flight.do("b", lambda: fetch(2))) == [1, 2]
+    # A later call for the same key starts a new fetch
+    assert await flight.do("a", lambda: fetch(3)) == 3
+    assert flight.stats["executions"] == 3
+
+
+async def test_error_reaches_every_waiter():
+    flight = SingleFlight("test")
+
+    async def fetch():
+        await asyncio.sleep(0)
+        raise RuntimeError("upstream down")
+
+    results = await asyncio.gather(*[flight.do("key", fetch) for _ in range(3)], return_exceptions=True)
+    assert all(isinstance(result, RuntimeError) for result in results)
+    assert flight.stats["errors"] == 1
+
+
+async def test_cancelled_caller_does_not_cancel_the_fetch():
+    flight = SingleFlight("test")
+    release = asyncio.Event()
+
+    async def fetch():
+        await release.wait()
+        return "data"
+
+    first = asyncio.ensure_future(flight.do("key", fetch))
+    second = asyncio.ensure_future(flight.do("key", fetch))
+    await asyncio.sleep(0)
+    first.cancel()
+    release.set()
+
+    assert await second == "data"
+    with pytest.raises(asyncio.CancelledError):
+        await first
@@ -0,0 +1,71 @@
+import numpy as np
+import pytest
+
+from services.research_integration import research_integration
+from services.spatial_grid import SpatialDemandGrid, TOKYO_LANDMARKS, distance_km, select_spread, tokyo_grid
+from services.weather_intelligence import weather_intelligence
+
+
+@pytest.fixture(scope="module")
+def grid():
+    config = {**tokyo_grid.config, "cell_size_m": 1000}
+    return SpatialDemandGrid(config)
+
+
+def test_cell_size_sets_the_resolution(grid):
+    assert grid.rows < tokyo_grid.rows and grid.cols < tokyo_grid.cols
+    assert 3 * len(grid) < len(tokyo_grid) < 5 * len(grid)
+
+
+def test_cell_centers_map_back_to_their_cells(grid):
+    cells = np.arange(len(grid))
+    assert grid.cells_at(grid.lat, grid.lng).tolist() == cells.tolist()
+    assert [grid.cell_at(lat, lng) for lat, lng in zip(grid.lat[:50], grid.lng[:50])] == cells[:50].tolist()
+
+
+def test_vectorized_lookup_matches_scalar_lookup(grid):
+    bounds = grid.config["bounds"]
+    rng = np.random.default_rng(7)
+    # Includes points outside the bounding box
+    lat = rng.uniform(bounds["south"] - 0.05, bounds["north"] + 0.05, 500)
+    lng = rng.uniform(bounds["west"] - 0.05, bounds["east"] + 0.05, 500)
+    scalar = [grid.cell_at(a, b) for a, b in zip(lat.tolist(), lng.tolist())]
+    assert grid.cells_at(lat, lng).tolist() == [-1 if cell is None else cell for cell in scalar]
+    assert None in scalar
+
+
+def test_landmark_cells_carry_the_study_values(grid):
+    for landmark in TOKYO_LANDMARKS:
+        cell = grid.landmark_cells[landmark.name]
+        assert grid.names[cell] == landmark.name
+        assert grid.base_revenue[cell] == landmark.base_revenue
+        assert grid.location_factor[cell] == landmark.location_factor
+
+
+def test_local_maxima_finds_isolated_peaks(grid):
+    values = np.zeros(len(grid))
+    peaks = [grid.landmark_cells["Tokyo Station"], grid.landmark_cells["Shinjuku"]]
+    values[peaks] = [5.0, 3.0]
+    mask = grid.local_maxima(values)
+    assert mask[peaks].all()
+    neighbours = np.flatnonzero(distance_km(grid.lat, grid.lng, grid.lat[peaks[0]], grid.lng[peaks[0]]) < 1.2)
+    # Cells around a peak are its slopes, not peaks of their own
+    assert mask[neighbours].sum() == 1
+
+
+def test_plateau_yields_a_single_peak(grid):
+    values = np.ones(len(grid))
+    assert grid.local_maxima(values).sum() < 0.05 * len(grid)
+
+
+def test_select_spread_skips_close_entries():
+    lat = np.array([35.68, 35.681, 35.70, 35.72])
+    lng = np.array([139.76, 139.76, 139.76, 139.76])
+    assert select_spread(lat, lng, np.arange(4), 3, 0.5) == [0, 2, 3]
+    assert select_spread(lat, lng, np.arange(4), 2, 0.0) == [0, 1]
+
+
+def test_engines_share_one_grid():
+    assert research_integration.grid is tokyo_grid
+    assert weather_intelligence.grid is tokyo_grid
+    assert research_integration.zones.lat is tokyo_grid.lat
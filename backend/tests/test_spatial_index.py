@@ -0,0 +1,58 @@
+import numpy as np
+import pytest
+
+from services.spatial_grid import tokyo_grid, distance_km
+from services.spatial_index import SpatialIndex
+from services.traffic_service import TOKYO_STATIONS
+
+
+@pytest.fixture(scope="module")
+def index():
+    return SpatialIndex(tokyo_grid.lat, tokyo_grid.lng, tokyo_grid.names)
+
+
+@pytest.fixture(scope="module")
+def points():
+    rng = np.random.default_rng(11)
+    return rng.uniform(35.55, 35.80, 25), rng.uniform(139.58, 139.90, 25)
+
+
+def brute_distances(lat, lng):
+    return distance_km(tokyo_grid.lat, tokyo_grid.lng, lat, lng)
+
+
+def test_nearest_matches_brute_force(index, points):
+    for lat, lng in zip(*points):
+        distances, indices = index.nearest(lat, lng, k=5)
+        expected = brute_distances(lat, lng)
+        assert np.allclose(distances, np.sort(expected)[:5])
+        assert np.allclose(expected[indices], distances)
+
+
+def test_nearest_many_matches_single_queries(index, points):
+    lat, lng = points
+    distances, indices = index.nearest_many(lat, lng, k=3)
+    assert distances.shape == indices.shape == (len(lat), 3)
+    for row, (a, b) in enumerate(zip(lat, lng)):
+        assert indices[row].tolist() == index.nearest(a, b, k=3)[1].tolist()
+
+
+def test_within_matches_brute_force(index, points):
+    for lat, lng in zip(*points):
+        expected = np.flatnonzero(brute_distances(lat, lng) <= 2.0)
+        assert index.within(lat, lng, 2.0).tolist() == expected.tolist()
+
+
+def test_distances_from_matches_brute_force(index):
+    indices = np.arange(0, len(index), 97)
+    assert np.allclose(index.distances_from(35.68, 139.76, indices), brute_distances(35.68, 139.76)[indices])
+
+
+def test_station_index_from_records():
+    stations = SpatialIndex.from_records(TOKYO_STATIONS)
+    station = TOKYO_STATIONS[0]
+    distances, indices = stations.nearest(station["lat"], station["lng"], k=len(TOKYO_STATIONS) + 5)
+    # k is capped at the number of points
+    assert len(indices) == len(TOKYO_STATIONS)
+    assert stations.names[indices[0]] == station["name"]
+    assert distances[0] == pytest.approx(0.0)
@@ -0,0 +1,105 @@
+import json
+
+import pytest
+
+from services.station_store import StationStore, iter_json_array, station_row_from_odpt
+
+RECORDS = [
+    {"owl:sameAs": "odpt.Station:JR-East.Yamanote.Tokyo", "dc:title": "東京", "geo:lat": 35.6812,
+     "geo:long": 139.7671, "odpt:passengerJourneys": 462589, "nested": {"list": [1, 2, {"x": "]"}]}},
+    12345,
+    "a string with , and ] inside",
+    {"owl:sameAs": "odpt.Station:TokyoMetro.Ginza.Shibuya", "dc:title": "Shibuya Station"},
+    [True, False, None, -0.25e3]
+]
+
+
+async def chunked(payload: bytes, size: int):
+    for start in range(0, len(payload), size):
+        yield payload[start:start + size]
+
+
+async def parse(payload: bytes, size: int):
+    return [item async for item in iter_json_array(chunked(payload, size))]
+
+
+@pytest.mark.parametrize("indent", [None, 2])
+async def test_elements_split_across_every_chunk_boundary(indent):
+    payload = json.dumps(RECORDS, ensure_ascii=False, indent=indent).encode("utf-8")
+    for size in range(1, len(payload) + 1):
+        assert await parse(payload, size) == RECORDS, f"chunk size {size}"
+
+
+async def test_empty_array():
+    assert await parse(b" [ ] ", 1) == []
+
+
+async def test_rejects_non_arrays_and_truncated_responses():
+    with pytest.raises(ValueError, match="not a JSON array"):
+        await parse(b'{"error": "forbidden"}', 4)
+    with pytest.raises(ValueError, match="ended inside"):
+        await parse(b'[{"a": 1}, {"b"', 4)
+
+
+def test_station_row_from_odpt():
+    row = station_row_from_odpt(RECORDS[0], "JR-East.Yamanote")
+    assert row == {"id": "odpt.Station:JR-East.Yamanote.Tokyo", "line": "JR-East.Yamanote", "name": "東京 Station",
+                   "latitude": 35.6812, "longitude": 139.7671, "passenger_count": 462589}
+    # Fields ODPT does not provide are left out, so they do not overwrite stored values
+    assert station_row_from_odpt(RECORDS[3], "TokyoMetro.Ginza") == {
+        "id": "odpt.Station:TokyoMetro.Ginza.Shibuya", "line": "TokyoMetro.Ginza", "name": "Shibuya Station"}
+
+
+def row(i, **fields):
+    return {"id": f"s{i}", "name": f"Station {i}", "line": "L", "operational_status": "Normal",
+            "passenger_count": 1000 * i, "delays": 0, "congestion_level": 80,
+            "latitude": 35.6 + i / 100, "longitude": 139.7, **fields}
+
+
+@pytest.fixture
+def store():
+    built = []
+
+    def make_station(values):
+        built.append(values["id"])
+        return dict(values)
+
+    store = StationStore(make_station, lambda station: {"name": station["name"]}, capacity=4)
+    store.built = built
+    return store
+
+
+def test_apply_counts_only_changed_rows(store):
+    assert store.apply(row(i) for i in range(10)) == 10
+    assert len(store) == 10  # Grown past the initial capacity
+    assert store.apply(row(i) for i in range(10)) == 0
+    assert store.version == 1
+    assert store.apply([row(3, delays=5), row(7)]) == 1
+    assert store.version == 2
+    assert store.row(3)["delays"] == 5
+    assert store.get_stats()["rows_changed"] == 11
+
+
+def test_partial_rows_update_only_their_fields(store):
+    store.apply([row(1)])
+    store.apply([{"id": "s1", "operational_status": "Delayed"}])
+    assert store.row(store.index["s1"]) == {**row(1), "operational_status": "Delayed"}
+
+
+def test_station_objects_rebuilt_only_for_changed_rows(store):
+    store.apply(row(i) for i in range(5))
+    stations = store.stations()
+    assert store.built == [f"s{i}" for i in range(5)]
+    assert store.stations() is stations
+
+    records = store.records_for(stations)
+    assert records == [{"name": f"Station {i}"} for i in range(5)]
+    assert store.records_for(stations) is records
+
+    store.apply([row(2, name="Renamed")])
+    updated = store.stations()
+    assert updated is not stations
+    assert store.built[5:] == ["s2"]
+    assert updated[0] is stations[0]
+    assert store.records_for(stations) is None
+    assert store.records_for(updated)[2] == {"name": "Renamed"}
@@ -0,0 +1,82 @@
+import asyncio
+from datetime import datetime, timedelta
+
+import pytest
+
+from services.cache import StaleWhileRevalidateCache
+
+
+def age(cache, key, seconds):
+    """Pretend the entry for key was fetched this many seconds ago"""
+    cache._entries[key].stored_at = datetime.now() - timedelta(seconds=seconds)
+
+
+class Upstream:
+    def __init__(self):
+        self.calls = 0
+        self.fail = False
+
+    async def fetch(self):
+        self.calls += 1
+        await asyncio.sleep(0)
+        if self.fail:
+            raise RuntimeError("upstream down")
+        return self.calls
+
+
+def test_hard_ttl_below_soft_ttl_is_rejected():
+    with pytest.raises(ValueError):
+        StaleWhileRevalidateCache("test", soft_ttl=60, hard_ttl=30)
+
+
+async def test_fresh_entry_is_served_without_fetching():
+    cache, upstream = StaleWhileRevalidateCache("test", soft_ttl=60, hard_ttl=300), Upstream()
+    assert (await cache.get_or_fetch("k", upstream.fetch)).data == 1
+    assert (await cache.get_or_fetch("k", upstream.fetch)).data == 1
+    assert upstream.calls == 1
+    assert cache.stats["misses"] == 1 and cache.stats["fresh_hits"] == 1
+
+
+async def test_stale_entry_is_served_then_refreshed_in_background():
+    cache, upstream = StaleWhileRevalidateCache("test", soft_ttl=60, hard_ttl=300), Upstream()
+    await cache.get_or_fetch("k", upstream.fetch)
+    age(cache, "k", 120)
+
+    # Served immediately, with one background refresh however many callers see it stale
+    entries = await asyncio.gather(*[cache.get_or_fetch("k", upstream.fetch) for _ in range(5)])
+    assert [entry.data for entry in entries] == [1] * 5
+    assert cache.stats["background_refreshes"] == 1
+
+    await asyncio.gather(*cache._refresh_tasks.values())
+    assert upstream.calls == 2
+    assert (await cache.get_or_fetch("k", upstream.fetch)).data == 2
+
+
+async def test_failed_refresh_keeps_serving_the_stale_entry():
+    cache, upstream = StaleWhileRevalidateCache("test", soft_ttl=60, hard_ttl=300), Upstream()
+    await cache.get_or_fetch("k", upstream.fetch)
+    age(cache, "k", 120)
+    upstream.fail = True
+
+    assert (await cache.get_or_fetch("k", upstream.fetch)).data == 1
+    await asyncio.gather(*cache._refresh_tasks.values(), return_exceptions=True)
+    await asyncio.sleep(0)
+    assert cache.stats["background_failures"] == 1
+    assert (await cache.get_or_fetch("k", upstream.fetch)).data == 1
+
+
+async def test_entry_past_hard_ttl_is_a_miss():
+    cache, upstream = StaleWhileRevalidateCache("test", soft_ttl=60, hard_ttl=300), Upstream()
+    await cache.get_or_fetch("k", upstream.fetch)
+    age(cache, "k", 301)
+
+    assert cache.get_entry("k") is None
+    assert (await cache.get_or_fetch("k", upstream.fetch)).data == 2
+    assert cache.stats["misses"] == 2
+
+
+async def test_miss_with_failing_upstream_raises():
+    cache, upstream = StaleWhileRevalidateCache("test", soft_ttl=60, hard_ttl=300), Upstream()
+    upstream.fail = True
+    with pytest.raises(RuntimeError):
+        await cache.get_or_fetch("k", upstream.fetch)
@@ -0,0 +1,78 @@
+import asyncio
+import time
+
+import pytest
+
+from services.traffic_service import TrafficService, TOKYO_STATIONS
+
+
+@pytest.fixture
+def service():
+    service = TrafficService()
+    service.config["call_timeout"] = 0.2
+    return service
+
+
+async def test_fan_out_runs_calls_concurrently_up_to_the_limit(service):
+    service.config["fetch_concurrency"] = 3
+    in_flight, peak = 0, 0
+
+    async def fetch():
+        nonlocal in_flight, peak
+        in_flight += 1
+        peak = max(peak, in_flight)
+        await asyncio.sleep(0.02)
+        in_flight -= 1
+        return "ok"
+
+    started = time.perf_counter()
+    results, failed = await service._fan_out({f"call{i}": fetch for i in range(9)})
+    elapsed = time.perf_counter() - started
+    assert len(results) == 9 and not failed
+    assert peak == 3
+    assert elapsed < 9 * 0.02
+
+
+async def test_slow_and_failing_calls_degrade_only_themselves(service):
+    async def fast():
+        return 1
+
+    async def slow():
+        await asyncio.sleep(5)
+
+    async def broken():
+        raise ConnectionError("line down")
+
+    started = time.perf_counter()
+    results, failed = await service._fan_out({"fast": fast, "slow": slow, "broken": broken})
+    assert results == {"fast": 1}
+    assert failed == ["slow", "broken"]
+    assert time.perf_counter() - started < 1
+
+
+async def test_failed_line_keeps_its_stations_with_unknown_status(service, monkeypatch):
+    failing_line = TOKYO_STATIONS[0]["line"]
+    get_rows = service._get_line_station_rows
+
+    async def rows(line, infos, draws):
+        if line == failing_line:
+            raise ConnectionError("line down")
+        return await get_rows(line, infos, draws)
+
+    monkeypatch.setattr(service, "_get_line_station_rows", rows)
+    traffic = await service._collect_odpt_traffic_data()
+
+    assert traffic.degraded == [f"stations:{failing_line}"]
+    assert len(traffic.stations) == len(TOKYO_STATIONS)
+    for station in traffic.stations:
+        assert (station.operational_status == "Unknown") == (station.line == failing_line)
+
+
+async def test_collection_fails_when_every_sub_fetch_fails(service, monkeypatch):
+    async def broken(*args):
+        raise ConnectionError("ODPT down")
+
+    for name in ("_get_line_station_rows", "_get_service_disruptions", "_get_congestion_levels"):
+        monkeypatch.setattr(service, name, broken)
+    with pytest.raises(Exception, match="sub-fetches failed"):
+        await service._collect_odpt_traffic_data()
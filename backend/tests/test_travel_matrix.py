@@ -0,0 +1,99 @@
+import json
+import os
+
+import numpy as np
+import pytest
+
+from services.spatial_grid import SpatialDemandGrid, tokyo_grid, distance_km
+from services.travel_matrix import TravelTimeMatrix
+
+STATIONS = [
+    {"name": "Tokyo Station", "lat": 35.6812, "lng": 139.7671},
+    {"name": "Shinjuku Station", "lat": 35.6896, "lng": 139.7006}
+]
+
+
+@pytest.fixture(scope="module")
+def grid():
+    return SpatialDemandGrid({**tokyo_grid.config, "cell_size_m": 2000})
+
+
+@pytest.fixture
+def matrix(grid, tmp_path):
+    config = {**TravelTimeMatrix(grid, STATIONS).config, "directory": str(tmp_path)}
+    return TravelTimeMatrix(grid, STATIONS, config)
+
+
+def test_build_and_memory_mapped_load(matrix, tmp_path):
+    matrix.load()
+    assert os.path.exists(tmp_path / "meta.json")
+    assert isinstance(matrix.minutes, np.memmap)
+    assert matrix.minutes.shape == (matrix.node_count, matrix.node_count)
+    assert matrix.minutes.dtype == np.float32
+    assert np.all(np.diag(matrix.minutes) == 0)
+
+
+def test_distances_follow_the_detour_factor(matrix, grid):
+    matrix.load()
+    tokyo, shinjuku = matrix.station_nodes["Tokyo Station"], matrix.station_nodes["Shinjuku Station"]
+    straight = distance_km(STATIONS[0]["lat"], STATIONS[0]["lng"], STATIONS[1]["lat"], STATIONS[1]["lng"])
+    assert matrix.road_distance(tokyo, shinjuku) == pytest.approx(straight * 1.3, rel=1e-5)
+    assert matrix.road_distance_between(np.array([tokyo]), np.array([shinjuku]))[0, 0] == \
+        pytest.approx(matrix.road_distance(tokyo, shinjuku))
+
+
+def test_time_of_day_and_rain_layers(matrix):
+    matrix.load()
+    origin, destination = matrix.station_nodes["Tokyo Station"], matrix.station_nodes["Shinjuku Station"]
+    night = matrix.travel_minutes(origin, destination, hour=3)
+    rush = matrix.travel_minutes(origin, destination, hour=8)
+    heavy_rain = matrix.travel_minutes(origin, destination, hour=8, rain_intensity=10.0)
+    assert night < rush < heavy_rain
+    assert heavy_rain == pytest.approx(rush * 1.35)
+    assert [matrix.rain_bucket(r) for r in (0.0, 0.5, 3.0, 10.0)] == [0, 1, 2, 3]
+
+
+def test_batched_lookups_match_single_lookups(matrix):
+    matrix.load()
+    origins = np.array([0, 5, matrix.station_nodes["Tokyo Station"]])
+    destinations = np.array([7, 2, 11])
+    pairs = matrix.travel_minutes_pairs(origins, destinations, 18, 2.0)
+    between = matrix.travel_minutes_between(origins, destinations, 18, 2.0)
+    for i, (origin, destination) in enumerate(zip(origins.tolist(), destinations.tolist())):
+        single = matrix.travel_minutes(origin, destination, 18, 2.0)
+        assert pairs[i] == pytest.approx(single)
+        assert between[i, i] == pytest.approx(single)
+        assert matrix.travel_minutes_from(origin, destinations, 18, 2.0)[i] == pytest.approx(single)
+
+
+def test_stale_matrix_is_rebuilt(matrix, grid, tmp_path):
+    matrix.build()
+    with open(tmp_path / "meta.json") as f:
+        meta = json.load(f)
+    meta["cells"] += 1
+    with open(tmp_path / "meta.json", "w") as f:
+        json.dump(meta, f)
+
+    with pytest.raises(RuntimeError):
+        TravelTimeMatrix(grid, STATIONS, matrix.config).load(build_missing=False)
+    rebuilt = TravelTimeMatrix(grid, STATIONS, matrix.config)
+    rebuilt.load()
+    assert rebuilt.minutes.shape[0] == rebuilt.node_count
+
+
+def test_oversized_grids_are_refused(grid, tmp_path):
+    config = {**TravelTimeMatrix(grid, STATIONS).config, "directory": str(tmp_path), "max_nodes": 10}
+    matrix = TravelTimeMatrix(grid, STATIONS, config)
+    with pytest.raises(ValueError, match="TRAVEL_MATRIX_MAX_NODES"):
+        matrix.compute()
+    with pytest.raises(ValueError):
+        matrix.load()
+    assert not os.listdir(tmp_path)
+
+
+def test_resolve_places(matrix, grid):
+    assert matrix.resolve("tokyo") == matrix.station_nodes["Tokyo Station"]
+    assert matrix.resolve("Shinjuku Station") == matrix.station_nodes["Shinjuku Station"]
+    assert matrix.resolve("Ginza") == grid.landmark_cells["Ginza"]
+    assert matrix.resolve("Setagaya") is not None
+    assert matrix.resolve("Osaka") is None
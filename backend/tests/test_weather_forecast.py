@@ -0,0 +1,119 @@
+import math
+from dataclasses import replace
+from datetime import datetime, timedelta
+
+import numpy as np
+import pytest
+
+from services.weather_forecast import JST, JMAForecast, parse_jma_forecast
+from services.weather_service import WeatherService
+
+DAY = datetime(2026, 10, 5, tzinfo=JST)
+
+
+def at(days=0, hours=0):
+    return DAY + timedelta(days=days, hours=hours)
+
+
+def iso(when):
+    return when.isoformat(timespec="seconds")
+
+
+def sample():
+    """JMA forecast response (short-term and weekly report) for 東京都"""
+    short_term = {
+        "publishingOffice": "気象庁", "reportDatetime": iso(at(hours=5)),
+        "timeSeries": [
+            {"timeDefines": [iso(at(hours=5)), iso(at(1)), iso(at(2))],
+             "areas": [{"area": {"name": "東京地方", "code": "130010"}, "weatherCodes": ["313", "201", "100"]},
+                       {"area": {"name": "伊豆諸島北部", "code": "130020"}, "weatherCodes": ["200", "200", "101"]}]},
+            {"timeDefines": [iso(at(hours=h)) for h in (0, 6, 12, 18, 24, 30, 36, 42)],
+             "areas": [{"area": {"name": "東京地方", "code": "130010"}, "pops": ["", "", "80", "60", "20", "10", "0", "0"]},
+                       {"area": {"name": "伊豆諸島北部", "code": "130020"}, "pops": ["", "", "30", "30", "10", "10", "0", "0"]}]},
+            # JMA lists the day's maximum (09:00) before its minimum (00:00)
+            {"timeDefines": [iso(at(hours=9)), iso(at()), iso(at(1)), iso(at(1, 9))],
+             "areas": [{"area": {"name": "東京", "code": "44132"}, "temps": ["21", "21", "15", "24"]}]}
+        ]
+    }
+    weekly = {
+        "publishingOffice": "気象庁", "reportDatetime": iso(at(hours=11)),
+        "timeSeries": [
+            {"timeDefines": [iso(at(i)) for i in range(7)],
+             "areas": [{"area": {"name": "東京地方", "code": "130010"},
+                        "weatherCodes": ["", "201", "100", "101", "200", "300", "200"],
+                        "pops": ["", "20", "10", "10", "30", "60", "30"]}]},
+            {"timeDefines": [iso(at(i)) for i in range(7)],
+             "areas": [{"area": {"name": "東京", "code": "44132"},
+                        "tempsMin": ["", "15", "14", "13", "15", "16", "14"],
+                        "tempsMax": ["", "24", "23", "22", "21", "20", "22"]}]}
+        ]
+    }
+    return [short_term, weekly]
+
+
+@pytest.fixture
+def forecast():
+    return parse_jma_forecast(sample())
+
+
+def test_every_series_and_area_is_parsed(forecast):
+    assert set(forecast.series) == {"weather_code", "pop", "temp", "weekly_weather_code", "weekly_pop",
+                                    "weekly_temp_min", "weekly_temp_max"}
+    pop = forecast.series["pop"]
+    assert pop.values.shape == (2, 8) and pop.values.dtype == np.float32
+    assert pop.area_codes == ["130010", "130020"]
+    assert math.isnan(pop.values[0, 0])
+    # Steps are sorted by time
+    assert (np.diff(forecast.series["temp"].times) > np.timedelta64(0, "s")).all()
+    assert forecast.office == "気象庁"
+    assert forecast.issued_at == at(hours=5)
+
+
+def test_weather_code_per_area_and_weekly_fallback(forecast):
+    assert forecast.weather_code_at(at(hours=12), "130010") == "313"
+    assert forecast.weather_code_at(at(1, 12), "130010") == "201"
+    assert forecast.weather_code_at(at(hours=12), "130020") == "200"
+    # Unknown areas read the office's main area
+    assert forecast.weather_code_at(at(hours=12), "999999") == "313"
+    # Past the short-term report
+    assert forecast.weather_code_at(at(5, 12), "130010") == "300"
+
+
+def test_max_pop_over_a_window(forecast):
+    assert forecast.max_pop(at(hours=12), at(hours=17), "130010") == 80
+    assert forecast.max_pop(at(hours=18), at(hours=23), "130010") == 60
+    assert forecast.max_pop(at(hours=12), at(hours=17), "130020") == 30
+    assert forecast.max_pop(at(5, 1), at(5, 3), "130010") == 60
+
+
+def test_temperatures_from_short_term_and_weekly_reports(forecast):
+    assert forecast.day_range(at(1, 12), "44132") == (15.0, 24.0)
+    assert forecast.day_range(at(3, 12), "44132") == (13.0, 22.0)
+    assert forecast.temperature_at(at(1, 14), "44132") == pytest.approx(24.0)
+    assert forecast.temperature_at(at(1, 2), "44132") == pytest.approx(15.0)
+    assert forecast.day_range(at(30), "44132") is None
+
+
+def test_round_trip_through_dict(forecast):
+    restored = JMAForecast.from_dict(forecast.to_dict())
+    for when in (at(hours=12), at(1, 12), at(5, 12)):
+        assert restored.weather_code_at(when, "130010") == forecast.weather_code_at(when, "130010")
+        assert restored.temperature_at(when, "44132") == forecast.temperature_at(when, "44132")
+    assert np.array_equal(restored.series["pop"].values, forecast.series["pop"].values, equal_nan=True)
+
+
+def test_response_without_series_is_rejected():
+    with pytest.raises(ValueError):
+        parse_jma_forecast([{"publishingOffice": "気象庁", "timeSeries": []}])
+
+
+def test_forecast_at_is_deterministic(forecast):
+    service = WeatherService()
+    weather = replace(service.get_fallback_weather(), timestamp=at(hours=10), forecast=forecast)
+    outlooks = [service.forecast_at(weather, 3, window_hours=3) for _ in range(3)]
+    assert outlooks[0] == outlooks[1] == outlooks[2]
+    assert outlooks[0]["weather_code"] == "313"
+    assert outlooks[0]["precipitation"] == 4.0
+    assert outlooks[0]["rain_probability"] == 80
+
+    assert service.forecast_at(service.get_fallback_weather(), 3) is None